@@ -84,6 +84,47 @@ class Config:
             'junk': 7           # Junk emails 7 days
         }
         
+        # Rules engine settings
+        self.rules_settings = {
+            'content_fetch_max_bytes': 2048,  # Partial body fetch cap for content rules
+            'header_cache_size': 50000,  # Headers kept per account for rule backtesting
+            'columnar_min_batch': 1000,  # Batch size from which rules are evaluated column-wise
+            'parallel_min_batch': 20000,  # Backfill size from which rules are evaluated in a process pool
+            'parallel_workers': 0,  # Backfill worker processes (0 = number of CPUs)
+            'first_match': False,  # Stop at the first matching rule for each email
+            'regex_message_budget_ms': 50  # CPU time a regex rule may spend on one message before it is disabled
+        }
+        
+        # Processing scheduler settings
+        self.scheduler_settings = {
+            'worker_threads': 4,  # Threads running processing jobs for all accounts
+            'adaptive_intervals': True,  # Adjust polling intervals to each account's arrival rate
+            'inbox_min_interval': 1,  # Shortest inbox interval (minutes)
+            'inbox_max_interval': 30,  # Longest inbox interval (minutes)
+            'folder_max_interval': 60,  # Longest interval for empty training folders (minutes)
+            'target_messages_per_cycle': 20,  # New messages an inbox cycle should pick up
+            'arrival_ewma_alpha': 0.3,  # Weight of the latest cycle in the arrival rate
+            'empty_cycles_before_backoff': 3,  # Empty training folder cycles before backing off
+            'job_jitter_seconds': 15,  # Random delay added to each job's start time
+            'max_cycle_starts_per_second': 2,  # Processing cycles started per second across all accounts (0 = unlimited)
+            'interactive_workers': 1,  # Worker threads reserved for dashboard requests
+            'manual_batch_timeout': 60,  # Seconds a dashboard batch request waits before answering 202
+            'backfill_window_size': 500,  # Messages per UID window in startup backfill
+            'backfill_target_rate': 100,  # Backfill messages per second (0 = unlimited)
+            'backfill_slice_seconds': 30,  # Backfill time on the lane before yielding to other jobs
+            'leader_election': True,  # Only one web worker process runs the processing engine
+            'leader_retry_interval': 5,  # Seconds between follower attempts to take over the leader lease
+            'control_timeout': 600,  # Seconds a follower waits for a proxied call to the leader
+            'sharded_processing': False,  # Run accounts in worker.py processes; the web app only controls them
+            'shard_lease_ttl': 30,  # Seconds a shard worker's account lease and heartbeat stay valid
+            'shard_heartbeat_interval': 10,  # Seconds between shard worker reconcile cycles
+            'trace_history_size': 20,  # Traced processing cycles kept in memory per account
+            'task_history_size': 1000,  # Task history entries kept in memory
+            'task_history_segment_entries': 10000,  # Task history entries per on-disk segment file
+            'task_history_max_segments': 50,  # Task history segment files kept on disk
+            'auto_transition_check_interval': 3600  # Seconds between checks for accounts ready for maintenance mode
+        }
+        
         self._load_config()
         self._ensure_directories()
     
@@ -245,6 +286,14 @@ class Config:
         """Get all retention settings"""
         return self.retention_settings.copy()
     
+    def get_rules_setting(self, key: str, default=None):
+        """Get a rules engine setting"""
+        return self.rules_settings.get(key, default)
+    
+    def get_scheduler_setting(self, key: str, default=None):
+        """Get a processing scheduler setting"""
+        return self.scheduler_settings.get(key, default)
+    
     def _load_from_secure_config(self):
         """Load configuration from encrypted secure_config.json"""
         try:
@@ -269,6 +318,14 @@ class Config:
             # Load retention settings if present
             if 'retention_settings' in secure_data:
                 self.retention_settings.update(secure_data['retention_settings'])
+            
+            # Load rules engine settings if present
+            if 'rules_settings' in secure_data:
+                self.rules_settings.update(secure_data['rules_settings'])
+            
+            # Load scheduler settings if present
+            if 'scheduler_settings' in secure_data:
+                self.scheduler_settings.update(secure_data['scheduler_settings'])
         except Exception as e:
             print(f"Warning: Could not load secure config: {e}")
     
@@ -294,6 +351,8 @@ class Config:
         secure_data = {
             'accounts': [],
             'retention_settings': self.retention_settings,
+            'rules_settings': self.rules_settings,
+            'scheduler_settings': self.scheduler_settings,
             'version': '1.0',
             'created_at': str(Path(__file__).stat().st_mtime)
         }
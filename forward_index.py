@@ -0,0 +1,117 @@
+"""
+Forward Index for Mail-Rulez
+
+Persistent per-account state for mail forwarding: a hash index of the
+Message-IDs already forwarded, and the highest UID scanned in each folder.
+Forwarding uses the checkpoint to fetch only new messages and the index to
+skip duplicates across restarts.
+"""
+
+import dbm
+import hashlib
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# Key prefix for per-folder UID checkpoints; Message-ID keys are raw digests
+_CHECKPOINT_PREFIX = b"checkpoint:"
+
+
+class ForwardIndex:
+    """
+    On-disk set of forwarded Message-IDs plus per-folder UID checkpoints
+
+    Each account has one dbm database. Message-IDs are stored as fixed-size
+    SHA-1 digests, so membership checks are a single hash lookup regardless
+    of how many messages have been forwarded.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self._databases: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('forward_index')
+
+    def _database(self, account_email: str):
+        database = self._databases.get(account_email)
+        if database is None:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            safe_name = re.sub(r'[^A-Za-z0-9@._-]', '_', account_email)
+            database = dbm.open(str(self.index_dir / safe_name), 'c')
+            self._databases[account_email] = database
+        return database
+
+    @staticmethod
+    def _key(message_id: str) -> bytes:
+        return hashlib.sha1(message_id.strip().lower().encode('utf-8', 'replace')).digest()
+
+    def contains(self, account_email: str, message_id: str) -> bool:
+        """Whether a message has already been forwarded"""
+        with self._lock:
+            return self._key(message_id) in self._database(account_email)
+
+    def add(self, account_email: str, message_id: str):
+        """Record a forwarded message"""
+        with self._lock:
+            self._database(account_email)[self._key(message_id)] = b"1"
+
+    def get_checkpoint(self, account_email: str, folder: str, uidvalidity: int) -> int:
+        """
+        Highest UID already scanned in a folder
+
+        Args:
+            account_email: Account the folder belongs to
+            folder: IMAP folder name
+            uidvalidity: Current UIDVALIDITY of the folder
+
+        Returns:
+            int: Last scanned UID, or 0 if the folder was never scanned or
+                 its UIDVALIDITY changed
+        """
+        with self._lock:
+            value = self._database(account_email).get(_CHECKPOINT_PREFIX + folder.encode('utf-8'))
+        if not value:
+            return 0
+        stored_validity, _, last_uid = value.decode().partition(':')
+        return int(last_uid) if int(stored_validity) == int(uidvalidity) else 0
+
+    def set_checkpoint(self, account_email: str, folder: str, uidvalidity: int, last_uid: int):
+        """Record the highest UID scanned in a folder"""
+        with self._lock:
+            database = self._database(account_email)
+            database[_CHECKPOINT_PREFIX + folder.encode('utf-8')] = f"{int(uidvalidity)}:{int(last_uid)}".encode()
+            # Write the dbm index through so a crash does not lose the checkpoint
+            if hasattr(database, 'sync'):
+                database.sync()
+
+    def close(self):
+        """Close all open databases"""
+        with self._lock:
+            for database in self._databases.values():
+                database.close()
+            self._databases = {}
+
+
+# Global forward index instance
+_forward_index: Optional[ForwardIndex] = None
+_forward_index_lock = threading.Lock()
+
+
+def get_forward_index() -> ForwardIndex:
+    """
+    Get global forward index instance (singleton)
+
+    Returns:
+        ForwardIndex: Forward index stored under the configured data directory
+    """
+    global _forward_index
+
+    with _forward_index_lock:
+        if _forward_index is None:
+            from config import get_config
+            _forward_index = ForwardIndex(get_config().data_dir / "forward_index")
+
+        return _forward_index
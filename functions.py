@@ -1,12 +1,17 @@
 from imap_tools import MailBox
 from datetime import datetime, timedelta
-import smtplib, ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 import os
+import re
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from config import get_config
+from metrics import get_stage_latency, get_metric_registry
+from tracing import span, traced, set_attributes
 load_dotenv()
 
 class Rule:
@@ -18,12 +23,45 @@ class Rule:
         self.registry.append(m)
 
 class Mail:
-    def __init__(self, uid, subject, from_, date_str, date):
+    def __init__(self, uid, subject, from_, date_str, date, size=0):
         self.uid = uid
         self.subject = subject
         self.from_ = from_
         self.date_str = date_str
         self.date = date
+        self.size = size
+
+
+class _PooledMailBox:
+    """Shared mailbox handed out inside an Account session; logout() keeps it open"""
+
+    def __init__(self, mailbox):
+        self._mailbox = mailbox
+
+    def __getattr__(self, name):
+        return getattr(self._mailbox, name)
+
+    def logout(self):
+        pass
+
+
+def _instrument_client(client):
+    """Time every IMAP command on a connection, labelled by verb (UID commands by sub-command)"""
+    simple_command = client._simple_command
+    registry = get_metric_registry()
+
+    def timed_command(name, *args):
+        verb = f"UID {args[0]}".upper() if name == 'UID' and args else name
+        start = time.perf_counter()
+        try:
+            return simple_command(name, *args)
+        except Exception:
+            registry.inc('mail_rulez_imap_command_errors_total', verb=verb)
+            raise
+        finally:
+            registry.observe('mail_rulez_imap_command_seconds', time.perf_counter() - start, verb=verb)
+
+    client._simple_command = timed_command
 
 
 class Account():
@@ -31,12 +69,88 @@ class Account():
         self.server = server
         self.email = email
         self.password = password
+        self._pooled = None  # Connection reused by session() blocks
+        self._session_owner = None
+        self._session_depth = 0
+        self._session_lock = threading.RLock()
+        self._close_pending = False
 
     def login(self):
         """Login to server account, return mailbox object"""
-        mb = MailBox(self.server).login(self.email, self.password)
+        if self._session_owner == threading.get_ident():
+            if self._pooled is None:
+                self._pooled = self._connect()
+            return _PooledMailBox(self._pooled)
+        return self._connect()
+
+    def _connect(self):
+        with get_stage_latency().time(self.email, 'login'), span('login', server=self.server):
+            mailbox = MailBox(self.server)
+            _instrument_client(mailbox.client)
+            try:
+                mb = mailbox.login(self.email, self.password)
+            except Exception:
+                get_metric_registry().inc('mail_rulez_imap_logins_total', result='failure')
+                raise
+        get_metric_registry().inc('mail_rulez_imap_logins_total', result='success')
         return mb
 
+    @contextmanager
+    def session(self):
+        """
+        Reuse one connection for every login() made by this thread inside the block.
+        The connection stays open for the next session and is checked with NOOP before reuse.
+        Other threads calling login() meanwhile get their own connection.
+        """
+        with self._session_lock:
+            outer = self._session_depth == 0
+            if outer:
+                self._session_owner = threading.get_ident()
+                self._check_pooled()
+            self._session_depth += 1
+            try:
+                yield self
+            finally:
+                self._session_depth -= 1
+                if outer:
+                    self._session_owner = None
+                    if self._close_pending:
+                        self._close_pooled()
+
+    def close_session(self):
+        """Log out the pooled connection, or once the running session ends"""
+        if self._session_lock.acquire(blocking=False):
+            try:
+                if self._session_depth:
+                    # Called from inside this thread's own session; the RLock let us back in
+                    self._close_pending = True
+                else:
+                    self._close_pooled()
+            finally:
+                self._session_lock.release()
+        else:
+            self._close_pending = True
+
+    def _check_pooled(self):
+        if self._pooled is None:
+            return
+        try:
+            self._pooled.client.noop()
+        except Exception:
+            logging.getLogger(__name__).debug(f"Pooled connection for {self.email} went stale, reconnecting")
+            get_metric_registry().inc('mail_rulez_imap_reconnects_total')
+            self._pooled = None
+
+    def _close_pooled(self):
+        self._close_pending = False
+        if self._pooled is not None:
+            try:
+                self._pooled.logout()
+            except Exception:
+                pass
+            self._pooled = None
+
+@traced()
 def fetch_class(login, folder="INBOX", age=None, limit=None):
     """
     Fetches messages from Account, classes them as Mail, changes date to date(), and returns list of those Mail
@@ -47,19 +161,143 @@ def fetch_class(login, folder="INBOX", age=None, limit=None):
     login.folder.set(folder)
     batch = login.fetch(limit=limit, mark_seen=False, bulk=True, reverse=True, headers_only=True)
     for item in batch:
-        item = Mail(item.uid, item.subject, item.from_, item.date_str, item.date)
-        classed_mail.append(item)
+        mail = Mail(item.uid, item.subject, item.from_, item.date_str, item.date)
+        mail.size = getattr(item, 'size_rfc822', 0)
+        classed_mail.append(mail)
     for item in classed_mail:
         item.date = item.date.date()
+    set_attributes(folder=folder, uids=len(classed_mail))
     return classed_mail
 
 
+_TEXT_PART_ITEMS = 'BODY.PEEK[HEADER.FIELDS (CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] BODY.PEEK[1.MIME]'
+
+
+def _parse_fetch_sections(data):
+    """
+    Groups the literals of a multi-item UID FETCH response by message
+    :param data: response data as returned by imaplib
+    :return: dict of uid -> {'header' | 'mime' | 'body': bytes}
+    """
+    uid_pattern = re.compile(rb'UID (\d+)')
+    messages = {}
+    sections, uid = None, None
+    for part in data:
+        prefix = part[0] if isinstance(part, tuple) else part
+        if not isinstance(prefix, bytes):
+            continue
+        if isinstance(part, tuple) and re.match(rb'\d+ \(', prefix):
+            # A new message starts
+            sections, uid = {}, None
+        if sections is None:
+            continue
+        match = uid_pattern.search(prefix)
+        if match:
+            uid = match.group(1).decode()
+            messages[uid] = sections
+        if isinstance(part, tuple):
+            if b'HEADER.FIELDS' in prefix:
+                sections['header'] = part[1] or b''
+            elif b'.MIME]' in prefix:
+                sections['mime'] = part[1] or b''
+            elif b'BODY[' in prefix:
+                sections['body'] = part[1] or b''
+    return messages
+
+
+def _decode_text_part(sections):
+    """
+    Decodes a (possibly truncated) first body part using its MIME headers
+    :param sections: fetched sections of one message
+    :return: decoded text, or None if the part is not a text part this can decode
+    """
+    from email.parser import BytesHeaderParser
+    import base64
+    import quopri
+
+    import binascii
+
+    parser = BytesHeaderParser()
+    part = parser.parsebytes(sections.get('header') or b'')
+    if part.get_content_maintype() == 'multipart':
+        part = parser.parsebytes(sections.get('mime') or b'')
+    # Otherwise the message is single-part and its first part is the body the message header describes
+    if part.get_content_maintype() != 'text':
+        return None  # e.g. a nested multipart/alternative
+
+    body = sections.get('body') or b''
+    encoding = (part.get('Content-Transfer-Encoding') or '7bit').strip().lower()
+    if encoding == 'base64':
+        body = re.sub(rb'[^A-Za-z0-9+/=]', b'', body)
+        try:
+            # The fetch may end mid-group; decode the complete groups
+            body = base64.b64decode(body[:len(body) - len(body) % 4])
+        except binascii.Error:
+            return None
+    elif encoding == 'quoted-printable':
+        body = quopri.decodestring(body)
+    elif encoding not in ('7bit', '8bit', 'binary'):
+        return None
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return body.decode(charset, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+
+def _fetch_full_texts(login, uids, max_bytes):
+    """Fetches whole messages and returns their text (or HTML) part, capped at max_bytes characters"""
+    from imap_tools import AND
+    texts = {}
+    for msg in login.fetch(AND(uid=[str(uid) for uid in uids]), mark_seen=False, bulk=True):
+        texts[str(msg.uid)] = (msg.text or msg.html or '')[:int(max_bytes)]
+    return texts
+
+
+@traced()
+def fetch_text_parts(login, uids, max_bytes):
+    """
+    Fetches the leading bytes of the first body part for a batch of messages in one UID FETCH command.
+    The part is decoded using its MIME headers (fetched in the same command); messages whose first
+    part is not a decodable text part, such as a nested multipart, fall back to a full fetch.
+    Uses BODY.PEEK so messages are not marked as seen.
+    :param login: mailbox with the folder already selected
+    :param uids: list of message UIDs
+    :param max_bytes: maximum number of body bytes to fetch per message
+    :return: dict of uid -> decoded text (messages the server returned nothing for are omitted)
+    """
+    texts = {}
+    if not uids:
+        return texts
+    result = login.client.uid('FETCH', ','.join(str(uid) for uid in uids),
+                              f'({_TEXT_PART_ITEMS} BODY.PEEK[1]<0.{int(max_bytes)}>)')
+    if result[0] != 'OK':
+        logging.warning(f"Partial body fetch failed: {result[1]}")
+        return texts
+    full_fetch = []
+    for uid, sections in _parse_fetch_sections(result[1]).items():
+        text = _decode_text_part(sections)
+        if text is None:
+            full_fetch.append(uid)
+        else:
+            texts[uid] = text
+    if full_fetch:
+        try:
+            texts.update(_fetch_full_texts(login, full_fetch, max_bytes))
+        except Exception as e:
+            logging.warning(f"Full body fetch failed for {len(full_fetch)} messages: {e}")
+    set_attributes(uids=len(uids), bytes=sum(len(text) for text in texts.values()), full_fetches=len(full_fetch))
+    return texts
+
+
+@traced()
 def purge_old(login, folder, age):
     """Purges all messages in specified folder over a specified age"""
     today = datetime.now().date()
     mail = fetch_class(login, folder=folder, age=age)
     purge = [item.uid for item in mail if today - item.date > timedelta(days=age)]
     login.delete(purge)
+    set_attributes(folder=folder, uids=len(purge))
 
 
 def rm_blanks(file):
@@ -278,6 +516,7 @@ def remove_gmail_label(mailbox, message_uids, label_name):
     return success_count, errors
 
 
+@traced()
 def gmail_aware_move(mailbox, message_uids, destination_folder, source_folder=None):
     """
     Gmail-specific move that properly handles label cleanup
@@ -296,6 +535,7 @@ def gmail_aware_move(mailbox, message_uids, destination_folder, source_folder=No
     
     if not message_uids:
         return result
+    set_attributes(uids=len(message_uids), folder=destination_folder)
     
     try:
         # First, perform the standard move operation (adds destination label)
@@ -322,49 +562,110 @@ def gmail_aware_move(mailbox, message_uids, destination_folder, source_folder=No
     return result
 
 
-def forward(account, sndr_to_fwd, fwd_addr, sent_mail):
+def build_forward_message(msg, from_addr, fwd_addr):
+    """
+    Builds the forwarded copy of a message
+    :param msg: imap_tools MailMessage to forward
+    :param from_addr: string.  address the copy is sent from
+    :param fwd_addr: string.  address to which the message is forwarded
+    :return: MIMEMultipart message
+    """
+    message = f"""----------------------------------<br>
+        From:  {msg.from_}<br>
+        To:  {msg.to}<br>
+        Subject:  FWD: {msg.subject}<br><br>
+    
+        {msg.html}"""
+
+    mail = MIMEMultipart()
+    mail["Subject"] = msg.subject
+    mail["From"] = from_addr
+    mail["To"] = fwd_addr
+    mail.attach(MIMEText(message, "html"))
+    return mail
+
+
+def message_id(msg):
+    """
+    Returns the Message-ID header of a message, or a (date, from, subject) key for messages without one
+    :param msg: imap_tools MailMessage
+    :return: string
+    """
+    values = msg.headers.get('message-id') or ()
+    if values and values[0].strip():
+        return values[0].strip()
+    return f"{msg.date_str}|{msg.from_}|{msg.subject}"
+
+
+def forward(account, sndr_to_fwd, fwd_addr, sent_mail=None, folder="INBOX"):
     """
     This function will forward emails from a list of specified senders to a specified address.
-    Messages that have been forwarded are logged as tuples (date, subject) and added to the sent_mail list.
-    Messages that meet the sender criteria are checked against the sent_mail list to avoid duplicate sending.
-    sent_mail list lives in memory and starts fresh each time mail_rulez_*.py is reloaded.
-    It is hardcoded to work with jay@jay-cohen.info account as specified in the .env file.
+    Only messages with UIDs above the folder's checkpoint are fetched, and senders are filtered by the server.
+    Forwarded Message-IDs are kept in a persistent on-disk index, so nothing is sent twice, even across restarts.
+    Messages are handed to the account's SMTP delivery queue, which sends them over a pooled connection.
+    A Message-ID is only indexed once the SMTP server has accepted it, and the checkpoint stays below the
+    lowest UID still waiting for delivery, so messages dropped by a restart or rejected are scanned again.
     :param account: will be called from the mail_rulez_*.py module
     :param sndr_to_fwd: list.  sender addresses whose messages will be forwarded
     :param fwd_addr:  string.  address to which messages will be forwarded
-    :param sent_mail:  list of mail already forwarded.  List of tuples (msg.date, msg.subject)
-    :return:
+    :param sent_mail:  optional list; (msg.date, msg.subject) of each forwarded message is appended to it
+    :param folder:  string.  folder to scan
+    :return: int.  number of messages queued for forwarding
     """
+    from functools import partial
+    from imap_tools import AND, OR, U
+    from services.smtp_sender import get_smtp_sender
+    from forward_index import get_forward_index
+
+    if not sndr_to_fwd:
+        return 0
+
     account_email = os.getenv("account_email")
     smtp_server = os.getenv("smtp_server")
     smtp_port = os.getenv("smtp_port")
     password = os.getenv("password")
+    sender = get_smtp_sender(account_email, password, smtp_server, smtp_port or 465)
+    index = get_forward_index()
+    senders = set(sndr_to_fwd)
 
     login = account.login()
-    for msg in login.fetch():
-        if msg.from_ in sndr_to_fwd:
-            mail_item = (msg.date, msg.subject)
-            if mail_item not in sent_mail:
-                sent_mail.append((msg.date, msg.subject))
-                message = f"""----------------------------------<br>
-        From:  {msg.from_}<br>
-        To:  {msg.to}<br>
-        Subject:  FWD: {msg.subject}<br><br>
-    
-        {msg.html}"""
-
-                ######  EMAIL  #######
-
-                mail = MIMEMultipart()
-                mail["Subject"] = msg.subject
-                mail["From"] = account_email
-                mail["To"] = fwd_addr
-                mail.attach(MIMEText(message, "html"))
-
-                #  Try to connect to mailserver and send
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(smtp_server, smtp_port, context=context) as server:
-                    server.login(account_email, password)
-                    server.sendmail(account_email, fwd_addr, mail.as_string())
-        else:
-            continue
\ No newline at end of file
+    try:
+        login.folder.set(folder)
+        status = login.folder.status(folder, ['UIDVALIDITY', 'UIDNEXT'])
+        last_uid = index.get_checkpoint(account_email, folder, status['UIDVALIDITY'])
+        highest = max(last_uid, status['UIDNEXT'] - 1)
+        # Lowest UID not yet delivered; the checkpoint must stay below it
+        undelivered = highest + 1
+
+        # Headers only for new messages from the listed senders; FROM is a substring match, so recheck
+        new_uids = []
+        criteria = AND(OR(from_=sorted(senders)), uid=U(last_uid + 1, '*'))
+        for msg in login.fetch(criteria, mark_seen=False, headers_only=True, bulk=True):
+            uid = int(msg.uid)
+            if uid <= last_uid:
+                continue  # "n:*" always includes the newest message
+            highest = max(highest, uid)
+            if msg.from_ not in senders:
+                continue
+            key = message_id(msg)
+            if index.contains(account_email, key):
+                continue
+            undelivered = min(undelivered, uid)
+            if not sender.is_pending(key):  # still queued from an earlier run
+                new_uids.append(msg.uid)
+
+        forwarded = 0
+        if new_uids:
+            for msg in login.fetch(AND(uid=new_uids), mark_seen=False, bulk=True):
+                key = message_id(msg)
+                queued = sender.enqueue(fwd_addr, build_forward_message(msg, account_email, fwd_addr), msg.subject,
+                                        key=key, on_delivered=partial(index.add, account_email, key))
+                if queued:
+                    if sent_mail is not None:
+                        sent_mail.append((msg.date, msg.subject))
+                    forwarded += 1
+
+        index.set_checkpoint(account_email, folder, status['UIDVALIDITY'], min(highest, undelivered - 1))
+        return forwarded
+    finally:
+        login.logout()
@@ -0,0 +1,222 @@
+"""
+Header Cache for Mail-Rulez
+
+Keeps a bounded, per-account corpus of recently seen message headers on
+disk so rules can be backtested offline without touching IMAP. Processing
+appends new headers; readers in any process pick up appended entries
+incrementally.
+"""
+
+import json
+import logging
+import re
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+
+DEFAULT_MAX_ENTRIES = 50000
+
+
+class _AccountCorpus:
+    """In-memory view of one account's header file"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[tuple, Dict[str, Any]] = {}
+        self.offset = 0
+        self.file_lines = 0
+
+
+class HeaderCache:
+    """
+    Bounded per-account cache of message headers
+
+    Entries are stored as JSON lines, one file per account. Each message is
+    kept once per (folder, uid); the oldest entries are dropped beyond
+    max_entries and the file is compacted when it grows to twice that size.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self._corpora: Dict[str, _AccountCorpus] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('header_cache')
+
+    def _path_for(self, account_email: str) -> Path:
+        safe_name = re.sub(r'[^A-Za-z0-9@._-]', '_', account_email)
+        return self.cache_dir / f"{safe_name}.jsonl"
+
+    def _corpus(self, account_email: str) -> _AccountCorpus:
+        corpus = self._corpora.get(account_email)
+        if corpus is None:
+            corpus = _AccountCorpus(self._path_for(account_email))
+            self._corpora[account_email] = corpus
+        return corpus
+
+    def _refresh(self, corpus: _AccountCorpus):
+        """Read entries appended to the file since the last refresh"""
+        try:
+            size = corpus.path.stat().st_size
+        except FileNotFoundError:
+            corpus.entries = {}
+            corpus.offset = 0
+            corpus.file_lines = 0
+            return
+
+        if size < corpus.offset:
+            # File was compacted by another process, reload from scratch
+            corpus.entries = {}
+            corpus.offset = 0
+            corpus.file_lines = 0
+        if size == corpus.offset:
+            return
+
+        with open(corpus.path, 'rb') as f:
+            f.seek(corpus.offset)
+            data = f.read()
+
+        # Ignore a trailing partial line still being written
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            key = (entry.get('folder', 'INBOX'), entry.get('uid'))
+            corpus.entries.pop(key, None)
+            corpus.entries[key] = entry
+            corpus.file_lines += 1
+        corpus.offset += end
+        self._trim(corpus)
+
+    def _trim(self, corpus: _AccountCorpus):
+        excess = len(corpus.entries) - self.max_entries
+        if excess > 0:
+            for key in list(corpus.entries)[:excess]:
+                del corpus.entries[key]
+
+    def _compact(self, corpus: _AccountCorpus):
+        """Rewrite the file with only the retained entries"""
+        temp_path = corpus.path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            for entry in corpus.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        temp_path.replace(corpus.path)
+        corpus.offset = corpus.path.stat().st_size
+        corpus.file_lines = len(corpus.entries)
+
+    def record(self, account_email: str, mail_list: List[Any], folder: str = "INBOX") -> int:
+        """
+        Add fetched messages to an account's corpus
+
+        Args:
+            account_email: Email address of the account
+            mail_list: Mail objects from fetch_class
+            folder: Folder the messages were fetched from
+
+        Returns:
+            int: Number of messages not already cached
+        """
+        with self._lock:
+            corpus = self._corpus(account_email)
+            self._refresh(corpus)
+
+            new_entries = []
+            for item in mail_list:
+                key = (folder, str(item.uid))
+                if key in corpus.entries:
+                    continue
+                item_date = item.date
+                if isinstance(item_date, (date, datetime)):
+                    item_date = item_date.isoformat()
+                entry = {
+                    'uid': str(item.uid),
+                    'folder': folder,
+                    'from': item.from_ or '',
+                    'subject': item.subject or '',
+                    'date': item_date,
+                    'size': getattr(item, 'size', 0) or 0
+                }
+                corpus.entries[key] = entry
+                new_entries.append(entry)
+
+            if not new_entries:
+                return 0
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(corpus.path, 'a') as f:
+                f.write(''.join(json.dumps(entry) + "\n" for entry in new_entries))
+            corpus.offset = corpus.path.stat().st_size
+            corpus.file_lines += len(new_entries)
+
+            self._trim(corpus)
+            if corpus.file_lines > 2 * self.max_entries:
+                self._compact(corpus)
+
+            return len(new_entries)
+
+    def get_headers(self, account_email: str, limit: Optional[int] = None,
+                    folder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get cached headers for an account, newest last
+
+        Args:
+            account_email: Email address of the account
+            limit: Maximum number of most recent headers to return
+            folder: Only return headers seen in this folder
+
+        Returns:
+            list: Header dicts with uid, folder, from, subject, date and size
+        """
+        with self._lock:
+            corpus = self._corpus(account_email)
+            self._refresh(corpus)
+            headers = list(corpus.entries.values())
+
+        if folder:
+            headers = [entry for entry in headers if entry.get('folder') == folder]
+        if limit is not None:
+            headers = headers[-limit:] if limit > 0 else []
+        return headers
+
+    def count(self, account_email: str) -> int:
+        """Number of cached headers for an account"""
+        with self._lock:
+            corpus = self._corpus(account_email)
+            self._refresh(corpus)
+            return len(corpus.entries)
+
+
+# Global header cache instance
+_header_cache: Optional[HeaderCache] = None
+_header_cache_lock = threading.Lock()
+
+
+def get_header_cache() -> HeaderCache:
+    """
+    Get global header cache instance (singleton)
+
+    Returns:
+        HeaderCache: Header cache stored under the configured data directory
+    """
+    global _header_cache
+
+    with _header_cache_lock:
+        if _header_cache is None:
+            from config import get_config
+            config = get_config()
+            max_entries = config.get_rules_setting('header_cache_size', DEFAULT_MAX_ENTRIES)
+            _header_cache = HeaderCache(config.data_dir / "header_cache", max_entries)
+
+        return _header_cache
+
+
+def record_headers(account_email: str, mail_list: List[Any], folder: str = "INBOX"):
+    """Record fetched headers for backtesting; never raises into processing code"""
+    try:
+        get_header_cache().record(account_email, mail_list, folder)
+    except Exception as e:
+        logging.getLogger('header_cache').warning(f"Failed to cache headers for {account_email}: {e}")
@@ -13,6 +13,8 @@ from pathlib import Path
 from datetime import datetime
 import json
 
+from tracing import TraceContextFilter
+
 
 class StructuredFormatter(logging.Formatter):
     """
@@ -55,6 +57,16 @@ class StructuredFormatter(logging.Formatter):
         if hasattr(record, 'operation'):
             log_entry['operation'] = record.operation
         
+        # Cycle tracing context (see tracing.py)
+        if hasattr(record, 'cycle_id'):
+            log_entry['cycle_id'] = record.cycle_id
+        if hasattr(record, 'span_id'):
+            log_entry['span_id'] = record.span_id
+        if hasattr(record, 'span'):
+            log_entry['span'] = record.span
+        if hasattr(record, 'trace'):
+            log_entry['trace'] = record.trace
+        
         # Add exception info if present
         if record.exc_info:
             log_entry['exception'] = self.formatException(record.exc_info)
@@ -123,12 +135,14 @@ def setup_logging(config: LogConfig = None) -> LogConfig:
     
     # Create formatter
     formatter = StructuredFormatter(use_json=config.use_json)
+    trace_filter = TraceContextFilter()
     
     # Console handler (for development and container logs)
     if config.enable_console:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
         console_handler.setLevel(getattr(logging, config.log_level.upper()))
+        console_handler.addFilter(trace_filter)
         root_logger.addHandler(console_handler)
     
     # File handlers with rotation
@@ -155,6 +169,7 @@ def setup_logging(config: LogConfig = None) -> LogConfig:
         )
         file_handler.setFormatter(formatter)
         file_handler.setLevel(file_level)
+        file_handler.addFilter(trace_filter)
         
         # Add custom filter for specific log files
         if log_file == 'email_processing.log':
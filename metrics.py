@@ -0,0 +1,527 @@
+"""
+Metrics for Mail-Rulez
+
+Low-overhead in-memory instrumentation primitives. Provides fixed-memory
+log-bucketed latency histograms, the per-rule metrics registry used by the
+rules engine, per-account processing stage latencies and the process-wide
+counters and gauges exported in Prometheus text format.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+# Timed parts of a processing cycle; 'cycle' is the whole job
+STAGES = ('login', 'fetch', 'classify', 'rules', 'move', 'purge', 'cycle')
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory log-bucketed histogram of non-negative integer values
+
+    Values below 16 are counted exactly; larger values fall into buckets
+    that split every power of two into 8 sub-buckets, so any percentile is
+    reported within 12.5% of the true value. Memory use is constant
+    regardless of how many values are recorded.
+    """
+
+    SUB_BUCKET_BITS = 3
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    BUCKET_COUNT = 64 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 1 - cls.SUB_BUCKET_BITS
+        return ((shift + 1) << cls.SUB_BUCKET_BITS) + (value >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        mantissa = (index & (cls.SUB_BUCKETS - 1)) + cls.SUB_BUCKETS
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int):
+        """Record a single value (negative values are clamped to 0)"""
+        value = max(0, int(value))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, quantile: float) -> int:
+        """
+        Get the value at a quantile (0.0 - 1.0)
+
+        Returns:
+            int: Upper bound of the bucket holding the quantile, capped at the
+                 recorded maximum; 0 if nothing has been recorded
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(quantile * self.count + 0.999999))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        """Arithmetic mean of recorded values"""
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's values into this one"""
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+
+    def copy(self) -> 'LatencyHistogram':
+        """Independent copy of this histogram"""
+        clone = LatencyHistogram()
+        clone.merge(self)
+        return clone
+
+    def summary(self, scale: float = 1.0) -> Dict[str, Any]:
+        """
+        Summarize the distribution
+
+        Args:
+            scale: Divisor applied to reported values (e.g. 1000 for ns -> us)
+        """
+        return {
+            'count': self.count,
+            'total': round(self.total / scale, 3),
+            'mean': round(self.mean() / scale, 3),
+            'p50': round(self.percentile(0.50) / scale, 3),
+            'p90': round(self.percentile(0.90) / scale, 3),
+            'p99': round(self.percentile(0.99) / scale, 3),
+            'max': round(self.max / scale, 3)
+        }
+
+
+class RuleMetrics:
+    """
+    Aggregated per-rule and per-condition-type metrics
+
+    Counter updates happen on the processing hot path, so they are plain
+    attribute increments without locking; readers get consistent-enough
+    snapshots for monitoring purposes.
+    """
+
+    def __init__(self):
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._condition_times: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _rule_entry(self, rule_id: str, rule_name: str = "") -> Dict[str, Any]:
+        entry = self._rules.get(rule_id)
+        if entry is None:
+            with self._lock:
+                entry = self._rules.setdefault(rule_id, {
+                    'name': rule_name,
+                    'evaluations': 0,
+                    'matches': 0,
+                    'actions_executed': 0,
+                    'action_failures': 0,
+                    'eval_time_ns': 0,
+                    'last_match': None,
+                    'disabled_reason': None,
+                    'disabled_at': None
+                })
+        if rule_name:
+            entry['name'] = rule_name
+        return entry
+
+    def record_evaluations(self, rule_id: str, rule_name: str, evaluated: int, matched: int, elapsed_ns: int = 0):
+        """Record a batch of message evaluations for a rule"""
+        entry = self._rule_entry(rule_id, rule_name)
+        entry['evaluations'] += evaluated
+        entry['matches'] += matched
+        entry['eval_time_ns'] += elapsed_ns
+        if matched:
+            entry['last_match'] = datetime.now()
+
+    def record_action(self, rule_id: str, success: bool):
+        """Record the outcome of a single rule action"""
+        entry = self._rule_entry(rule_id)
+        if success:
+            entry['actions_executed'] += 1
+        else:
+            entry['action_failures'] += 1
+
+    def record_disabled(self, rule_id: str, rule_name: str, reason: str):
+        """Record that a rule was disabled automatically"""
+        entry = self._rule_entry(rule_id, rule_name)
+        if entry['disabled_reason'] != reason:
+            entry['disabled_reason'] = reason
+            entry['disabled_at'] = datetime.now()
+    
+    def record_condition_time(self, condition_type: str, elapsed_ns: int):
+        """Record the time taken by a single condition evaluation"""
+        histogram = self._condition_times.get(condition_type)
+        if histogram is None:
+            with self._lock:
+                histogram = self._condition_times.setdefault(condition_type, LatencyHistogram())
+        histogram.record(elapsed_ns)
+
+    def get_rule_stats(self, rule_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get per-rule counters
+
+        Args:
+            rule_id: Single rule to report, or None for all rules
+
+        Returns:
+            dict: Rule ID -> counters (a single counters dict if rule_id is given)
+        """
+        def render(entry):
+            evaluations = entry['evaluations']
+            return {
+                'name': entry['name'],
+                'evaluations': evaluations,
+                'matches': entry['matches'],
+                'match_rate': round(entry['matches'] / evaluations, 4) if evaluations else 0.0,
+                'actions_executed': entry['actions_executed'],
+                'action_failures': entry['action_failures'],
+                'eval_time_ms': round(entry['eval_time_ns'] / 1e6, 3),
+                'avg_eval_us': round(entry['eval_time_ns'] / evaluations / 1e3, 3) if evaluations else 0.0,
+                'last_match': entry['last_match'].isoformat() if entry['last_match'] else None,
+                'disabled_reason': entry['disabled_reason'],
+                'disabled_at': entry['disabled_at'].isoformat() if entry['disabled_at'] else None
+            }
+
+        with self._lock:
+            entries = dict(self._rules)
+
+        if rule_id is not None:
+            entry = entries.get(rule_id)
+            return render(entry) if entry else None
+        return {key: render(entry) for key, entry in entries.items()}
+
+    def get_condition_stats(self) -> Dict[str, Any]:
+        """Evaluation time distribution per condition type, in microseconds"""
+        with self._lock:
+            histograms = {key: histogram.copy() for key, histogram in self._condition_times.items()}
+        return {key: histogram.summary(scale=1000.0) for key, histogram in histograms.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Complete metrics snapshot for the stats API"""
+        return {
+            'rules': self.get_rule_stats(),
+            'condition_types': self.get_condition_stats()
+        }
+
+    def reset(self):
+        """Clear all collected metrics"""
+        with self._lock:
+            self._rules = {}
+            self._condition_times = {}
+
+
+class StageLatency:
+    """
+    Per-account, per-stage latency histograms
+
+    Durations are recorded in microseconds and reported in milliseconds.
+    Like RuleMetrics, recording is lock-free; the lock only guards creating
+    an account's histograms.
+    """
+
+    def __init__(self):
+        self._accounts: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+
+    def _histograms(self, account_email: str) -> Dict[str, LatencyHistogram]:
+        histograms = self._accounts.get(account_email)
+        if histograms is None:
+            with self._lock:
+                histograms = self._accounts.setdefault(
+                    account_email, {stage: LatencyHistogram() for stage in STAGES})
+        return histograms
+
+    def record(self, account_email: str, stage: str, seconds: float):
+        """Record one stage duration for an account"""
+        self._histograms(account_email)[stage].record(seconds * 1e6)
+
+    @contextmanager
+    def time(self, account_email: str, stage: str):
+        """Time the enclosed block as one stage duration"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(account_email, stage, time.perf_counter() - start)
+
+    def mean_seconds(self, account_email: str, stage: str = 'cycle') -> float:
+        """Mean duration of a stage for an account, in seconds"""
+        return self._histograms(account_email)[stage].mean() / 1e6
+
+    def merged(self, accounts: Optional[Iterable[str]] = None) -> Dict[str, LatencyHistogram]:
+        """
+        Histograms of several accounts merged per stage
+
+        Args:
+            accounts: Account emails to include, or None for all accounts
+        """
+        with self._lock:
+            selected = [self._accounts[email] for email in (self._accounts if accounts is None else accounts)
+                        if email in self._accounts]
+        merged = {stage: LatencyHistogram() for stage in STAGES}
+        for histograms in selected:
+            for stage, histogram in histograms.items():
+                merged[stage].merge(histogram)
+        return merged
+
+    def summary(self, account_email: Optional[str] = None,
+                accounts: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Latency distribution per stage, in milliseconds
+
+        Args:
+            account_email: Single account to report
+            accounts: Accounts to merge when account_email is not given (None for all)
+        """
+        histograms = self.merged([account_email] if account_email is not None else accounts)
+        return {stage: histogram.summary(scale=1000.0) for stage, histogram in histograms.items()}
+
+    def remove(self, account_email: str):
+        """Drop an account's histograms"""
+        with self._lock:
+            self._accounts.pop(account_email, None)
+
+    def reset(self):
+        """Clear all collected latencies"""
+        with self._lock:
+            self._accounts = {}
+
+
+# Global rule metrics instance
+_rule_metrics: Optional[RuleMetrics] = None
+_rule_metrics_lock = threading.Lock()
+
+
+def get_rule_metrics() -> RuleMetrics:
+    """
+    Get global rule metrics instance (singleton)
+
+    Returns:
+        RuleMetrics: Global rule metrics registry
+    """
+    global _rule_metrics
+
+    if _rule_metrics is None:
+        with _rule_metrics_lock:
+            if _rule_metrics is None:
+                _rule_metrics = RuleMetrics()
+
+    return _rule_metrics
+
+
+# Global stage latency instance
+_stage_latency: Optional[StageLatency] = None
+_stage_latency_lock = threading.Lock()
+
+
+def get_stage_latency() -> StageLatency:
+    """
+    Get global stage latency instance (singleton)
+
+    Returns:
+        StageLatency: Global per-account stage latency registry
+    """
+    global _stage_latency
+
+    if _stage_latency is None:
+        with _stage_latency_lock:
+            if _stage_latency is None:
+                _stage_latency = StageLatency()
+
+    return _stage_latency
+
+
+# Exported metrics: name -> (type, help)
+METRICS = {
+    'mail_rulez_messages_classified_total': ('counter', 'Messages moved by sender list or rule, by disposition'),
+    'mail_rulez_imap_command_seconds': ('summary', 'IMAP command latency by verb'),
+    'mail_rulez_imap_command_errors_total': ('counter', 'IMAP commands that failed, by verb'),
+    'mail_rulez_imap_logins_total': ('counter', 'IMAP logins by result'),
+    'mail_rulez_imap_reconnects_total': ('counter', 'Pooled IMAP connections replaced after going stale'),
+    'mail_rulez_rule_evaluations_total': ('counter', 'Messages evaluated against each rule'),
+    'mail_rulez_rule_matches_total': ('counter', 'Messages matched by each rule'),
+    'mail_rulez_list_cache_hits_total': ('counter', 'Sender list lookups served from cache'),
+    'mail_rulez_list_cache_loads_total': ('counter', 'Sender list reads from disk'),
+    'mail_rulez_scheduler_lag_seconds': ('summary', 'Time tasks waited in the worker pool before starting'),
+    'mail_rulez_scheduler_queue_depth': ('gauge', 'Tasks queued in the worker pool'),
+    'mail_rulez_stage_seconds': ('summary', 'Processing stage latency per account')
+}
+
+# Quantiles reported for summaries
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+Sample = Tuple[str, Dict[str, str], Any]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + '}'
+
+
+class MetricRegistry:
+    """
+    Process-wide counters, gauges and latency summaries
+
+    Updates are cheap dictionary operations under one lock, made where the
+    event happens, so rendering never has to walk processors or touch IMAP.
+    Summaries are LatencyHistograms of microseconds. Collectors add samples
+    from other registries (rules, stage latency) at render time.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Dict[Tuple, float]] = {}
+        self._summaries: Dict[str, Dict[Tuple, LatencyHistogram]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add to a counter"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a duration in a summary"""
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._summaries.setdefault(name, {}).get(key)
+            if histogram is None:
+                histogram = self._summaries[name][key] = LatencyHistogram()
+            histogram.record(seconds * 1e6)
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 if never set)"""
+        with self._lock:
+            return self._values.get(name, {}).get(self._key(labels), 0)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Register a function returning (name, labels, value or LatencyHistogram) samples"""
+        self._collectors.append(collector)
+
+    def samples(self) -> List[Sample]:
+        """All samples: own counters, gauges and summaries plus collector output"""
+        with self._lock:
+            samples = [(name, dict(key), value)
+                       for name, series in self._values.items() for key, value in series.items()]
+            samples += [(name, dict(key), histogram.copy())
+                        for name, series in self._summaries.items() for key, histogram in series.items()]
+        for collector in self._collectors:
+            samples.extend(collector())
+        return samples
+
+    def render(self) -> str:
+        """Samples in Prometheus text exposition format"""
+        grouped: Dict[str, List[Tuple[Dict[str, str], Any]]] = {}
+        for name, labels, value in self.samples():
+            grouped.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(grouped):
+            metric_type, help_text = METRICS.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in grouped[name]:
+                if isinstance(value, LatencyHistogram):
+                    for quantile in SUMMARY_QUANTILES:
+                        quantile_labels = {**labels, 'quantile': str(quantile)}
+                        lines.append(f"{name}{_format_labels(quantile_labels)} "
+                                     f"{value.percentile(quantile) / 1e6:.6f}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value.total / 1e6:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Clear counters, gauges and summaries (collectors stay registered)"""
+        with self._lock:
+            self._values = {}
+            self._summaries = {}
+
+
+def _rule_samples() -> List[Sample]:
+    samples = []
+    for rule_id, stats in get_rule_metrics().get_rule_stats().items():
+        samples.append(('mail_rulez_rule_evaluations_total', {'rule': rule_id}, stats['evaluations']))
+        samples.append(('mail_rulez_rule_matches_total', {'rule': rule_id}, stats['matches']))
+    return samples
+
+
+def _stage_samples() -> List[Sample]:
+    latency = get_stage_latency()
+    with latency._lock:
+        accounts = dict(latency._accounts)
+    return [('mail_rulez_stage_seconds', {'account': account, 'stage': stage}, histogram.copy())
+            for account, histograms in accounts.items()
+            for stage, histogram in histograms.items() if histogram.count]
+
+
+# Global metric registry instance
+_metric_registry: Optional[MetricRegistry] = None
+_metric_registry_lock = threading.Lock()
+
+
+def get_metric_registry() -> MetricRegistry:
+    """
+    Get global metric registry instance (singleton)
+
+    Returns:
+        MetricRegistry: Global registry with rule and stage collectors attached
+    """
+    global _metric_registry
+
+    if _metric_registry is None:
+        with _metric_registry_lock:
+            if _metric_registry is None:
+                registry = MetricRegistry()
+                registry.add_collector(_rule_samples)
+                registry.add_collector(_stage_samples)
+                _metric_registry = registry
+
+    return _metric_registry
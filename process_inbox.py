@@ -1,7 +1,27 @@
+import time
 import rules as r
 import functions as pf
 from config import get_config
+from header_cache import record_headers
+from metrics import get_stage_latency, get_metric_registry
+from services.stats_store import record_dispositions
+from tracing import span, add_span, traced
 
+
+def _record_dispositions(account, log, whitelist_disposition):
+    """Count classified messages by where they went"""
+    registry = get_metric_registry()
+    counts = {}
+    for key, disposition in (("uids in whitelist", whitelist_disposition), ("uids in blacklist", "junk"),
+                             ("uids in vendorlist", "approved_ads"), ("uids in pending", "pending")):
+        if log.get(key):
+            registry.inc('mail_rulez_messages_classified_total', len(log[key]), disposition=disposition)
+            counts[disposition] = len(log[key])
+    if counts:
+        record_dispositions(account.email, counts)
+
+
+@traced()
 def process_inbox(account, folder="INBOX", limit=100):
     """
     Fetches mail from specified server/account and folder.  Compares the from_ attribute against specified sender lists.
@@ -25,14 +45,20 @@ def process_inbox(account, folder="INBOX", limit=100):
     log["vendorlist count"] = len(vendorlist)
     #  Fetch mail
     mb = account.login()
-    mail_list = pf.fetch_class(mb, limit=limit)
+    latency = get_stage_latency()
+    with latency.time(account.email, 'fetch'):
+        mail_list = pf.fetch_class(mb, limit=limit)
+    record_headers(account.email, mail_list)
 
     log["mail_list count"] = len(mail_list)
 
     #  Build list of uids to move to defined folders
-    whitelisted = [item.uid for item in mail_list if item.from_ in whitelist]
-    blacklisted = [item.uid for item in mail_list if item.from_ in blacklist]
-    vendorlist = [item.uid for item in mail_list if item.from_ in vendorlist]
+    with latency.time(account.email, 'classify'), span('classify') as classify_span:
+        whitelisted = [item.uid for item in mail_list if item.from_ in whitelist]
+        blacklisted = [item.uid for item in mail_list if item.from_ in blacklist]
+        vendorlist = [item.uid for item in mail_list if item.from_ in vendorlist]
+        classify_span.set(uids=len(mail_list), whitelisted=len(whitelisted), blacklisted=len(blacklisted),
+                          vendor=len(vendorlist))
     log["uids in whitelist"] = whitelisted
     log["uids in blacklist"] = blacklisted
     log["uids in vendorlist"] = vendorlist
@@ -56,6 +82,7 @@ def process_inbox(account, folder="INBOX", limit=100):
         approved_ads_folder = "INBOX.Approved_Ads"
         pending_folder = "INBOX.Pending"
     
+    move_started = time.perf_counter()
     # Use Gmail-aware processing if Gmail account
     if pf.is_gmail_account(account.email):
         # Gmail-specific processing with label cleanup
@@ -73,6 +100,8 @@ def process_inbox(account, folder="INBOX", limit=100):
         mb.move(whitelisted, processed_folder)
         mb.move(blacklisted, junk_folder)
         mb.move(vendorlist, approved_ads_folder)
+    move_seconds = time.perf_counter() - move_started
+    add_span('move', move_started, uids=len(whitelisted) + len(blacklisted) + len(vendorlist))
     
     # Apply retention policy to approved_ads folder after moving vendor emails
     if vendorlist:  # Only if we moved any vendor emails
@@ -80,7 +109,8 @@ def process_inbox(account, folder="INBOX", limit=100):
             config = get_config()
             retention_days = config.get_retention_setting('approved_ads')
             if retention_days > 0:
-                pf.purge_old(mb, approved_ads_folder, retention_days)
+                with latency.time(account.email, 'purge'):
+                    pf.purge_old(mb, approved_ads_folder, retention_days)
                 log["vendor_retention_applied"] = f"Purged vendor emails older than {retention_days} days"
         except Exception as e:
             log["vendor_retention_error"] = f"Could not apply vendor retention policy: {str(e)}"
@@ -92,16 +122,22 @@ def process_inbox(account, folder="INBOX", limit=100):
         log["uids in pending"] = pending
 
         # Use Gmail-aware processing for pending messages
+        move_started = time.perf_counter()
         if pf.is_gmail_account(account.email) and pending:
             gmail_result = pf.gmail_aware_move(mb, pending, pending_folder, 'INBOX')
             log["gmail_pending_result"] = gmail_result
         else:
             mb.move(pending, pending_folder)
+        move_seconds += time.perf_counter() - move_started
+        add_span('move', move_started, uids=len(pending), folder=pending_folder)
     else:
         pass
 
+    latency.record(account.email, 'move', move_seconds)
+    _record_dispositions(account, log, "processed")
     return log
 
+@traced()
 def process_inbox_maint(account, folder="INBOX", limit=500):
     """
     Fetches mail from specified server/account and folder.  Compares the from_ attribute against specified sender lists.
@@ -125,14 +161,22 @@ def process_inbox_maint(account, folder="INBOX", limit=500):
     log["vendorlist count"] = len(vendorlist)
     #  Fetch mail
     mb = account.login()
-    mail_list = pf.fetch_class(mb, limit=limit)
+    latency = get_stage_latency()
+    with latency.time(account.email, 'fetch'):
+        mail_list = pf.fetch_class(mb, limit=limit)
+    record_headers(account.email, mail_list)
 
     log["mail_list count"] = len(mail_list)
+    #  Highest UID seen; used by the scheduler to estimate the arrival rate
+    log["max uid"] = max((int(item.uid) for item in mail_list), default=None)
 
     #  Build list of uids to move to defined folders
-    whitelisted = [item.uid for item in mail_list if item.from_ in whitelist]
-    blacklisted = [item.uid for item in mail_list if item.from_ in blacklist]
-    vendorlist = [item.uid for item in mail_list if item.from_ in vendorlist]
+    with latency.time(account.email, 'classify'), span('classify') as classify_span:
+        whitelisted = [item.uid for item in mail_list if item.from_ in whitelist]
+        blacklisted = [item.uid for item in mail_list if item.from_ in blacklist]
+        vendorlist = [item.uid for item in mail_list if item.from_ in vendorlist]
+        classify_span.set(uids=len(mail_list), whitelisted=len(whitelisted), blacklisted=len(blacklisted),
+                          vendor=len(vendorlist))
     log["uids in whitelist"] = whitelisted
     log["uids in blacklist"] = blacklisted
     log["uids in vendorlist"] = vendorlist
@@ -155,6 +199,7 @@ def process_inbox_maint(account, folder="INBOX", limit=500):
         pending_folder = "INBOX.Pending"
     
     # In maintenance mode, don't move whitelisted emails to processed
+    move_started = time.perf_counter()
     # Use Gmail-aware processing if Gmail account
     if pf.is_gmail_account(account.email):
         # Gmail-specific processing with label cleanup
@@ -168,13 +213,16 @@ def process_inbox_maint(account, folder="INBOX", limit=500):
         # Standard IMAP processing
         mb.move(blacklisted, junk_folder)
         mb.move(vendorlist, approved_ads_folder)
+    move_seconds = time.perf_counter() - move_started
+    add_span('move', move_started, uids=len(blacklisted) + len(vendorlist))
     
     # Apply retention policy to approved_ads folder after moving vendor emails
     if vendorlist:  # Only if we moved any vendor emails
         try:
             retention_days = config.get_retention_setting('approved_ads')
             if retention_days > 0:
-                pf.purge_old(mb, approved_ads_folder, retention_days)
+                with latency.time(account.email, 'purge'):
+                    pf.purge_old(mb, approved_ads_folder, retention_days)
                 log["vendor_retention_applied"] = f"Purged vendor emails older than {retention_days} days"
         except Exception as e:
             log["vendor_retention_error"] = f"Could not apply vendor retention policy: {str(e)}"
@@ -185,10 +233,16 @@ def process_inbox_maint(account, folder="INBOX", limit=500):
                    item.from_ not in vendorlist]
         log["uids in pending"] = pending
 
+        move_started = time.perf_counter()
         mb.move(pending, pending_folder)
+        move_seconds += time.perf_counter() - move_started
+        add_span('move', move_started, uids=len(pending), folder=pending_folder)
     else:
         pass
 
+    latency.record(account.email, 'move', move_seconds)
+    # Whitelisted mail stays in the inbox in maintenance mode
+    _record_dispositions(account, log, "inbox")
     return log
 
 
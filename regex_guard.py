@@ -0,0 +1,131 @@
+"""
+Regex Guard for Mail-Rulez
+
+Safety checks for user-supplied subject regexes. Patterns are analyzed
+statically for constructs that cause catastrophic backtracking, inputs are
+truncated before matching, and rules whose regexes spend longer than a
+per-message CPU time budget on any one message are disabled until the rules
+are reloaded.
+"""
+
+from typing import List, Optional
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+# Longest pattern accepted when saving a rule
+MAX_PATTERN_LENGTH = 500
+
+# Subjects are truncated to this many characters before regex matching
+REGEX_MAX_INPUT = 1000
+
+# Default thread CPU time a rule may spend evaluating one message's headers
+DEFAULT_REGEX_MESSAGE_BUDGET_MS = 50
+
+# Repeats with an upper bound above this are treated as unbounded
+_LARGE_REPEAT = 10
+
+_REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+_POSSESSIVE_REPEAT = getattr(sre_constants, 'POSSESSIVE_REPEAT', None)
+_ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+
+class RegexBudgetExceeded(Exception):
+    """Raised when a rule spends longer than its time budget matching one message"""
+
+
+def _is_unbounded(max_repeat: int) -> bool:
+    return max_repeat == sre_constants.MAXREPEAT or max_repeat > _LARGE_REPEAT
+
+
+def _find_backtracking(items, inside_repeat: bool, problems: List[str]):
+    """Walk a parsed pattern looking for nested or ambiguous repetition"""
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            _, max_repeat, sub = av
+            unbounded = _is_unbounded(max_repeat)
+            if unbounded and inside_repeat:
+                problems.append("nested quantifier")
+                return
+            _find_backtracking(sub, inside_repeat or unbounded, problems)
+        elif op == _POSSESSIVE_REPEAT or op == _ATOMIC_GROUP:
+            # Possessive repeats and atomic groups never backtrack into themselves
+            _find_backtracking(av[2] if op == _POSSESSIVE_REPEAT else av, False, problems)
+        elif op == sre_constants.SUBPATTERN:
+            _find_backtracking(av[-1], inside_repeat, problems)
+        elif op == sre_constants.BRANCH:
+            alternatives = av[1]
+            # Overlapping alternatives, e.g. (a|aa)+, are factored into a
+            # common prefix followed by a branch with an empty alternative
+            if inside_repeat and any(len(alternative) == 0 for alternative in alternatives):
+                problems.append("overlapping alternatives")
+                return
+            for alternative in alternatives:
+                _find_backtracking(alternative, inside_repeat, problems)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _find_backtracking(av[1], inside_repeat, problems)
+        elif op == sre_constants.GROUPREF_EXISTS:
+            for branch in av[1:]:
+                if branch is not None:
+                    _find_backtracking(branch, inside_repeat, problems)
+        if problems:
+            return
+
+
+def analyze_regex(pattern: str, case_sensitive: bool = False) -> List[str]:
+    """
+    Check a subject regex for problems before it is saved or run
+
+    Args:
+        pattern: Regular expression supplied by the user
+        case_sensitive: Whether the pattern is matched case-sensitively
+
+    Returns:
+        list: Human readable problems; empty if the pattern is safe to run
+    """
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return [f"Regex is longer than {MAX_PATTERN_LENGTH} characters"]
+
+    import re
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error as e:
+        return [f"Invalid regex '{pattern}': {e}"]
+
+    found: List[str] = []
+    _find_backtracking(parsed, False, found)
+    return [
+        f"Regex '{pattern}' can cause catastrophic backtracking ({problem})"
+        for problem in found
+    ]
+
+
+def unsafe_regex_reason(rule) -> Optional[str]:
+    """
+    First backtracking problem among a rule's subject regexes, if any
+
+    Invalid patterns are not reported here: they never match and are
+    harmless to run.
+
+    Args:
+        rule: EmailRule to check
+
+    Returns:
+        str: Description of the problem, or None if all regexes are safe
+    """
+    from rules import ConditionType
+    for condition in rule.conditions:
+        if condition.type == ConditionType.SUBJECT_REGEX:
+            problems = [
+                problem for problem in analyze_regex(condition.value, condition.case_sensitive)
+                if "catastrophic backtracking" in problem
+            ]
+            if problems:
+                return problems[0]
+    return None
@@ -6,12 +6,31 @@ Supports sender-based, subject-based, and content-based rules.
 """
 
 import json
+import os
 import re
+import threading
+import time
+import weakref
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+from metrics import get_rule_metrics, get_metric_registry
+from tracing import span, traced, set_attributes
+from header_cache import record_headers
+from regex_guard import REGEX_MAX_INPUT, DEFAULT_REGEX_MESSAGE_BUDGET_MS, RegexBudgetExceeded, unsafe_regex_reason
+
+
+# Default cap for partial body fetches used by content conditions
+DEFAULT_CONTENT_FETCH_MAX_BYTES = 2048
+
+# Batches at least this large are evaluated with the columnar evaluator
+DEFAULT_COLUMNAR_MIN_BATCH = 1000
+
+# One condition evaluation in this many is timed for the condition histograms
+CONDITION_TIMING_SAMPLE = 32
+
 
 class ConditionType(Enum):
     """Types of rule conditions"""
@@ -34,6 +53,69 @@ class ActionType(Enum):
     MARK_READ = "mark_read"
 
 
+# Execution order of action types: actions that read the message run before
+# a move takes it out of the folder
+ACTION_ORDER = {ActionType.MARK_READ: 0, ActionType.ADD_TO_LIST: 1, ActionType.FORWARD: 2, ActionType.MOVE_TO_FOLDER: 3}
+
+
+# Condition types that need the message body rather than just headers
+CONTENT_CONDITION_TYPES = {ConditionType.CONTENT_CONTAINS}
+
+
+@dataclass
+class ContentFetchStats:
+    """Body fetch statistics for content rules on a single account"""
+    messages_evaluated: int = 0
+    bodies_fetched: int = 0
+    bodies_avoided: int = 0
+    body_bytes_fetched: int = 0
+    body_bytes_avoided: int = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        return asdict(self)
+
+
+_content_fetch_stats: Dict[str, ContentFetchStats] = {}
+_content_fetch_stats_lock = threading.Lock()
+
+
+def get_content_fetch_stats(account_email: str) -> Dict[str, Any]:
+    """
+    Get body fetch statistics for content rules on an account
+    
+    Args:
+        account_email: Email address of the account
+        
+    Returns:
+        dict: Fetched and avoided body counts and bytes
+    """
+    with _content_fetch_stats_lock:
+        stats = _content_fetch_stats.get(account_email, ContentFetchStats())
+        return stats.to_dict()
+
+
+def _record_content_fetch(account_email: str, evaluated: int, fetched: int, avoided: int,
+                          bytes_fetched: int, bytes_avoided: int):
+    """Accumulate body fetch statistics for an account"""
+    with _content_fetch_stats_lock:
+        stats = _content_fetch_stats.setdefault(account_email, ContentFetchStats())
+        stats.messages_evaluated += evaluated
+        stats.bodies_fetched += fetched
+        stats.bodies_avoided += avoided
+        stats.body_bytes_fetched += bytes_fetched
+        stats.body_bytes_avoided += bytes_avoided
+
+
+def _get_rules_setting(key: str, default):
+    """Read a rules engine setting from configuration, falling back to a default"""
+    try:
+        from config import get_config
+        return get_config().get_rules_setting(key, default)
+    except Exception:
+        return default
+
+
 @dataclass
 class RuleCondition:
     """A single condition in a rule"""
@@ -41,6 +123,11 @@ class RuleCondition:
     value: str
     case_sensitive: bool = False
     
+    @property
+    def needs_content(self) -> bool:
+        """True if this condition inspects the message body"""
+        return self.type in CONTENT_CONDITION_TYPES
+    
     def matches(self, email_data: Dict[str, Any]) -> bool:
         """Check if this condition matches the email data"""
         if self.type == ConditionType.SENDER_CONTAINS:
@@ -74,7 +161,7 @@ class RuleCondition:
             return subject == self.value
             
         elif self.type == ConditionType.SUBJECT_REGEX:
-            subject = email_data.get('subject', '')
+            subject = email_data.get('subject', '')[:REGEX_MAX_INPUT]
             flags = 0 if self.case_sensitive else re.IGNORECASE
             try:
                 return bool(re.search(self.value, subject, flags))
@@ -122,6 +209,311 @@ class RuleAction:
             self.parameters = {}
 
 
+# Relative evaluation cost of each condition type, used to order conditions
+CONDITION_COSTS = {
+    ConditionType.SENDER_EXACT: 1.0,
+    ConditionType.SUBJECT_EXACT: 1.0,
+    ConditionType.SENDER_DOMAIN: 2.0,
+    ConditionType.SENDER_CONTAINS: 2.0,
+    ConditionType.SUBJECT_CONTAINS: 2.0,
+    ConditionType.SUBJECT_REGEX: 10.0,
+    ConditionType.SENDER_IN_LIST: 20.0,
+    ConditionType.CONTENT_CONTAINS: 100.0
+}
+
+# Number of rule evaluations between condition reorderings
+RETUNE_INTERVAL = 500
+
+# Seconds between modification checks of cached sender lists
+LIST_CACHE_CHECK_INTERVAL = 5.0
+
+_list_cache: Dict[str, Dict[str, Any]] = {}
+_list_cache_lock = threading.Lock()
+
+
+def _extract_address(sender: str) -> str:
+    """Extract the bare address from a "Name <email@domain.com>" sender"""
+    if '<' in sender and '>' in sender:
+        return sender.split('<')[1].split('>')[0].strip()
+    return sender.strip()
+
+
+def _load_list_entries(list_name: str) -> set:
+    """
+    Load a sender list as a lowercase set, reloading only when the file changes
+    
+    Args:
+        list_name: List name ('white', 'black', ...) or file path, as accepted by open_read
+        
+    Returns:
+        set: Lowercased list entries
+    """
+    now = time.monotonic()
+    with _list_cache_lock:
+        entry = _list_cache.get(list_name)
+        if entry and now - entry['checked'] < LIST_CACHE_CHECK_INTERVAL:
+            entry['hits'] += 1
+            get_metric_registry().inc('mail_rulez_list_cache_hits_total', list=list_name)
+            return entry['entries']
+    
+    import functions as pf
+    path = list_name
+    if list_name in ['white', 'black', 'vendor', 'head']:
+        from config import get_config
+        path = get_config().get_list_file_path(list_name)
+    mtime = os.stat(path).st_mtime_ns
+    
+    with _list_cache_lock:
+        entry = _list_cache.get(list_name)
+        if entry and entry['mtime'] == mtime:
+            entry['checked'] = now
+            entry['hits'] += 1
+            get_metric_registry().inc('mail_rulez_list_cache_hits_total', list=list_name)
+            return entry['entries']
+    
+    entries = set(item.lower() for item in pf.open_read(list_name))
+    get_metric_registry().inc('mail_rulez_list_cache_loads_total', list=list_name)
+    with _list_cache_lock:
+        hits = entry['hits'] if entry else 0
+        _list_cache[list_name] = {'entries': entries, 'mtime': mtime, 'checked': now, 'hits': hits}
+    return entries
+
+
+class CompiledCondition:
+    """
+    A rule condition prepared for repeated evaluation
+    
+    Holds the precomputed comparison value, a compiled regex where needed,
+    a static cost estimate and runtime counters used to estimate how often
+    the condition is true. Semantics are identical to RuleCondition.matches.
+    """
+    
+    def __init__(self, condition: RuleCondition):
+        self.condition = condition
+        self.type = condition.type
+        self.needs_content = condition.needs_content
+        self.cost = CONDITION_COSTS.get(condition.type, 5.0)
+        self.evaluations = 0
+        self.hits = 0
+        self._type_name = condition.type.value
+        self._metrics = get_rule_metrics()
+        
+        self._value = condition.value if condition.case_sensitive else condition.value.lower()
+        self._regex = None
+        if condition.type == ConditionType.SUBJECT_REGEX:
+            flags = 0 if condition.case_sensitive else re.IGNORECASE
+            try:
+                self._regex = re.compile(condition.value, flags)
+            except re.error:
+                self._regex = None
+        
+        checks = {
+            ConditionType.SENDER_CONTAINS: self._sender_contains,
+            ConditionType.SENDER_DOMAIN: self._sender_domain,
+            ConditionType.SENDER_EXACT: self._sender_exact,
+            ConditionType.SUBJECT_CONTAINS: self._subject_contains,
+            ConditionType.SUBJECT_EXACT: self._subject_exact,
+            ConditionType.SUBJECT_REGEX: self._subject_regex,
+            ConditionType.CONTENT_CONTAINS: self._content_contains,
+            ConditionType.SENDER_IN_LIST: self._sender_in_list
+        }
+        self._check = checks.get(condition.type, lambda email_data: False)
+    
+    @property
+    def selectivity(self) -> float:
+        """Smoothed probability that this condition is true"""
+        return (self.hits + 1) / (self.evaluations + 2)
+    
+    def evaluate(self, email_data: Dict[str, Any]) -> bool:
+        """Evaluate the condition and record the outcome (timing is sampled)"""
+        if self.evaluations % CONDITION_TIMING_SAMPLE:
+            result = self._check(email_data)
+        else:
+            start = time.perf_counter_ns()
+            result = self._check(email_data)
+            self._metrics.record_condition_time(self._type_name, time.perf_counter_ns() - start)
+        self.evaluations += 1
+        if result:
+            self.hits += 1
+        return result
+    
+    def _field(self, email_data: Dict[str, Any], key: str) -> str:
+        value = email_data.get(key, '')
+        return value if self.condition.case_sensitive else value.lower()
+    
+    def _sender_contains(self, email_data):
+        return self._value in self._field(email_data, 'from')
+    
+    def _sender_domain(self, email_data):
+        sender = email_data.get('from', '')
+        if '@' in sender:
+            return sender.split('@')[-1].strip('>').lower() == self.condition.value.lower()
+        return False
+    
+    def _sender_exact(self, email_data):
+        return self._field(email_data, 'from') == self._value
+    
+    def _subject_contains(self, email_data):
+        return self._value in self._field(email_data, 'subject')
+    
+    def _subject_exact(self, email_data):
+        return self._field(email_data, 'subject') == self._value
+    
+    def _subject_regex(self, email_data):
+        if self._regex is None:
+            return False
+        return bool(self._regex.search(email_data.get('subject', '')[:REGEX_MAX_INPUT]))
+    
+    def _content_contains(self, email_data):
+        return self._value in self._field(email_data, 'content')
+    
+    def _sender_in_list(self, email_data):
+        sender_email = _extract_address(email_data.get('from', ''))
+        try:
+            return sender_email.lower() in _load_list_entries(self.condition.value)
+        except Exception as e:
+            import logging
+            logging.warning(f"Failed to check sender against list {self.condition.value}: {e}")
+            return False
+    
+    def describe(self) -> Dict[str, Any]:
+        """Describe the condition and its collected statistics"""
+        return {
+            'type': self.type.value,
+            'value': self.condition.value,
+            'cost': self.cost,
+            'selectivity': round(self.selectivity, 4),
+            'evaluations': self.evaluations,
+            'hits': self.hits
+        }
+
+
+# Weakly held, so a condition is dropped once no live evaluation plan uses it
+_compiled_conditions: 'weakref.WeakValueDictionary[tuple, CompiledCondition]' = weakref.WeakValueDictionary()
+_compiled_conditions_lock = threading.Lock()
+
+
+def compile_condition(condition: RuleCondition, shared: bool = True) -> CompiledCondition:
+    """
+    Get the compiled form of a condition
+    
+    Identical shared conditions use one compiled instance, so selectivity
+    statistics survive rule reloads and are pooled across rules.
+    
+    Args:
+        condition: Condition to compile
+        shared: Use the process-wide instance; False builds a private one
+            whose statistics are not pooled
+    """
+    if not shared:
+        return CompiledCondition(condition)
+    key = (condition.type, condition.value, condition.case_sensitive)
+    with _compiled_conditions_lock:
+        compiled = _compiled_conditions.get(key)
+        if compiled is None:
+            compiled = CompiledCondition(condition)
+            _compiled_conditions[key] = compiled
+        return compiled
+
+
+class CompiledRule:
+    """
+    Evaluation plan for a rule
+    
+    AND conditions are ordered so cheap conditions that are likely to be
+    false run first; OR conditions so cheap conditions that are likely to be
+    true run first. Content conditions always run after header conditions.
+    The order is re-tuned every RETUNE_INTERVAL evaluations.
+    """
+    
+    def __init__(self, rule: 'EmailRule', shared: bool = False):
+        self.rule = rule
+        self.logic = "OR" if rule.condition_logic == "OR" else "AND"
+        self.header_conditions = [compile_condition(c, shared) for c in rule.conditions if not c.needs_content]
+        self.content_conditions = [compile_condition(c, shared) for c in rule.conditions if c.needs_content]
+        self.evaluations = 0
+        self.retune()
+    
+    def _rank(self, condition: CompiledCondition) -> float:
+        """Expected cost per decisive outcome (lower runs first)"""
+        if self.logic == "AND":
+            decisive = 1.0 - condition.selectivity
+        else:
+            decisive = condition.selectivity
+        return condition.cost / max(decisive, 0.001)
+    
+    def retune(self):
+        """Reorder conditions from the collected statistics"""
+        # Rebind rather than sort in place so concurrent evaluations see a complete list
+        self.header_conditions = sorted(self.header_conditions, key=self._rank)
+        self.content_conditions = sorted(self.content_conditions, key=self._rank)
+    
+    def _tick(self):
+        self.evaluations += 1
+        if self.evaluations % RETUNE_INTERVAL == 0:
+            self.retune()
+    
+    def match_headers(self, email_data: Dict[str, Any], budget_ns: Optional[int] = None) -> Optional[bool]:
+        """
+        Evaluate header conditions; None means content conditions decide
+        
+        Args:
+            email_data: Email dict with from and subject
+            budget_ns: Thread CPU time the regex conditions may use on this
+                message; RegexBudgetExceeded is raised once they use more
+        """
+        self._tick()
+        evaluate = CompiledCondition.evaluate if budget_ns is None else self._budgeted(budget_ns)
+        if self.logic == "OR":
+            for condition in self.header_conditions:
+                if evaluate(condition, email_data):
+                    return True
+            return None if self.content_conditions else False
+        
+        for condition in self.header_conditions:
+            if not evaluate(condition, email_data):
+                return False
+        return None if self.content_conditions else True
+    
+    def _budgeted(self, budget_ns: int):
+        """Condition evaluator that charges regex conditions against a per-message budget"""
+        spent = 0
+        
+        def evaluate(condition: CompiledCondition, email_data: Dict[str, Any]) -> bool:
+            nonlocal spent
+            if condition.type != ConditionType.SUBJECT_REGEX:
+                return condition.evaluate(email_data)
+            # Regexes cannot be interrupted, so the budget is checked after each search
+            cpu_start = time.thread_time_ns()
+            result = condition.evaluate(email_data)
+            spent += time.thread_time_ns() - cpu_start
+            if spent > budget_ns:
+                raise RegexBudgetExceeded(
+                    f"Rule '{self.rule.name}' exceeded its regex time budget of "
+                    f"{budget_ns / 1e6:g} ms on one message"
+                )
+            return result
+        
+        return evaluate
+    
+    def match_content(self, email_data: Dict[str, Any]) -> bool:
+        """Evaluate content conditions for a message the headers left undecided"""
+        if self.logic == "OR":
+            return any(condition.evaluate(email_data) for condition in self.content_conditions)
+        return all(condition.evaluate(email_data) for condition in self.content_conditions)
+    
+    def matches(self, email_data: Dict[str, Any]) -> bool:
+        """Evaluate all conditions"""
+        outcome = self.match_headers(email_data)
+        if outcome is None:
+            return self.match_content(email_data)
+        return outcome
+    
+    def evaluation_order(self) -> List[Dict[str, Any]]:
+        """Current evaluation order with cost and selectivity, for debugging"""
+        return [condition.describe() for condition in self.header_conditions + self.content_conditions]
+
+
 @dataclass
 class EmailRule:
     """A complete email processing rule"""
@@ -136,81 +528,214 @@ class EmailRule:
     priority: int = 100
     created_at: str = ""
     updated_at: str = ""
+    stop_processing: bool = False  # Later rules skip emails this rule matches
+    disabled_reason: str = ""  # Why the rule was disabled automatically, if it was
     
     def matches(self, email_data: Dict[str, Any]) -> bool:
         """Check if this rule matches the given email data"""
         if not self.active or not self.conditions:
             return False
-            
-        if self.condition_logic == "AND":
-            return all(condition.matches(email_data) for condition in self.conditions)
-        elif self.condition_logic == "OR":
-            return any(condition.matches(email_data) for condition in self.conditions)
-        else:
-            # Default to AND logic
-            return all(condition.matches(email_data) for condition in self.conditions)
+        
+        # Unknown condition_logic values fall back to AND
+        return self.compiled.matches(email_data)
+    
+    @property
+    def compiled(self) -> CompiledRule:
+        """Cost-ordered evaluation plan for this rule (built on first use)"""
+        compiled = self.__dict__.get('_compiled')
+        if compiled is None:
+            compiled = self.compile()
+        return compiled
+    
+    def compile(self, shared: bool = False) -> CompiledRule:
+        """
+        Build the evaluation plan for this rule
+        
+        Only the live rule set is compiled with shared conditions, so drafts,
+        rule tests and backtests never enter the process-wide condition cache.
+        
+        Args:
+            shared: Pool condition statistics with identical live conditions
+        """
+        compiled = CompiledRule(self, shared)
+        self.__dict__['_compiled'] = compiled
+        return compiled
+    
+    def evaluation_order(self) -> List[Dict[str, Any]]:
+        """Order in which conditions are currently evaluated"""
+        return self.compiled.evaluation_order()
+    
+    def __getstate__(self):
+        """Pickle rule data only; the compiled plan is rebuilt on first use"""
+        state = self.__dict__.copy()
+        state.pop('_compiled', None)
+        return state
+    
+    @property
+    def needs_content(self) -> bool:
+        """True if any condition of this rule inspects the message body"""
+        return any(condition.needs_content for condition in self.conditions)
+    
+    @property
+    def has_regex(self) -> bool:
+        """True if any condition of this rule is a subject regex"""
+        return any(condition.type == ConditionType.SUBJECT_REGEX for condition in self.conditions)
+    
+    def is_terminal(self, first_match: bool = False) -> bool:
+        """
+        True if emails matched by this rule are skipped by later rules
+        
+        That is the case when the rule stops processing, when it moves
+        emails out of the folder, or in first-match mode.
+        """
+        return (first_match or self.stop_processing or
+                any(action.type == ActionType.MOVE_TO_FOLDER for action in self.actions))
+    
+    def ordered_actions(self) -> List['RuleAction']:
+        """Actions in execution order (see ACTION_ORDER), declaration order otherwise"""
+        return sorted(self.actions, key=lambda action: ACTION_ORDER.get(action.type, len(ACTION_ORDER)))
+    
+    def match_headers(self, email_data: Dict[str, Any], budget_ns: Optional[int] = None) -> Optional[bool]:
+        """
+        Evaluate only the header conditions of this rule
+        
+        Returns:
+            True or False if the headers decide the outcome, None if the
+            remaining content conditions still have to be evaluated
+        """
+        if not self.active or not self.conditions:
+            return False
+        
+        return self.compiled.match_headers(email_data, budget_ns)
 
-    def process_emails(self, account, folder="INBOX", limit=None):
+    def process_emails(self, account, folder="INBOX", limit=None, content_max_bytes=None):
         """
         Process emails in the specified folder against this rule
         
+        Header conditions are evaluated first. Bodies are only fetched, in a
+        single batched partial fetch, for messages whose outcome still depends
+        on content conditions.
+        
         Args:
             account: Account object with IMAP connection
             folder: IMAP folder to process (default: INBOX)  
             limit: Maximum number of emails to process
+            content_max_bytes: Body bytes to fetch per message for content
+                conditions (defaults to the configured cap)
+        """
+        return process_rules(account, [self], folder=folder, limit=limit,
+                             content_max_bytes=content_max_bytes).get(self.id, 0)
+    
+    def _match_mail_list(self, mb, account, mail_list, candidates, evaluator=None,
+                         texts=None, content_max_bytes=None) -> List[int]:
+        """
+        Find which of the candidate messages this rule matches
+        
+        Args:
+            mb: Logged-in mailbox, used to fetch bodies for content conditions
+            account: Account object
+            mail_list: Mail objects fetched for this pass
+            candidates: Positions in mail_list still to be evaluated
+            evaluator: ColumnarEvaluator over mail_list, for large batches
+            texts: UID -> body text already fetched in this pass; updated
+                with any bodies fetched here
+            content_max_bytes: Body bytes to fetch per message
+            
+        Returns:
+            list: Positions of matching messages, header matches first
         """
         import logging
+        import functions as pf
         logger = logging.getLogger(__name__)
+        if texts is None:
+            texts = {}
         
-        try:
-            # Connect to IMAP
-            mb = account.login()
-            if not mb:
-                logger.error(f"Failed to connect to IMAP for account {account.email}")
-                return 0
-                
-            mb.folder.set(folder)
-            
-            # Fetch emails using existing function
-            import functions as pf
-            mail_list = pf.fetch_class(mb, folder=folder, limit=limit)
-            
-            processed_count = 0
-            logger.info(f"Rule '{self.name}' processing {len(mail_list)} emails from {folder}")
+        # Only regex conditions are charged against the budget; thread CPU
+        # time leaves out waits for the GIL or the host
+        budget_ns = None
+        if self.has_regex:
+            budget_ns = int(_get_rules_setting('regex_message_budget_ms', DEFAULT_REGEX_MESSAGE_BUDGET_MS) * 1e6)
+        
+        # Phase 1: decide as many messages as possible from headers alone
+        eval_start = time.perf_counter_ns()
+        matched = []
+        undecided = []
+        if evaluator is not None:
+            matched, undecided = evaluator.match_headers(self, budget_ns)
+            if len(candidates) < len(mail_list):
+                remaining = set(candidates)
+                matched = [i for i in matched if i in remaining]
+                undecided = [i for i in undecided if i in remaining]
+        else:
+            # Load sender lists up front rather than on the first message
+            for condition in self.conditions:
+                if condition.type == ConditionType.SENDER_IN_LIST:
+                    try:
+                        _load_list_entries(condition.value)
+                    except Exception:
+                        pass  # Reported when the condition is evaluated
             
-            # Process each email
-            for mail_item in mail_list:
+            for i in candidates:
+                mail_item = mail_list[i]
                 # Convert to format expected by rule conditions
                 email_data = {
                     'from': mail_item.from_,
                     'subject': mail_item.subject,
-                    'content': '',  # Would need full body for content rules
+                    'content': '',
                     'date': mail_item.date
                 }
                 
-                # Check if rule matches
-                if self.matches(email_data):
-                    logger.info(f"Rule '{self.name}' matched email from {mail_item.from_} with subject '{mail_item.subject}'")
-                    # Execute all actions for this rule
-                    for action in self.actions:
-                        self._execute_action(action, mail_item, mb, account)
-                    processed_count += 1
+                outcome = self.match_headers(email_data, budget_ns)
+                if outcome is None:
+                    undecided.append(i)
+                elif outcome:
+                    matched.append(i)
+        
+        # Phase 2: fetch text parts only for messages that still need content
+        if self.needs_content:
+            if content_max_bytes is None:
+                content_max_bytes = _get_rules_setting('content_fetch_max_bytes', DEFAULT_CONTENT_FETCH_MAX_BYTES)
             
-            mb.logout()
-            logger.info(f"Rule '{self.name}' processed {processed_count} matching emails")
-            return processed_count
+            # Bodies fetched for an earlier rule in this pass are reused
+            to_fetch = [mail_list[i].uid for i in undecided if mail_list[i].uid not in texts]
+            fetched = pf.fetch_text_parts(mb, to_fetch, content_max_bytes) if to_fetch else {}
+            texts.update(fetched)
+            for i in undecided:
+                mail_item = mail_list[i]
+                email_data = {
+                    'from': mail_item.from_,
+                    'subject': mail_item.subject,
+                    'content': texts.get(mail_item.uid, ''),
+                    'date': mail_item.date
+                }
+                if self.compiled.match_content(email_data):
+                    matched.append(i)
             
-        except Exception as e:
-            logger.error(f"Error processing emails for rule {self.id}: {e}")
-            if 'mb' in locals() and mb:
-                try:
-                    mb.logout()
-                except:
-                    pass
-            return 0
+            # Bytes avoided relative to downloading every full message
+            fetched_sizes = {uid: len(text.encode('utf-8')) for uid, text in fetched.items()}
+            bytes_fetched = sum(fetched_sizes.values())
+            bytes_avoided = sum(
+                max(0, (getattr(mail_list[i], 'size', 0) or 0) - fetched_sizes.get(mail_list[i].uid, 0))
+                for i in candidates
+            )
+            _record_content_fetch(account.email, len(candidates), len(to_fetch),
+                                  len(candidates) - len(to_fetch), bytes_fetched, bytes_avoided)
+            set_attributes(bodies_fetched=len(to_fetch), bytes=bytes_fetched)
+            logger.debug(f"Rule '{self.name}' fetched {len(to_fetch)} bodies ({bytes_fetched} bytes), "
+                         f"avoided {len(candidates) - len(to_fetch)} ({bytes_avoided} bytes)")
+        
+        # Content fetch time is included, since it is part of what the rule costs
+        get_rule_metrics().record_evaluations(self.id, self.name, len(candidates), len(matched),
+                                              time.perf_counter_ns() - eval_start)
+        return matched
 
-    def _execute_action(self, action, mail_item, mailbox, account):
-        """Execute a single rule action on an email"""
+    def _execute_action(self, action, mail_item, mailbox, account) -> bool:
+        """
+        Execute a single rule action on an email
+        
+        Returns:
+            bool: True if the action was carried out, False if it failed
+        """
         import logging
         logger = logging.getLogger(__name__)
         
@@ -240,10 +765,162 @@ class EmailRule:
                 # Mark email as read
                 mailbox.flag([mail_item.uid], ['\\Seen'], True)
                 
-            # Additional action types would be implemented here
+            elif action.type == ActionType.FORWARD:
+                # Queued for the account's SMTP sender thread, so processing does not wait on delivery
+                logger.info(f"Queueing email UID {mail_item.uid} for forwarding to {action.target}")
+                from services.smtp_sender import forward_messages
+                if not forward_messages(mailbox, account, [str(mail_item.uid)], action.target):
+                    logger.warning(f"Email UID {mail_item.uid} was not queued for forwarding to {action.target}")
+                    return False
+                
+            else:
+                # Not carried out, so not counted as executed
+                logger.warning(f"Action type {action.type.value} is not supported for rule {self.id}")
+                return False
+            
+            return True
             
         except Exception as e:
             logger.error(f"Error executing action {action.type} for rule {self.id}: {e}")
+            return False
+
+
+def disable_rule(rule: EmailRule, reason: str, rules_file: Path = None, persist: bool = True):
+    """
+    Deactivate a misbehaving rule
+    
+    Args:
+        rule: Rule to disable (also deactivated in memory)
+        reason: Why the rule was disabled, shown in rule stats
+        rules_file: Rules file path (defaults to the configured rules.json)
+        persist: Also save the rule as inactive; otherwise it stays disabled
+            only until the rule set is reloaded
+    """
+    import logging
+    from datetime import datetime
+    
+    rule.active = False
+    rule.disabled_reason = reason
+    get_rule_metrics().record_disabled(rule.id, rule.name, reason)
+    if not persist:
+        return
+    
+    try:
+        engine = RulesEngine(rules_file)
+        stored = engine.get_rule(rule.id)
+        if stored is not None:
+            stored.active = False
+            stored.disabled_reason = reason
+            stored.updated_at = datetime.now().isoformat()
+            engine.save_rules()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Failed to save disabled rule {rule.id}: {e}")
+
+
+@traced()
+def process_rules(account, rule_list: List[EmailRule], folder="INBOX", limit=None,
+                  content_max_bytes=None, first_match: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Process a folder against a set of rules in a single pass
+    
+    Logs in and fetches headers once, then applies the rules in the given
+    (priority) order. Once a matching rule is terminal for a message (it
+    moves it, sets stop_processing, or first-match mode is on), later rules
+    neither evaluate nor act on that message.
+    
+    Args:
+        account: Account object with IMAP connection
+        rule_list: Rules in priority order
+        folder: IMAP folder to process (default: INBOX)
+        limit: Maximum number of emails to process
+        content_max_bytes: Body bytes to fetch per message for content
+            conditions (defaults to the configured cap)
+        first_match: Stop at the first matching rule for each message
+            (defaults to the first_match rules setting)
+        
+    Returns:
+        dict: Rule ID -> number of matching emails processed
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    counts = {rule.id: 0 for rule in rule_list}
+    rule_list = [rule for rule in rule_list if rule.active and rule.conditions]
+    if not rule_list:
+        return counts
+    if first_match is None:
+        first_match = _get_rules_setting('first_match', False)
+    
+    try:
+        # Connect to IMAP
+        mb = account.login()
+        if not mb:
+            logger.error(f"Failed to connect to IMAP for account {account.email}")
+            return counts
+        
+        mb.folder.set(folder)
+        
+        # Fetch emails using existing function
+        import functions as pf
+        mail_list = pf.fetch_class(mb, folder=folder, limit=limit)
+        record_headers(account.email, mail_list, folder)
+        set_attributes(folder=folder, uids=len(mail_list), rules=len(rule_list))
+        
+        evaluator = None
+        columnar_min_batch = _get_rules_setting('columnar_min_batch', DEFAULT_COLUMNAR_MIN_BATCH)
+        if columnar_min_batch and len(mail_list) >= columnar_min_batch:
+            # Large batches (startup backfills) are evaluated column-wise
+            from rules_columnar import ColumnarEvaluator, HeaderBatch
+            evaluator = ColumnarEvaluator(HeaderBatch.from_mail(mail_list))
+        
+        finished = set()  # Positions later rules skip
+        texts = {}  # Bodies fetched during this pass
+        metrics = get_rule_metrics()
+        
+        for rule in rule_list:
+            candidates = [i for i in range(len(mail_list)) if i not in finished]
+            if not candidates:
+                break
+            
+            with span('rule', rule=rule.name, candidates=len(candidates)) as rule_span:
+                try:
+                    logger.info(f"Rule '{rule.name}' processing {len(candidates)} emails from {folder}")
+                    matched = rule._match_mail_list(mb, account, mail_list, candidates, evaluator,
+                                                    texts, content_max_bytes)
+                    rule_span.set(matched=len(matched))
+                    terminal = rule.is_terminal(first_match)
+                
+                    for i in matched:
+                        mail_item = mail_list[i]
+                        logger.info(f"Rule '{rule.name}' matched email from {mail_item.from_} with subject '{mail_item.subject}'")
+                        # Execute all actions for this rule
+                        for action in rule.ordered_actions():
+                            metrics.record_action(rule.id, rule._execute_action(action, mail_item, mb, account))
+                        counts[rule.id] += 1
+                        if terminal:
+                            finished.add(i)
+                
+                    logger.info(f"Rule '{rule.name}' processed {counts[rule.id]} matching emails")
+                
+                except RegexBudgetExceeded as e:
+                    # A slow host can trip the budget too, so rules.json is left alone
+                    logger.warning(f"{e}; disabling rule {rule.id} until the rules are reloaded")
+                    disable_rule(rule, str(e), persist=False)
+                
+                except Exception as e:
+                    logger.error(f"Error processing emails for rule {rule.id}: {e}")
+        
+        mb.logout()
+        
+    except Exception as e:
+        logger.error(f"Error processing rules for account {account.email}: {e}")
+        if 'mb' in locals() and mb:
+            try:
+                mb.logout()
+            except:
+                pass
+    
+    return counts
 
 
 class RulesEngine:
@@ -301,11 +978,14 @@ class RulesEngine:
                     description=rule_data['description'],
                     conditions=conditions,
                     actions=actions,
+                    account_email=rule_data.get('account_email', ''),
                     condition_logic=rule_data.get('condition_logic', 'AND'),
                     active=rule_data.get('active', True),
                     priority=rule_data.get('priority', 100),
                     created_at=rule_data.get('created_at', ''),
-                    updated_at=rule_data.get('updated_at', '')
+                    updated_at=rule_data.get('updated_at', ''),
+                    stop_processing=rule_data.get('stop_processing', False),
+                    disabled_reason=rule_data.get('disabled_reason', '')
                 )
                 
                 self.rules.append(rule)
@@ -347,6 +1027,9 @@ class RulesEngine:
             os.rename(temp_file, self.rules_file)
             temp_file = None  # Successfully renamed, don't delete
             
+            # Processors in this process pick up the new rules on their next cycle
+            _invalidate_rule_set_cache(self.rules_file)
+            
         except Exception as e:
             # Clean up temp file if something went wrong
             if temp_file and os.path.exists(temp_file):
@@ -388,17 +1071,199 @@ class RulesEngine:
         """Get all rules, sorted by priority"""
         return sorted(self.rules, key=lambda r: r.priority)
     
-    def process_email(self, email_data: Dict[str, Any]) -> List[RuleAction]:
-        """Process an email through all rules and return matching actions"""
+    def get_evaluation_orders(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Current condition evaluation order for every rule, keyed by rule ID"""
+        return {rule.id: rule.evaluation_order() for rule in self.get_all_rules()}
+    
+    def process_email(self, email_data: Dict[str, Any], first_match: Optional[bool] = None) -> List[RuleAction]:
+        """
+        Process an email through all rules and return matching actions
+        
+        Rules are applied in priority order until a matching rule is
+        terminal (see EmailRule.is_terminal).
+        
+        Args:
+            email_data: Email dict with from, subject and content
+            first_match: Stop at the first matching rule (defaults to the
+                first_match rules setting)
+        """
+        if first_match is None:
+            first_match = _get_rules_setting('first_match', False)
         matching_actions = []
         
         for rule in self.get_all_rules():
             if rule.matches(email_data):
                 matching_actions.extend(rule.actions)
+                if rule.is_terminal(first_match):
+                    break
                 
         return matching_actions
 
 
+@dataclass(frozen=True)
+class RuleSetSnapshot:
+    """Immutable set of active rules for one account at a given version"""
+    account_email: str
+    version: int
+    rules: tuple
+    
+    def __iter__(self):
+        return iter(self.rules)
+    
+    def __len__(self):
+        return len(self.rules)
+
+
+class RuleSetCache:
+    """
+    Process-wide cache of parsed rules for one rules file
+    
+    The file is only re-parsed when its (mtime, inode, size) changes or
+    save_rules invalidates it; each reload bumps the version. Per-account
+    snapshots are built once per version, with compiled evaluation plans,
+    and shared by all processors.
+    """
+    
+    def __init__(self, rules_file: Path):
+        self.rules_file = Path(rules_file)
+        self.version = 0
+        self._file_key = None
+        self._rules: List[EmailRule] = []
+        self._snapshots: Dict[str, RuleSetSnapshot] = {}
+        self._lock = threading.Lock()
+    
+    def _stat_key(self) -> Optional[tuple]:
+        try:
+            stat = self.rules_file.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+    
+    def _reload(self, file_key: Optional[tuple]):
+        rules = RulesEngine(self.rules_file).get_all_rules() if file_key else []
+        active = []
+        for rule in rules:
+            if not rule.active:
+                continue
+            # Rules saved outside the web interface are not validated, so
+            # patterns prone to catastrophic backtracking are skipped here
+            reason = unsafe_regex_reason(rule)
+            if reason:
+                get_rule_metrics().record_disabled(rule.id, rule.name, reason)
+                continue
+            # Compiled while the previous plans still hold their conditions, so statistics carry over
+            rule.compile(shared=True)
+            active.append(rule)
+        self._rules = active
+        self._snapshots = {}
+        self._file_key = file_key
+        self.version += 1
+    
+    def invalidate(self):
+        """Force a reload on the next access"""
+        with self._lock:
+            self._file_key = False
+    
+    def get(self, account_email: str) -> RuleSetSnapshot:
+        """
+        Get the active rules for an account
+        
+        Args:
+            account_email: Email address of the account
+            
+        Returns:
+            RuleSetSnapshot: Active rules for the account and for all accounts,
+                             sorted by priority
+        """
+        file_key = self._stat_key()
+        with self._lock:
+            if file_key != self._file_key:
+                self._reload(file_key)
+            
+            snapshot = self._snapshots.get(account_email)
+            if snapshot is None:
+                rules = tuple(
+                    rule for rule in self._rules
+                    if rule.account_email == account_email or rule.account_email == ""
+                )
+                snapshot = RuleSetSnapshot(account_email, self.version, rules)
+                self._snapshots[account_email] = snapshot
+            return snapshot
+    
+    def get_evaluation_orders(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Condition evaluation order of every active rule, as tuned by live processing"""
+        file_key = self._stat_key()
+        with self._lock:
+            if file_key != self._file_key:
+                self._reload(file_key)
+            rules = list(self._rules)
+        return {rule.id: rule.evaluation_order() for rule in rules}
+
+
+_rule_set_caches: Dict[Path, RuleSetCache] = {}
+_rule_set_caches_lock = threading.Lock()
+
+
+def _default_rules_file() -> Path:
+    try:
+        from config import get_config
+        return get_config().config_dir / "rules.json"
+    except Exception:
+        # Fallback if config unavailable
+        return Path("rules.json")
+
+
+def get_rule_set_cache(rules_file: Path = None) -> RuleSetCache:
+    """
+    Get the shared rule set cache for a rules file
+    
+    Args:
+        rules_file: Rules file path (defaults to the configured rules.json)
+    """
+    path = Path(rules_file or _default_rules_file()).absolute()
+    with _rule_set_caches_lock:
+        cache = _rule_set_caches.get(path)
+        if cache is None:
+            cache = RuleSetCache(path)
+            _rule_set_caches[path] = cache
+        return cache
+
+
+def _invalidate_rule_set_cache(rules_file: Path):
+    """Invalidate the cached rule set of a rules file, if any"""
+    with _rule_set_caches_lock:
+        cache = _rule_set_caches.get(Path(rules_file).absolute())
+    if cache is not None:
+        cache.invalidate()
+
+
+def get_active_rule_set(account_email: str, rules_file: Path = None) -> RuleSetSnapshot:
+    """
+    Get the cached snapshot of active rules for an account
+    
+    Args:
+        account_email: Email address of the account
+        rules_file: Rules file path (defaults to the configured rules.json)
+        
+    Returns:
+        RuleSetSnapshot: Immutable, versioned set of active rules
+    """
+    return get_rule_set_cache(rules_file).get(account_email)
+
+
+def get_live_evaluation_orders(rules_file: Path = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Condition evaluation order of the active rules used for processing
+    
+    Args:
+        rules_file: Rules file path (defaults to the configured rules.json)
+        
+    Returns:
+        dict: Rule ID -> conditions in evaluation order
+    """
+    return get_rule_set_cache(rules_file).get_evaluation_orders()
+
+
 # Pre-built rule templates
 RULE_TEMPLATES = {
     "package_delivery": {
@@ -582,25 +1447,7 @@ def load_active_rules_for_account(account_email: str) -> List[EmailRule]:
     """
     try:
         # Ensure we use the same persistent config directory as the web interface
-        rules_file = None
-        try:
-            from config import get_config
-            config = get_config()
-            rules_file = config.config_dir / "rules.json"
-        except Exception:
-            # Fallback if config unavailable
-            pass
-        
-        manager = RulesEngine(rules_file)
-        rules = manager.get_all_rules()
-        
-        # Filter for active rules that apply to this account or all accounts (empty account_email)
-        active_rules = [
-            rule for rule in rules 
-            if rule.active and (rule.account_email == account_email or rule.account_email == "")
-        ]
-        
-        return active_rules
+        return list(get_active_rule_set(account_email))
         
     except Exception as e:
         import logging
@@ -609,6 +1456,113 @@ def load_active_rules_for_account(account_email: str) -> List[EmailRule]:
         return []
 
 
+def _rule_hits(rule: EmailRule, evaluator) -> tuple:
+    """
+    Indexes of corpus messages the rule matches on headers, and of those needing a body
+    
+    Evaluated column-wise, which never calls CompiledCondition.evaluate, so
+    a backtest leaves the shared selectivity counters and rule metrics of
+    live processing untouched.
+    """
+    if not rule.conditions:
+        return [], []
+    if not rule.active:
+        # Drafts are tested whether or not they are enabled yet
+        from dataclasses import replace
+        rule = replace(rule, active=True)
+    return evaluator.match_headers(rule)
+
+
+def backtest_rules(rules: List[EmailRule], headers: List[Dict[str, Any]],
+                   draft: Optional[EmailRule] = None, sample_size: int = 10) -> Dict[str, Any]:
+    """
+    Run rules against cached headers without touching IMAP
+
+    Uses the same condition semantics as live processing, evaluated
+    column-wise over the corpus without recording statistics. The corpus
+    holds headers only, so messages that a rule could only decide from the
+    body are reported as undecided rather than matched.
+
+    Args:
+        rules: Current rules for the account
+        headers: Cached header dicts (from, subject, date, uid, ...)
+        draft: Proposed rule; replaces the current rule with the same ID,
+            or is added as a new rule
+        sample_size: Number of sample messages to return per result
+
+    Returns:
+        dict: Per-rule match counts and samples, and when a draft is given
+              the messages it adds to or removes from the current rule set
+    """
+    from rules_columnar import ColumnarEvaluator, HeaderBatch
+
+    start = time.perf_counter()
+    # One evaluator for all rules, so conditions shared between rules are evaluated once
+    evaluator = ColumnarEvaluator(HeaderBatch(headers))
+
+    def sample(indexes):
+        return [{
+            'uid': headers[i].get('uid'),
+            'folder': headers[i].get('folder'),
+            'from': headers[i].get('from', ''),
+            'subject': headers[i].get('subject', ''),
+            'date': headers[i].get('date')
+        } for i in indexes[:sample_size]]
+
+    def describe(rule, matched, undecided):
+        return {
+            'name': rule.name,
+            'active': rule.active,
+            'matches': len(matched),
+            'match_rate': round(len(matched) / len(headers), 4) if headers else 0.0,
+            'needs_content': len(undecided),
+            'samples': sample(matched)
+        }
+
+    current_hits = {}
+    results = {}
+    for rule in rules:
+        if not rule.active or (draft is not None and rule.id == draft.id):
+            continue
+        matched, undecided = _rule_hits(rule, evaluator)
+        current_hits[rule.id] = set(matched)
+        results[rule.id] = describe(rule, matched, undecided)
+
+    report = {
+        'messages': len(headers),
+        'rules': results,
+        'diff': None
+    }
+
+    if draft is not None:
+        previous = next((rule for rule in rules if rule.id == draft.id and rule.active), None)
+        previous_matched = set(_rule_hits(previous, evaluator)[0]) if previous else set()
+        draft_matched, draft_undecided = _rule_hits(draft, evaluator)
+        draft_set = set(draft_matched)
+
+        added = sorted(draft_set - previous_matched)
+        removed = sorted(previous_matched - draft_set)
+        overlaps = {
+            rule_id: len(draft_set & hits)
+            for rule_id, hits in current_hits.items()
+            if draft_set & hits
+        }
+
+        report['draft'] = describe(draft, draft_matched, draft_undecided)
+        report['diff'] = {
+            'replaces': previous.id if previous else None,
+            'added': len(added),
+            'removed': len(removed),
+            'unchanged': len(draft_set & previous_matched),
+            'added_samples': sample(added),
+            'removed_samples': sample(removed),
+            'overlapping_rules': overlaps
+        }
+
+    report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return report
+
+
 # Backward compatibility for old rules system
 # The old system used @rule decorators and rules_list
 # For now, provide an empty list to prevent crashes
@@ -0,0 +1,306 @@
+"""
+Columnar Rule Evaluation for Mail-Rulez
+
+Evaluates rules over a whole batch of headers at once, for large startup
+backfills. Headers are split into parallel columns, each condition is
+evaluated once per distinct column value and expanded into a boolean mask
+over the batch, and AND/OR logic becomes mask algebra. Results are identical
+to evaluating EmailRule.matches message by message.
+
+NumPy is used for masks when it is installed; otherwise masks are byte
+strings of 0/1 packed into Python integers, so AND/OR run as single big-int
+operations.
+"""
+
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+import time
+
+import rules
+from rules import ConditionType, EmailRule, CompiledCondition
+from regex_guard import REGEX_MAX_INPUT, RegexBudgetExceeded
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class HeaderBatch:
+    """
+    A batch of message headers stored as parallel columns
+
+    Text columns are factorized into their distinct values plus a code per
+    message, since senders and subjects repeat heavily within a mailbox.
+    """
+
+    FIELDS = ('from', 'subject', 'content')
+
+    def __init__(self, emails: List[Dict[str, Any]]):
+        self.size = len(emails)
+        self._values = {field: [email.get(field) or '' for email in emails] for field in self.FIELDS}
+        self._dates = [email.get('date') for email in emails]
+        self._factorized: Dict[str, Tuple[list, list]] = {}
+        self._lowered: Dict[str, list] = {}
+
+    @classmethod
+    def from_mail(cls, mail_list: List[Any]) -> 'HeaderBatch':
+        """Build a batch from Mail objects returned by fetch_class"""
+        return cls([
+            {'from': item.from_, 'subject': item.subject, 'date': item.date}
+            for item in mail_list
+        ])
+
+    def column(self, field: str) -> List[str]:
+        """Raw values of a text column, one per message"""
+        return self._values[field]
+
+    def factorized(self, field: str) -> Tuple[list, list]:
+        """Distinct values of a text column and the code of each message"""
+        result = self._factorized.get(field)
+        if result is None:
+            index: Dict[str, int] = {}
+            codes = [index.setdefault(value, len(index)) for value in self._values[field]]
+            result = (list(index), codes)
+            self._factorized[field] = result
+        return result
+
+    def lowered(self, field: str) -> List[str]:
+        """Lowercased distinct values of a text column"""
+        result = self._lowered.get(field)
+        if result is None:
+            result = [value.lower() for value in self.factorized(field)[0]]
+            self._lowered[field] = result
+        return result
+
+    @property
+    def dates(self) -> List[float]:
+        """Message dates as epoch seconds (0.0 when unknown)"""
+        epochs = []
+        for value in self._dates:
+            if isinstance(value, datetime):
+                epochs.append(value.timestamp())
+            elif isinstance(value, date):
+                epochs.append(datetime(value.year, value.month, value.day).timestamp())
+            else:
+                epochs.append(0.0)
+        return epochs
+
+
+class _BitsetMasks:
+    """Masks as integers whose little-endian bytes are 0 or 1 per message"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.zeros = 0
+        self.ones = int.from_bytes(b'\x01' * size, 'little')
+
+    def expand(self, unique_results: bytearray, codes: list) -> int:
+        return int.from_bytes(bytes(map(unique_results.__getitem__, codes)), 'little')
+
+    def invert(self, mask: int) -> int:
+        return mask ^ self.ones
+
+    def to_bytes(self, mask: int) -> bytes:
+        return mask.to_bytes(self.size, 'little')
+
+    def indexes(self, mask: int) -> List[int]:
+        data = self.to_bytes(mask)
+        result = []
+        position = data.find(1)
+        while position != -1:
+            result.append(position)
+            position = data.find(1, position + 1)
+        return result
+
+    def to_list(self, mask: int) -> List[bool]:
+        return [bool(flag) for flag in self.to_bytes(mask)]
+
+
+class _NumpyMasks:
+    """Masks as NumPy boolean arrays"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.zeros = np.zeros(size, dtype=bool)
+        self.ones = np.ones(size, dtype=bool)
+        self._codes: Dict[int, Any] = {}
+
+    def expand(self, unique_results: bytearray, codes: list):
+        code_array = self._codes.get(id(codes))
+        if code_array is None:
+            code_array = np.asarray(codes, dtype=np.intp)
+            self._codes[id(codes)] = code_array
+        return np.frombuffer(bytes(unique_results), dtype=np.uint8).astype(bool)[code_array]
+
+    def invert(self, mask):
+        return ~mask
+
+    def indexes(self, mask) -> List[int]:
+        return np.flatnonzero(mask).tolist()
+
+    def to_list(self, mask) -> List[bool]:
+        return mask.tolist()
+
+
+class ColumnarEvaluator:
+    """
+    Evaluates rules against a HeaderBatch using mask algebra
+
+    Condition masks are memoized per evaluator, so conditions shared by
+    several rules are evaluated once per batch.
+    """
+
+    def __init__(self, batch: HeaderBatch, use_numpy: Optional[bool] = None):
+        self.batch = batch
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
+        self.masks = _NumpyMasks(batch.size) if use_numpy else _BitsetMasks(batch.size)
+        self._condition_masks: Dict[tuple, Any] = {}
+        self._budget_ns: Optional[int] = None
+
+    def _unique_results(self, compiled: CompiledCondition) -> Tuple[bytearray, str]:
+        """Evaluate a condition once per distinct value of the column it reads"""
+        condition = compiled.condition
+        condition_type = compiled.type
+        value = compiled._value
+        case_sensitive = condition.case_sensitive
+
+        def text(field):
+            return self.batch.factorized(field)[0] if case_sensitive else self.batch.lowered(field)
+
+        if condition_type == ConditionType.SENDER_CONTAINS:
+            return bytearray(value in sender for sender in text('from')), 'from'
+        if condition_type == ConditionType.SENDER_EXACT:
+            return bytearray(sender == value for sender in text('from')), 'from'
+        if condition_type == ConditionType.SENDER_DOMAIN:
+            domain = condition.value.lower()
+            return bytearray(
+                '@' in sender and sender.split('@')[-1].strip('>').lower() == domain
+                for sender in self.batch.factorized('from')[0]
+            ), 'from'
+        if condition_type == ConditionType.SENDER_IN_LIST:
+            senders = self.batch.factorized('from')[0]
+            try:
+                entries = rules._load_list_entries(condition.value)
+            except Exception as e:
+                import logging
+                logging.warning(f"Failed to check sender against list {condition.value}: {e}")
+                return bytearray(len(senders)), 'from'
+            return bytearray(rules._extract_address(sender).lower() in entries for sender in senders), 'from'
+        if condition_type == ConditionType.SUBJECT_CONTAINS:
+            return bytearray(value in subject for subject in text('subject')), 'subject'
+        if condition_type == ConditionType.SUBJECT_EXACT:
+            return bytearray(subject == value for subject in text('subject')), 'subject'
+        if condition_type == ConditionType.SUBJECT_REGEX:
+            subjects = self.batch.factorized('subject')[0]
+            if compiled._regex is None:
+                return bytearray(len(subjects)), 'subject'
+            search = compiled._regex.search
+            if self._budget_ns is None:
+                return bytearray(search(subject[:REGEX_MAX_INPUT]) is not None for subject in subjects), 'subject'
+            results = bytearray(len(subjects))
+            for index, subject in enumerate(subjects):
+                cpu_start = time.thread_time_ns()
+                results[index] = search(subject[:REGEX_MAX_INPUT]) is not None
+                if time.thread_time_ns() - cpu_start > self._budget_ns:
+                    raise RegexBudgetExceeded(f"Regex '{condition.value}' exceeded its time budget on one subject")
+            return results, 'subject'
+        if condition_type == ConditionType.CONTENT_CONTAINS:
+            return bytearray(value in content for content in text('content')), 'content'
+
+        return bytearray(len(self.batch.factorized('from')[0])), 'from'
+
+    def condition_mask(self, compiled: CompiledCondition):
+        """Mask of messages matching a single compiled condition"""
+        condition = compiled.condition
+        key = (condition.type, condition.value, condition.case_sensitive)
+        mask = self._condition_masks.get(key)
+        if mask is None:
+            unique_results, field = self._unique_results(compiled)
+            mask = self.masks.expand(unique_results, self.batch.factorized(field)[1])
+            self._condition_masks[key] = mask
+        return mask
+
+    def _combine(self, conditions: List[CompiledCondition], logic: str):
+        if logic == "OR":
+            result = self.masks.zeros
+            for condition in conditions:
+                result = result | self.condition_mask(condition)
+        else:
+            result = self.masks.ones
+            for condition in conditions:
+                result = result & self.condition_mask(condition)
+        return result
+
+    def rule_mask(self, rule: EmailRule):
+        """Mask of messages matching a rule, including content conditions"""
+        if not rule.active or not rule.conditions:
+            return self.masks.zeros
+        plan = rule.compiled
+        return self._combine(plan.header_conditions + plan.content_conditions, plan.logic)
+
+    def header_masks(self, rule: EmailRule) -> tuple:
+        """
+        Masks equivalent to EmailRule.match_headers over the batch
+
+        Returns:
+            tuple: (matched, undecided) masks; undecided messages still need
+                   their content conditions evaluated
+        """
+        zeros = self.masks.zeros
+        if not rule.active or not rule.conditions:
+            return zeros, zeros
+
+        plan = rule.compiled
+        header = self._combine(plan.header_conditions, plan.logic)
+        if not plan.content_conditions:
+            return header, zeros
+        if plan.logic == "OR":
+            return header, self.masks.invert(header)
+        return zeros, header
+
+    def matches(self, rule: EmailRule) -> List[bool]:
+        """Per-message match results for a rule"""
+        return self.masks.to_list(self.rule_mask(rule))
+
+    def matching_indexes(self, rule: EmailRule) -> List[int]:
+        """Batch positions of messages matching a rule"""
+        return self.masks.indexes(self.rule_mask(rule))
+
+    def match_headers(self, rule: EmailRule, budget_ns: Optional[int] = None) -> Tuple[List[int], List[int]]:
+        """
+        Batch positions of messages matched and left undecided by header conditions
+        
+        Args:
+            rule: Rule to evaluate
+            budget_ns: Thread CPU time the rule's regexes may take on one
+                distinct subject before RegexBudgetExceeded is raised (no
+                limit if None)
+        """
+        self._budget_ns = budget_ns
+        try:
+            matched, undecided = self.header_masks(rule)
+        finally:
+            self._budget_ns = None
+        return self.masks.indexes(matched), self.masks.indexes(undecided)
+
+
+def evaluate_rules(rule_list: List[EmailRule], emails: List[Dict[str, Any]],
+                   use_numpy: Optional[bool] = None) -> Dict[str, List[int]]:
+    """
+    Evaluate several rules over a batch of email dicts
+
+    Args:
+        rule_list: Rules to evaluate
+        emails: Email dicts with from, subject and optionally content and date
+        use_numpy: Force or disable the NumPy backend (default: use if installed)
+
+    Returns:
+        dict: Rule ID -> positions of matching emails
+    """
+    evaluator = ColumnarEvaluator(HeaderBatch(emails), use_numpy=use_numpy)
+    return {rule.id: evaluator.matching_indexes(rule) for rule in rule_list}
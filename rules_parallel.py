@@ -0,0 +1,348 @@
+"""
+Parallel Rule Evaluation for Mail-Rulez
+
+Backfill mode for first-time imports of large mailboxes. The header corpus
+is split into shards that are evaluated in a process pool, where each worker
+holds its own compiled copy of the rule set, so rule matching is not bound
+to the scheduler thread's GIL. Decisions are merged back in the parent and
+actions are executed in bulk, one IMAP command per (action, target) chunk.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from rules import EmailRule, ActionType, ACTION_ORDER, _extract_address, _get_rules_setting, DEFAULT_CONTENT_FETCH_MAX_BYTES
+from metrics import get_rule_metrics
+
+
+# Shards per worker process; more shards even out uneven shard costs
+SHARDS_PER_WORKER = 4
+
+# Corpora smaller than this are evaluated in-process
+DEFAULT_PARALLEL_MIN_BATCH = 20000
+
+# Maximum UIDs per bulk IMAP command
+BULK_ACTION_CHUNK = 500
+
+# Bodies fetched per partial-fetch command for content conditions
+CONTENT_FETCH_CHUNK = 200
+
+
+logger = logging.getLogger(__name__)
+
+# Rule set held by each worker process, compiled once by _init_worker
+_worker_rules: Optional[List[EmailRule]] = None
+
+
+def _init_worker(rule_list: List[EmailRule]):
+    """Process pool initializer: compile the unpickled rule set once"""
+    global _worker_rules
+    for rule in rule_list:
+        rule.compile(shared=True)
+    _worker_rules = rule_list
+
+
+def _evaluate_shard(shard: Tuple[int, List[Tuple[str, str]]], rule_list: Optional[List[EmailRule]] = None) -> Dict[str, tuple]:
+    """
+    Evaluate header conditions of every rule over one shard
+
+    Args:
+        shard: (offset, [(from, subject), ...]) for a contiguous slice of the corpus
+        rule_list: Rules to evaluate (defaults to the worker's rule set)
+
+    Returns:
+        dict: Rule ID -> (matched positions, positions that still need content),
+              as positions in the whole corpus
+    """
+    from rules_columnar import ColumnarEvaluator, HeaderBatch
+
+    offset, headers = shard
+    evaluator = ColumnarEvaluator(HeaderBatch([
+        {'from': sender, 'subject': subject} for sender, subject in headers
+    ]))
+
+    results = {}
+    for rule in (rule_list if rule_list is not None else _worker_rules):
+        matched, undecided = evaluator.match_headers(rule)
+        results[rule.id] = ([offset + i for i in matched], [offset + i for i in undecided])
+    return results
+
+
+def _split(items: list, parts: int) -> List[list]:
+    """Split a list into at most `parts` contiguous, similarly sized shards"""
+    parts = max(1, min(parts, len(items)))
+    size, remainder = divmod(len(items), parts)
+    shards = []
+    start = 0
+    for index in range(parts):
+        end = start + size + (1 if index < remainder else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+def evaluate_parallel(rule_list: List[EmailRule], mail_list: List[Any], workers: Optional[int] = None,
+                      min_batch: Optional[int] = None) -> Dict[str, tuple]:
+    """
+    Evaluate header conditions of a rule set over a large corpus
+
+    Args:
+        rule_list: Rules to evaluate, in priority order
+        mail_list: Mail objects from fetch_class
+        workers: Worker processes (defaults to, and capped at, the number of CPUs)
+        min_batch: Corpora smaller than this are evaluated in-process
+
+    Returns:
+        dict: Rule ID -> (matched UIDs, UIDs that still need content), with
+              UIDs in corpus order
+    """
+    if workers is None:
+        workers = _get_rules_setting('parallel_workers', None) or os.cpu_count() or 1
+    workers = max(1, min(int(workers), os.cpu_count() or 1))
+    if min_batch is None:
+        min_batch = _get_rules_setting('parallel_min_batch', DEFAULT_PARALLEL_MIN_BATCH)
+
+    uids = [str(item.uid) for item in mail_list]
+    corpus = [(item.from_ or '', item.subject or '') for item in mail_list]
+    if workers <= 1 or len(corpus) < min_batch:
+        positions = _evaluate_shard((0, corpus), rule_list)
+    else:
+        shards = []
+        offset = 0
+        for part in _split(corpus, workers * SHARDS_PER_WORKER):
+            shards.append((offset, part))
+            offset += len(part)
+
+        positions = {rule.id: ([], []) for rule in rule_list}
+        # Spawn rather than fork: the parent runs scheduler and web threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(list(rule_list),)) as pool:
+            for shard_results in pool.map(_evaluate_shard, shards):
+                for rule_id, (matched, undecided) in shard_results.items():
+                    positions[rule_id][0].extend(matched)
+                    positions[rule_id][1].extend(undecided)
+
+    return {
+        rule_id: ([uids[i] for i in matched], [uids[i] for i in undecided])
+        for rule_id, (matched, undecided) in positions.items()
+    }
+
+
+def plan_actions(rule_list: List[EmailRule], decisions: Dict[str, List[str]],
+                 first_match: bool = False) -> Dict[str, List[tuple]]:
+    """
+    Merge per-rule decisions into the actions to run for each message
+
+    Rules are applied in priority order; once a matching rule is terminal
+    for a message (see EmailRule.is_terminal), later rules are skipped.
+
+    Args:
+        rule_list: Rules in priority order
+        decisions: Rule ID -> matched UIDs
+        first_match: Stop at the first matching rule for each message
+
+    Returns:
+        dict: UID -> [(rule, action), ...] in rule priority order
+    """
+    planned: Dict[str, List[tuple]] = {}
+    finished = set()
+    for rule in rule_list:
+        terminal = rule.is_terminal(first_match)
+        for uid in decisions.get(rule.id, ()):
+            if uid in finished:
+                continue
+            entries = planned.setdefault(uid, [])
+            entries.extend((rule, action) for action in rule.actions)
+            if terminal:
+                finished.add(uid)
+    return planned
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def execute_bulk_actions(mailbox, account, planned: Dict[str, List[tuple]], mail_by_uid: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Execute planned actions grouped by action type and target
+
+    Flags, list updates and forwards run before moves, since a moved message
+    leaves the folder. A message is only moved once, even if the plan was built
+    without terminal-rule skipping.
+
+    Args:
+        mailbox: Logged-in IMAP mailbox with the source folder selected
+        account: Account object
+        planned: UID -> [(rule, action), ...] from plan_actions
+        mail_by_uid: UID -> Mail object, used for senders
+
+    Returns:
+        dict: actions_executed, action_failures and imap_commands counts
+    """
+    import functions as pf
+
+    groups: Dict[tuple, List[tuple]] = {}
+    moved = set()
+    for uid, entries in planned.items():
+        for rule, action in entries:
+            if action.type == ActionType.MOVE_TO_FOLDER:
+                if uid in moved:
+                    continue
+                moved.add(uid)
+            groups.setdefault((action.type, action.target), []).append((uid, rule.id))
+
+    metrics = get_rule_metrics()
+    summary = {'actions_executed': 0, 'action_failures': 0, 'imap_commands': 0}
+    is_gmail = pf.is_gmail_account(account.email)
+
+    for (action_type, target), entries in sorted(groups.items(), key=lambda item: ACTION_ORDER.get(item[0][0], len(ACTION_ORDER))):
+        for chunk in _chunks(entries, BULK_ACTION_CHUNK):
+            uids = [uid for uid, _ in chunk]
+            try:
+                if action_type == ActionType.MOVE_TO_FOLDER:
+                    logger.info(f"Bulk moving {len(uids)} emails to folder {target}")
+                    if is_gmail:
+                        pf.gmail_aware_move(mailbox, uids, target)
+                    else:
+                        mailbox.move(uids, target)
+                    summary['imap_commands'] += 1
+                elif action_type == ActionType.MARK_READ:
+                    logger.info(f"Bulk marking {len(uids)} emails as read")
+                    mailbox.flag(uids, ['\\Seen'], True)
+                    summary['imap_commands'] += 1
+                elif action_type == ActionType.ADD_TO_LIST:
+                    senders = list(dict.fromkeys(_extract_address(mail_by_uid[uid].from_) for uid in uids))
+                    logger.info(f"Adding {len(senders)} senders to {target} list")
+                    pf.new_entries(target, senders)
+                elif action_type == ActionType.FORWARD:
+                    from services.smtp_sender import forward_messages
+                    logger.info(f"Queueing {len(uids)} emails for forwarding to {target}")
+                    queued = forward_messages(mailbox, account, uids, target)
+                    summary['imap_commands'] += 1
+                    if not queued:
+                        raise RuntimeError("no messages were queued")
+                # Other action types are not executed by rules yet
+
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Error executing bulk action {action_type} ({target}) on {len(uids)} emails: {e}")
+                succeeded = False
+
+            for _, rule_id in chunk:
+                metrics.record_action(rule_id, succeeded)
+            summary['actions_executed' if succeeded else 'action_failures'] += len(chunk)
+
+    return summary
+
+
+def apply_rules(mailbox, account, rule_list: List[EmailRule], mail_list: List[Any], workers: Optional[int] = None,
+                content_max_bytes: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, List[tuple]]]:
+    """
+    Evaluate active rules over fetched headers and execute their actions in bulk
+
+    Args:
+        mailbox: Logged-in IMAP mailbox with the messages' folder selected
+        account: Account object
+        rule_list: Active rules with conditions, in priority order
+        mail_list: Mail objects to evaluate
+        workers: Worker processes (defaults to the number of CPUs)
+        content_max_bytes: Body bytes fetched per message for content conditions
+
+    Returns:
+        tuple: (summary dict, UID -> [(rule, action), ...] plan that was executed)
+    """
+    import functions as pf
+
+    mail_by_uid = {str(item.uid): item for item in mail_list}
+
+    eval_start = time.perf_counter_ns()
+    decisions = evaluate_parallel(rule_list, mail_list, workers=workers)
+
+    # Content conditions: one batched partial fetch for every undecided message
+    pending = list(dict.fromkeys(uid for _, undecided in decisions.values() for uid in undecided))
+    matched = {rule_id: list(decided) for rule_id, (decided, _) in decisions.items()}
+    if pending:
+        if content_max_bytes is None:
+            content_max_bytes = _get_rules_setting('content_fetch_max_bytes', DEFAULT_CONTENT_FETCH_MAX_BYTES)
+        texts = {}
+        for chunk in _chunks(pending, CONTENT_FETCH_CHUNK):
+            texts.update(pf.fetch_text_parts(mailbox, chunk, content_max_bytes))
+
+        position = {uid: index for index, uid in enumerate(mail_by_uid)}
+        for rule in rule_list:
+            undecided = decisions[rule.id][1]
+            for uid in undecided:
+                item = mail_by_uid[uid]
+                email_data = {'from': item.from_, 'subject': item.subject,
+                              'content': texts.get(uid, ''), 'date': item.date}
+                if rule.compiled.match_content(email_data):
+                    matched[rule.id].append(uid)
+            # Keep corpus order after appending content matches
+            if undecided:
+                matched[rule.id].sort(key=position.__getitem__)
+    elapsed_ns = time.perf_counter_ns() - eval_start
+
+    # Evaluation time is shared by all rules in a batch, so split it evenly
+    metrics = get_rule_metrics()
+    for rule in rule_list:
+        metrics.record_evaluations(rule.id, rule.name, len(mail_list), len(matched[rule.id]),
+                                   elapsed_ns // max(1, len(rule_list)))
+
+    planned = plan_actions(rule_list, matched, _get_rules_setting('first_match', False))
+    summary = execute_bulk_actions(mailbox, account, planned, mail_by_uid)
+    summary.update({
+        'messages': len(mail_list),
+        'messages_matched': len(planned),
+        'bodies_fetched': len(pending),
+        'evaluation_time': round(elapsed_ns / 1e9, 3),
+        'matches': {rule.id: len(matched[rule.id]) for rule in rule_list}
+    })
+    return summary, planned
+
+
+def backfill(account, rule_list: List[EmailRule], folder: str = "INBOX", limit: Optional[int] = None,
+             workers: Optional[int] = None, content_max_bytes: Optional[int] = None,
+             progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Run a rule set over a whole folder using the process pool
+
+    Args:
+        account: Account object with IMAP connection
+        rule_list: Active rules in priority order
+        folder: IMAP folder to process
+        limit: Maximum number of emails to process
+        workers: Worker processes (defaults to the number of CPUs)
+        content_max_bytes: Body bytes fetched per message for content conditions
+        progress: Called with the stage ('fetching', 'applying') and messages fetched so far
+
+    Returns:
+        dict: Messages evaluated, matches per rule, action counts and timing
+    """
+    import functions as pf
+
+    report = progress or (lambda stage, messages: None)
+    rule_list = [rule for rule in rule_list if rule.active and rule.conditions]
+    mb = account.login()
+    if not mb:
+        raise ConnectionError(f"Failed to connect to IMAP for account {account.email}")
+
+    try:
+        mb.folder.set(folder)
+        report('fetching', 0)
+        mail_list = pf.fetch_class(mb, folder=folder, limit=limit)
+        report('applying', len(mail_list))
+        summary, _ = apply_rules(mb, account, rule_list, mail_list, workers=workers,
+                                 content_max_bytes=content_max_bytes)
+        return summary
+
+    finally:
+        try:
+            mb.logout()
+        except Exception:
+            pass
@@ -8,5 +8,6 @@ and centralized scheduling for web-managed email processing.
 from .email_processor import EmailProcessor
 from .task_manager import TaskManager
 from .scheduler_manager import SchedulerManager
+from .worker_pool import ProcessingScheduler, WorkerPool
 
-__all__ = ['EmailProcessor', 'TaskManager', 'SchedulerManager']
\ No newline at end of file
+__all__ = ['EmailProcessor', 'TaskManager', 'SchedulerManager', 'ProcessingScheduler', 'WorkerPool']
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+Inbox Backfill Engine
+
+Onboards a large inbox unattended in startup mode. The inbox is walked in
+UID windows from oldest to newest. A fetch thread reads the headers of the
+next window on its own connection while the current window is classified
+(user rules first, then sender lists) and moved in bulk. Throughput is
+paced to a configurable target, and the position is saved after every
+window, so a backfill that a restart interrupted resumes where it stopped
+when the account starts again in startup mode.
+"""
+
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from imap_tools import AND, U
+
+import functions as pf
+from header_cache import record_headers
+from metrics import get_metric_registry
+from .worker_pool import _get_scheduler_setting
+from .stats_store import record_dispositions
+
+
+DEFAULT_WINDOW_SIZE = 500
+DEFAULT_TARGET_RATE = 100.0  # messages per second, 0 = unlimited
+DEFAULT_SLICE_SECONDS = 30.0
+
+# Windows fetched ahead of the one being classified
+PIPELINE_DEPTH = 2
+
+# Sender list -> folder key for messages no rule moved
+LIST_FOLDERS = [('white', 'processed'), ('black', 'junk'), ('vendor', 'approved_ads')]
+
+DEFAULT_FOLDERS = {
+    'processed': 'INBOX.Processed',
+    'junk': 'INBOX.Junk',
+    'approved_ads': 'INBOX.Approved_Ads',
+    'pending': 'INBOX.Pending'
+}
+
+
+@dataclass
+class BackfillState:
+    """Persisted backfill position and counters"""
+    account_email: str
+    folder: str = "INBOX"
+    status: str = "idle"  # idle, running, paused, completed, failed
+    uidvalidity: Optional[int] = None
+    next_uid: int = 1
+    processed: int = 0
+    remaining: Optional[int] = None
+    active_seconds: float = 0.0
+    categories: Dict[str, int] = field(default_factory=dict)
+    started_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        return asdict(self)
+
+
+class InboxBackfill:
+    """
+    Resumable, windowed inbox backfill for one account
+
+    run() processes windows until the inbox is done, stop() is called or the
+    optional time slice runs out. Messages moved before a crash are simply
+    missing when their window is fetched again, so replaying a window after
+    a restart is safe.
+    """
+
+    def __init__(self, account, state_dir: Path, folders: Optional[Dict[str, str]] = None,
+                 folder: str = "INBOX", window_size: Optional[int] = None, target_rate: Optional[float] = None):
+        """
+        Initialize backfill
+
+        Args:
+            account: Account object
+            state_dir: Directory holding per-account backfill state
+            folders: Folder names for processed, junk, approved_ads and pending
+            folder: Folder to backfill
+            window_size: Messages per UID window (defaults to backfill_window_size setting)
+            target_rate: Target messages per second (defaults to backfill_target_rate setting)
+        """
+        self.account = account
+        self.folders = {**DEFAULT_FOLDERS, **(folders or {})}
+        self.window_size = max(1, int(window_size or _get_scheduler_setting('backfill_window_size',
+                                                                             DEFAULT_WINDOW_SIZE)))
+        self.target_rate = float(target_rate if target_rate is not None else
+                                 _get_scheduler_setting('backfill_target_rate', DEFAULT_TARGET_RATE))
+        safe_name = re.sub(r'[^A-Za-z0-9@._-]', '_', account.email)
+        self.path = Path(state_dir) / f"{safe_name}.json"
+        self.interrupted = False  # Saved as running, i.e. stopped by a restart rather than by stop()
+        self.state = self._load(folder)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._run_rate = 0.0  # messages per second in the current run
+        self.logger = logging.getLogger('backfill')
+
+    def _load(self, folder: str) -> BackfillState:
+        try:
+            with open(self.path) as f:
+                state = BackfillState(**json.load(f))
+            if state.status == 'running':
+                state.status = 'paused'
+                self.interrupted = True
+            return state
+        except FileNotFoundError:
+            return BackfillState(account_email=self.account.email, folder=folder)
+        except Exception as e:
+            logging.getLogger('backfill').warning(f"Ignoring unreadable backfill state {self.path}: {e}")
+            return BackfillState(account_email=self.account.email, folder=folder)
+
+    def _save(self):
+        self.state.updated_at = datetime.now().isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self.state.to_dict(), f)
+        temp_path.replace(self.path)
+
+    def stop(self):
+        """Pause after the current window; later runs return at once until resume()"""
+        self._stop.set()
+
+    def resume(self):
+        """Allow runs again after stop()"""
+        self._stop.clear()
+        self.interrupted = False
+
+    def reset(self):
+        """Forget the saved position and start over on the next run"""
+        with self._lock:
+            self.state = BackfillState(account_email=self.account.email, folder=self.state.folder)
+            self._save()
+
+    def run(self, rule_list: Optional[List[Any]] = None, max_seconds: Optional[float] = None) -> bool:
+        """
+        Process windows until done, stopped or out of time
+
+        Args:
+            rule_list: Rules applied before sender-list classification
+            max_seconds: Time slice; the run returns after the window that exceeds it
+
+        Returns:
+            bool: True once the whole folder has been processed
+        """
+        if self._stop.is_set():
+            with self._lock:
+                self.state.status = 'paused'
+                self._save()
+            return False
+
+        rule_list = [rule for rule in (rule_list or []) if rule.active and rule.conditions]
+        run_started = time.monotonic()
+        run_processed = 0
+        deadline = run_started + max_seconds if max_seconds else None
+
+        with self._lock:
+            if self.state.started_at is None:
+                self.state.started_at = datetime.now().isoformat()
+            self.state.status = 'running'
+            self.state.error = None
+
+        mailbox = None
+        fetch_done = threading.Event()
+        windows: queue.Queue = queue.Queue(maxsize=PIPELINE_DEPTH)
+        fetcher = None
+        try:
+            mailbox = self.account.login()
+            uids = self._pending_uids(mailbox)
+            self.state.remaining = len(uids)
+            if not uids:
+                self._complete()
+                return True
+
+            batches = [uids[start:start + self.window_size] for start in range(0, len(uids), self.window_size)]
+            fetcher = threading.Thread(target=self._fetch_windows, args=(batches, windows, fetch_done),
+                                       name=f"backfill-fetch-{self.account.email}", daemon=True)
+            fetcher.start()
+
+            while True:
+                item = windows.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                window_uids, mail_list = item
+
+                counts = self._process_window(mailbox, mail_list, rule_list)
+                run_processed += len(window_uids)
+                for key, count in counts.items():
+                    get_metric_registry().inc('mail_rulez_messages_classified_total', count, disposition=key)
+                if counts:
+                    record_dispositions(self.account.email, counts)
+
+                # Pace to the target rate; stop() interrupts the wait
+                if self.target_rate > 0:
+                    ahead = run_processed / self.target_rate - (time.monotonic() - run_started)
+                    if ahead > 0:
+                        self._stop.wait(ahead)
+
+                elapsed = time.monotonic() - run_started
+                with self._lock:
+                    for key, count in counts.items():
+                        self.state.categories[key] = self.state.categories.get(key, 0) + count
+                    self.state.next_uid = window_uids[-1] + 1
+                    self.state.processed += len(window_uids)
+                    self.state.remaining = max(0, self.state.remaining - len(window_uids))
+                    self._run_rate = run_processed / elapsed if elapsed > 0 else 0.0
+                    self._save()
+
+                if self._stop.is_set() or (deadline and time.monotonic() >= deadline):
+                    break
+
+            if self.state.remaining == 0:
+                self._complete()
+                return True
+            with self._lock:
+                self.state.status = 'paused' if self._stop.is_set() else 'running'
+                self._save()
+            return False
+
+        except Exception as e:
+            with self._lock:
+                self.state.status = 'failed'
+                self.state.error = str(e)
+                self._save()
+            self.logger.error(f"Backfill failed for {self.account.email}: {e}")
+            raise
+
+        finally:
+            fetch_done.set()
+            if fetcher is not None:
+                # Unblock a fetcher waiting on a full queue
+                while fetcher.is_alive():
+                    try:
+                        windows.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            with self._lock:
+                self.state.active_seconds += time.monotonic() - run_started
+                self._save()
+            if mailbox is not None:
+                try:
+                    mailbox.logout()
+                except Exception:
+                    pass
+
+    def _pending_uids(self, mailbox) -> List[int]:
+        """UIDs still to process, oldest first; resets the position if UIDVALIDITY changed"""
+        folder = self.state.folder
+        mailbox.folder.set(folder)
+        status = mailbox.folder.status(folder, ['UIDVALIDITY', 'UIDNEXT'])
+        uidvalidity, uidnext = int(status['UIDVALIDITY']), int(status['UIDNEXT'])
+
+        with self._lock:
+            if self.state.uidvalidity is not None and self.state.uidvalidity != uidvalidity:
+                self.logger.warning(f"UIDVALIDITY of {folder} changed for {self.account.email}, restarting backfill")
+                self.state.next_uid = 1
+            self.state.uidvalidity = uidvalidity
+
+        if self.state.next_uid >= uidnext:
+            return []
+        uids = sorted(int(uid) for uid in mailbox.uids(AND(uid=U(self.state.next_uid, uidnext - 1))))
+        # A range past the last message still matches the newest one
+        return [uid for uid in uids if uid >= self.state.next_uid]
+
+    def _fetch_windows(self, batches: List[List[int]], windows: queue.Queue, done: threading.Event):
+        """Fetch thread: read each window's headers on a separate connection"""
+        try:
+            mailbox = self.account.login()
+        except Exception as e:
+            windows.put(e)
+            return
+
+        try:
+            mailbox.folder.set(self.state.folder)
+            for batch in batches:
+                if done.is_set():
+                    return
+                messages = mailbox.fetch(AND(uid=[str(uid) for uid in batch]), mark_seen=False,
+                                         bulk=True, headers_only=True)
+                mail_list = []
+                for item in messages:
+                    mail = pf.Mail(item.uid, item.subject, item.from_, item.date_str,
+                                   item.date.date() if item.date else item.date)
+                    mail.size = getattr(item, 'size_rfc822', 0)
+                    mail_list.append(mail)
+                windows.put((batch, mail_list))
+            windows.put(None)
+        except Exception as e:
+            windows.put(e)
+        finally:
+            try:
+                mailbox.logout()
+            except Exception:
+                pass
+
+    def _process_window(self, mailbox, mail_list: List[Any], rule_list: List[Any]) -> Dict[str, int]:
+        """Apply rules, then move the rest by sender list; returns messages per category"""
+        counts: Dict[str, int] = {}
+        if not mail_list:
+            return counts
+        record_headers(self.account.email, mail_list)
+
+        moved = set()
+        if rule_list:
+            import rules_parallel
+            from rules import ActionType
+
+            summary, planned = rules_parallel.apply_rules(mailbox, self.account, rule_list, mail_list)
+            moved = {uid for uid, entries in planned.items()
+                     if any(action.type == ActionType.MOVE_TO_FOLDER for _, action in entries)}
+            counts['rules'] = len(moved)
+
+        remaining = [item for item in mail_list if str(item.uid) not in moved]
+        lists = {name: set(pf.open_read(name)) for name, _ in LIST_FOLDERS}
+        buckets: Dict[str, List[str]] = {key: [] for _, key in LIST_FOLDERS}
+        buckets['pending'] = []
+        for item in remaining:
+            key = next((key for name, key in LIST_FOLDERS if item.from_ in lists[name]), 'pending')
+            buckets[key].append(str(item.uid))
+
+        is_gmail = pf.is_gmail_account(self.account.email)
+        for key, uids in buckets.items():
+            if not uids:
+                continue
+            if is_gmail:
+                pf.gmail_aware_move(mailbox, uids, self.folders[key], self.state.folder)
+            else:
+                mailbox.move(uids, self.folders[key])
+            counts[key] = len(uids)
+        return counts
+
+    def _complete(self):
+        with self._lock:
+            self.state.status = 'completed'
+            self.state.remaining = 0
+            self.state.completed_at = datetime.now().isoformat()
+            self._save()
+        self.logger.info(f"Backfill completed for {self.account.email}: {self.state.processed} messages")
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        Backfill progress
+
+        Returns:
+            dict: State plus percent done, messages/second and ETA in seconds
+        """
+        with self._lock:
+            state = self.state
+            rate = self._run_rate or (state.processed / state.active_seconds if state.active_seconds else 0.0)
+            total = state.processed + (state.remaining or 0)
+            progress = state.to_dict()
+            progress.update({
+                'total': total if state.remaining is not None else None,
+                'percent': round(100.0 * state.processed / total, 1) if total else
+                (100.0 if state.status == 'completed' else 0.0),
+                'messages_per_second': round(rate, 2),
+                'eta_seconds': round(state.remaining / rate) if rate and state.remaining else
+                (0 if state.status == 'completed' else None),
+                'window_size': self.window_size,
+                'target_rate': self.target_rate
+            })
+            return progress
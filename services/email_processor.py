@@ -6,17 +6,18 @@ Handles startup and maintenance modes, integrates with rules engine,
 and provides web-manageable email processing capabilities.
 """
 
+import functools
 import logging
 import threading
 import time
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, Any, Optional, List, Tuple
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Tuple, Mapping
 from dataclasses import dataclass, asdict
 import json
 import imaplib
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 # Import existing modules
@@ -25,6 +26,17 @@ import process_inbox as pi
 import rules as r
 from functions import Account
 from config import get_config, AccountConfig
+from .smtp_sender import get_sender_status
+from .worker_pool import ProcessingScheduler, get_processing_scheduler, _get_scheduler_setting
+from .scheduling_policy import AdaptiveIntervalPolicy, first_run_time, DEFAULT_JOB_JITTER_SECONDS
+from .backfill import InboxBackfill, DEFAULT_SLICE_SECONDS
+from metrics import get_stage_latency
+import tracing
+
+
+# Seconds a dashboard request waits for a manual batch before answering
+# that it is still running
+DEFAULT_MANUAL_BATCH_TIMEOUT = 60
 
 
 class ServiceState(Enum):
@@ -67,15 +79,37 @@ class ServiceStats:
         }
 
 
+def _publishes_status(method):
+    """Publish a new status snapshot after the method returns or raises"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._publish_status()
+    return wrapper
+
+
 class EmailProcessor:
     """
     Email processing service for a single account
     
     Manages email processing in startup or maintenance mode,
     provides statistics, and integrates with the rules engine.
+    
+    Status reads never take the processor lock: the processor publishes an
+    immutable snapshot at the end of every job and after every state
+    change, and readers pick up the current one with a single reference read.
     """
     
-    def __init__(self, account_config: AccountConfig):
+    def __init__(self, account_config: AccountConfig, scheduler: Optional[ProcessingScheduler] = None):
+        """
+        Initialize email processor
+        
+        Args:
+            account_config: Account configuration
+            scheduler: Shared processing scheduler (defaults to the global one)
+        """
         self.account_config = account_config
         self.account = Account(
             account_config.server,
@@ -88,10 +122,8 @@ class EmailProcessor:
         self.mode = ProcessingMode.STARTUP
         self.stats = ServiceStats()
         
-        # Scheduler and threading
-        import pytz
-        
-        self.scheduler = BackgroundScheduler(timezone=pytz.UTC)
+        # Jobs run on the shared scheduler and worker pool
+        self.scheduler = (scheduler or get_processing_scheduler()).for_account(account_config.email)
         self._lock = threading.Lock()
         
         # Configuration
@@ -102,6 +134,22 @@ class EmailProcessor:
             'forwarding': 1  # Check forwarding every minute
         }
         
+        # Intervals adapt to the account's arrival rate within configured bounds
+        self.adaptive_intervals = _get_scheduler_setting('adaptive_intervals', True)
+        self.interval_policy = AdaptiveIntervalPolicy(
+            self.processing_intervals['inbox'],
+            self.processing_intervals['folders']
+        )
+        self._job_intervals: Dict[str, float] = {}  # Job ID -> interval currently scheduled
+        self.job_jitter = _get_scheduler_setting('job_jitter_seconds', DEFAULT_JOB_JITTER_SECONDS)
+        
+        # Startup-mode inbox backfill, created on first use
+        self._backfill: Optional[InboxBackfill] = None
+        self._backfill_running = False
+        
+        # Whole-inbox rule backfill, run as one lane job
+        self._rule_backfill: Dict[str, Any] = {'status': 'idle'}
+        
         # Logger with structured context
         from logging_config import get_logger
         self.logger = get_logger(
@@ -112,8 +160,15 @@ class EmailProcessor:
         # Error tracking
         self.last_error = None
         self.consecutive_errors = 0
+        self.rules_version = 0  # Version of the rule set last used
         self.max_consecutive_errors = 5
         
+        # Published (status, stats) snapshot; replaced as a whole, never modified
+        self._snapshot: Tuple[Mapping[str, Any], Mapping[str, Any]] = (MappingProxyType({}), MappingProxyType({}))
+        self._publish_lock = threading.Lock()  # Orders publishers; readers never take it
+        self._publish_status()
+        
+    @_publishes_status
     def start(self, mode: ProcessingMode = ProcessingMode.STARTUP) -> bool:
         """
         Start email processing service
@@ -154,6 +209,8 @@ class EmailProcessor:
                 self.scheduler.start()
                 
                 self.state = ServiceState.RUNNING_STARTUP if mode == ProcessingMode.STARTUP else ServiceState.RUNNING_MAINTENANCE
+                if mode == ProcessingMode.STARTUP:
+                    self._resume_interrupted_backfill()
                 self.logger.info(f"Email processing service started successfully")
                 return True
                 
@@ -163,6 +220,7 @@ class EmailProcessor:
                 self.logger.error(f"Failed to start service: {e}")
                 return False
     
+    @_publishes_status
     def stop(self) -> bool:
         """
         Stop email processing service
@@ -173,24 +231,35 @@ class EmailProcessor:
         with self._lock:
             if self.state in [ServiceState.STOPPED, ServiceState.STOPPING]:
                 return True
-                
-            try:
-                self.state = ServiceState.STOPPING
-                self.logger.info("Stopping email processing service")
-                
-                # Stop scheduler
-                if self.scheduler.running:
-                    self.scheduler.shutdown(wait=True)
-                
+            self.state = ServiceState.STOPPING
+            self.logger.info("Stopping email processing service")
+            backfill_running = self._backfill_running
+        
+        # Not under self._lock: the running task being waited for may need it
+        try:
+            # Stop scheduler, cancel queued tasks and wait for the running one
+            self.stop_backfill()
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=True)
+            self.account.close_session()
+            if backfill_running:
+                # Picked up again when the service next starts in startup mode
+                self._backfill.interrupted = True
+            
+            with self._lock:
+                self._backfill_running = False  # Its queued slice may have been cancelled
+                if self._rule_backfill['status'] == 'running':
+                    self._rule_backfill.update(status='cancelled', completed_at=datetime.now().isoformat())
                 self.state = ServiceState.STOPPED
-                self.logger.info("Email processing service stopped")
-                return True
-                
-            except Exception as e:
+            self.logger.info("Email processing service stopped")
+            return True
+            
+        except Exception as e:
+            with self._lock:
                 self.state = ServiceState.ERROR
                 self.last_error = str(e)
-                self.logger.error(f"Failed to stop service: {e}")
-                return False
+            self.logger.error(f"Failed to stop service: {e}")
+            return False
     
     def restart(self) -> bool:
         """
@@ -205,6 +274,7 @@ class EmailProcessor:
             return self.start(current_mode)
         return False
     
+    @_publishes_status
     def switch_mode(self, new_mode: ProcessingMode) -> bool:
         """
         Switch processing mode (startup <-> maintenance)
@@ -247,47 +317,84 @@ class EmailProcessor:
                 self.logger.error(f"Failed to switch mode: {e}")
                 return False
     
+    def _publish_status(self):
+        """Build a new status snapshot and swap it in"""
+        with self._publish_lock:
+            try:
+                with self._lock:
+                    stats = {
+                        'emails_processed': self.stats.emails_processed,
+                        'emails_pending': self.stats.emails_pending,
+                        'last_run': self.stats.last_run,
+                        'total_runtime': self.stats.total_runtime,
+                        'error_count': self.stats.error_count,
+                        'avg_processing_time': self.stats.avg_processing_time,
+                        'mode_start_time': self.stats.mode_start_time,
+                        'state': self.state.value,
+                        'mode': self.mode.value,
+                        'account': self.account_config.email
+                    }
+                    status = {
+                        'account_email': self.account_config.email,
+                        'state': self.state.value,
+                        'mode': self.mode.value,
+                        'stats': self.stats.to_dict(),
+                        'last_error': self.last_error,
+                        'consecutive_errors': self.consecutive_errors,
+                        'rules_version': self.rules_version
+                    }
+                
+                # Sources with their own locks are read outside the processor lock
+                status.update({
+                    'scheduler_running': self.scheduler.running if hasattr(self.scheduler, 'running') else False,
+                    'active_jobs': len(self.scheduler.get_jobs()) if hasattr(self.scheduler, 'get_jobs') else 0,
+                    'content_fetch': r.get_content_fetch_stats(self.account_config.email),
+                    'forward_queue': get_sender_status(self.account_config.email),
+                    'intervals': self.interval_policy.get_status(),
+                    'lane': self.scheduler.get_lane_status() if hasattr(self.scheduler, 'get_lane_status') else None,
+                    'backfill': self._backfill.get_progress() if self._backfill else None,
+                    'latency': get_stage_latency().summary(self.account_config.email),
+                    'snapshot_at': datetime.now().isoformat()
+                })
+            except Exception as e:
+                self.logger.warning(f"Failed to publish status snapshot: {e}")
+                return
+            self._snapshot = (MappingProxyType(status), MappingProxyType(stats))
+    
     def get_status(self) -> Dict[str, Any]:
         """
         Get current service status
         
+        Lock-free: returns a copy of the snapshot published at the end of
+        the last job or state change (see snapshot_at).
+        
         Returns:
             dict: Service status information
         """
-        with self._lock:
-            return {
-                'account_email': self.account_config.email,
-                'state': self.state.value,
-                'mode': self.mode.value,
-                'stats': self.stats.to_dict(),
-                'last_error': self.last_error,
-                'consecutive_errors': self.consecutive_errors,
-                'scheduler_running': self.scheduler.running if hasattr(self.scheduler, 'running') else False,
-                'active_jobs': len(self.scheduler.get_jobs()) if hasattr(self.scheduler, 'get_jobs') else 0
-            }
+        return dict(self._snapshot[0])
+    
+    def get_traces(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Recent processing cycles with their spans, newest first
+        
+        Args:
+            limit: Maximum number of cycles to return
+            
+        Returns:
+            list: Cycles for a waterfall view (span times in ms from cycle start)
+        """
+        return tracing.get_trace_buffer().recent(self.account_config.email, limit)
     
     def get_stats_snapshot(self) -> Dict[str, Any]:
         """
         Get atomic snapshot of current statistics for safe concurrent access
         
+        Lock-free, published together with the status snapshot.
+        
         Returns:
-            dict: Immutable copy of current stats
+            dict: Copy of the published stats
         """
-        with self._lock:
-            # Create deep copy of stats to prevent concurrent modification
-            snapshot = {
-                'emails_processed': self.stats.emails_processed,
-                'emails_pending': self.stats.emails_pending,
-                'last_run': self.stats.last_run,
-                'total_runtime': self.stats.total_runtime,
-                'error_count': self.stats.error_count,
-                'avg_processing_time': self.stats.avg_processing_time,
-                'mode_start_time': self.stats.mode_start_time,
-                'state': self.state.value,
-                'mode': self.mode.value,
-                'account': self.account_config.email
-            }
-            return snapshot
+        return dict(self._snapshot[1])
     
     def _test_connection(self) -> bool:
         """Test connection to email server"""
@@ -453,6 +560,7 @@ class EmailProcessor:
     
     def _setup_jobs(self):
         """Setup scheduler jobs based on current mode"""
+        self._job_intervals = {}
         try:
             if self.mode == ProcessingMode.STARTUP:
                 # Startup mode: NO automatic jobs scheduled
@@ -460,13 +568,13 @@ class EmailProcessor:
                 self.logger.info("Startup mode: Manual processing only - no automatic jobs scheduled")
                 return  # Exit early, no jobs scheduled
             else:
-                # Maintenance mode jobs - run immediately then at intervals
+                # Maintenance mode jobs - first run staggered across the interval
                 self.scheduler.add_job(
-                    func=self._process_inbox_maintenance,
-                    trigger=IntervalTrigger(minutes=self.processing_intervals['inbox']),
+                    func=self._in_session(self._process_inbox_maintenance),
+                    trigger=IntervalTrigger(minutes=self.processing_intervals['inbox'], jitter=self.job_jitter),
                     id=f'inbox_maintenance_{self.account_config.email}',
                     replace_existing=True,
-                    next_run_time=datetime.now()  # Run immediately
+                    next_run_time=self._first_run_time('inbox_maintenance', self.processing_intervals['inbox'])
                 )
                 
                 # Training folder jobs also run automatically in maintenance mode
@@ -501,13 +609,37 @@ class EmailProcessor:
         
         for list_name, source_folder, dest_folder in folders:
             self.scheduler.add_job(
-                func=lambda ln=list_name, sf=source_folder, df=dest_folder: self._process_training_folder(ln, sf, df),
-                trigger=IntervalTrigger(minutes=self.processing_intervals['folders']),
+                func=self._in_session(lambda ln=list_name, sf=source_folder, df=dest_folder:
+                                  self._process_training_folder(ln, sf, df)),
+                trigger=IntervalTrigger(minutes=self.processing_intervals['folders'], jitter=self.job_jitter),
                 id=f'folder_{list_name}_{self.account_config.email}',
                 replace_existing=True,
-                next_run_time=datetime.now()  # Run immediately
+                next_run_time=self._first_run_time(f'folder_{list_name}', self.processing_intervals['folders'])
             )
     
+    def _in_session(self, func):
+        """
+        Run a scheduled job on the account's pooled connection, traced as one cycle
+        
+        Jobs that come due while the service is not running are skipped.
+        """
+        def run():
+            if self.state not in (ServiceState.RUNNING_STARTUP, ServiceState.RUNNING_MAINTENANCE):
+                self.logger.debug(f"Skipping {run.__name__}: service is {self.state.value}")
+                return None
+            try:
+                with tracing.cycle(self.account_config.email, getattr(func, '__name__', 'job')), \
+                        self.account.session():
+                    return func()
+            finally:
+                self._publish_status()
+        run.__name__ = getattr(func, '__name__', 'job')
+        return run
+    
+    def _first_run_time(self, job: str, interval_minutes: float) -> datetime:
+        """Per-account phase offset plus jitter, so accounts don't all start at once"""
+        return first_run_time(self.account_config.email, job, interval_minutes, jitter_seconds=self.job_jitter)
+    
     def _process_inbox_startup(self):
         """Process inbox in startup mode with batch processing"""
         try:
@@ -532,6 +664,28 @@ class EmailProcessor:
         except Exception as e:
             self._handle_processing_error(e, "startup inbox processing")
     
+    def run_manual_batch(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run process_manual_batch on the account's lane as an interactive task
+        
+        The batch goes ahead of queued background jobs and may use a reserved
+        worker, so dashboard requests are not stuck behind scheduled cycles.
+        
+        Args:
+            timeout: Seconds to wait for the result (None waits indefinitely)
+            
+        Returns:
+            dict: Comprehensive processing results
+        """
+        if self.state != ServiceState.RUNNING_STARTUP:
+            raise ValueError("Manual batch processing only available in startup mode")
+        
+        future = self.scheduler.submit_interactive(self._in_session(self.process_manual_batch))
+        result = future.result(timeout=timeout)
+        if result is None:
+            raise ValueError("Service stopped before the batch ran")
+        return result
+    
     def process_manual_batch(self) -> Dict[str, Any]:
         """
         Manual processing for startup mode - combines all processing types
@@ -652,6 +806,12 @@ class EmailProcessor:
             processing_time = time.time() - start_time
             self._update_stats(result, processing_time)
             
+            # Poll again sooner or later depending on how fast mail is arriving
+            self._adapt_interval(
+                f'inbox_maintenance_{self.account_config.email}',
+                self.interval_policy.observe_inbox('inbox', result.get('max uid'))
+            )
+            
             self.consecutive_errors = 0
             self.logger.debug(f"Maintenance inbox processing completed in {processing_time:.2f}s (processed {result.get('mail_list count', 0)} messages)")
             
@@ -666,30 +826,237 @@ class EmailProcessor:
             result = pf.process_folder(list_file_path, self.account, source_folder, dest_folder)
             self.logger.info(f"Training folder processing result: {result}")
             
+            # Back off folders that stay empty
+            self._adapt_interval(
+                f'folder_{list_name}_{self.account_config.email}',
+                self.interval_policy.observe_folder(f'folder_{list_name}', result.get("Messages Processed", 0))
+            )
+            
         except Exception as e:
             self.logger.error(f"Failed to process training folder {source_folder}: {e}")
     
+    def _adapt_interval(self, job_id: str, minutes: float):
+        """Reschedule a job if the policy chose a different interval"""
+        if not self.adaptive_intervals:
+            return
+        
+        current = self._job_intervals.get(job_id)
+        if current is not None and abs(current - minutes) < 0.05 * current:
+            return
+        
+        if self.scheduler.reschedule_job(job_id, trigger=IntervalTrigger(seconds=round(minutes * 60),
+                                                                          jitter=self.job_jitter)):
+            self._job_intervals[job_id] = minutes
+            self.logger.debug(f"Next {job_id} run in {minutes:.1f} minutes")
+    
     def _execute_rules(self):
         """Execute rules from the rules engine"""
         try:
-            # Load and execute active rules for this account
-            active_rules = r.load_active_rules_for_account(self.account_config.email)
-            for rule in active_rules:
-                rule.process_emails(self.account)
+            # Cached snapshot; only re-parsed when rules.json changes
+            rule_set = r.get_active_rule_set(self.account_config.email)
+            if rule_set.version != self.rules_version:
+                self.logger.info(f"Using rule set version {rule_set.version} ({len(rule_set)} active rules)")
+                self.rules_version = rule_set.version
+            
+            # One login and fetch for all rules; moved or stopped emails skip later rules
+            with get_stage_latency().time(self.account_config.email, 'rules'):
+                r.process_rules(self.account, list(rule_set))
                 
         except Exception as e:
             self.logger.error(f"Failed to execute rules: {e}")
     
+    def backfill_rules(self, limit: Optional[int] = None, workers: Optional[int] = None,
+                       progress=None) -> Dict[str, Any]:
+        """
+        Run all active rules over the whole inbox using the process pool
+        
+        Intended for first-time imports of large mailboxes, where evaluating
+        rules on the scheduler thread is too slow.
+        
+        Args:
+            limit: Maximum number of emails to process
+            workers: Worker processes (defaults to the number of CPUs)
+            progress: Optional callback taking the stage and messages fetched
+            
+        Returns:
+            dict: Backfill summary with match and action counts
+        """
+        import rules_parallel
+        
+        start_time = time.time()
+        rule_set = r.get_active_rule_set(self.account_config.email)
+        self.logger.info(f"Starting rule backfill with {len(rule_set)} rules (rule set version {rule_set.version})")
+        
+        summary = rules_parallel.backfill(self.account, list(rule_set), limit=limit, workers=workers,
+                                          progress=progress)
+        summary['processing_time'] = time.time() - start_time
+        
+        with self._lock:
+            self.stats.emails_processed += summary['messages']
+        
+        self.logger.info(f"Rule backfill completed in {summary['processing_time']:.2f}s: "
+                         f"{summary['messages']} messages, {summary['messages_matched']} matched")
+        return summary
+    
+    def start_rule_backfill(self, limit: Optional[int] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Queue a rule backfill on the account's lane and return at once
+        
+        Args:
+            limit: Maximum number of emails to process
+            workers: Worker processes (defaults to the number of CPUs)
+            
+        Returns:
+            dict: Rule backfill progress
+        """
+        if self.state not in (ServiceState.RUNNING_STARTUP, ServiceState.RUNNING_MAINTENANCE):
+            raise ValueError("Rule backfill only available while the service is running")
+        
+        with self._lock:
+            if self._rule_backfill['status'] == 'running':
+                return dict(self._rule_backfill)
+            self._rule_backfill = {
+                'status': 'running',
+                'stage': 'queued',
+                'messages': 0,
+                'limit': limit,
+                'workers': workers,
+                'started_at': datetime.now().isoformat(),
+                'completed_at': None,
+                'summary': None,
+                'error': None
+            }
+            progress = dict(self._rule_backfill)
+        
+        self.scheduler.submit(self._in_session(self._run_rule_backfill))
+        return progress
+    
+    def get_rule_backfill_progress(self) -> Dict[str, Any]:
+        """Stage, messages fetched and, once done, the summary of the rule backfill"""
+        with self._lock:
+            return dict(self._rule_backfill)
+    
+    def _run_rule_backfill(self):
+        """Lane job queued by start_rule_backfill"""
+        def report(stage: str, messages: int):
+            with self._lock:
+                self._rule_backfill.update(stage=stage, messages=messages)
+        
+        options = self.get_rule_backfill_progress()
+        try:
+            summary = self.backfill_rules(limit=options['limit'], workers=options['workers'], progress=report)
+            with self._lock:
+                self._rule_backfill.update(status='completed', stage='done', messages=summary['messages'],
+                                           summary=summary, completed_at=datetime.now().isoformat())
+        except Exception as e:
+            self.logger.error(f"Rule backfill failed: {e}")
+            with self._lock:
+                self._rule_backfill.update(status='failed', error=str(e), completed_at=datetime.now().isoformat())
+    
+    def _get_backfill(self) -> InboxBackfill:
+        """Backfill for this account, resuming any saved position"""
+        if self._backfill is None:
+            self._backfill = InboxBackfill(
+                self.account,
+                self.config.data_dir / "backfill",
+                folders=getattr(self.account_config, 'folders', None) or None
+            )
+        return self._backfill
+    
+    @_publishes_status
+    def start_backfill(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Start or resume the inbox backfill in startup mode
+        
+        The backfill runs on the account's lane in time slices, so dashboard
+        requests and other jobs get a turn between slices.
+        
+        Args:
+            reset: Start over from the oldest message
+            
+        Returns:
+            dict: Backfill progress
+        """
+        if self.state != ServiceState.RUNNING_STARTUP:
+            raise ValueError("Inbox backfill only available in startup mode")
+        
+        backfill = self._get_backfill()
+        with self._lock:
+            if self._backfill_running:
+                return backfill.get_progress()
+            if reset:
+                backfill.reset()
+            backfill.resume()
+            self._backfill_running = True
+        
+        self.logger.info(f"Starting inbox backfill for {self.account_config.email} from UID {backfill.state.next_uid}")
+        self.scheduler.submit(self._in_session(self._run_backfill_slice))
+        return backfill.get_progress()
+    
+    def _resume_interrupted_backfill(self):
+        """Queue a backfill that a restart interrupted; called with self._lock held"""
+        try:
+            backfill = self._get_backfill()
+        except Exception as e:
+            self.logger.warning(f"Could not load saved backfill state: {e}")
+            return
+        if backfill.interrupted and not self._backfill_running:
+            backfill.resume()
+            self._backfill_running = True
+            self.logger.info(f"Resuming interrupted inbox backfill from UID {backfill.state.next_uid}")
+            self.scheduler.submit(self._in_session(self._run_backfill_slice))
+    
+    def stop_backfill(self):
+        """Pause the inbox backfill after its current window"""
+        if self._backfill is not None:
+            self._backfill.stop()
+    
+    def get_backfill_progress(self) -> Dict[str, Any]:
+        """Backfill progress, including a position saved before a restart"""
+        progress = self._get_backfill().get_progress()
+        progress['active'] = self._backfill_running
+        return progress
+    
+    def _run_backfill_slice(self):
+        """Run one backfill time slice, then queue the next behind other lane work"""
+        backfill = self._backfill
+        if self.state != ServiceState.RUNNING_STARTUP:
+            with self._lock:
+                self._backfill_running = False
+            return
+        
+        processed_before = backfill.state.processed
+        start_time = time.time()
+        done = True
+        try:
+            rule_set = r.get_active_rule_set(self.account_config.email)
+            slice_seconds = _get_scheduler_setting('backfill_slice_seconds', DEFAULT_SLICE_SECONDS)
+            done = backfill.run(list(rule_set), max_seconds=slice_seconds)
+            
+            processed = backfill.state.processed - processed_before
+            with self._lock:
+                self.stats.emails_processed += processed
+                self.stats.last_run = datetime.now()
+                self.stats.total_runtime += timedelta(seconds=time.time() - start_time)
+            self.consecutive_errors = 0
+        except Exception as e:
+            self._handle_processing_error(e, "inbox backfill")
+        
+        if done or backfill.state.status == 'paused' or self.state != ServiceState.RUNNING_STARTUP:
+            with self._lock:
+                self._backfill_running = False
+            return
+        self.scheduler.submit(self._in_session(self._run_backfill_slice))
+    
     def _update_stats(self, result: Dict[str, Any], processing_time: float):
         """Update processing statistics"""
         with self._lock:
             self.stats.last_run = datetime.now()
             
-            # Update processing time average
-            if self.stats.avg_processing_time == 0:
-                self.stats.avg_processing_time = processing_time
-            else:
-                self.stats.avg_processing_time = (self.stats.avg_processing_time + processing_time) / 2
+            # Cycle time distribution; the average is the true mean over all cycles
+            latency = get_stage_latency()
+            latency.record(self.account_config.email, 'cycle', processing_time)
+            self.stats.avg_processing_time = latency.mean_seconds(self.account_config.email)
             
             # Update email counts from result (handle both old and new result formats)
             if 'emails_processed' in result:
@@ -0,0 +1,315 @@
+"""
+Leader Election for Mail-Rulez
+
+gunicorn runs several worker processes, each with its own task manager.
+Only one of them may run the processing engine, or every mailbox would be
+processed once per worker. The leader is whichever process holds an
+exclusive fcntl lock on the lease file; the kernel releases the lock when
+that process exits, so a crashed leader never blocks a successor.
+
+The leader serves control and status calls on a local Unix socket. Other
+workers get a TaskManagerProxy that forwards those calls, and keep retrying
+the lease so one of them takes over if the leader goes away.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+DEFAULT_RETRY_INTERVAL = 5.0  # seconds between follower lease attempts
+DEFAULT_CONTROL_TIMEOUT = 600.0  # seconds; manual batches and backfill calls can be slow
+
+# Calls followers may forward to the leader
+TASK_MANAGER_METHODS = {
+    'start_account', 'stop_account', 'restart_account', 'switch_mode', 'remove_account',
+    'get_account_status', 'get_all_status', 'get_aggregate_stats', 'get_task_history',
+    'start_all', 'stop_all', 'refresh_accounts_from_config', 'get_metrics_text',
+    'get_rule_stats', 'get_evaluation_orders'
+}
+PROCESSOR_METHODS = {
+    'get_status', 'get_folder_status', '_validate_and_setup_folders', 'run_manual_batch',
+    'process_manual_batch', 'start_rule_backfill', 'get_rule_backfill_progress', 'start_backfill',
+    'stop_backfill', 'get_backfill_progress', 'get_traces'
+}
+
+
+class LeaderLease:
+    """
+    Exclusive, process-lifetime lease on a lock file
+
+    The holder writes its PID to the file for diagnostics; ownership itself
+    is the fcntl lock, not the file contents.
+    """
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = Path(lock_path)
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """
+        Take the lease if no other process holds it
+
+        Returns:
+            bool: True if this process now holds the lease
+        """
+        with self._lock:
+            if self._fd is not None:
+                return True
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        """Give up the lease"""
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+    def holder_pid(self) -> Optional[int]:
+        """PID recorded by the current or last holder"""
+        try:
+            return int(self.lock_path.read_text().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return {'__enum__': type(value).__name__, 'value': value.value}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and '__enum__' in value:
+        from .email_processor import ProcessingMode, ServiceState
+        enum_type = {'ProcessingMode': ProcessingMode, 'ServiceState': ServiceState}[value['__enum__']]
+        return enum_type(value['value'])
+    return value
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON response line out"""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = {'result': self.server.dispatch(request)}
+        except Exception as e:
+            response = {'error': str(e), 'type': type(e).__name__}
+        self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+
+class ControlServer(socketserver.ThreadingUnixStreamServer):
+    """Serves the leader's task manager to other workers"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, task_manager):
+        self.socket_path = Path(socket_path)
+        self.task_manager = task_manager
+        # A leader that crashed leaves its socket file behind
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        super().__init__(str(self.socket_path), _ControlHandler)
+        os.chmod(self.socket_path, 0o600)
+        self._thread: Optional[threading.Thread] = None
+
+    def dispatch(self, request: Dict[str, Any]) -> Any:
+        method = request['method']
+        args = [_decode(arg) for arg in request.get('args', [])]
+        kwargs = {key: _decode(value) for key, value in request.get('kwargs', {}).items()}
+        account = request.get('account')
+
+        if method == '_get_processor':
+            return self.task_manager._get_processor(args[0]) is not None
+        if account is not None:
+            if method not in PROCESSOR_METHODS:
+                raise PermissionError(f"Processor method {method} is not available remotely")
+            processor = self.task_manager._get_processor(account)
+            if processor is None:
+                raise LookupError(f"Account {account} not found")
+            return getattr(processor, method)(*args, **kwargs)
+        if method not in TASK_MANAGER_METHODS:
+            raise PermissionError(f"Task manager method {method} is not available remotely")
+        return getattr(self.task_manager, method)(*args, **kwargs)
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="control-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and remove the socket file"""
+        self.shutdown()
+        self.server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# Exceptions re-raised with their own type on the follower side
+_REMOTE_EXCEPTIONS = {'ValueError': ValueError, 'LookupError': LookupError, 'PermissionError': PermissionError,
+                      'TimeoutError': TimeoutError}
+
+
+class ControlClient:
+    """Calls the leader's task manager over its control socket"""
+
+    def __init__(self, socket_path: Path, timeout: float = DEFAULT_CONTROL_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+
+    def call(self, method: str, *args, account: Optional[str] = None, **kwargs) -> Any:
+        """
+        Run a task manager (or processor, with account) method in the leader
+
+        Raises:
+            ConnectionError: If the leader cannot be reached
+        """
+        request = {'method': method, 'args': [_encode(arg) for arg in args],
+                   'kwargs': {key: _encode(value) for key, value in kwargs.items()}}
+        if account is not None:
+            request['account'] = account
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(str(self.socket_path))
+                sock.sendall(json.dumps(request).encode() + b"\n")
+                with sock.makefile('rb') as stream:
+                    line = stream.readline()
+        except OSError as e:
+            raise ConnectionError(f"Processing leader unavailable: {e}") from e
+        if not line:
+            raise ConnectionError("Processing leader closed the connection")
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise _REMOTE_EXCEPTIONS.get(response.get('type'), RuntimeError)(response['error'])
+        return response['result']
+
+
+class ProcessorProxy:
+    """Follower-side stand-in for one account's EmailProcessor"""
+
+    def __init__(self, client: ControlClient, account_email: str):
+        self._client = client
+        self.account_email = account_email
+
+    def __getattr__(self, name: str) -> Callable:
+        if name not in PROCESSOR_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._client.call(name, *args, account=self.account_email, **kwargs)
+
+    @property
+    def account(self):
+        """IMAP account for read-only use in this process (e.g. counting messages)"""
+        from config import get_config
+        from functions import Account
+
+        account_config = next(acc for acc in get_config().accounts if acc.email == self.account_email)
+        return Account(account_config.server, account_config.email, account_config.password)
+
+
+class TaskManagerProxy:
+    """Follower-side stand-in for the leader's TaskManager"""
+
+    is_leader = False
+
+    def __init__(self, client: ControlClient):
+        self._client = client
+
+    def __getattr__(self, name: str) -> Callable:
+        if name not in TASK_MANAGER_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._client.call(name, *args, **kwargs)
+
+    def _get_processor(self, account_email: str) -> Optional[ProcessorProxy]:
+        if self._client.call('_get_processor', account_email):
+            return ProcessorProxy(self._client, account_email)
+        return None
+
+    def shutdown(self):
+        """Nothing runs in a follower"""
+
+
+class LeaderElection:
+    """
+    Lease plus control socket paths, and the follower's takeover watch
+    """
+
+    def __init__(self, lock_path: Path, socket_path: Path, retry_interval: float = DEFAULT_RETRY_INTERVAL):
+        self.lease = LeaderLease(lock_path)
+        self.socket_path = Path(socket_path)
+        self.retry_interval = retry_interval
+        self._stop = threading.Event()
+        self._watch: Optional[threading.Thread] = None
+        self.logger = logging.getLogger('leader')
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lease.held
+
+    def try_acquire(self) -> bool:
+        """Become leader if no other process is"""
+        acquired = self.lease.try_acquire()
+        if acquired:
+            self.logger.info(f"Process {os.getpid()} is the processing leader")
+        return acquired
+
+    def watch(self, on_elected: Callable[[], None]):
+        """
+        Retry the lease in the background and call on_elected once it is won
+
+        Args:
+            on_elected: Called in the watch thread after this process becomes leader
+        """
+        if self._watch is not None and self._watch.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.retry_interval):
+                if self.try_acquire():
+                    self.logger.info(f"Process {os.getpid()} took over processing from {self.lease.holder_pid()}")
+                    on_elected()
+                    return
+
+        self._watch = threading.Thread(target=run, name="leader-watch", daemon=True)
+        self._watch.start()
+
+    def release(self):
+        """Stop watching and give up the lease"""
+        self._stop.set()
+        self.lease.release()
+
+
+def client_for(election: LeaderElection) -> ControlClient:
+    """Control client for the current leader"""
+    from .worker_pool import _get_scheduler_setting
+    return ControlClient(election.socket_path,
+                         timeout=_get_scheduler_setting('control_timeout', DEFAULT_CONTROL_TIMEOUT))
@@ -0,0 +1,284 @@
+"""
+Adaptive Scheduling Policy
+
+Chooses the delay before each account's next processing cycle. The inbox
+interval follows the account's message arrival rate, tracked as an
+exponentially weighted moving average of new UIDs per cycle, so busy
+accounts are polled more often and idle ones less. Training folders that
+stay empty back off exponentially. All intervals stay within configured
+bounds.
+
+Job start times are spread out as well: each account's jobs get a
+deterministic phase offset within their interval plus random jitter, and a
+global limiter caps how many cycles may start per second, so starting many
+accounts at once does not hit the IMAP server with a burst of logins.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from .worker_pool import _get_scheduler_setting
+
+
+# Defaults for the scheduler settings used here (intervals in minutes)
+DEFAULT_INBOX_MIN_INTERVAL = 1.0
+DEFAULT_INBOX_MAX_INTERVAL = 30.0
+DEFAULT_FOLDER_MAX_INTERVAL = 60.0
+DEFAULT_TARGET_MESSAGES_PER_CYCLE = 20
+DEFAULT_ARRIVAL_EWMA_ALPHA = 0.3
+DEFAULT_EMPTY_CYCLES_BEFORE_BACKOFF = 3
+DEFAULT_JOB_JITTER_SECONDS = 15
+DEFAULT_MAX_CYCLE_STARTS_PER_SECOND = 2.0
+
+
+def phase_offset(account_email: str, job: str, interval_seconds: float) -> float:
+    """
+    Deterministic offset of a job within its interval
+
+    The same account and job always get the same offset, and offsets are
+    spread uniformly across the interval for different accounts.
+
+    Args:
+        account_email: Account the job belongs to
+        job: Job name
+        interval_seconds: Job interval
+
+    Returns:
+        float: Offset in seconds, in [0, interval_seconds)
+    """
+    digest = hashlib.sha1(f"{account_email}:{job}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 * interval_seconds
+
+
+def first_run_time(account_email: str, job: str, interval_minutes: float,
+                   jitter_seconds: Optional[float] = None, now: Optional[datetime] = None) -> datetime:
+    """
+    Staggered first run time for a job
+
+    Args:
+        account_email: Account the job belongs to
+        job: Job name
+        interval_minutes: Job interval
+        jitter_seconds: Maximum random delay added to the phase offset
+            (defaults to the job_jitter_seconds setting)
+        now: Reference time (defaults to now)
+
+    Returns:
+        datetime: When the job should first run
+    """
+    if jitter_seconds is None:
+        jitter_seconds = _get_scheduler_setting('job_jitter_seconds', DEFAULT_JOB_JITTER_SECONDS)
+    offset = phase_offset(account_email, job, interval_minutes * 60) + random.uniform(0, jitter_seconds)
+    return (now or datetime.now()) + timedelta(seconds=offset)
+
+
+class StartLimiter:
+    """
+    Token bucket limiting how many processing cycles start per second
+
+    acquire() blocks the calling worker until a start is allowed, so bursts
+    of due jobs are spread out instead of opening many connections at once.
+    try_acquire() lets a caller that can do other work meanwhile, like the
+    worker pool, wait on its own terms.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Initialize limiter
+
+        Args:
+            rate: Cycle starts allowed per second (0 or less disables the limit)
+            burst: Starts allowed back to back (defaults to rate, at least 1)
+        """
+        self.rate = float(rate)
+        self.burst = max(1, int(burst if burst is not None else rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0  # Total seconds spent waiting, for stats
+
+    def acquire(self) -> float:
+        """
+        Wait for permission to start a cycle
+
+        Returns:
+            float: Seconds waited
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Take the token now (possibly going negative) so waiters queue up in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self) -> float:
+        """
+        Take a start if one is available, without blocking
+
+        Returns:
+            float: 0.0 if the start was taken, otherwise seconds until one is available
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+@dataclass
+class JobInterval:
+    """Adaptive interval state for one scheduled job"""
+    interval: float  # minutes
+    base_interval: float
+    arrival_rate: float = 0.0  # EWMA of new messages per minute
+    last_uid: Optional[int] = None
+    last_observed: Optional[float] = None
+    empty_cycles: int = 0
+    cycles: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'interval_minutes': round(self.interval, 2),
+            'base_interval_minutes': self.base_interval,
+            'arrival_rate_per_minute': round(self.arrival_rate, 3),
+            'empty_cycles': self.empty_cycles,
+            'cycles': self.cycles
+        }
+
+
+class AdaptiveIntervalPolicy:
+    """
+    Per-account interval policy for inbox and training folder jobs
+
+    Inbox: each cycle reports the highest INBOX UID seen. UIDs are assigned
+    in arrival order, so the UID delta since the last cycle that saw a UID
+    is the number of new messages. An empty inbox counts as no arrivals. The
+    per-minute arrival rate is smoothed with an EWMA and the next interval is
+    the time expected for target_messages_per_cycle messages to arrive.
+
+    Folders: after empty_cycles_before_backoff empty cycles in a row, the
+    interval doubles with every further empty cycle, up to the folder
+    maximum. Any processed message resets it to the base interval.
+    """
+
+    def __init__(self, inbox_interval: float, folder_interval: float):
+        """
+        Initialize policy
+
+        Args:
+            inbox_interval: Configured inbox interval in minutes, used until a rate is known
+            folder_interval: Configured training folder interval in minutes
+        """
+        self.inbox_interval = inbox_interval
+        self.folder_interval = folder_interval
+        self.inbox_min = _get_scheduler_setting('inbox_min_interval', DEFAULT_INBOX_MIN_INTERVAL)
+        self.inbox_max = _get_scheduler_setting('inbox_max_interval', DEFAULT_INBOX_MAX_INTERVAL)
+        self.folder_max = _get_scheduler_setting('folder_max_interval', DEFAULT_FOLDER_MAX_INTERVAL)
+        self.target = _get_scheduler_setting('target_messages_per_cycle', DEFAULT_TARGET_MESSAGES_PER_CYCLE)
+        self.alpha = _get_scheduler_setting('arrival_ewma_alpha', DEFAULT_ARRIVAL_EWMA_ALPHA)
+        self.empty_before_backoff = _get_scheduler_setting('empty_cycles_before_backoff',
+                                                           DEFAULT_EMPTY_CYCLES_BEFORE_BACKOFF)
+        self._jobs: Dict[str, JobInterval] = {}
+        self._lock = threading.Lock()
+
+    def _job(self, job: str, base_interval: float) -> JobInterval:
+        state = self._jobs.get(job)
+        if state is None:
+            state = self._jobs[job] = JobInterval(interval=base_interval, base_interval=base_interval)
+        return state
+
+    def interval(self, job: str) -> Optional[float]:
+        """Current interval for a job in minutes, or None if it never ran"""
+        with self._lock:
+            state = self._jobs.get(job)
+            return state.interval if state else None
+
+    def observe_inbox(self, job: str, max_uid: Optional[int], now: Optional[float] = None) -> float:
+        """
+        Record an inbox cycle and choose the next interval
+
+        Args:
+            job: Job name
+            max_uid: Highest UID seen in the inbox this cycle (None if empty,
+                counted as no new messages)
+            now: Monotonic time of the observation (defaults to now)
+
+        Returns:
+            float: Next interval in minutes
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._job(job, self.inbox_interval)
+            state.cycles += 1
+
+            if state.last_uid is not None and state.last_observed is not None:
+                # A lower UID means UIDVALIDITY changed; count nothing for that cycle.
+                # Messages are counted over the time since the last UID was seen.
+                new_messages = max(0, max_uid - state.last_uid) if max_uid is not None else 0
+                elapsed = max((now - state.last_observed) / 60.0, 1e-6)
+                rate = new_messages / elapsed
+                if state.cycles <= 2:
+                    state.arrival_rate = rate
+                else:
+                    state.arrival_rate = self.alpha * rate + (1 - self.alpha) * state.arrival_rate
+                state.empty_cycles = 0 if new_messages else state.empty_cycles + 1
+
+                if state.arrival_rate > 0:
+                    interval = self.target / state.arrival_rate
+                else:
+                    interval = self.inbox_max
+                state.interval = min(self.inbox_max, max(self.inbox_min, interval))
+
+            if max_uid is not None:
+                state.last_uid = max_uid
+                state.last_observed = now
+            return state.interval
+
+    def observe_folder(self, job: str, processed: int) -> float:
+        """
+        Record a training folder cycle and choose the next interval
+
+        Args:
+            job: Job name
+            processed: Messages processed this cycle
+
+        Returns:
+            float: Next interval in minutes
+        """
+        with self._lock:
+            state = self._job(job, self.folder_interval)
+            state.cycles += 1
+            if processed:
+                state.empty_cycles = 0
+                state.interval = state.base_interval
+            else:
+                state.empty_cycles += 1
+                if state.empty_cycles >= self.empty_before_backoff:
+                    state.interval = min(self.folder_max, state.interval * 2)
+            return state.interval
+
+    def get_status(self) -> Dict[str, Any]:
+        """Interval state per job"""
+        with self._lock:
+            return {job: state.to_dict() for job, state in self._jobs.items()}
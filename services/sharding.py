@@ -0,0 +1,557 @@
+"""
+Account Sharding for Mail-Rulez
+
+Spreads accounts over standalone worker processes (worker.py). Workers
+register in a shared SQLite store and heartbeat there. Each account is
+assigned to a worker by consistent hashing over the live workers, so a
+worker joining or leaving only moves its share of accounts. Ownership is a
+lease in the store: a worker must hold an account's unexpired lease before
+processing it, so an account is never processed by two workers during a
+rebalance.
+
+The web app becomes a control plane: ShardedTaskManager writes the desired
+state of each account to the store and reads the status workers publish.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from .email_processor import ServiceState, ProcessingMode
+
+
+DEFAULT_RING_REPLICAS = 64
+DEFAULT_LEASE_TTL = 30.0  # seconds
+DEFAULT_HEARTBEAT_INTERVAL = 10.0  # seconds
+DEFAULT_ACCOUNT_REFRESH_INTERVAL = 60.0  # seconds between config reloads in a worker
+
+RUNNING_STATES = {ServiceState.RUNNING_STARTUP.value, ServiceState.RUNNING_MAINTENANCE.value}
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes: List[str], replicas: int = DEFAULT_RING_REPLICAS):
+        self._points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{replica}"), node) for node in set(nodes) for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def owner(self, key: str) -> Optional[str]:
+        """Node responsible for a key, or None if the ring is empty"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardStore:
+    """
+    Shared local store for workers, account leases, desired state and status
+
+    Every operation uses its own short transaction, so workers in separate
+    processes (or containers sharing the data volume) coordinate safely.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._connect().executescript("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY, host TEXT, pid INTEGER, heartbeat REAL, started REAL);
+                CREATE TABLE IF NOT EXISTS leases (
+                    account_email TEXT PRIMARY KEY, worker_id TEXT, expires REAL);
+                CREATE TABLE IF NOT EXISTS desired (
+                    account_email TEXT PRIMARY KEY, state TEXT, mode TEXT, updated REAL);
+                CREATE TABLE IF NOT EXISTS status (
+                    account_email TEXT PRIMARY KEY, worker_id TEXT, status TEXT, updated REAL);
+                CREATE TABLE IF NOT EXISTS rule_stats (
+                    worker_id TEXT PRIMARY KEY, stats TEXT, updated REAL);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = _Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    # Workers
+
+    def heartbeat(self, worker_id: str, now: Optional[float] = None):
+        """Register or refresh a worker"""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO workers (worker_id, host, pid, heartbeat, started) VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat""",
+                         (worker_id, socket.gethostname(), os.getpid(), now, now))
+
+    def remove_worker(self, worker_id: str):
+        """Deregister a worker and release its leases"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            conn.execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+            conn.execute("DELETE FROM rule_stats WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self, ttl: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Workers that heartbeated within ttl seconds"""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute("SELECT worker_id, host, pid, heartbeat, started FROM workers "
+                                "WHERE heartbeat >= ? ORDER BY worker_id", (now - ttl,)).fetchall()
+        return [dict(zip(('worker_id', 'host', 'pid', 'heartbeat', 'started'), row)) for row in rows]
+
+    # Leases
+
+    def acquire_lease(self, account_email: str, worker_id: str, ttl: float, now: Optional[float] = None) -> bool:
+        """
+        Take or renew an account lease
+
+        Returns:
+            bool: True if the worker holds the lease afterwards
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO leases (account_email, worker_id, expires) VALUES (?, ?, ?)
+                            ON CONFLICT(account_email) DO UPDATE SET
+                                worker_id = excluded.worker_id, expires = excluded.expires
+                            WHERE leases.worker_id = excluded.worker_id OR leases.expires < ?""",
+                         (account_email, worker_id, now + ttl, now))
+            row = conn.execute("SELECT worker_id FROM leases WHERE account_email = ?", (account_email,)).fetchone()
+        return row is not None and row[0] == worker_id
+
+    def release_lease(self, account_email: str, worker_id: str):
+        """Give up an account lease held by a worker"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE account_email = ? AND worker_id = ?", (account_email, worker_id))
+
+    def lease_owners(self, now: Optional[float] = None) -> Dict[str, str]:
+        """Account -> worker for unexpired leases"""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute("SELECT account_email, worker_id FROM leases WHERE expires >= ?", (now,)).fetchall()
+        return dict(rows)
+
+    # Desired state (written by the control plane)
+
+    def set_desired(self, account_email: str, state: str, mode: Optional[str] = None) -> float:
+        """
+        Record whether an account should run, and in which mode
+
+        Args:
+            account_email: Account
+            state: 'running', 'stopped' or 'restart' (a one-off request the owner turns back into 'running')
+            mode: Processing mode (None keeps the recorded one)
+
+        Returns:
+            float: Update timestamp, which workers use to notice new requests
+        """
+        updated = time.time()
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO desired (account_email, state, mode, updated) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(account_email) DO UPDATE SET
+                                state = excluded.state, mode = COALESCE(excluded.mode, desired.mode),
+                                updated = excluded.updated""",
+                         (account_email, state, mode, updated))
+        return updated
+
+    def get_desired(self, account_email: str) -> Tuple[str, str, float]:
+        """(state, mode, updated) for an account; stopped in startup mode if never set"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT state, mode, updated FROM desired WHERE account_email = ?",
+                               (account_email,)).fetchone()
+        if row is None:
+            return 'stopped', ProcessingMode.STARTUP.value, 0.0
+        return row[0], row[1] or ProcessingMode.STARTUP.value, row[2]
+
+    # Status (written by workers)
+
+    def publish_status(self, account_email: str, worker_id: str, status: Dict[str, Any]):
+        """Store an account's latest status"""
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO status (account_email, worker_id, status, updated) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(account_email) DO UPDATE SET worker_id = excluded.worker_id,
+                                status = excluded.status, updated = excluded.updated""",
+                         (account_email, worker_id, json.dumps(status, default=str), time.time()))
+
+    def get_statuses(self) -> Dict[str, Dict[str, Any]]:
+        """Account -> latest published status, with worker_id and status_updated added"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT account_email, worker_id, status, updated FROM status").fetchall()
+        statuses = {}
+        for account_email, worker_id, status, updated in rows:
+            statuses[account_email] = {**json.loads(status), 'worker_id': worker_id, 'status_updated': updated}
+        return statuses
+
+    def publish_rule_stats(self, worker_id: str, stats: Dict[str, Any]):
+        """Store a worker's rule counters and condition evaluation orders"""
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO rule_stats (worker_id, stats, updated) VALUES (?, ?, ?)
+                            ON CONFLICT(worker_id) DO UPDATE SET stats = excluded.stats, updated = excluded.updated""",
+                         (worker_id, json.dumps(stats, default=str), time.time()))
+
+    def get_rule_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Worker -> latest published rule stats"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT worker_id, stats FROM rule_stats").fetchall()
+        return {worker_id: json.loads(stats) for worker_id, stats in rows}
+
+
+class _Transaction:
+    """Connection wrapper whose context manager is one IMMEDIATE transaction"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class ShardWorker:
+    """
+    Reconciles one worker's accounts with the ring, leases and desired state
+
+    Each cycle: heartbeat, compute the ring over live workers, release
+    accounts that hash elsewhere, lease the ones that hash here, start, stop
+    or switch mode to match the desired state, then publish status.
+    """
+
+    def __init__(self, worker_id: str, store: ShardStore, task_manager,
+                 lease_ttl: float = DEFAULT_LEASE_TTL, heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 account_refresh_interval: float = DEFAULT_ACCOUNT_REFRESH_INTERVAL):
+        self.worker_id = worker_id
+        self.store = store
+        self.task_manager = task_manager
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.account_refresh_interval = account_refresh_interval
+        self.owned: set = set()
+        self._applied: Dict[str, float] = {}  # account -> desired-state timestamp last applied
+        self._last_refresh = time.monotonic()
+        self.logger = logging.getLogger('shard_worker')
+
+    def run_once(self, now: Optional[float] = None):
+        """One reconcile cycle"""
+        now = time.time() if now is None else now
+        if time.monotonic() - self._last_refresh >= self.account_refresh_interval:
+            self.task_manager.refresh_accounts_from_config()
+            self._last_refresh = time.monotonic()
+
+        self.store.heartbeat(self.worker_id, now)
+        live = [worker['worker_id'] for worker in self.store.live_workers(self.lease_ttl, now)]
+        ring = HashRing(live)
+
+        for email in list(self.task_manager.processors):
+            if ring.owner(email) != self.worker_id:
+                if email in self.owned:
+                    self._hand_off(email, timeout=self.heartbeat_interval)
+                continue
+            if self.store.acquire_lease(email, self.worker_id, self.lease_ttl, now):
+                if email not in self.owned:
+                    self.logger.info(f"Worker {self.worker_id} took account {email}")
+                    self.owned.add(email)
+                self._apply_desired(email)
+            elif email in self.owned:
+                # Lease lost (e.g. this worker stalled past its TTL); stop before the new owner gets going
+                self.logger.warning(f"Worker {self.worker_id} lost the lease on {email}")
+                self._stop_and_drain(email, timeout=None)
+                self.owned.discard(email)
+                self._applied.pop(email, None)
+
+        # Accounts removed from the configuration
+        for email in self.owned - set(self.task_manager.processors):
+            self.store.release_lease(email, self.worker_id)
+            self.owned.discard(email)
+            self._applied.pop(email, None)
+
+        for email in self.owned:
+            status = self.task_manager.get_account_status(email)
+            if status is not None:
+                self.store.publish_status(email, self.worker_id, status)
+
+        # Rule counters and condition order are per process, so the control plane merges them
+        self.store.publish_rule_stats(self.worker_id, {
+            **self.task_manager.get_rule_stats(),
+            'evaluation_orders': self.task_manager.get_evaluation_orders()
+        })
+
+    def _apply_desired(self, email: str):
+        state, mode, updated = self.store.get_desired(email)
+        status = self.task_manager.get_account_status(email) or {}
+        running = status.get('state') in RUNNING_STATES
+
+        if self._applied.get(email) == updated:
+            # No new request; keep mode changes made here (auto-transition) for the next owner
+            if running and state == 'running' and status.get('mode') != mode:
+                self._applied[email] = self.store.set_desired(email, 'running', status.get('mode'))
+            return
+
+        self._applied[email] = updated
+        if state == 'restart':
+            # One-off request; recorded as running again once carried out
+            if running:
+                self.task_manager.restart_account(email)
+            else:
+                self.task_manager.start_account(email, ProcessingMode(mode))
+            self._applied[email] = self.store.set_desired(email, 'running')
+        elif state == 'running':
+            if not running:
+                self.task_manager.start_account(email, ProcessingMode(mode))
+            elif status.get('mode') != mode:
+                self.task_manager.switch_mode(email, ProcessingMode(mode))
+        elif running:
+            self.task_manager.stop_account(email)
+
+    def _stop_and_drain(self, email: str, timeout: Optional[float]) -> bool:
+        """Stop an account, cancel its queued tasks and wait for its running one"""
+        self.task_manager.stop_account(email)
+        return self.task_manager.drain_account(email, timeout)
+
+    def _hand_off(self, email: str, timeout: Optional[float] = None):
+        """
+        Stop an account that now hashes to another worker and free its lease
+
+        The lease is only released once the account's lane is idle; until
+        then it is renewed, so the next owner cannot start early.
+        """
+        self.logger.info(f"Worker {self.worker_id} handing off account {email}")
+        if not self._stop_and_drain(email, timeout):
+            self.logger.info(f"Account {email} still has a task running, keeping its lease")
+            self.store.acquire_lease(email, self.worker_id, self.lease_ttl)
+            return
+        self.store.release_lease(email, self.worker_id)
+        self.owned.discard(email)
+        self._applied.pop(email, None)
+
+    def run(self, stop_event: threading.Event):
+        """Reconcile until stop_event is set, then release everything"""
+        self.logger.info(f"Shard worker {self.worker_id} started")
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.logger.error(f"Shard worker cycle failed: {e}")
+                stop_event.wait(self.heartbeat_interval)
+        finally:
+            for email in list(self.owned):
+                self._hand_off(email)
+            self.store.remove_worker(self.worker_id)
+            self.logger.info(f"Shard worker {self.worker_id} stopped")
+
+
+class ShardedAccountView:
+    """Control-plane stand-in for an account processed by a shard worker"""
+
+    def __init__(self, manager: 'ShardedTaskManager', account_email: str):
+        self._manager = manager
+        self.account_email = account_email
+
+    def get_status(self) -> Optional[Dict[str, Any]]:
+        return self._manager.get_account_status(self.account_email)
+
+    def get_backfill_progress(self) -> Optional[Dict[str, Any]]:
+        return (self.get_status() or {}).get('backfill')
+
+    @property
+    def account(self):
+        """IMAP account for read-only use in the web process (e.g. counting messages)"""
+        from functions import Account
+
+        account_config = self._manager._account_config(self.account_email)
+        return Account(account_config.server, account_config.email, account_config.password)
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def unavailable(*args, **kwargs):
+            raise RuntimeError(f"{name} runs in the shard worker for {self.account_email} "
+                               f"and is not available from the web app")
+        return unavailable
+
+
+class ShardedTaskManager:
+    """
+    Thin control plane used by the web app when accounts run in shard workers
+
+    Start, stop and mode changes become desired state in the store; status
+    comes from what workers last published.
+    """
+
+    is_leader = False
+
+    def __init__(self, store: ShardStore, lease_ttl: float = DEFAULT_LEASE_TTL):
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self.startup_time = datetime.now()
+
+    def _accounts(self) -> List[str]:
+        from config import get_config
+        return [account.email for account in get_config().accounts]
+
+    def _account_config(self, account_email: str):
+        from config import get_config
+        return next(acc for acc in get_config().accounts if acc.email == account_email)
+
+    def _get_processor(self, account_email: str) -> Optional[ShardedAccountView]:
+        if account_email in self._accounts():
+            return ShardedAccountView(self, account_email)
+        return None
+
+    def start_account(self, account_email: str, mode: ProcessingMode = ProcessingMode.STARTUP) -> bool:
+        self.store.set_desired(account_email, 'running', mode.value)
+        return True
+
+    def stop_account(self, account_email: str) -> bool:
+        self.store.set_desired(account_email, 'stopped')
+        return True
+
+    def restart_account(self, account_email: str) -> bool:
+        self.store.set_desired(account_email, 'restart')
+        return True
+
+    def switch_mode(self, account_email: str, new_mode: ProcessingMode) -> bool:
+        self.store.set_desired(account_email, 'running', new_mode.value)
+        return True
+
+    def start_all(self) -> Dict[str, bool]:
+        return {email: self.start_account(email) for email in self._accounts()}
+
+    def stop_all(self) -> Dict[str, bool]:
+        return {email: self.stop_account(email) for email in self._accounts()}
+
+    def refresh_accounts_from_config(self):
+        """Workers reload the configuration themselves"""
+
+    def get_task_history(self, limit: int = 50, before: Optional[int] = None,
+                         account_email: Optional[str] = None, task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Task activity happens in the workers, which keep no shared history"""
+        return []
+
+    def get_metrics_text(self) -> str:
+        """Metrics of the web process only; processing counters live in the workers"""
+        from metrics import get_metric_registry
+        return get_metric_registry().render()
+
+    def _published_rule_stats(self) -> List[Dict[str, Any]]:
+        live = {worker['worker_id'] for worker in self.store.live_workers(self.lease_ttl)}
+        return [stats for worker_id, stats in sorted(self.store.get_rule_stats().items()) if worker_id in live]
+
+    def get_rule_stats(self) -> Dict[str, Any]:
+        """Rule counters summed over the live workers"""
+        rules: Dict[str, Dict[str, Any]] = {}
+        condition_types: Dict[str, Dict[str, Any]] = {}
+        for published in self._published_rule_stats():
+            for rule_id, stats in published.get('rules', {}).items():
+                merged = rules.setdefault(rule_id, {**stats, 'evaluations': 0, 'matches': 0, 'actions_executed': 0,
+                                                    'action_failures': 0, 'eval_time_ms': 0.0})
+                for key in ('evaluations', 'matches', 'actions_executed', 'action_failures', 'eval_time_ms'):
+                    merged[key] += stats[key]
+                merged['last_match'] = max(filter(None, (merged['last_match'], stats['last_match'])), default=None)
+                merged['disabled_reason'] = merged['disabled_reason'] or stats['disabled_reason']
+                merged['disabled_at'] = merged['disabled_at'] or stats['disabled_at']
+            for condition_type, summary in published.get('condition_types', {}).items():
+                # Percentiles cannot be merged; report the worker with the most samples
+                if summary['count'] > condition_types.get(condition_type, {}).get('count', -1):
+                    condition_types[condition_type] = summary
+
+        for stats in rules.values():
+            evaluations = stats['evaluations']
+            stats['match_rate'] = round(stats['matches'] / evaluations, 4) if evaluations else 0.0
+            stats['avg_eval_us'] = round(stats['eval_time_ms'] * 1e3 / evaluations, 3) if evaluations else 0.0
+            stats['eval_time_ms'] = round(stats['eval_time_ms'], 3)
+        return {'rules': rules, 'condition_types': condition_types}
+
+    def get_evaluation_orders(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Each rule's condition order from the live worker that evaluated it most"""
+        orders: Dict[str, List[Dict[str, Any]]] = {}
+        evaluations: Dict[str, int] = {}
+        for published in self._published_rule_stats():
+            for rule_id, order in published.get('evaluation_orders', {}).items():
+                count = published.get('rules', {}).get(rule_id, {}).get('evaluations', 0)
+                if count > evaluations.get(rule_id, -1):
+                    orders[rule_id] = order
+                    evaluations[rule_id] = count
+        return orders
+
+    def _status(self, account_email: str, statuses: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Published status, or a stopped placeholder for an account no worker has reported"""
+        if account_email in statuses:
+            return statuses[account_email]
+        _, mode, _ = self.store.get_desired(account_email)
+        return {'account_email': account_email, 'state': ServiceState.STOPPED.value, 'mode': mode,
+                'stats': {}, 'last_error': None, 'worker_id': None, 'status_updated': None}
+
+    def get_account_status(self, account_email: str) -> Optional[Dict[str, Any]]:
+        if account_email not in self._accounts():
+            return None
+        return self._status(account_email, self.store.get_statuses())
+
+    def get_all_status(self) -> Dict[str, Any]:
+        statuses = self.store.get_statuses()
+        accounts = {email: self._status(email, statuses) for email in self._accounts()}
+        return {
+            'task_manager': {
+                'sharded': True,
+                'total_accounts': len(self._accounts()),
+                'running_accounts': sum(1 for status in accounts.values() if status.get('state') in RUNNING_STATES),
+                'error_accounts': sum(1 for status in accounts.values()
+                                      if status.get('state') == ServiceState.ERROR.value),
+                'workers': self.store.live_workers(self.lease_ttl),
+                'leases': self.store.lease_owners()
+            },
+            'accounts': accounts
+        }
+
+    def get_aggregate_stats(self) -> Dict[str, Any]:
+        statuses = [status for email, status in self.store.get_statuses().items() if email in self._accounts()]
+        running = [status for status in statuses if status.get('state') in RUNNING_STATES]
+        stats = [status.get('stats', {}) for status in statuses]
+        total_processed = sum(stat.get('emails_processed', 0) for stat in stats)
+        total_errors = sum(stat.get('error_count', 0) for stat in stats)
+        averages = [stat['avg_processing_time'] for stat in stats if stat.get('avg_processing_time')]
+        return {
+            'total_accounts': len(self._accounts()),
+            'running_accounts': len(running),
+            'startup_mode_accounts': sum(1 for status in running if status.get('mode') == 'startup'),
+            'maintenance_mode_accounts': sum(1 for status in running if status.get('mode') == 'maintenance'),
+            'total_emails_processed': total_processed,
+            'total_emails_pending': sum(stat.get('emails_pending', 0) for stat in stats),
+            'total_errors': total_errors,
+            'avg_processing_time': sum(averages) / len(averages) if averages else 0,
+            'error_rate': total_errors / max(1, total_processed)
+        }
+
+    def shutdown(self):
+        """Nothing runs in the control plane"""
+
+
+def get_shard_store() -> ShardStore:
+    """Shard store under the configured data directory"""
+    from config import get_config
+    data_dir = get_config().data_dir
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return ShardStore(data_dir / "shards.db")
@@ -0,0 +1,428 @@
+"""
+SMTP Delivery Queue
+
+Per-account outgoing mail queue for forwarded messages. Each account has a
+background sender thread that keeps one authenticated SMTP connection open,
+sends queued messages in batches over that connection, and retries failed
+deliveries with exponential backoff. Rule processing only enqueues messages,
+so IMAP processing cycles never wait on SMTP latency.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Set
+
+
+# Messages sent over one connection before the queue is checked again
+DEFAULT_BATCH_SIZE = 20
+
+# Delivery attempts before a message is dropped
+DEFAULT_MAX_ATTEMPTS = 5
+
+# First retry delay in seconds; doubles with every failed attempt
+DEFAULT_RETRY_BASE = 2.0
+
+# Longest retry delay in seconds
+MAX_RETRY_DELAY = 300.0
+
+# Idle seconds after which the pooled connection is closed
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# Messages held per account before enqueue starts refusing them
+DEFAULT_QUEUE_SIZE = 10000
+
+
+@dataclass
+class OutgoingMessage:
+    """A message waiting for delivery"""
+    to_addr: str
+    message: Any  # email.message.Message
+    description: str = ""
+    attempts: int = 0
+    queued_at: datetime = field(default_factory=datetime.now)
+    key: str = ""  # caller's identifier, reported by is_pending() until the message is settled
+    on_delivered: Optional[Callable[[], None]] = None  # called once the server accepted the message
+
+
+class SmtpSender:
+    """
+    Delivery queue and pooled SMTP connection for a single account
+
+    Messages are sent by a background thread started with start(). Consecutive
+    queued messages share one connection; the connection is kept open between
+    batches and closed after it has been idle for idle_timeout seconds.
+    """
+
+    def __init__(self, account_email: str, password: str, smtp_server: str, smtp_port: int = 465,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 retry_base: float = DEFAULT_RETRY_BASE, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize the sender
+
+        Args:
+            account_email: Sending address, also used to log in
+            password: SMTP password
+            smtp_server: SMTP host (implicit TLS)
+            smtp_port: SMTP port
+            batch_size: Messages sent per batch
+            max_attempts: Delivery attempts before a message is dropped
+            retry_base: First retry delay in seconds
+            idle_timeout: Idle seconds before the connection is closed
+            queue_size: Maximum queued messages
+        """
+        self.account_email = account_email
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = int(smtp_port)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.idle_timeout = idle_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._retries: List[tuple] = []  # heap of (due time, sequence, OutgoingMessage)
+        self._sequence = itertools.count()
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._pending_keys: Set[str] = set()
+        self._keys_lock = threading.Lock()
+        self.logger = logging.getLogger(f'smtp_sender.{account_email}')
+
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'connections': 0,
+            'batches': 0
+        }
+
+    def enqueue(self, to_addr: str, message, description: str = "", key: str = "",
+                on_delivered: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queue a message for delivery
+
+        Args:
+            to_addr: Recipient address
+            message: email.message.Message to send
+            description: Short label used in logs
+            key: Identifier reported by is_pending() until the message is delivered or dropped
+            on_delivered: Called from the sender thread once the server accepted the message
+
+        Returns:
+            bool: True if queued, False if the queue is full
+        """
+        if key:
+            with self._keys_lock:
+                self._pending_keys.add(key)
+        try:
+            self._queue.put_nowait(OutgoingMessage(to_addr, message, description, key=key,
+                                                   on_delivered=on_delivered))
+        except queue.Full:
+            self.logger.error(f"SMTP queue full, dropping message to {to_addr}: {description}")
+            self._settle(OutgoingMessage(to_addr, message, description, key=key), delivered=False)
+            return False
+        self.stats['queued'] += 1
+        return True
+
+    def is_pending(self, key: str) -> bool:
+        """Whether a message queued with this key is still waiting for delivery"""
+        with self._keys_lock:
+            return key in self._pending_keys
+
+    def start(self):
+        """Start the background sender thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"smtp-{self.account_email}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the sender thread after it finishes the current batch
+
+        Messages still queued are sent before returning, within the timeout.
+        Anything left after that is dropped without calling its on_delivered
+        callback, so callers never record it as delivered.
+
+        Args:
+            timeout: Seconds to wait for the thread to exit and the queue to drain
+        """
+        deadline = time.monotonic() + timeout
+        self._stop_event.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+        if thread is None or not thread.is_alive():
+            while not self._queue.empty() and time.monotonic() < deadline:
+                self.process_batch()
+
+        dropped = self._discard()
+        if dropped:
+            self.logger.warning(f"Dropped {dropped} undelivered messages on shutdown")
+        self._close()
+
+    @property
+    def pending(self) -> int:
+        """Messages waiting for delivery, including scheduled retries"""
+        return self._queue.qsize() + len(self._retries)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Queue status and delivery counters"""
+        return {
+            'account': self.account_email,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'pending': self.pending,
+            'connected': self._connection is not None,
+            **self.stats
+        }
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.process_batch(wait=1.0)
+            except Exception as e:
+                self.logger.error(f"SMTP sender error: {e}")
+        self._close()
+
+    def _next_batch(self, wait: float) -> List[OutgoingMessage]:
+        """Due retries first, then queued messages, up to batch_size"""
+        batch = []
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._retries)[2])
+
+        if not batch:
+            # Wake in time for the next retry even if nothing new arrives
+            if self._retries:
+                wait = max(0.0, min(wait, self._retries[0][0] - now))
+            try:
+                batch.append(self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process_batch(self, wait: float = 0.0) -> int:
+        """
+        Send one batch of queued messages over the pooled connection
+
+        Args:
+            wait: Seconds to wait for a message if nothing is due
+
+        Returns:
+            int: Messages delivered
+        """
+        batch = self._next_batch(wait)
+        if not batch:
+            if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._close()
+            return 0
+
+        self.stats['batches'] += 1
+        delivered = 0
+        for index, item in enumerate(batch):
+            try:
+                connection = self._connect()
+                connection.sendmail(self.account_email, item.to_addr, item.message.as_string())
+                self._last_used = time.monotonic()
+                self.stats['sent'] += 1
+                delivered += 1
+                self._settle(item, delivered=True)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                # Permanent rejections (5xx) are not retried
+                if getattr(e, 'smtp_code', 0) >= 500 or isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self.stats['failed'] += 1
+                    self.logger.error(f"SMTP server rejected message to {item.to_addr} ({item.description}): {e}")
+                    self._settle(item, delivered=False)
+                else:
+                    self._retry(item, e)
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection problems: drop the connection and retry the rest of the batch later
+                self._close()
+                for remaining in batch[index:]:
+                    self._retry(remaining, e)
+                break
+
+        return delivered
+
+    def _retry(self, item: OutgoingMessage, error: Exception):
+        item.attempts += 1
+        if item.attempts >= self.max_attempts:
+            self.stats['failed'] += 1
+            self.logger.error(f"Giving up on message to {item.to_addr} ({item.description}) "
+                              f"after {item.attempts} attempts: {error}")
+            self._settle(item, delivered=False)
+            return
+
+        delay = min(MAX_RETRY_DELAY, self.retry_base * (2 ** (item.attempts - 1)))
+        self.stats['retried'] += 1
+        self.logger.warning(f"Delivery to {item.to_addr} failed ({error}); retrying in {delay:.0f}s")
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), item))
+
+    def _settle(self, item: OutgoingMessage, delivered: bool):
+        """Release a message's key and report a successful delivery"""
+        if item.key:
+            with self._keys_lock:
+                self._pending_keys.discard(item.key)
+        if delivered and item.on_delivered is not None:
+            try:
+                item.on_delivered()
+            except Exception as e:
+                self.logger.error(f"Delivery callback failed for {item.description}: {e}")
+
+    def _discard(self) -> int:
+        """Drop everything still queued or waiting for a retry"""
+        dropped = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._settle(item, delivered=False)
+            dropped += 1
+        for _, _, item in self._retries:
+            self._settle(item, delivered=False)
+            dropped += 1
+        self._retries = []
+        return dropped
+
+    def _connect(self) -> smtplib.SMTP:
+        """Return the pooled connection, logging in if needed"""
+        if self._connection is None:
+            context = ssl.create_default_context()
+            connection = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context)
+            try:
+                connection.login(self.account_email, self.password)
+            except Exception:
+                connection.close()
+                raise
+            self._connection = connection
+            self.stats['connections'] += 1
+            self.logger.debug(f"Opened SMTP connection to {self.smtp_server}:{self.smtp_port}")
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except Exception:
+                pass
+            self._connection = None
+
+
+def smtp_endpoint(account) -> tuple:
+    """
+    SMTP host and port for an account
+
+    Uses the smtp_server/smtp_port environment settings when present, and
+    otherwise derives the host from the account's IMAP server name.
+
+    Args:
+        account: Account object
+
+    Returns:
+        tuple: (host, port)
+    """
+    server = os.getenv("smtp_server")
+    if not server:
+        server = account.server
+        if server.startswith('imap.'):
+            server = 'smtp.' + server[len('imap.'):]
+    return server, int(os.getenv("smtp_port") or 465)
+
+
+# Global sender registry, one sender per account
+_senders: Dict[str, SmtpSender] = {}
+_senders_lock = threading.Lock()
+
+
+def get_smtp_sender(account_email: str, password: str, smtp_server: str, smtp_port: int = 465) -> SmtpSender:
+    """
+    Get the running sender for an account, creating it on first use
+
+    Args:
+        account_email: Sending address
+        password: SMTP password
+        smtp_server: SMTP host
+        smtp_port: SMTP port
+
+    Returns:
+        SmtpSender: Started sender for the account
+    """
+    with _senders_lock:
+        sender = _senders.get(account_email)
+        if sender is None:
+            sender = SmtpSender(account_email, password, smtp_server, smtp_port)
+            _senders[account_email] = sender
+        sender.start()
+        return sender
+
+
+def get_account_sender(account) -> SmtpSender:
+    """Sender for an Account object"""
+    server, port = smtp_endpoint(account)
+    return get_smtp_sender(account.email, account.password, server, port)
+
+
+def get_sender_status(account_email: str) -> Optional[Dict[str, Any]]:
+    """Delivery queue status for an account, or None if nothing was forwarded yet"""
+    with _senders_lock:
+        sender = _senders.get(account_email)
+    return sender.get_status() if sender else None
+
+
+def shutdown_smtp_senders(timeout: float = 10.0):
+    """Stop all sender threads and close their connections"""
+    with _senders_lock:
+        senders = list(_senders.values())
+        _senders.clear()
+    for sender in senders:
+        sender.stop(timeout)
+
+
+def forward_messages(mailbox, account, uids: List[str], fwd_addr: str) -> int:
+    """
+    Queue forwarded copies of messages for delivery
+
+    Args:
+        mailbox: Logged-in IMAP mailbox with the source folder selected
+        account: Account object the messages belong to
+        uids: Message UIDs to forward
+        fwd_addr: Address to forward to
+
+    Returns:
+        int: Messages queued
+    """
+    from imap_tools import AND
+    import functions as pf
+
+    if not uids:
+        return 0
+
+    sender = get_account_sender(account)
+    queued = 0
+    for msg in mailbox.fetch(AND(uid=list(uids)), mark_seen=False, bulk=True):
+        message = pf.build_forward_message(msg, account.email, fwd_addr)
+        if sender.enqueue(fwd_addr, message, msg.subject):
+            queued += 1
+    return queued
@@ -0,0 +1,261 @@
+"""
+Processing Statistics Store
+
+Compact on-disk time series of classified messages per account and
+disposition. Each account has one fixed-size, memory-mapped file holding
+three ring buffers of int64 slots: per minute for the last day, per hour
+for the last eight days and per day for over a year. A write updates the
+matching slot of all three rings, so hourly and daily roll-ups are always
+current and "today" or "last 7 days" reads a handful of slots.
+
+Every slot starts with the bucket number it holds. A slot left over from
+an earlier lap of the ring has a different bucket number, so it reads as
+zero and is cleared on the next write. Files are shared between processes
+through the page cache, so the web app reads what the processing leader
+or shard workers write.
+"""
+
+import mmap
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+DISPOSITIONS = ('processed', 'inbox', 'junk', 'approved_ads', 'pending', 'rules')
+
+# Resolution -> (seconds per bucket, slots in ring)
+RESOLUTIONS = {
+    'minute': (60, 1440),
+    'hour': (3600, 192),
+    'day': (86400, 400)
+}
+
+MAGIC = b'MRTS0001'
+HEADER_SIZE = 64
+SLOT_WIDTH = 1 + len(DISPOSITIONS)  # bucket number, then one counter per disposition
+
+_RING_OFFSETS = {}
+_offset = 0
+for _name, (_, _slots) in RESOLUTIONS.items():
+    _RING_OFFSETS[_name] = _offset
+    _offset += _slots * SLOT_WIDTH
+FILE_SIZE = HEADER_SIZE + _offset * 8
+
+
+def _utc_offset(now: float) -> int:
+    return time.localtime(now).tm_gmtoff
+
+
+def _bucket(resolution: str, now: float) -> int:
+    """Bucket number of a timestamp; days start at local midnight"""
+    width = RESOLUTIONS[resolution][0]
+    if resolution == 'day':
+        return int((now + _utc_offset(now)) // width)
+    return int(now // width)
+
+
+def _bucket_start(resolution: str, bucket: int, now: float) -> datetime:
+    width = RESOLUTIONS[resolution][0]
+    start = bucket * width
+    if resolution == 'day':
+        start -= _utc_offset(now)
+    return datetime.fromtimestamp(start)
+
+
+class StatsSeries:
+    """One account's memory-mapped time series"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+        header = self._file.read(len(MAGIC))
+        if header != MAGIC or os.fstat(self._file.fileno()).st_size != FILE_SIZE:
+            # New file, or one written with another layout
+            self._file.truncate(0)
+            self._file.truncate(FILE_SIZE)
+            self._file.seek(0)
+            self._file.write(MAGIC)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), FILE_SIZE)
+        self._slots = memoryview(self._map)[HEADER_SIZE:].cast('q')
+
+    def _slot(self, resolution: str, bucket: int) -> int:
+        slots = RESOLUTIONS[resolution][1]
+        return _RING_OFFSETS[resolution] + (bucket % slots) * SLOT_WIDTH
+
+    def record(self, counts: Dict[str, int], now: Optional[float] = None):
+        """
+        Add message counts by disposition
+
+        Args:
+            counts: Disposition -> messages; unknown dispositions are ignored
+            now: Timestamp to record at (defaults to the current time)
+        """
+        now = time.time() if now is None else now
+        columns = [(1 + DISPOSITIONS.index(key), count) for key, count in counts.items()
+                   if key in DISPOSITIONS and count]
+        if not columns:
+            return
+
+        slots = self._slots
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                bucket = _bucket(resolution, now)
+                base = self._slot(resolution, bucket)
+                if slots[base] != bucket:
+                    for column in range(1, SLOT_WIDTH):
+                        slots[base + column] = 0
+                    slots[base] = bucket
+                for column, count in columns:
+                    slots[base + column] += count
+
+    def read(self, resolution: str, bucket: int) -> Dict[str, int]:
+        """Counts of one bucket (zeros if the ring no longer holds it)"""
+        base = self._slot(resolution, bucket)
+        slots = self._slots
+        if slots[base] != bucket:
+            return dict.fromkeys(DISPOSITIONS, 0)
+        return {key: slots[base + 1 + index] for index, key in enumerate(DISPOSITIONS)}
+
+    def close(self):
+        self._slots.release()
+        self._map.close()
+        self._file.close()
+
+
+def _add(total: Dict[str, int], counts: Dict[str, int]):
+    for key, count in counts.items():
+        total[key] = total.get(key, 0) + count
+
+
+class StatsStore:
+    """
+    Time series for all accounts under one directory
+
+    Query methods aggregate over every account with a series file unless an
+    account is given.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._series: Dict[str, StatsSeries] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, account_email: str) -> Path:
+        return self.directory / f"{re.sub(r'[^A-Za-z0-9@._-]', '_', account_email)}.ts"
+
+    def series(self, account_email: str) -> StatsSeries:
+        """Open (or create) an account's series"""
+        series = self._series.get(account_email)
+        if series is None:
+            with self._lock:
+                series = self._series.get(account_email)
+                if series is None:
+                    series = self._series[account_email] = StatsSeries(self._path(account_email))
+        return series
+
+    def accounts(self) -> List[str]:
+        """Accounts with a series file (names as stored on disk)"""
+        with self._lock:
+            known = {self._path(email).name: email for email in self._series}
+        return sorted(known.get(path.name, path.stem) for path in self.directory.glob('*.ts'))
+
+    def _selected(self, account_email: Optional[str]) -> List[StatsSeries]:
+        if account_email is not None:
+            return [self.series(account_email)] if self._path(account_email).exists() else []
+        return [self.series(email) for email in self.accounts()]
+
+    def record(self, account_email: str, counts: Dict[str, int], now: Optional[float] = None):
+        """Add message counts by disposition for an account"""
+        self.series(account_email).record(counts, now)
+
+    def totals(self, resolution: str, buckets: int, account_email: Optional[str] = None,
+               now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Counts over the last buckets of a resolution, including the current one
+
+        Args:
+            resolution: 'minute', 'hour' or 'day'
+            buckets: Number of buckets to sum
+            account_email: Single account, or None for all accounts
+        """
+        now = time.time() if now is None else now
+        last = _bucket(resolution, now)
+        buckets = min(buckets, RESOLUTIONS[resolution][1])
+        total = dict.fromkeys(DISPOSITIONS, 0)
+        for series in self._selected(account_email):
+            for bucket in range(last - buckets + 1, last + 1):
+                _add(total, series.read(resolution, bucket))
+        return total
+
+    def today(self, account_email: Optional[str] = None, now: Optional[float] = None) -> Dict[str, int]:
+        """Counts since local midnight"""
+        return self.totals('day', 1, account_email, now)
+
+    def last_days(self, days: int = 7, account_email: Optional[str] = None,
+                  now: Optional[float] = None) -> Dict[str, int]:
+        """Counts over the last days, including today"""
+        return self.totals('day', days, account_email, now)
+
+    def trend(self, resolution: str = 'hour', points: int = 24, account_email: Optional[str] = None,
+              now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Counts per bucket, oldest first, for charts
+
+        Returns:
+            list: One dict per bucket with its start time and counts by disposition
+        """
+        now = time.time() if now is None else now
+        last = _bucket(resolution, now)
+        points = min(points, RESOLUTIONS[resolution][1])
+        selected = self._selected(account_email)
+        trend = []
+        for bucket in range(last - points + 1, last + 1):
+            total = dict.fromkeys(DISPOSITIONS, 0)
+            for series in selected:
+                _add(total, series.read(resolution, bucket))
+            trend.append({'time': _bucket_start(resolution, bucket, now).isoformat(), **total})
+        return trend
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series = {}
+
+
+# Global stats store instance
+_stats_store: Optional[StatsStore] = None
+_stats_store_lock = threading.Lock()
+
+
+def get_stats_store() -> StatsStore:
+    """
+    Get global stats store instance (singleton)
+
+    Returns:
+        StatsStore: Store under the configured data directory
+    """
+    global _stats_store
+
+    with _stats_store_lock:
+        if _stats_store is None:
+            from config import get_config
+            _stats_store = StatsStore(get_config().data_dir / "stats")
+        return _stats_store
+
+
+def record_dispositions(account_email: str, counts: Dict[str, int]):
+    """Record classified messages; failures are logged, never raised into processing"""
+    try:
+        get_stats_store().record(account_email, counts)
+    except Exception as e:
+        import logging
+        logging.getLogger('stats_store').warning(f"Could not record stats for {account_email}: {e}")
@@ -0,0 +1,244 @@
+"""
+Task History Log
+
+Bounded, persistent history of task manager activity. The newest entries
+are kept in memory in a deque; with a directory, every entry is also
+appended to on-disk segment files, so history survives restarts and can
+reach back months.
+
+Each segment is a JSON-lines file named after the sequence number of its
+first entry, with an .idx file of 8-byte byte offsets, one per entry. A
+query walks back from a cursor (an entry's sequence number) through the
+in-memory tail and then through the segments, reading blocks of entries
+by offset instead of scanning whole files. The oldest segments are
+deleted once there are more than max_segments.
+"""
+
+import bisect
+import json
+import logging
+import threading
+from array import array
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator
+
+
+DEFAULT_TAIL_SIZE = 1000
+DEFAULT_SEGMENT_ENTRIES = 10000
+DEFAULT_MAX_SEGMENTS = 50
+READ_BLOCK = 256  # entries read per seek when walking back through a segment
+
+
+class TaskLog:
+    """In-memory tail of task entries plus optional append-only segments"""
+
+    def __init__(self, directory: Optional[Path] = None, tail_size: int = DEFAULT_TAIL_SIZE,
+                 segment_entries: int = DEFAULT_SEGMENT_ENTRIES, max_segments: int = DEFAULT_MAX_SEGMENTS):
+        """
+        Initialize task log
+
+        Args:
+            directory: Segment directory, or None to keep history in memory only
+            tail_size: Entries kept in memory
+            segment_entries: Entries per segment file before starting a new one
+            max_segments: Segment files kept on disk
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.tail: deque = deque(maxlen=max(1, int(tail_size)))
+        self.segment_entries = max(1, int(segment_entries))
+        self.max_segments = max(1, int(max_segments))
+        self.next_seq = 1
+        self.logger = logging.getLogger('task_log')
+        self._lock = threading.Lock()
+        self._segments: List[int] = []  # first sequence number of each segment, ascending
+        self._log_file = None
+        self._index_file = None
+        self._active_entries = 0
+
+        if self.directory is not None:
+            try:
+                self._open()
+            except OSError as e:
+                self.logger.error(f"Task history directory {self.directory} unavailable, keeping history in memory: {e}")
+                self.directory = None
+
+    def _paths(self, first_seq: int):
+        return self.directory / f"{first_seq:012d}.log", self.directory / f"{first_seq:012d}.idx"
+
+    def _open(self):
+        """Find existing segments, repair the active one and load the tail"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(int(path.stem) for path in self.directory.glob('*.log') if path.stem.isdigit())
+        if not self._segments:
+            self._start_segment(1)
+            return
+
+        first_seq = self._segments[-1]
+        log_path, index_path = self._paths(first_seq)
+        offsets = self._repair(log_path, index_path)
+        self.next_seq = first_seq + len(offsets)
+        self._active_entries = len(offsets)
+        self._log_file = open(log_path, 'ab')
+        self._index_file = open(index_path, 'ab')
+
+        for entry in islice(self._walk_back(self.next_seq), self.tail.maxlen):
+            self.tail.appendleft(entry)
+
+    def _repair(self, log_path: Path, index_path: Path) -> array:
+        """Rebuild the index of a segment cut short by a crash"""
+        offsets = self._read_index(index_path)
+        data = log_path.read_bytes()
+        complete = data.rfind(b'\n') + 1
+        if complete == len(data) and data.count(b'\n') == len(offsets):
+            return offsets
+
+        offsets = array('Q')
+        position = 0
+        while position < complete:
+            offsets.append(position)
+            position = data.index(b'\n', position) + 1
+        if complete < len(data):
+            with open(log_path, 'r+b') as f:
+                f.truncate(complete)
+        with open(index_path, 'wb') as f:
+            offsets.tofile(f)
+        self.logger.warning(f"Rebuilt task history index {index_path.name} ({len(offsets)} entries)")
+        return offsets
+
+    @staticmethod
+    def _read_index(index_path: Path) -> array:
+        offsets = array('Q')
+        try:
+            data = index_path.read_bytes()
+        except FileNotFoundError:
+            return offsets
+        offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+        return offsets
+
+    def _start_segment(self, first_seq: int):
+        for handle in (self._log_file, self._index_file):
+            if handle is not None:
+                handle.close()
+        log_path, index_path = self._paths(first_seq)
+        self._log_file = open(log_path, 'ab')
+        self._index_file = open(index_path, 'ab')
+        self._segments.append(first_seq)
+        self._active_entries = 0
+
+        while len(self._segments) > self.max_segments:
+            for path in self._paths(self._segments.pop(0)):
+                path.unlink(missing_ok=True)
+
+    def append(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add an entry, stamping it with the next sequence number
+
+        Returns:
+            dict: The stored entry
+        """
+        with self._lock:
+            entry = {'seq': self.next_seq, **entry}
+            self.next_seq += 1
+            self.tail.append(entry)
+
+            if self._log_file is not None:
+                try:
+                    if self._active_entries >= self.segment_entries:
+                        self._start_segment(entry['seq'])
+                    offset = self._log_file.tell()
+                    self._log_file.write(json.dumps(entry, default=str).encode() + b'\n')
+                    self._log_file.flush()
+                    self._index_file.write(array('Q', [offset]).tobytes())
+                    self._index_file.flush()
+                    self._active_entries += 1
+                except OSError as e:
+                    self.logger.error(f"Failed to persist task history entry: {e}")
+            return entry
+
+    def _walk_back(self, before: int) -> Iterator[Dict[str, Any]]:
+        """Entries on disk with sequence numbers below before, newest first"""
+        if self.directory is None:
+            return
+        position = bisect.bisect_left(self._segments, before)
+        for first_seq in reversed(self._segments[:position]):
+            log_path, index_path = self._paths(first_seq)
+            offsets = self._read_index(index_path)
+            end = min(before - first_seq, len(offsets))
+            try:
+                with open(log_path, 'rb') as f:
+                    while end > 0:
+                        start = max(0, end - READ_BLOCK)
+                        f.seek(offsets[start])
+                        stop = offsets[end] if end < len(offsets) else None
+                        block = f.read() if stop is None else f.read(stop - offsets[start])
+                        for line in reversed(block.splitlines()):
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # Partly written by a concurrent append
+                            if entry.get('seq', 0) < before:
+                                yield entry
+                        end = start
+            except FileNotFoundError:
+                continue  # Deleted by retention while reading
+
+    def query(self, limit: int = 50, before: Optional[int] = None, account_email: Optional[str] = None,
+              task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Most recent matching entries older than a cursor
+
+        Args:
+            limit: Maximum number of entries
+            before: Only entries with a lower sequence number (None for the newest)
+            account_email: Only entries about this account
+            task_type: Only entries of this type
+
+        Returns:
+            list: Entries in chronological order; the first entry's seq is the cursor for the next page
+        """
+        if limit <= 0:
+            return []
+
+        def matches(entry):
+            return ((task_type is None or entry.get('type') == task_type) and
+                    (account_email is None or entry.get('details', {}).get('account') == account_email))
+
+        with self._lock:
+            tail = list(self.tail)
+            segments_open = self._log_file is not None
+        before = before if before is not None else float('inf')
+
+        found = []
+        for entry in reversed(tail):
+            if entry['seq'] < before and matches(entry):
+                found.append(entry)
+                if len(found) == limit:
+                    break
+
+        if len(found) < limit and segments_open:
+            oldest_in_memory = tail[0]['seq'] if tail else self.next_seq
+            cursor = int(min(before, oldest_in_memory))
+            for entry in self._walk_back(cursor):
+                if matches(entry):
+                    found.append(entry)
+                    if len(found) == limit:
+                        break
+
+        found.reverse()
+        return found
+
+    def __len__(self) -> int:
+        """Entries retained, on disk or in memory"""
+        with self._lock:
+            if self._segments:
+                return self.next_seq - self._segments[0]
+            return len(self.tail)
+
+    def close(self):
+        with self._lock:
+            for handle in (self._log_file, self._index_file):
+                if handle is not None:
+                    handle.close()
+            self._log_file = self._index_file = None
@@ -11,11 +11,18 @@ import threading
 import time
 from typing import Dict, List, Optional, Any
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, Future
 import json
+from pathlib import Path
 
 from .email_processor import EmailProcessor, ServiceState, ProcessingMode
+from .smtp_sender import shutdown_smtp_senders
+from .worker_pool import ProcessingScheduler, _get_scheduler_setting
+from .task_log import TaskLog, DEFAULT_TAIL_SIZE, DEFAULT_SEGMENT_ENTRIES, DEFAULT_MAX_SEGMENTS
+from .leader import LeaderElection, ControlServer, TaskManagerProxy, client_for
+from .sharding import ShardedTaskManager, get_shard_store
 from config import get_config, AccountConfig
+from metrics import get_stage_latency, get_metric_registry, get_rule_metrics
+from rules import get_live_evaluation_orders
 
 
 class TaskManager:
@@ -26,15 +33,28 @@ class TaskManager:
     and handles resource coordination across accounts.
     """
     
-    def __init__(self, max_workers: int = 4):
+    is_leader = True
+    
+    def __init__(self, max_workers: Optional[int] = None, history_dir: Optional[Path] = None,
+                 state_file: Optional[Path] = None):
         """
         Initialize task manager
         
         Args:
             max_workers: Maximum number of concurrent processing threads
+                (defaults to the worker_threads scheduler setting)
+            history_dir: Directory for persistent task history (None keeps it in memory only)
+            state_file: File recording the running accounts and their modes, so
+                the next leader can restore them (None records nothing)
         """
         self.processors: Dict[str, EmailProcessor] = {}
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.state_file = Path(state_file) if state_file is not None else None
+        self._state_lock = threading.Lock()
+        self._record_running = True  # Off during shutdown, so the file keeps what was running
+        
+        # One scheduler and one bounded worker pool shared by all accounts
+        self.scheduler = ProcessingScheduler(max_workers)
+        self.executor = self.scheduler.pool
         self._lock = threading.Lock()
         self._initialized = False  # Track initialization state
         
@@ -44,12 +64,23 @@ class TaskManager:
         
         # Monitoring
         self.startup_time = datetime.now()
-        self.task_history: List[Dict[str, Any]] = []
-        self.max_history_size = 1000
-        
-        # Auto-transition monitoring
-        self.transition_check_interval = 3600  # Check every hour
+        self.task_history = TaskLog(
+            history_dir,
+            tail_size=_get_scheduler_setting('task_history_size', DEFAULT_TAIL_SIZE),
+            segment_entries=_get_scheduler_setting('task_history_segment_entries', DEFAULT_SEGMENT_ENTRIES),
+            max_segments=_get_scheduler_setting('task_history_max_segments', DEFAULT_MAX_SEGMENTS))
+        
+        # Auto-transition checks run on a timer, not in status reads
+        self.transition_check_interval = _get_scheduler_setting('auto_transition_check_interval', 3600)
         self.last_transition_check = datetime.now()
+        self.scheduler.scheduler.add_job(
+            self._check_auto_transitions,
+            trigger='interval',
+            seconds=self.transition_check_interval,
+            id='task_manager:auto_transitions',
+            name='auto_transitions',
+            replace_existing=True
+        )
         
         self.logger.info("Task manager initialized")
     
@@ -71,7 +102,7 @@ class TaskManager:
                 return False
             
             try:
-                processor = EmailProcessor(account_config)
+                processor = EmailProcessor(account_config, scheduler=self.scheduler)
                 self.processors[email] = processor
                 
                 self.logger.info(f"Added account {email} for processing")
@@ -106,6 +137,8 @@ class TaskManager:
                 
                 # Remove from processors
                 del self.processors[account_email]
+                get_stage_latency().remove(account_email)
+                self._record_account_mode(account_email, None)
                 
                 self.logger.info(f"Removed account {account_email}")
                 self._log_task("account_removed", {"account": account_email})
@@ -133,6 +166,7 @@ class TaskManager:
         try:
             result = processor.start(mode)
             if result:
+                self._record_account_mode(account_email, mode)
                 self._log_task("service_started", {
                     "account": account_email,
                     "mode": mode.value
@@ -160,6 +194,7 @@ class TaskManager:
         try:
             result = processor.stop()
             if result:
+                self._record_account_mode(account_email, None)
                 self._log_task("service_stopped", {"account": account_email})
             return result
             
@@ -191,6 +226,20 @@ class TaskManager:
             self.logger.error(f"Failed to restart account {account_email}: {e}")
             return False
     
+    def drain_account(self, account_email: str, timeout: Optional[float] = None) -> bool:
+        """
+        Cancel an account's queued tasks and wait for its running one
+        
+        Args:
+            account_email: Email address of account
+            timeout: Seconds to wait (None waits indefinitely)
+            
+        Returns:
+            bool: True once nothing of the account is queued or running
+        """
+        self.executor.cancel_account(account_email)
+        return self.executor.wait_idle(account_email, timeout)
+    
     def switch_mode(self, account_email: str, new_mode: ProcessingMode) -> bool:
         """
         Switch processing mode for an account
@@ -209,6 +258,7 @@ class TaskManager:
         try:
             result = processor.switch_mode(new_mode)
             if result:
+                self._record_account_mode(account_email, new_mode)
                 self._log_task("mode_switched", {
                     "account": account_email,
                     "new_mode": new_mode.value
@@ -239,30 +289,28 @@ class TaskManager:
         """
         Get status for all accounts and task manager
         
+        Reads each processor's published snapshot without taking the task
+        manager or processor locks, so polling never waits on processing.
+        
         Returns:
             dict: Complete system status
         """
-        with self._lock:
-            accounts_status = {}
-            
-            for email, processor in self.processors.items():
-                accounts_status[email] = processor.get_status()
-            
-            # Check for auto-transitions
-            self._check_auto_transitions()
-            
-            return {
-                'task_manager': {
-                    'startup_time': self.startup_time.isoformat(),
-                    'total_accounts': len(self.processors),
-                    'running_accounts': len([p for p in self.processors.values() 
-                                           if p.state in [ServiceState.RUNNING_STARTUP, ServiceState.RUNNING_MAINTENANCE]]),
-                    'error_accounts': len([p for p in self.processors.values() 
-                                         if p.state == ServiceState.ERROR]),
-                    'last_transition_check': self.last_transition_check.isoformat()
-                },
-                'accounts': accounts_status
-            }
+        processors = dict(self.processors)
+        accounts_status = {email: processor.get_status() for email, processor in processors.items()}
+        states = [status.get('state') for status in accounts_status.values()]
+        
+        return {
+            'task_manager': {
+                'startup_time': self.startup_time.isoformat(),
+                'total_accounts': len(processors),
+                'running_accounts': sum(state in (ServiceState.RUNNING_STARTUP.value,
+                                                  ServiceState.RUNNING_MAINTENANCE.value) for state in states),
+                'error_accounts': sum(state == ServiceState.ERROR.value for state in states),
+                'last_transition_check': self.last_transition_check.isoformat(),
+                'scheduler': self.scheduler.get_status()
+            },
+            'accounts': accounts_status
+        }
     
     def get_aggregate_stats(self) -> Dict[str, Any]:
         """
@@ -283,62 +331,62 @@ class TaskManager:
                 'total_emails_pending': 0, 
                 'total_errors': 0,
                 'avg_processing_time': 0.0,
-                'error_rate': 0.0
+                'error_rate': 0.0,
+                'latency': {}
             }
             
-        with self._lock:
-            # Create atomic snapshots of all processor stats
-            processor_snapshots = {}
-            for email, processor in self.processors.items():
-                try:
-                    processor_snapshots[email] = processor.get_stats_snapshot()
-                except Exception as e:
-                    self.logger.warning(f"Failed to get stats snapshot for {email}: {e}")
-                    # Skip this processor if snapshot fails
-                    continue
-            
-            # Calculate aggregates from snapshots (immune to concurrent changes)
-            total_processed = 0
-            total_pending = 0
-            total_errors = 0
-            avg_processing_times = []
-            
-            running_count = 0
-            startup_count = 0
-            maintenance_count = 0
-            
-            for snapshot in processor_snapshots.values():
-                total_processed += snapshot.get('emails_processed', 0)
-                total_pending += snapshot.get('emails_pending', 0)
-                total_errors += snapshot.get('error_count', 0)
-                
-                avg_time = snapshot.get('avg_processing_time', 0)
-                if avg_time > 0:
-                    avg_processing_times.append(avg_time)
-                
-                # Count by state and mode from snapshot
-                state = snapshot.get('state', '')
-                mode = snapshot.get('mode', '')
+        # Published snapshots of all processor stats, read without locks
+        processors = dict(self.processors)
+        processor_snapshots = {}
+        for email, processor in processors.items():
+            try:
+                processor_snapshots[email] = processor.get_stats_snapshot()
+            except Exception as e:
+                self.logger.warning(f"Failed to get stats snapshot for {email}: {e}")
+                # Skip this processor if snapshot fails
+                continue
+        
+        # Calculate aggregates from snapshots (immune to concurrent changes)
+        total_processed = 0
+        total_pending = 0
+        total_errors = 0
+        
+        running_count = 0
+        startup_count = 0
+        maintenance_count = 0
+        
+        for snapshot in processor_snapshots.values():
+            total_processed += snapshot.get('emails_processed', 0)
+            total_pending += snapshot.get('emails_pending', 0)
+            total_errors += snapshot.get('error_count', 0)
+            
+            # Count by state and mode from snapshot
+            state = snapshot.get('state', '')
+            mode = snapshot.get('mode', '')
+            
+            if state in [ServiceState.RUNNING_STARTUP.value, ServiceState.RUNNING_MAINTENANCE.value]:
+                running_count += 1
                 
-                if state in ['RUNNING_STARTUP', 'RUNNING_MAINTENANCE']:
-                    running_count += 1
-                    
-                if mode == 'STARTUP':
-                    startup_count += 1
-                else:
-                    maintenance_count += 1
-            
-            return {
-                'total_accounts': len(self.processors),
-                'running_accounts': running_count,
-                'startup_mode_accounts': startup_count,
-                'maintenance_mode_accounts': maintenance_count,
-                'total_emails_processed': total_processed,
-                'total_emails_pending': total_pending,
-                'total_errors': total_errors,
-                'avg_processing_time': sum(avg_processing_times) / len(avg_processing_times) if avg_processing_times else 0,
-                'error_rate': total_errors / max(1, total_processed)
-            }
+            if mode == ProcessingMode.STARTUP.value:
+                startup_count += 1
+            else:
+                maintenance_count += 1
+        
+        # Stage histograms merged across accounts, so tails are not averaged away
+        latency = get_stage_latency().merged(processor_snapshots)
+        
+        return {
+            'total_accounts': len(processors),
+            'running_accounts': running_count,
+            'startup_mode_accounts': startup_count,
+            'maintenance_mode_accounts': maintenance_count,
+            'total_emails_processed': total_processed,
+            'total_emails_pending': total_pending,
+            'total_errors': total_errors,
+            'avg_processing_time': latency['cycle'].mean() / 1e6,
+            'error_rate': total_errors / max(1, total_processed),
+            'latency': {stage: histogram.summary(scale=1000.0) for stage, histogram in latency.items()}
+        }
     
     def start_all(self) -> Dict[str, bool]:
         """
@@ -374,14 +422,74 @@ class TaskManager:
         """Shutdown task manager and all processors"""
         self.logger.info("Shutting down task manager")
         
-        # Stop all processors
+        # Stop all processors; the state file still lists them for the next leader
+        self._record_running = False
         self.stop_all()
         
-        # Shutdown executor
-        self.executor.shutdown(wait=True)
+        # Shutdown shared scheduler and worker pool
+        self.scheduler.shutdown(wait=True)
+        
+        # Deliver or abandon queued forwards and close SMTP connections
+        shutdown_smtp_senders()
+        
+        self.task_history.close()
         
         self.logger.info("Task manager shutdown complete")
     
+    def _load_running_accounts(self) -> Dict[str, str]:
+        """Account email -> mode of the accounts recorded as running"""
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable account state {self.state_file}: {e}")
+            return {}
+    
+    def _record_account_mode(self, account_email: str, mode: Optional[ProcessingMode]):
+        """Record an account's running mode, or None once it is stopped"""
+        if self.state_file is None or not self._record_running:
+            return
+        
+        with self._state_lock:
+            running = self._load_running_accounts()
+            if mode is None:
+                running.pop(account_email, None)
+            else:
+                running[account_email] = mode.value
+            try:
+                self.state_file.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = self.state_file.with_suffix('.tmp')
+                with open(temp_path, 'w') as f:
+                    json.dump(running, f, indent=2)
+                temp_path.replace(self.state_file)
+            except OSError as e:
+                self.logger.error(f"Failed to save account state {self.state_file}: {e}")
+    
+    def restore_running_accounts(self) -> Dict[str, bool]:
+        """
+        Start the accounts recorded as running, in their recorded modes
+        
+        Returns:
+            dict: Start result for each restored account
+        """
+        if self.state_file is None:
+            return {}
+        
+        results = {}
+        for email, mode in self._load_running_accounts().items():
+            if email not in self.processors:
+                continue
+            try:
+                results[email] = self.start_account(email, ProcessingMode(mode))
+            except ValueError:
+                self.logger.warning(f"Unknown mode {mode} recorded for account {email}")
+        
+        if results:
+            self.logger.info(f"Restored running accounts: {sum(results.values())}/{len(results)} started")
+        return results
+    
     def _get_processor(self, account_email: str) -> Optional[EmailProcessor]:
         """Get processor for account, with auto-recovery if missing"""
         processor = self.processors.get(account_email)
@@ -408,22 +516,16 @@ class TaskManager:
         }
         
         self.task_history.append(task_entry)
-        
-        # Trim history if too large
-        if len(self.task_history) > self.max_history_size:
-            self.task_history = self.task_history[-self.max_history_size:]
     
     def _check_auto_transitions(self):
-        """Check for accounts ready for auto-transition to maintenance mode"""
-        now = datetime.now()
-        
-        # Only check periodically
-        if (now - self.last_transition_check).seconds < self.transition_check_interval:
-            return
+        """
+        Check for accounts ready for auto-transition to maintenance mode
         
-        self.last_transition_check = now
+        Runs every transition_check_interval seconds on the shared scheduler.
+        """
+        self.last_transition_check = datetime.now()
         
-        for email, processor in self.processors.items():
+        for email, processor in list(self.processors.items()):
             if processor.should_transition_to_maintenance():
                 self.logger.info(f"Auto-transitioning {email} to maintenance mode")
                 if self.switch_mode(email, ProcessingMode.MAINTENANCE):
@@ -491,48 +593,139 @@ class TaskManager:
         except Exception as e:
             self.logger.error(f"Failed to refresh accounts from config: {e}")
     
-    def get_task_history(self, limit: int = 50) -> List[Dict[str, Any]]:
+    def get_metrics_text(self) -> str:
+        """
+        Prometheus metrics for this process
+        
+        Rendered from pre-aggregated counters and histograms; does not walk
+        processors or take the task manager lock.
+        
+        Returns:
+            str: Metrics in text exposition format
+        """
+        return get_metric_registry().render()
+    
+    def get_rule_stats(self) -> Dict[str, Any]:
+        """
+        Per-rule counters and condition timings collected by this process
+        
+        Returns:
+            dict: 'rules' (rule ID -> counters) and 'condition_types'
+                  (condition type -> timing summary)
+        """
+        return get_rule_metrics().snapshot()
+    
+    def get_evaluation_orders(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Condition evaluation order of the active rules, as tuned by processing
+        
+        Returns:
+            dict: Rule ID -> conditions in evaluation order
+        """
+        return get_live_evaluation_orders()
+    
+    def get_task_history(self, limit: int = 50, before: Optional[int] = None,
+                         account_email: Optional[str] = None, task_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get recent task history
         
         Args:
             limit: Maximum number of entries to return
+            before: Cursor; only entries with a lower seq (the first seq of the previous page)
+            account_email: Only entries about this account
+            task_type: Only entries of this type
             
         Returns:
-            list: Recent task history entries
+            list: Task history entries in chronological order
         """
-        with self._lock:
-            return self.task_history[-limit:] if self.task_history else []
+        return self.task_history.query(limit, before, account_email, task_type)
 
 
-# Global task manager instance
+# Global task manager instance (a TaskManagerProxy in non-leader processes,
+# a ShardedTaskManager when accounts run in shard workers)
 _task_manager: Optional[TaskManager] = None
 _task_manager_lock = threading.Lock()
+_election: Optional[LeaderElection] = None
+_control_server: Optional[ControlServer] = None
+
+
+def _start_leader() -> TaskManager:
+    """Create the processing engine in this process and serve it to other workers"""
+    global _control_server
+    
+    data_dir = get_config().data_dir
+    task_manager = TaskManager(history_dir=data_dir / "task_history", state_file=data_dir / "running_accounts.json")
+    # Load accounts from configuration
+    task_manager.load_accounts_from_config()
+    
+    # Accounts that were running under the previous leader; connecting can be slow
+    threading.Thread(target=task_manager.restore_running_accounts, name="restore-accounts", daemon=True).start()
+    
+    if _election is not None:
+        try:
+            _control_server = ControlServer(_election.socket_path, task_manager)
+            _control_server.start()
+        except OSError as e:
+            logging.getLogger('task_manager').error(f"Control socket unavailable, other workers cannot proxy: {e}")
+    return task_manager
+
+
+def _take_over():
+    """Follower won the lease after the leader exited"""
+    global _task_manager
+    
+    with _task_manager_lock:
+        _task_manager = _start_leader()
 
 
 def get_task_manager() -> TaskManager:
     """
     Get global task manager instance (singleton)
     
+    With sharded processing enabled, accounts run in worker.py processes and
+    the web app only gets a control plane over the shard store. Otherwise,
+    with leader election enabled, only the process holding the leader lease
+    runs processors; other processes get a proxy that forwards calls to it.
+    
     Returns:
-        TaskManager: Global task manager instance
+        TaskManager: Global task manager instance, a TaskManagerProxy or a ShardedTaskManager
     """
-    global _task_manager
+    global _task_manager, _election
     
     with _task_manager_lock:
         if _task_manager is None:
-            _task_manager = TaskManager()
-            # Load accounts from configuration
-            _task_manager.load_accounts_from_config()
+            if _get_scheduler_setting('sharded_processing', False):
+                _task_manager = ShardedTaskManager(get_shard_store(),
+                                                   lease_ttl=_get_scheduler_setting('shard_lease_ttl', 30.0))
+                return _task_manager
+            
+            if not _get_scheduler_setting('leader_election', True):
+                _task_manager = _start_leader()
+                return _task_manager
+            
+            data_dir = get_config().data_dir
+            _election = LeaderElection(data_dir / "leader.lock", data_dir / "control.sock",
+                                       retry_interval=_get_scheduler_setting('leader_retry_interval', 5.0))
+            if _election.try_acquire():
+                _task_manager = _start_leader()
+            else:
+                _task_manager = TaskManagerProxy(client_for(_election))
+                _election.watch(_take_over)
         
         return _task_manager
 
 
 def shutdown_task_manager():
     """Shutdown global task manager"""
-    global _task_manager
+    global _task_manager, _election, _control_server
     
     with _task_manager_lock:
+        if _control_server is not None:
+            _control_server.stop()
+            _control_server = None
         if _task_manager is not None:
             _task_manager.shutdown()
-            _task_manager = None
\ No newline at end of file
+            _task_manager = None
+        if _election is not None:
+            _election.release()
+            _election = None
\ No newline at end of file
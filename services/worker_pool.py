@@ -0,0 +1,567 @@
+"""
+Processing Scheduler and Worker Pool
+
+A single APScheduler instance shared by every account, dispatching due jobs
+onto one bounded worker pool. The pool keeps a serialized lane per account:
+an account's tasks run one at a time, in order, and accounts are served
+round-robin, so a busy account cannot starve the others. Thread count stays
+constant however many accounts are added.
+
+Interactive tasks (dashboard requests) jump ahead of an account's queued
+background cycles and have reserved worker threads, so UI latency does not
+depend on how much background work is queued.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, List, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
+from apscheduler.jobstores.base import JobLookupError
+
+from metrics import get_metric_registry
+
+
+DEFAULT_WORKER_THREADS = 4
+DEFAULT_INTERACTIVE_WORKERS = 1
+
+# Task priorities
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class WorkerPool:
+    """
+    Fixed-size thread pool with serialized per-account lanes
+
+    Tasks are queued per account and at most one task per account runs at a
+    time. Accounts with queued work and nothing running are served
+    round-robin. A task submitted with a key is coalesced (skipped) while
+    another task with the same key is queued or running, so repeated triggers
+    of a slow job collapse into one run.
+
+    Interactive tasks run before any queued background task of their account
+    and before other accounts' background work. Reserved workers run only
+    interactive tasks and are started on first use. The start limiter only
+    applies to background tasks.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKER_THREADS, name: str = 'worker', start_limiter=None,
+                 reserved_workers: int = 0):
+        """
+        Initialize worker pool
+
+        Args:
+            max_workers: Number of worker threads
+            name: Thread name prefix
+            start_limiter: Optional StartLimiter every background task waits on before it starts
+            reserved_workers: Extra threads that only run interactive tasks
+        """
+        self._max_workers = max(1, int(max_workers))
+        self._reserved_workers = max(0, int(reserved_workers))
+        self.name = name
+        self.start_limiter = start_limiter
+        self._queues: Dict[str, deque] = {}  # Background tasks per account
+        self._urgent: Dict[str, deque] = {}  # Interactive tasks per account
+        self._ready: deque = deque()  # Idle accounts with queued tasks, in service order
+        self._active_keys = set()
+        self._running: Dict[str, int] = {}
+        self._lane_waits: Dict[str, Dict[str, float]] = {}  # Per-account background queue wait stats
+        self._interactive_waits: Dict[str, float] = {}
+        self._depth = {'background': 0, 'interactive': 0}  # Queued tasks, mirrored to the queue depth gauge
+        self._metrics = get_metric_registry()
+        self._threads: List[threading.Thread] = []
+        self._reserved_threads: List[threading.Thread] = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._local = threading.local()  # Account whose task the current worker thread runs
+        self.logger = logging.getLogger('worker_pool')
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'skipped': 0
+        }
+
+    def submit(self, account: str, fn: Callable, *args, key: Optional[str] = None,
+               priority: int = PRIORITY_BACKGROUND, **kwargs) -> Optional[Future]:
+        """
+        Queue a task for an account
+
+        Args:
+            account: Account the task belongs to
+            fn: Callable to run
+            key: Optional job key; the task is skipped if one with the same key is pending
+            priority: PRIORITY_BACKGROUND or PRIORITY_INTERACTIVE
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            Future: Task future, or None if the task was skipped
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Worker pool is shut down")
+            if key is not None and key in self._active_keys:
+                self.stats['skipped'] += 1
+                return None
+
+            interactive = priority == PRIORITY_INTERACTIVE
+            if account not in self._running and not self._has_queued(account):
+                self._ready.append(account)
+            queues = self._urgent if interactive else self._queues
+            future = Future()
+            queues.setdefault(account, deque()).append((key, future, fn, args, kwargs, time.monotonic()))
+            if key is not None:
+                self._active_keys.add(key)
+            self.stats['submitted'] += 1
+            self._update_depth('interactive' if interactive else 'background', 1)
+
+            self._start_threads(interactive)
+            # Reserved workers ignore background tasks, so wake everyone
+            self._condition.notify_all()
+            return future
+
+    def _update_depth(self, priority: str, change: int):
+        self._depth[priority] += change
+        self._metrics.set('mail_rulez_scheduler_queue_depth', self._depth[priority], pool=self.name, priority=priority)
+
+    def _has_queued(self, account: str) -> bool:
+        return account in self._queues or account in self._urgent
+
+    def _start_threads(self, interactive: bool = False):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self._max_workers:
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if not interactive:
+            return
+        self._reserved_threads = [thread for thread in self._reserved_threads if thread.is_alive()]
+        while len(self._reserved_threads) < self._reserved_workers:
+            thread = threading.Thread(target=self._work, args=(True,),
+                                      name=f"{self.name}-interactive-{len(self._reserved_threads)}", daemon=True)
+            thread.start()
+            self._reserved_threads.append(thread)
+
+    def _next_task(self, interactive_only: bool = False) -> Optional[tuple]:
+        """Pop the next task, interactive first, rotating accounts; None once shut down and drained"""
+        with self._condition:
+            while True:
+                account = next((account for account in self._ready if account in self._urgent), None)
+                if account is None and self._ready and not interactive_only:
+                    # A background task stays queued until the limiter allows a start, so its lane
+                    # takes interactive tasks meanwhile and the wait counts as queue lag
+                    delay = self.start_limiter.try_acquire() if self.start_limiter is not None else 0.0
+                    if delay:
+                        waited_from = time.monotonic()
+                        self._condition.wait(delay)
+                        self.start_limiter.waited += time.monotonic() - waited_from
+                        continue
+                    account = self._ready[0]
+                if account is not None:
+                    break
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+            self._ready.remove(account)
+            interactive = account in self._urgent
+            queues = self._urgent if interactive else self._queues
+            queue = queues[account]
+            key, future, fn, args, kwargs, queued_at = queue.popleft()
+            if not queue:
+                del queues[account]
+            self._running[account] = self._running.get(account, 0) + 1
+            wait = time.monotonic() - queued_at
+            priority = 'interactive' if interactive else 'background'
+            self._update_depth(priority, -1)
+            self._metrics.observe('mail_rulez_scheduler_lag_seconds', wait, pool=self.name, priority=priority)
+            if interactive:
+                self._record_wait(self._interactive_waits, wait)
+            else:
+                self._record_wait(self._lane_waits.setdefault(account, {}), wait)
+            return account, key, future, fn, args, kwargs
+
+    @staticmethod
+    def _record_wait(waits: Dict[str, float], wait: float):
+        waits['runs'] = waits.get('runs', 0) + 1
+        waits['total_wait'] = waits.get('total_wait', 0.0) + wait
+        waits['max_wait'] = max(waits.get('max_wait', 0.0), wait)
+        waits['last_wait'] = wait
+
+    @staticmethod
+    def _wait_status(waits: Dict[str, float]) -> Dict[str, Any]:
+        runs = waits.get('runs', 0)
+        return {
+            'runs': runs,
+            'avg_wait_seconds': round(waits['total_wait'] / runs, 3) if runs else 0.0,
+            'max_wait_seconds': round(waits.get('max_wait', 0.0), 3),
+            'last_wait_seconds': round(waits.get('last_wait', 0.0), 3)
+        }
+
+    def _work(self, interactive_only: bool = False):
+        while True:
+            task = self._next_task(interactive_only)
+            if task is None:
+                return
+
+            account, key, future, fn, args, kwargs = task
+            succeeded = True
+            if future.set_running_or_notify_cancel():
+                self._local.account = account
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    succeeded = False
+                    self.logger.error(f"Task for {account} failed: {e}")
+                    future.set_exception(e)
+                finally:
+                    self._local.account = None
+
+            with self._condition:
+                self._active_keys.discard(key)
+                self._running[account] -= 1
+                if not self._running[account]:
+                    del self._running[account]
+                    if self._has_queued(account):
+                        self._ready.append(account)
+                self.stats['completed' if succeeded else 'failed'] += 1
+                self._condition.notify_all()
+
+    def cancel_account(self, account: str) -> int:
+        """
+        Cancel an account's queued tasks; a running task is not interrupted
+
+        Returns:
+            int: Tasks cancelled
+        """
+        with self._condition:
+            cancelled = 0
+            for queues, priority in ((self._queues, 'background'), (self._urgent, 'interactive')):
+                queue = queues.pop(account, ())
+                for key, future, *_ in queue:
+                    future.cancel()
+                    self._active_keys.discard(key)
+                if queue:
+                    self._update_depth(priority, -len(queue))
+                    cancelled += len(queue)
+            if account in self._ready:
+                self._ready.remove(account)
+            return cancelled
+
+    def wait_idle(self, account: str, timeout: Optional[float] = None) -> bool:
+        """
+        Block until no task of an account is running
+
+        Returns immediately when called from the account's own task, which
+        would otherwise wait for itself.
+
+        Args:
+            account: Account to wait for
+            timeout: Seconds to wait (None waits indefinitely)
+
+        Returns:
+            bool: True if the account is idle
+        """
+        if getattr(self._local, 'account', None) == account:
+            return False
+        with self._condition:
+            return self._condition.wait_for(lambda: account not in self._running, timeout)
+
+    def start(self):
+        """Accept tasks again after shutdown"""
+        with self._condition:
+            self._shutdown = False
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """
+        Stop accepting tasks and let workers exit
+
+        Args:
+            wait: Block until running tasks finish
+            cancel_pending: Cancel queued tasks instead of running them
+        """
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                for queue in list(self._queues.values()) + list(self._urgent.values()):
+                    for key, future, *_ in queue:
+                        future.cancel()
+                        self._active_keys.discard(key)
+                self._queues.clear()
+                self._urgent.clear()
+                self._ready.clear()
+                for priority in self._depth:
+                    self._update_depth(priority, -self._depth[priority])
+            self._condition.notify_all()
+            threads = self._threads + self._reserved_threads
+
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Worker and queue status"""
+        with self._condition:
+            return {
+                'workers': self._max_workers,
+                'reserved_workers': self._reserved_workers,
+                'busy': sum(self._running.values()),
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'queued_interactive': sum(len(queue) for queue in self._urgent.values()),
+                'queued_by_account': {account: len(queue) for account, queue in self._queues.items()},
+                'lanes': {account: self._lane_status(account)
+                          for account in set(self._lane_waits) | set(self._queues) | set(self._urgent)},
+                'interactive': self._wait_status(self._interactive_waits),
+                'start_wait_seconds': round(self.start_limiter.waited, 3) if self.start_limiter else 0.0,
+                **self.stats
+            }
+
+
+    def lane_status(self, account: str) -> Dict[str, Any]:
+        """Queue depth and wait times for one account's lane"""
+        with self._condition:
+            return self._lane_status(account)
+
+    def _lane_status(self, account: str) -> Dict[str, Any]:
+        return {
+            'queued': len(self._queues.get(account, ())),
+            'queued_interactive': len(self._urgent.get(account, ())),
+            'running': account in self._running,
+            **self._wait_status(self._lane_waits.get(account, {}))
+        }
+
+
+class AccountScheduler:
+    """
+    One account's view of the shared processing scheduler
+
+    Offers the part of the BackgroundScheduler interface EmailProcessor uses
+    (start, shutdown, running, add_job, get_jobs, remove_all_jobs). Jobs are
+    registered on the shared scheduler and run on the shared worker pool.
+    """
+
+    def __init__(self, shared: 'ProcessingScheduler', account_email: str):
+        self.shared = shared
+        self.account_email = account_email
+        self.running = False
+        self._job_ids = set()
+
+    def start(self):
+        """Start scheduling this account's jobs"""
+        self.shared.ensure_started()
+        self.running = True
+
+    def shutdown(self, wait: bool = True):
+        """
+        Remove this account's jobs and cancel its queued tasks; the shared
+        scheduler keeps running
+
+        Args:
+            wait: Block until the account's running task finishes
+        """
+        self.running = False
+        self.remove_all_jobs()
+        self.shared.pool.cancel_account(self.account_email)
+        if wait:
+            self.shared.pool.wait_idle(self.account_email)
+
+    def add_job(self, func: Callable, trigger=None, id: Optional[str] = None,
+                replace_existing: bool = False, **kwargs):
+        """
+        Schedule a job for this account
+
+        Args:
+            func: Callable run on the worker pool when the job is due
+            trigger: APScheduler trigger
+            id: Job ID (must be unique across accounts)
+            replace_existing: Replace a job with the same ID
+            **kwargs: Further APScheduler add_job options (e.g. next_run_time)
+
+        Returns:
+            Job: The scheduled APScheduler job
+        """
+        job_id = id or f"{self.account_email}:{getattr(func, '__name__', 'job')}:{len(self._job_ids)}"
+        job = self.shared.scheduler.add_job(
+            self.shared.dispatch,
+            trigger=trigger,
+            args=[self.account_email, job_id, func],
+            id=job_id,
+            name=getattr(func, '__name__', job_id),
+            replace_existing=replace_existing,
+            **kwargs
+        )
+        self._job_ids.add(job_id)
+        return job
+
+    def get_jobs(self) -> list:
+        """This account's scheduled jobs"""
+        return [job for job in self.shared.scheduler.get_jobs() if job.id in self._job_ids]
+
+    def reschedule_job(self, job_id: str, trigger):
+        """
+        Give one of this account's jobs a new trigger
+
+        Args:
+            job_id: Job ID
+            trigger: New APScheduler trigger; the next run is computed from now
+
+        Returns:
+            Job: The rescheduled job, or None if it is not scheduled
+        """
+        if job_id not in self._job_ids:
+            return None
+        try:
+            return self.shared.scheduler.reschedule_job(job_id, trigger=trigger)
+        except JobLookupError:
+            return None
+
+    def submit(self, func: Callable, *args, key: Optional[str] = None, **kwargs) -> Optional[Future]:
+        """
+        Queue a one-off background task on this account's lane
+
+        Args:
+            func: Callable to run
+            key: Optional job key; the task is skipped if one with the same key is pending
+            *args, **kwargs: Arguments for func
+
+        Returns:
+            Future: Task future, or None if the task was skipped
+        """
+        self.shared.ensure_started()
+        return self.shared.pool.submit(self.account_email, func, *args, key=key, **kwargs)
+
+    def submit_interactive(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        Run a task for this account ahead of its queued background jobs
+
+        Args:
+            func: Callable to run
+            *args, **kwargs: Arguments for func
+
+        Returns:
+            Future: Task future
+        """
+        self.shared.ensure_started()
+        return self.shared.pool.submit(self.account_email, func, *args, priority=PRIORITY_INTERACTIVE, **kwargs)
+
+    def get_lane_status(self) -> Dict[str, Any]:
+        """Queue depth and wait times for this account's lane"""
+        return self.shared.pool.lane_status(self.account_email)
+
+    def remove_job(self, job_id: str):
+        """Remove one of this account's jobs"""
+        self._job_ids.discard(job_id)
+        try:
+            self.shared.scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass
+
+    def remove_all_jobs(self):
+        """Remove all of this account's jobs"""
+        for job_id in list(self._job_ids):
+            self.remove_job(job_id)
+
+
+class ProcessingScheduler:
+    """
+    Shared scheduler plus bounded worker pool for all accounts
+
+    The APScheduler instance only decides when jobs are due; its single
+    executor thread hands each due job to the worker pool, which runs it.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize processing scheduler
+
+        Args:
+            max_workers: Worker threads (defaults to the worker_threads setting)
+        """
+        import pytz
+        from .scheduling_policy import StartLimiter, DEFAULT_MAX_CYCLE_STARTS_PER_SECOND
+
+        if max_workers is None:
+            max_workers = _get_scheduler_setting('worker_threads', DEFAULT_WORKER_THREADS)
+        starts_per_second = _get_scheduler_setting('max_cycle_starts_per_second', DEFAULT_MAX_CYCLE_STARTS_PER_SECOND)
+        interactive_workers = _get_scheduler_setting('interactive_workers', DEFAULT_INTERACTIVE_WORKERS)
+
+        self.scheduler = BackgroundScheduler(
+            timezone=pytz.UTC,
+            executors={'default': SchedulerThreadPool(1)},
+            job_defaults={'coalesce': True, 'max_instances': 1}
+        )
+        self.pool = WorkerPool(max_workers, name='processing', start_limiter=StartLimiter(starts_per_second),
+                               reserved_workers=interactive_workers)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('processing_scheduler')
+
+    def ensure_started(self):
+        """Start the shared scheduler if it is not running"""
+        with self._lock:
+            self.pool.start()
+            if not self.scheduler.running:
+                self.scheduler.start()
+                self.logger.info(f"Processing scheduler started with {self.pool._max_workers} workers")
+
+    def for_account(self, account_email: str) -> AccountScheduler:
+        """Scheduler view for one account"""
+        return AccountScheduler(self, account_email)
+
+    def dispatch(self, account_email: str, job_id: str, func: Callable):
+        """Scheduler callback: queue a due job on the worker pool"""
+        try:
+            self.pool.submit(account_email, func, key=job_id)
+        except RuntimeError:
+            self.logger.debug(f"Dropped job {job_id}: worker pool is shut down")
+
+    def shutdown(self, wait: bool = True):
+        """Stop the scheduler and the worker pool"""
+        with self._lock:
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+            self.pool.shutdown(wait=wait, cancel_pending=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Scheduler and worker pool status"""
+        return {
+            'running': self.scheduler.running,
+            'jobs': len(self.scheduler.get_jobs()),
+            'pool': self.pool.get_status()
+        }
+
+
+def _get_scheduler_setting(key: str, default):
+    try:
+        from config import get_config
+        return get_config().get_scheduler_setting(key, default)
+    except Exception:
+        return default
+
+
+# Global processing scheduler for processors created outside a TaskManager
+_processing_scheduler: Optional[ProcessingScheduler] = None
+_processing_scheduler_lock = threading.Lock()
+
+
+def get_processing_scheduler() -> ProcessingScheduler:
+    """
+    Get global processing scheduler instance (singleton)
+
+    Returns:
+        ProcessingScheduler: Shared scheduler and worker pool
+    """
+    global _processing_scheduler
+
+    with _processing_scheduler_lock:
+        if _processing_scheduler is None:
+            _processing_scheduler = ProcessingScheduler()
+
+        return _processing_scheduler
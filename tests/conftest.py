@@ -0,0 +1,33 @@
+"""
+Shared test fixtures
+
+Processing code writes caches, statistics, task history and lock files
+under the configured data directory. Every test gets its own temporary
+data directory so none of that lands in the repository.
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+import header_cache
+import forward_index
+from services import stats_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    """Point the data directory, and the stores created under it, at tmp_path"""
+    data_dir = tmp_path / "data"
+    monkeypatch.setenv('MAIL_RULEZ_DATA_DIR', str(data_dir))
+    if config._config_instance is not None:
+        monkeypatch.setattr(config._config_instance, 'data_dir', data_dir)
+
+    # Stores opened by an earlier test still point at its directory
+    monkeypatch.setattr(header_cache, '_header_cache', None)
+    monkeypatch.setattr(forward_index, '_forward_index', None)
+    monkeypatch.setattr(stats_store, '_stats_store', None)
+    return data_dir
@@ -0,0 +1,268 @@
+"""
+Unit Tests for the Inbox Backfill Engine
+
+Tests for windowed, resumable backfill: classification and moves, saved
+positions, UIDVALIDITY resets, pacing and progress reporting.
+"""
+
+import re
+import time
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.backfill import InboxBackfill
+from services.email_processor import EmailProcessor, ServiceState
+from services.worker_pool import ProcessingScheduler
+from config import AccountConfig
+from rules import ActionType
+
+
+class FakeMailbox:
+    """Mailbox over a shared {uid: sender} inbox; every login shares the same messages"""
+
+    def __init__(self, server):
+        self.server = server
+        self.folder = Mock()
+        self.folder.status.side_effect = lambda folder, items: {
+            'UIDVALIDITY': server.uidvalidity, 'UIDNEXT': max(server.inbox, default=0) + 1}
+
+    def uids(self, criteria):
+        return [str(uid) for uid in sorted(self.server.inbox)]
+
+    def fetch(self, criteria, **kwargs):
+        requested = [int(uid) for uid in re.findall(r'\d+', str(criteria))]
+        return [Mock(uid=str(uid), subject="Hello", from_=self.server.inbox[uid], date_str="", date=None)
+                for uid in requested if uid in self.server.inbox]
+
+    def move(self, uids, folder):
+        for uid in uids:
+            self.server.inbox.pop(int(uid))
+            self.server.moves.append((int(uid), folder))
+
+    def logout(self):
+        pass
+
+
+@pytest.fixture
+def server():
+    senders = ["friend@example.com", "spam@example.com", "shop@example.com", "new@example.com"]
+    return Mock(uidvalidity=1, inbox={uid: senders[uid % 4] for uid in range(1, 11)}, moves=[])
+
+
+@pytest.fixture
+def account(server):
+    account = MagicMock(email="me@example.com")
+    account.login.side_effect = lambda: FakeMailbox(server)
+    return account
+
+
+@pytest.fixture(autouse=True)
+def lists():
+    contents = {'white': ["friend@example.com"], 'black': ["spam@example.com"], 'vendor': ["shop@example.com"]}
+    with patch('services.backfill.pf.open_read', side_effect=contents.__getitem__), \
+            patch('services.backfill.pf.is_gmail_account', return_value=False), \
+            patch('services.backfill.record_headers'):
+        yield
+
+
+class TestInboxBackfill:
+    """Test the windowed backfill"""
+
+    def test_walks_inbox_oldest_first_and_classifies(self, account, server, tmp_path):
+        """Every message is moved once, in UID order, to its list's folder"""
+        # Arrange
+        backfill = InboxBackfill(account, tmp_path, window_size=3, target_rate=0)
+
+        # Act
+        done = backfill.run()
+
+        # Assert
+        assert done
+        moved = [uid for uid, _ in server.moves]
+        assert [sorted(moved[start:start + 3]) for start in (0, 3, 6)] == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+        assert len(server.moves) == 10 and not server.inbox
+        assert (4, 'INBOX.Processed') in server.moves and (1, 'INBOX.Junk') in server.moves
+        progress = backfill.get_progress()
+        assert progress['status'] == 'completed' and progress['percent'] == 100.0
+        assert progress['categories'] == {'processed': 2, 'junk': 3, 'approved_ads': 3, 'pending': 2}
+
+    def test_resumes_from_saved_position(self, account, server, tmp_path):
+        """A slice that runs out of time leaves a position a new instance continues from"""
+        # Arrange
+        first = InboxBackfill(account, tmp_path, window_size=4, target_rate=0)
+
+        # Act
+        done = first.run(max_seconds=1e-9)
+        resumed = InboxBackfill(account, tmp_path, window_size=4, target_rate=0)
+        position = resumed.state.next_uid
+        resumed.run()
+
+        # Assert
+        assert not done
+        assert position == 5
+        assert resumed.interrupted
+        assert resumed.state.status == 'completed'
+        assert resumed.state.processed == 10
+        assert len(server.moves) == 10
+
+    def test_stop_before_run_is_kept(self, account, server, tmp_path):
+        """A stop that arrives between slices pauses the next run until resume()"""
+        # Arrange
+        backfill = InboxBackfill(account, tmp_path, window_size=4, target_rate=0)
+        backfill.stop()
+
+        # Act
+        stopped = backfill.run()
+        processed_while_stopped = backfill.state.processed
+        backfill.resume()
+        done = backfill.run()
+
+        # Assert
+        assert not stopped and processed_while_stopped == 0
+        assert done and backfill.state.processed == 10
+
+    def test_uidvalidity_change_restarts(self, account, server, tmp_path):
+        """A new UIDVALIDITY invalidates the saved position"""
+        # Arrange
+        backfill = InboxBackfill(account, tmp_path, window_size=4, target_rate=0)
+        backfill.run(max_seconds=1e-9)
+        server.uidvalidity = 2
+        server.inbox = {1: "new@example.com", 2: "new@example.com"}
+
+        # Act
+        backfill.run()
+
+        # Assert
+        assert (1, 'INBOX.Pending') in server.moves
+        assert backfill.state.uidvalidity == 2 and backfill.state.next_uid == 3
+
+    def test_rule_moves_skip_list_classification(self, account, server, tmp_path):
+        """Messages a rule moved are not moved again by sender list"""
+        # Arrange
+        rule = Mock(active=True, conditions=[Mock()])
+        move = Mock(type=ActionType.MOVE_TO_FOLDER)
+        backfill = InboxBackfill(account, tmp_path, window_size=10, target_rate=0)
+
+        def apply_rules(mailbox, account, rule_list, mail_list):
+            mailbox.move(['4'], 'INBOX.Rules')
+            return {}, {'4': [(rule, move)]}
+
+        # Act
+        with patch('rules_parallel.apply_rules', side_effect=apply_rules):
+            backfill.run([rule])
+
+        # Assert
+        assert [folder for uid, folder in server.moves if uid == 4] == ['INBOX.Rules']
+        assert backfill.state.categories['rules'] == 1
+
+    def test_paced_to_target_rate(self, account, tmp_path):
+        """Throughput stays at or below the target"""
+        # Arrange
+        backfill = InboxBackfill(account, tmp_path, window_size=5, target_rate=200)
+
+        # Act
+        started = time.monotonic()
+        backfill.run()
+        elapsed = time.monotonic() - started
+
+        # Assert
+        assert elapsed >= 10 / 200
+        assert backfill.get_progress()['messages_per_second'] <= 200 * 1.2
+
+
+class TestProcessorBackfill:
+    """Test backfill slices on the account's lane"""
+
+    @patch('services.email_processor.r.get_active_rule_set', return_value=[])
+    def test_backfill_runs_in_slices_to_completion(self, mock_rule_set, account, server, tmp_path):
+        """Each slice re-queues itself until the inbox is done"""
+        # Arrange
+        scheduler = ProcessingScheduler(max_workers=1)
+        with patch('services.email_processor.get_config') as mock_config, \
+                patch('services.backfill._get_scheduler_setting', side_effect=lambda key, default: default):
+            mock_config.return_value.data_dir = tmp_path
+            processor = EmailProcessor(AccountConfig(name="a", server="imap.example.com",
+                                                     email="me@example.com", password="x"), scheduler=scheduler)
+        processor.account = account
+        processor.state = ServiceState.RUNNING_STARTUP
+        processor._get_backfill().window_size = 3
+        processor._get_backfill().target_rate = 0
+
+        # Act
+        with patch('services.email_processor._get_scheduler_setting', side_effect=lambda key, default:
+                   1e-9 if key == 'backfill_slice_seconds' else default):
+            processor.start_backfill()
+            deadline = time.monotonic() + 5
+            while processor._backfill_running and time.monotonic() < deadline:
+                time.sleep(0.01)
+        scheduler.shutdown(wait=True)
+
+        # Assert
+        progress = processor.get_backfill_progress()
+        assert progress['status'] == 'completed' and not progress['active']
+        assert processor.stats.emails_processed == 10
+        assert scheduler.pool.get_status()['lanes']['me@example.com']['runs'] == 4
+
+    @patch('services.email_processor.r.get_active_rule_set', return_value=MagicMock(version=1))
+    def test_rule_backfill_runs_as_lane_job(self, mock_rule_set, account, tmp_path):
+        """The rule backfill returns at once and reports progress until done"""
+        # Arrange
+        scheduler = ProcessingScheduler(max_workers=1)
+        with patch('services.email_processor.get_config') as mock_config:
+            mock_config.return_value.data_dir = tmp_path
+            processor = EmailProcessor(AccountConfig(name="a", server="imap.example.com",
+                                                     email="me@example.com", password="x"), scheduler=scheduler)
+        processor.account = account
+        processor.state = ServiceState.RUNNING_MAINTENANCE
+        stages = []
+
+        def fake_backfill(account, rule_list, limit=None, workers=None, progress=None):
+            progress('fetching', 0)
+            progress('applying', 10)
+            stages.append(processor.get_rule_backfill_progress()['stage'])
+            return {'messages': 10, 'messages_matched': 4}
+
+        # Act
+        with patch('rules_parallel.backfill', side_effect=fake_backfill):
+            started = processor.start_rule_backfill(workers=2)
+            deadline = time.monotonic() + 5
+            while processor.get_rule_backfill_progress()['status'] == 'running' and time.monotonic() < deadline:
+                time.sleep(0.01)
+        scheduler.shutdown(wait=True)
+
+        # Assert
+        progress = processor.get_rule_backfill_progress()
+        assert started['status'] == 'running' and started['workers'] == 2
+        assert stages == ['applying']
+        assert progress['status'] == 'completed' and progress['messages'] == 10
+        assert progress['summary']['messages_matched'] == 4
+        assert processor.stats.emails_processed == 10
+
+    @patch('services.email_processor.r.get_active_rule_set', return_value=[])
+    def test_interrupted_backfill_resumes_on_start(self, mock_rule_set, account, server, tmp_path):
+        """A backfill saved as running is queued again when startup mode starts"""
+        # Arrange
+        InboxBackfill(account, tmp_path / "backfill", window_size=3, target_rate=0).run(max_seconds=1e-9)
+        scheduler = ProcessingScheduler(max_workers=1)
+        with patch('services.email_processor.get_config') as mock_config:
+            mock_config.return_value.data_dir = tmp_path
+            processor = EmailProcessor(AccountConfig(name="a", server="imap.example.com",
+                                                     email="me@example.com", password="x"), scheduler=scheduler)
+        processor.account = account
+        processor.state = ServiceState.RUNNING_STARTUP
+
+        # Act
+        with patch('services.backfill._get_scheduler_setting', side_effect=lambda key, default: default):
+            processor._resume_interrupted_backfill()
+            deadline = time.monotonic() + 5
+            while processor._backfill_running and time.monotonic() < deadline:
+                time.sleep(0.01)
+        scheduler.shutdown(wait=True)
+
+        # Assert
+        assert processor.get_backfill_progress()['status'] == 'completed'
+        assert len(server.moves) == 10
@@ -0,0 +1,143 @@
+"""
+Unit Tests for the Forward Index
+
+Tests for the persistent Message-ID index, UID checkpoints and incremental
+forward scanning.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import functions as pf
+from forward_index import ForwardIndex
+from services.smtp_sender import SmtpSender
+
+
+def make_message(uid, sender, message_id="", subject="Report"):
+    """MailMessage-like object"""
+    return Mock(uid=str(uid), from_=sender, subject=subject, to=("me@example.com",), html="<p>hi</p>",
+                date=None, date_str="Mon, 1 Jan 2024", headers={'message-id': (message_id,)} if message_id else {})
+
+
+class TestForwardIndex:
+    """Test Message-ID membership and checkpoints"""
+
+    def test_membership_persists_across_instances(self, tmp_path):
+        """Forwarded Message-IDs survive a restart"""
+        # Arrange
+        index = ForwardIndex(tmp_path)
+        index.add("me@example.com", "<abc@example.com>")
+        index.close()
+
+        # Act
+        reopened = ForwardIndex(tmp_path)
+
+        # Assert
+        assert reopened.contains("me@example.com", "<ABC@example.com> ")
+        assert not reopened.contains("me@example.com", "<other@example.com>")
+        assert not reopened.contains("other@example.com", "<abc@example.com>")
+
+    def test_checkpoint_reset_on_uidvalidity_change(self, tmp_path):
+        """A new UIDVALIDITY invalidates the stored checkpoint"""
+        # Arrange
+        index = ForwardIndex(tmp_path)
+        index.set_checkpoint("me@example.com", "INBOX", 7, 120)
+
+        # Act & Assert
+        assert index.get_checkpoint("me@example.com", "INBOX", 7) == 120
+        assert index.get_checkpoint("me@example.com", "INBOX", 8) == 0
+        assert index.get_checkpoint("me@example.com", "Archive", 7) == 0
+
+
+class TestIncrementalForward:
+    """Test that forward only fetches and sends new messages"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = ForwardIndex(tmp_path)
+        with patch('forward_index.get_forward_index', return_value=index):
+            yield index
+
+    @patch('services.smtp_sender.get_smtp_sender')
+    def test_forward_uses_checkpoint_and_dedupes(self, mock_get_sender, index, monkeypatch):
+        """Second run starts after the checkpoint and skips non-matching senders"""
+        # Arrange
+        monkeypatch.setenv("account_email", "me@example.com")
+        mailbox = Mock()
+        mailbox.folder.status.return_value = {'UIDVALIDITY': 1, 'UIDNEXT': 4}
+        headers = [make_message(2, "boss@example.com", "<m2@x>"), make_message(3, "bossy@example.com", "<m3@x>")]
+        mailbox.fetch.side_effect = [headers, [headers[0]]]
+        account = Mock()
+        account.login.return_value = mailbox
+        sender = mock_get_sender.return_value
+        sender.is_pending.return_value = False
+        sender.enqueue.side_effect = lambda *args, on_delivered=None, **kwargs: on_delivered() or True
+
+        # Act
+        first = pf.forward(account, ["boss@example.com"], "fwd@example.com")
+        first_checkpoint = index.get_checkpoint("me@example.com", "INBOX", 1)
+        mailbox.folder.status.return_value = {'UIDVALIDITY': 1, 'UIDNEXT': 5}
+        mailbox.fetch.side_effect = [[headers[0], make_message(3, "bossy@example.com", "<m3@x>")]]
+        second = pf.forward(account, ["boss@example.com"], "fwd@example.com")
+
+        # Assert
+        assert (first, second) == (1, 0)
+        assert sender.enqueue.call_count == 1
+        criteria = [str(c.args[0]) for c in mailbox.fetch.call_args_list]
+        assert criteria[0] == '((FROM "boss@example.com") UID 1:*)'
+        assert criteria[2] == '((FROM "boss@example.com") UID 2:*)'
+        assert index.contains("me@example.com", "<m2@x>")
+        assert not index.contains("me@example.com", "<m3@x>")
+        assert first_checkpoint == 1  # UID 2 was only queued when the scan finished
+        assert index.get_checkpoint("me@example.com", "INBOX", 1) == 4
+
+    @patch('services.smtp_sender.get_smtp_sender')
+    def test_known_message_id_not_refetched(self, mock_get_sender, index, monkeypatch):
+        """Messages already in the index are not fetched in full"""
+        # Arrange
+        monkeypatch.setenv("account_email", "me@example.com")
+        index.add("me@example.com", "<m2@x>")
+        mailbox = Mock()
+        mailbox.folder.status.return_value = {'UIDVALIDITY': 1, 'UIDNEXT': 3}
+        mailbox.fetch.return_value = [make_message(2, "boss@example.com", "<m2@x>")]
+        account = Mock()
+        account.login.return_value = mailbox
+
+        # Act
+        forwarded = pf.forward(account, ["boss@example.com"], "fwd@example.com")
+
+        # Assert
+        assert forwarded == 0
+        mailbox.fetch.assert_called_once()
+        assert index.get_checkpoint("me@example.com", "INBOX", 1) == 2
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    @patch('services.smtp_sender.get_smtp_sender')
+    def test_messages_dropped_on_stop_are_forwarded_again(self, mock_get_sender, mock_smtp, index, monkeypatch):
+        """Stopping the sender with messages still queued leaves them unindexed and above the checkpoint"""
+        # Arrange
+        monkeypatch.setenv("account_email", "me@example.com")
+        mock_smtp.return_value.sendmail.side_effect = OSError("network down")
+        sender = SmtpSender("me@example.com", "secret", "smtp.example.com", retry_base=60)
+        mock_get_sender.return_value = sender
+        mailbox = Mock()
+        mailbox.folder.status.return_value = {'UIDVALIDITY': 1, 'UIDNEXT': 3}
+        message = make_message(2, "boss@example.com", "<m2@x>")
+        mailbox.fetch.side_effect = [[message], [message], [message], [message]]
+        account = Mock()
+        account.login.return_value = mailbox
+
+        # Act
+        first = pf.forward(account, ["boss@example.com"], "fwd@example.com")
+        sender.stop(timeout=1)
+        second = pf.forward(account, ["boss@example.com"], "fwd@example.com")
+
+        # Assert
+        assert (first, second) == (1, 1)
+        assert not index.contains("me@example.com", "<m2@x>")
+        assert index.get_checkpoint("me@example.com", "INBOX", 1) == 1
+        assert sender.stats['sent'] == 0
@@ -50,6 +50,83 @@ class TestAccount:
         mock_mailbox.return_value.login.assert_called_once_with("test@example.com", "password123")
         assert result == mock_mb
 
+    @patch('functions.MailBox')
+    def test_session_reuses_connection(self, mock_mailbox):
+        mock_mb = Mock()
+        mock_mailbox.return_value.login.return_value = mock_mb
+        account = Account("imap.example.com", "test@example.com", "password123")
+
+        with account.session():
+            first = account.login()
+            first.logout()
+        with account.session():
+            account.login().folder.set("INBOX")
+
+        mock_mailbox.return_value.login.assert_called_once()
+        mock_mb.logout.assert_not_called()
+        mock_mb.client.noop.assert_called_once()
+        mock_mb.folder.set.assert_called_once_with("INBOX")
+
+        account.close_session()
+        mock_mb.logout.assert_called_once()
+
+    @patch('functions.MailBox')
+    def test_close_session_from_owning_thread_is_deferred(self, mock_mailbox):
+        mock_mb = Mock()
+        mock_mailbox.return_value.login.return_value = mock_mb
+        account = Account("imap.example.com", "test@example.com", "password123")
+
+        with account.session():
+            account.login()
+            account.close_session()
+            mock_mb.logout.assert_not_called()
+            account.login().folder.set("INBOX")
+
+        mock_mb.logout.assert_called_once()
+        mock_mb.folder.set.assert_called_once_with("INBOX")
+
+    @patch('functions.MailBox')
+    def test_session_reconnects_stale_connection(self, mock_mailbox):
+        stale, fresh = Mock(), Mock()
+        stale.client.noop.side_effect = OSError("connection reset")
+        mock_mailbox.return_value.login.side_effect = [stale, fresh]
+        account = Account("imap.example.com", "test@example.com", "password123")
+
+        with account.session():
+            account.login()
+        with account.session():
+            account.login().fetch()
+
+        fresh.fetch.assert_called_once()
+        assert mock_mailbox.return_value.login.call_count == 2
+
+    @patch('functions.MailBox')
+    def test_login_outside_session_not_pooled(self, mock_mailbox):
+        account = Account("imap.example.com", "test@example.com", "password123")
+
+        with account.session():
+            account.login()
+        account.login()
+
+        assert mock_mailbox.return_value.login.call_count == 2
+
+    @patch('functions.MailBox')
+    def test_login_instruments_imap_commands(self, mock_mailbox):
+        from metrics import get_metric_registry
+        registry = get_metric_registry()
+        logins = registry.value('mail_rulez_imap_logins_total', result='success')
+        client = mock_mailbox.return_value.client
+        client._simple_command.side_effect = [('OK', []), OSError("connection reset")]
+
+        Account("imap.example.com", "test@example.com", "password123").login()
+        client._simple_command('UID', 'fetch', '1:*', '(FLAGS)')
+        with pytest.raises(OSError):
+            client._simple_command('NOOP')
+
+        assert registry.value('mail_rulez_imap_logins_total', result='success') == logins + 1
+        assert 'mail_rulez_imap_command_seconds_count{verb="UID FETCH"}' in registry.render()
+        assert registry.value('mail_rulez_imap_command_errors_total', verb='NOOP') >= 1
+
 
 class TestFetchClass:
     @patch('functions.Mail')
@@ -0,0 +1,102 @@
+"""
+Unit Tests for Header Cache
+
+Tests for the bounded per-account header corpus used for rule backtesting.
+"""
+
+import pytest
+from datetime import date
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from header_cache import HeaderCache
+from functions import Mail
+
+
+def make_mail(uid, sender="a@example.com", subject="Hello"):
+    """Build a Mail object as returned by fetch_class"""
+    return Mail(str(uid), subject, sender, "", date(2024, 1, 1), size=100)
+
+
+class TestHeaderCache:
+    """Test HeaderCache class"""
+
+    def test_record_and_get(self, tmp_path):
+        """Recorded headers are returned oldest first"""
+        # Arrange
+        cache = HeaderCache(tmp_path)
+
+        # Act
+        added = cache.record("user@example.com", [make_mail(1), make_mail(2, subject="Bye")])
+        headers = cache.get_headers("user@example.com")
+
+        # Assert
+        assert added == 2
+        assert [h['uid'] for h in headers] == ["1", "2"]
+        assert headers[1]['subject'] == "Bye"
+        assert headers[0]['date'] == "2024-01-01"
+        assert headers[0]['folder'] == "INBOX"
+
+    def test_duplicates_are_ignored(self, tmp_path):
+        """Messages seen again on a later cycle are stored once"""
+        # Arrange
+        cache = HeaderCache(tmp_path)
+        cache.record("user@example.com", [make_mail(1), make_mail(2)])
+
+        # Act
+        added = cache.record("user@example.com", [make_mail(2), make_mail(3)])
+
+        # Assert
+        assert added == 1
+        assert cache.count("user@example.com") == 3
+
+    def test_bounded_and_compacted(self, tmp_path):
+        """Oldest headers are dropped and the file is compacted"""
+        # Arrange
+        cache = HeaderCache(tmp_path, max_entries=5)
+
+        # Act
+        for uid in range(12):
+            cache.record("user@example.com", [make_mail(uid)])
+
+        # Assert
+        headers = cache.get_headers("user@example.com")
+        assert [h['uid'] for h in headers] == ["7", "8", "9", "10", "11"]
+        path = tmp_path / "user@example.com.jsonl"
+        assert len(path.read_text().splitlines()) <= 10
+
+    def test_other_instance_sees_appended_headers(self, tmp_path):
+        """Readers in another process pick up headers appended by processing"""
+        # Arrange
+        writer = HeaderCache(tmp_path)
+        reader = HeaderCache(tmp_path)
+        writer.record("user@example.com", [make_mail(1)])
+        assert reader.count("user@example.com") == 1
+
+        # Act
+        writer.record("user@example.com", [make_mail(2)])
+
+        # Assert
+        assert [h['uid'] for h in reader.get_headers("user@example.com")] == ["1", "2"]
+
+    def test_get_headers_limit(self, tmp_path):
+        """Limit returns the most recent headers"""
+        # Arrange
+        cache = HeaderCache(tmp_path)
+        cache.record("user@example.com", [make_mail(uid) for uid in range(10)])
+
+        # Act
+        headers = cache.get_headers("user@example.com", limit=3)
+
+        # Assert
+        assert [h['uid'] for h in headers] == ["7", "8", "9"]
+
+    def test_unknown_account_is_empty(self, tmp_path):
+        """Accounts without cached headers return an empty corpus"""
+        # Arrange
+        cache = HeaderCache(tmp_path)
+
+        # Act & Assert
+        assert cache.get_headers("nobody@example.com") == []
@@ -0,0 +1,132 @@
+"""
+Unit Tests for Leader Election
+
+Tests for the leader lease, the control socket proxy used by non-leader
+workers, and follower takeover.
+"""
+
+import os
+import threading
+import pytest
+from unittest.mock import Mock
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.leader import LeaderLease, LeaderElection, ControlServer, ControlClient, TaskManagerProxy
+from services.email_processor import ProcessingMode
+
+
+class TestLeaderLease:
+    """Test the exclusive lease file"""
+
+    def test_only_one_holder(self, tmp_path):
+        """A second holder is refused until the first releases"""
+        # Arrange
+        first, second = LeaderLease(tmp_path / "leader.lock"), LeaderLease(tmp_path / "leader.lock")
+
+        # Act & Assert
+        assert first.try_acquire()
+        assert not second.try_acquire()
+        assert second.holder_pid() == os.getpid()
+        first.release()
+        assert second.try_acquire()
+        second.release()
+
+    def test_follower_takes_over(self, tmp_path):
+        """A watching follower becomes leader once the lease is free"""
+        # Arrange
+        leader = LeaderElection(tmp_path / "leader.lock", tmp_path / "control.sock")
+        follower = LeaderElection(tmp_path / "leader.lock", tmp_path / "control.sock", retry_interval=0.01)
+        elected = threading.Event()
+        assert leader.try_acquire()
+
+        # Act
+        follower.watch(elected.set)
+        assert not elected.wait(0.05)
+        leader.release()
+
+        # Assert
+        assert elected.wait(5)
+        assert follower.is_leader
+        follower.release()
+
+
+class TestControlProxy:
+    """Test forwarding calls from a follower to the leader"""
+
+    @pytest.fixture
+    def task_manager(self):
+        manager = Mock()
+        manager.get_all_status.return_value = {'total_accounts': 1}
+        processor = Mock()
+        processor.run_manual_batch.return_value = {'emails_processed': 3}
+        processor.start_backfill.side_effect = ValueError("Inbox backfill only available in startup mode")
+        manager._get_processor.side_effect = lambda email: processor if email == "me@example.com" else None
+        return manager
+
+    @pytest.fixture
+    def proxy(self, task_manager, tmp_path):
+        server = ControlServer(tmp_path / "control.sock", task_manager)
+        server.start()
+        yield TaskManagerProxy(ControlClient(tmp_path / "control.sock", timeout=5))
+        server.stop()
+
+    def test_status_and_control_calls_forwarded(self, proxy, task_manager):
+        """Calls run in the leader, with enum arguments restored"""
+        # Act
+        status = proxy.get_all_status()
+        proxy.switch_mode("me@example.com", ProcessingMode.MAINTENANCE)
+
+        # Assert
+        assert status == {'total_accounts': 1}
+        task_manager.switch_mode.assert_called_once_with("me@example.com", ProcessingMode.MAINTENANCE)
+
+    def test_rule_stats_read_from_leader(self, proxy, task_manager):
+        """Rule counters and condition order come from the processing process"""
+        # Arrange
+        task_manager.get_rule_stats.return_value = {'rules': {'r1': {'evaluations': 4}}, 'condition_types': {}}
+        task_manager.get_evaluation_orders.return_value = {'r1': [{'type': 'sender_domain'}]}
+
+        # Act
+        stats = proxy.get_rule_stats()
+        orders = proxy.get_evaluation_orders()
+
+        # Assert
+        assert stats['rules']['r1']['evaluations'] == 4
+        assert orders == {'r1': [{'type': 'sender_domain'}]}
+
+    def test_processor_calls_forwarded(self, proxy):
+        """Processor methods run on the leader's processor"""
+        # Act
+        processor = proxy._get_processor("me@example.com")
+
+        # Assert
+        assert proxy._get_processor("other@example.com") is None
+        assert processor.run_manual_batch() == {'emails_processed': 3}
+        with pytest.raises(ValueError, match="startup mode"):
+            processor.start_backfill(reset=False)
+
+    def test_batch_timeout_reraised_on_follower(self, proxy, task_manager):
+        """A manual batch that outlasts its timeout raises TimeoutError in the follower"""
+        # Arrange
+        task_manager._get_processor("me@example.com").run_manual_batch.side_effect = TimeoutError()
+
+        # Act & Assert
+        with pytest.raises(TimeoutError):
+            proxy._get_processor("me@example.com").run_manual_batch(timeout=1)
+
+    def test_unlisted_methods_not_forwarded(self, proxy):
+        """Only control and status methods are exposed"""
+        # Act & Assert
+        with pytest.raises(AttributeError):
+            proxy.load_accounts_from_config()
+
+    def test_missing_leader_raises_connection_error(self, tmp_path):
+        """Followers report an unreachable leader clearly"""
+        # Arrange
+        proxy = TaskManagerProxy(ControlClient(tmp_path / "missing.sock", timeout=1))
+
+        # Act & Assert
+        with pytest.raises(ConnectionError):
+            proxy.get_all_status()
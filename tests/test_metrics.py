@@ -0,0 +1,240 @@
+"""
+Unit Tests for Metrics Module
+
+Tests for LatencyHistogram, RuleMetrics, StageLatency and MetricRegistry.
+"""
+
+import pytest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from metrics import LatencyHistogram, RuleMetrics, StageLatency, MetricRegistry, get_rule_metrics
+
+
+class TestLatencyHistogram:
+    """Test LatencyHistogram class"""
+
+    def test_empty_histogram(self):
+        """Empty histogram reports zeros"""
+        # Arrange
+        histogram = LatencyHistogram()
+
+        # Act & Assert
+        assert histogram.percentile(0.5) == 0
+        assert histogram.mean() == 0.0
+        assert histogram.summary()['count'] == 0
+
+    def test_small_values_are_exact(self):
+        """Values below 16 are counted exactly"""
+        # Arrange
+        histogram = LatencyHistogram()
+
+        # Act
+        for value in range(10):
+            histogram.record(value)
+
+        # Assert
+        assert histogram.percentile(0.5) == 4
+        assert histogram.percentile(1.0) == 9
+        assert histogram.min == 0
+
+    def test_percentiles_within_bucket_precision(self):
+        """Percentiles are within 12.5% of the exact value"""
+        # Arrange
+        rng = random.Random(42)
+        values = [int(rng.lognormvariate(10, 2)) for _ in range(5000)]
+        histogram = LatencyHistogram()
+
+        # Act
+        for value in values:
+            histogram.record(value)
+
+        # Assert
+        ordered = sorted(values)
+        for quantile in (0.5, 0.9, 0.99):
+            exact = ordered[int(quantile * len(ordered) + 0.999999) - 1]
+            assert exact <= histogram.percentile(quantile) <= exact * 1.125 + 1
+        assert histogram.percentile(1.0) == max(values)
+        assert histogram.count == len(values)
+
+    def test_merge(self):
+        """Merged histogram equals one built from both inputs"""
+        # Arrange
+        first, second, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(0, 1000, 7):
+            first.record(value)
+            combined.record(value)
+        for value in range(5000, 9000, 13):
+            second.record(value)
+            combined.record(value)
+
+        # Act
+        first.merge(second)
+
+        # Assert
+        assert first.counts == combined.counts
+        assert first.total == combined.total
+        assert first.max == combined.max
+        assert first.min == combined.min
+
+
+class TestRuleMetrics:
+    """Test RuleMetrics class"""
+
+    def test_record_evaluations_and_actions(self):
+        """Rule counters accumulate evaluations, matches and action outcomes"""
+        # Arrange
+        metrics = RuleMetrics()
+
+        # Act
+        metrics.record_evaluations("r1", "Receipts", evaluated=100, matched=4, elapsed_ns=2_000_000)
+        metrics.record_action("r1", True)
+        metrics.record_action("r1", False)
+
+        # Assert
+        stats = metrics.get_rule_stats("r1")
+        assert stats['name'] == "Receipts"
+        assert stats['evaluations'] == 100
+        assert stats['matches'] == 4
+        assert stats['match_rate'] == 0.04
+        assert stats['actions_executed'] == 1
+        assert stats['action_failures'] == 1
+        assert stats['eval_time_ms'] == 2.0
+        assert stats['last_match'] is not None
+
+    def test_condition_stats(self):
+        """Condition timings are summarized per condition type in microseconds"""
+        # Arrange
+        metrics = RuleMetrics()
+
+        # Act
+        for _ in range(10):
+            metrics.record_condition_time("subject_regex", 5000)
+
+        # Assert
+        stats = metrics.get_condition_stats()
+        assert stats['subject_regex']['count'] == 10
+        assert stats['subject_regex']['p50'] == pytest.approx(5.0, rel=0.125)
+
+    def test_unknown_rule(self):
+        """Unknown rules report None"""
+        # Act & Assert
+        assert RuleMetrics().get_rule_stats("missing") is None
+
+    def test_get_rule_metrics_singleton(self):
+        """get_rule_metrics returns singleton"""
+        # Act & Assert
+        assert get_rule_metrics() is get_rule_metrics()
+
+
+class TestStageLatency:
+    """Test StageLatency class"""
+
+    def test_per_account_stage_percentiles(self):
+        """Each account and stage keeps its own distribution, reported in milliseconds"""
+        # Arrange
+        latency = StageLatency()
+
+        # Act
+        for _ in range(99):
+            latency.record("a@example.com", 'fetch', 0.010)
+        latency.record("a@example.com", 'fetch', 2.0)
+        latency.record("b@example.com", 'move', 0.050)
+
+        # Assert
+        fetch = latency.summary("a@example.com")['fetch']
+        assert fetch['count'] == 100
+        assert fetch['p50'] == pytest.approx(10.0, rel=0.125)
+        assert fetch['max'] == pytest.approx(2000.0)
+        assert latency.summary("a@example.com")['move']['count'] == 0
+
+    def test_merged_across_accounts(self):
+        """Merging keeps the tail of every account"""
+        # Arrange
+        latency = StageLatency()
+        for _ in range(50):
+            latency.record("a@example.com", 'cycle', 1.0)
+        latency.record("b@example.com", 'cycle', 30.0)
+
+        # Act
+        merged = latency.merged(["a@example.com", "b@example.com", "missing@example.com"])
+
+        # Assert
+        assert merged['cycle'].count == 51
+        assert merged['cycle'].max == 30_000_000
+        assert latency.mean_seconds("a@example.com") == pytest.approx(1.0)
+
+    def test_time_context_manager(self):
+        """Timed blocks are recorded even when they raise"""
+        # Arrange
+        latency = StageLatency()
+
+        # Act
+        with pytest.raises(ValueError):
+            with latency.time("a@example.com", 'login'):
+                raise ValueError("auth failed")
+
+        # Assert
+        assert latency.summary("a@example.com")['login']['count'] == 1
+
+
+class TestMetricRegistry:
+    """Test MetricRegistry class"""
+
+    def test_counters_and_gauges_rendered(self):
+        """Counters accumulate, gauges overwrite, both rendered with HELP and TYPE"""
+        # Arrange
+        registry = MetricRegistry()
+
+        # Act
+        registry.inc('mail_rulez_messages_classified_total', 3, disposition="junk")
+        registry.inc('mail_rulez_messages_classified_total', 2, disposition="junk")
+        registry.set('mail_rulez_scheduler_queue_depth', 7, pool="worker", priority="background")
+        registry.set('mail_rulez_scheduler_queue_depth', 4, pool="worker", priority="background")
+        text = registry.render()
+
+        # Assert
+        assert '# TYPE mail_rulez_messages_classified_total counter' in text
+        assert 'mail_rulez_messages_classified_total{disposition="junk"} 5' in text
+        assert 'mail_rulez_scheduler_queue_depth{pool="worker",priority="background"} 4' in text
+        assert text.endswith("\n")
+
+    def test_summary_rendered_in_seconds(self):
+        """Summaries report quantiles, sum and count"""
+        # Arrange
+        registry = MetricRegistry()
+
+        # Act
+        for _ in range(10):
+            registry.observe('mail_rulez_imap_command_seconds', 0.25, verb="SELECT")
+        lines = registry.render().splitlines()
+
+        # Assert
+        assert '# TYPE mail_rulez_imap_command_seconds summary' in lines
+        quantile = next(line for line in lines if 'quantile="0.5"' in line)
+        assert float(quantile.split()[-1]) == pytest.approx(0.25, rel=0.125)
+        assert 'mail_rulez_imap_command_seconds_count{verb="SELECT"} 10' in lines
+        assert 'mail_rulez_imap_command_seconds_sum{verb="SELECT"} 2.500000' in lines
+
+    def test_label_values_escaped(self):
+        """Quotes, backslashes and newlines in labels are escaped"""
+        # Arrange
+        registry = MetricRegistry()
+
+        # Act
+        registry.inc('mail_rulez_list_cache_hits_total', list='C:\\lists\n"white"')
+
+        # Assert
+        assert 'list="C:\\\\lists\\n\\"white\\""' in registry.render()
+
+    def test_collectors_add_samples(self):
+        """Collector samples are rendered alongside the registry's own"""
+        # Arrange
+        registry = MetricRegistry()
+        registry.add_collector(lambda: [('mail_rulez_rule_matches_total', {'rule': "r1"}, 9)])
+
+        # Act & Assert
+        assert 'mail_rulez_rule_matches_total{rule="r1"} 9' in registry.render()
@@ -0,0 +1,182 @@
+"""
+Unit Tests for Regex Guard
+
+Tests for static regex analysis, input truncation and the per-rule regex
+time budget.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+from datetime import date
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import rules as r
+from rules import RuleCondition, RuleAction, EmailRule, ConditionType, ActionType
+from regex_guard import analyze_regex, unsafe_regex_reason, REGEX_MAX_INPUT, MAX_PATTERN_LENGTH
+from metrics import get_rule_metrics
+from functions import Mail
+
+
+def regex_rule(pattern, rule_id="regex-rule"):
+    """Rule with a single subject regex condition"""
+    return EmailRule(
+        id=rule_id,
+        name=rule_id,
+        description="",
+        conditions=[RuleCondition(ConditionType.SUBJECT_REGEX, pattern)],
+        actions=[RuleAction(ActionType.MARK_READ, "")]
+    )
+
+
+class TestAnalyzeRegex:
+    """Test static detection of catastrophic backtracking"""
+
+    @pytest.mark.parametrize('pattern', [r'(a+)+$', r'(\w+\s?)+$', r'(a|aa)+', r'(?:a*)*', r'(.*a){12}'])
+    def test_dangerous_patterns_rejected(self, pattern):
+        """Nested and overlapping repetition is reported"""
+        # Act
+        problems = analyze_regex(pattern)
+
+        # Assert
+        assert len(problems) == 1
+        assert "catastrophic backtracking" in problems[0]
+
+    @pytest.mark.parametrize('pattern', [r'a++', r'(?>a+)+', r'(a|b)+', r'order\s+#\d+', r'(\d{1,3}\.){3}\d+', r'^big'])
+    def test_safe_patterns_accepted(self, pattern):
+        """Ordinary and possessive patterns pass"""
+        # Act & Assert
+        assert analyze_regex(pattern) == []
+
+    def test_invalid_and_long_patterns(self):
+        """Invalid and overlong patterns are reported but not flagged as unsafe"""
+        # Act
+        invalid = analyze_regex(r'(unclosed')
+        too_long = analyze_regex('a' * (MAX_PATTERN_LENGTH + 1))
+
+        # Assert
+        assert invalid[0].startswith("Invalid regex")
+        assert too_long[0].startswith("Regex is longer")
+        assert unsafe_regex_reason(regex_rule(r'(unclosed')) is None
+        assert unsafe_regex_reason(regex_rule(r'(a+)+$')) is not None
+
+
+class TestRegexLimits:
+    """Test input truncation and runtime enforcement"""
+
+    def test_subject_truncated_before_matching(self):
+        """Text past the input limit is never searched"""
+        # Arrange
+        rule = regex_rule(r'needle')
+        email = {'from': 'a@example.com', 'subject': 'x' * REGEX_MAX_INPUT + 'needle'}
+
+        # Act & Assert
+        assert rule.matches(email) is False
+        assert rule.compiled.match_headers(email) is False
+
+    def test_unsafe_rules_skipped_at_load(self, tmp_path):
+        """Rules with dangerous regexes are left out of the active rule set"""
+        # Arrange
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        engine.add_rule(regex_rule(r'(a+)+$', rule_id="unsafe-at-load"))
+        engine.add_rule(regex_rule(r'^big', rule_id="safe-at-load"))
+
+        # Act
+        rule_set = r.get_active_rule_set("", rules_file=tmp_path / "rules.json")
+
+        # Assert
+        assert [rule.id for rule in rule_set] == ["safe-at-load"]
+        assert "catastrophic" in get_rule_metrics().get_rule_stats("unsafe-at-load")['disabled_reason']
+
+    @patch('functions.fetch_class')
+    def test_rule_over_budget_is_disabled(self, mock_fetch_class):
+        """A rule exceeding its time budget is disabled for the pass, not in rules.json"""
+        # Arrange
+        mock_fetch_class.return_value = [
+            Mail(str(i), "big news", "a@example.com", "", date(2024, 1, 1)) for i in range(3)
+        ]
+        mailbox = Mock()
+        account = Mock()
+        account.email = "budget@example.com"
+        account.login.return_value = mailbox
+        rule = regex_rule(r'^big', rule_id="slow-rule")
+
+        # Act
+        with patch.object(r, '_get_rules_setting', side_effect=lambda key, default: -1 if key == 'regex_message_budget_ms' else default), \
+                patch.object(r, 'disable_rule') as mock_disable:
+            processed = r.process_rules(account, [rule])
+
+        # Assert
+        assert processed == {"slow-rule": 0}
+        mock_disable.assert_called_once()
+        assert "time budget" in mock_disable.call_args[0][1]
+        assert mock_disable.call_args.kwargs['persist'] is False
+        mailbox.flag.assert_not_called()
+
+    @patch('functions.fetch_class')
+    def test_list_loading_not_charged_to_budget(self, mock_fetch_class):
+        """Only regex conditions count against the budget; sender lists are loaded up front"""
+        # Arrange
+        import time
+        mock_fetch_class.return_value = [
+            Mail(str(i), "big news", "a@example.com", "", date(2024, 1, 1)) for i in range(3)
+        ]
+        mailbox = Mock()
+        account = Mock()
+        account.email = "budget-lists@example.com"
+        account.login.return_value = mailbox
+        rule = regex_rule(r'^big', rule_id="listed-rule")
+        rule.conditions.insert(0, RuleCondition(ConditionType.SENDER_IN_LIST, "white"))
+        loads = []
+
+        def cold_list(list_name):
+            if not loads:
+                end = time.thread_time_ns() + 30_000_000
+                while time.thread_time_ns() < end:
+                    pass
+            loads.append(list_name)
+            return {"a@example.com"}
+
+        # Act
+        with patch.object(r, '_get_rules_setting', side_effect=lambda key, default: 10 if key == 'regex_message_budget_ms' else default), \
+                patch.object(r, '_load_list_entries', side_effect=cold_list), \
+                patch.object(r, 'disable_rule') as mock_disable:
+            processed = r.process_rules(account, [rule])
+
+        # Assert
+        mock_disable.assert_not_called()
+        assert processed == {"listed-rule": 3}
+        assert loads[0] == "white"
+
+    def test_disable_rule_persists_reason(self, tmp_path):
+        """disable_rule deactivates the stored rule and records the reason"""
+        # Arrange
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        rule = regex_rule(r'^big', rule_id="disabled-rule")
+        engine.add_rule(rule)
+
+        # Act
+        r.disable_rule(rule, "too slow", rules_file=tmp_path / "rules.json")
+
+        # Assert
+        stored = r.RulesEngine(tmp_path / "rules.json").get_rule("disabled-rule")
+        assert stored.active is False
+        assert stored.disabled_reason == "too slow"
+        assert get_rule_metrics().get_rule_stats("disabled-rule")['disabled_reason'] == "too slow"
+
+    def test_disable_rule_without_persist_leaves_file(self, tmp_path):
+        """A budget disable deactivates the rule in memory only"""
+        # Arrange
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        rule = regex_rule(r'^big', rule_id="suspended-rule")
+        engine.add_rule(rule)
+
+        # Act
+        r.disable_rule(rule, "too slow", rules_file=tmp_path / "rules.json", persist=False)
+
+        # Assert
+        assert rule.active is False
+        assert r.RulesEngine(tmp_path / "rules.json").get_rule("suspended-rule").active is True
+        assert get_rule_metrics().get_rule_stats("suspended-rule")['disabled_reason'] == "too slow"
@@ -0,0 +1,734 @@
+"""
+Unit Tests for Rules Engine
+
+Tests for rule conditions, rule evaluation and rule processing against
+a mocked IMAP mailbox.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+from datetime import date
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import rules as r
+from rules import RuleCondition, RuleAction, EmailRule, ConditionType, ActionType
+from functions import Mail, fetch_text_parts
+
+
+def make_rule(conditions, logic="AND", actions=None):
+    """Build a rule with the given conditions"""
+    return EmailRule(
+        id="rule-1",
+        name="Test Rule",
+        description="",
+        conditions=conditions,
+        actions=actions or [RuleAction(type=ActionType.MARK_READ, target="")],
+        condition_logic=logic
+    )
+
+
+class TestTwoPhaseEvaluation:
+    """Test header-first evaluation of rules with content conditions"""
+
+    def test_match_headers_and_rejects_without_content(self):
+        """AND rule is decided False when a header condition fails"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SENDER_DOMAIN, "example.com"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "invoice")
+        ])
+
+        # Act
+        result = rule.match_headers({'from': 'a@other.com', 'subject': ''})
+
+        # Assert
+        assert result is False
+
+    def test_match_headers_and_undecided_needs_content(self):
+        """AND rule stays undecided when headers pass but content is required"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SENDER_DOMAIN, "example.com"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "invoice")
+        ])
+
+        # Act
+        result = rule.match_headers({'from': 'a@example.com', 'subject': ''})
+
+        # Assert
+        assert result is None
+
+    def test_match_headers_or_accepts_without_content(self):
+        """OR rule is decided True when a header condition matches"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SUBJECT_CONTAINS, "receipt"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "invoice")
+        ], logic="OR")
+
+        # Act
+        result = rule.match_headers({'from': 'a@example.com', 'subject': 'Your Receipt'})
+
+        # Assert
+        assert result is True
+
+    def test_match_headers_header_only_rule(self):
+        """Header-only rules are always decided in the first phase"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_EXACT, "a@example.com")])
+
+        # Act & Assert
+        assert rule.match_headers({'from': 'a@example.com'}) is True
+        assert rule.match_headers({'from': 'b@example.com'}) is False
+        assert not rule.needs_content
+
+    @patch('functions.fetch_text_parts')
+    @patch('functions.fetch_class')
+    def test_process_emails_fetches_only_undecided_bodies(self, mock_fetch_class, mock_fetch_text_parts):
+        """Bodies are fetched in one batch, only for messages the headers could not decide"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SENDER_DOMAIN, "example.com"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "invoice")
+        ])
+        mail_list = [
+            Mail("1", "Hello", "a@example.com", "", date(2024, 1, 1), size=5000),
+            Mail("2", "Hello", "b@other.com", "", date(2024, 1, 1), size=8000),
+            Mail("3", "Hello", "c@example.com", "", date(2024, 1, 1), size=3000),
+        ]
+        mock_fetch_class.return_value = mail_list
+        mock_fetch_text_parts.return_value = {"1": "Your invoice is attached", "3": "Nothing here"}
+
+        mock_mailbox = Mock()
+        account = Mock()
+        account.email = "two-phase@example.com"
+        account.login.return_value = mock_mailbox
+
+        # Act
+        processed = rule.process_emails(account, content_max_bytes=1024)
+
+        # Assert
+        assert processed == 1
+        mock_fetch_text_parts.assert_called_once_with(mock_mailbox, ["1", "3"], 1024)
+        mock_mailbox.flag.assert_called_once_with(["1"], ['\\Seen'], True)
+
+        stats = r.get_content_fetch_stats("two-phase@example.com")
+        assert stats['bodies_fetched'] == 2
+        assert stats['bodies_avoided'] == 1
+        assert stats['body_bytes_fetched'] == len("Your invoice is attached") + len("Nothing here")
+        assert stats['body_bytes_avoided'] == 16000 - stats['body_bytes_fetched']
+
+    @patch('functions.fetch_text_parts')
+    @patch('functions.fetch_class')
+    def test_process_emails_header_rule_never_fetches_bodies(self, mock_fetch_class, mock_fetch_text_parts):
+        """Rules without content conditions do not fetch bodies"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        mock_fetch_class.return_value = [Mail("1", "Hi", "a@example.com", "", date(2024, 1, 1))]
+        account = Mock()
+        account.email = "headers@example.com"
+
+        # Act
+        processed = rule.process_emails(account)
+
+        # Assert
+        assert processed == 1
+        mock_fetch_text_parts.assert_not_called()
+
+
+class TestFetchTextParts:
+    """Test batched partial body fetching"""
+
+    def test_fetch_text_parts_parses_uids(self):
+        """Response literals are mapped back to their UIDs"""
+        # Arrange
+        mailbox = Mock()
+        mailbox.client.uid.return_value = ('OK', [
+            (b'1 (UID 10 BODY[1]<0> {5}', b'hello'),
+            b')',
+            (b'2 (BODY[1]<0> {5}', b'world'),
+            b' UID 11)',
+        ])
+
+        # Act
+        texts = fetch_text_parts(mailbox, ["10", "11"], 5)
+
+        # Assert
+        mailbox.client.uid.assert_called_once_with(
+            'FETCH', '10,11',
+            '(BODY.PEEK[HEADER.FIELDS (CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] BODY.PEEK[1.MIME] BODY.PEEK[1]<0.5>)'
+        )
+        assert texts == {"10": "hello", "11": "world"}
+
+    def test_fetch_text_parts_decodes_transfer_encoding(self):
+        """Base64 and quoted-printable parts are decoded using their MIME headers"""
+        # Arrange
+        mailbox = Mock()
+        mailbox.client.uid.return_value = ('OK', [
+            (b'1 (UID 10 BODY[HEADER.FIELDS (CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {51}',
+             b'Content-Type: text/plain\r\nContent-Transfer-Encoding: base64\r\n\r\n'),
+            (b' BODY[1.MIME] {0}', b''),
+            (b' BODY[1]<0> {18}', b'SW52b2ljZSBkdWUgMQ'),
+            b')',
+            (b'2 (UID 11 BODY[HEADER.FIELDS (CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {40}',
+             b'Content-Type: multipart/alternative; boundary="b"\r\n\r\n'),
+            (b' BODY[1.MIME] {90}',
+             b'Content-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'),
+            (b' BODY[1]<0> {13}', b'Caf=C3=A9 bill'),
+            b')',
+        ])
+
+        # Act
+        texts = fetch_text_parts(mailbox, ["10", "11"], 18)
+
+        # Assert
+        assert texts == {"10": "Invoice due ", "11": "Caf\u00e9 bill"}
+
+    def test_fetch_text_parts_falls_back_for_nested_multipart(self):
+        """A first part that is itself multipart is read with a full fetch"""
+        # Arrange
+        mailbox = Mock()
+        mailbox.client.uid.return_value = ('OK', [
+            (b'1 (UID 10 BODY[HEADER.FIELDS (CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {40}',
+             b'Content-Type: multipart/mixed; boundary="a"\r\n\r\n'),
+            (b' BODY[1.MIME] {50}', b'Content-Type: multipart/alternative; boundary="b"\r\n\r\n'),
+            (b' BODY[1]<0> {4}', b'--b\r'),
+            b')',
+        ])
+        mailbox.fetch.return_value = [Mock(uid="10", text="Amount due: 10", html="")]
+
+        # Act
+        texts = fetch_text_parts(mailbox, ["10"], 100)
+
+        # Assert
+        assert texts == {"10": "Amount due: 10"}
+        assert mailbox.fetch.call_args.kwargs['mark_seen'] is False
+
+    def test_fetch_text_parts_empty(self):
+        """No command is sent for an empty UID list"""
+        # Arrange
+        mailbox = Mock()
+
+        # Act
+        texts = fetch_text_parts(mailbox, [], 100)
+
+        # Assert
+        assert texts == {}
+        mailbox.client.uid.assert_not_called()
+
+
+class TestConditionOrdering:
+    """Test cost- and selectivity-aware condition ordering"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_condition_stats(self):
+        """Isolate shared compiled-condition statistics between tests"""
+        r._compiled_conditions.clear()
+        yield
+        r._compiled_conditions.clear()
+
+    def test_cheap_conditions_run_first(self):
+        """Regex conditions are ordered after exact sender checks"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SUBJECT_REGEX, r"order\s+#\d+"),
+            RuleCondition(ConditionType.SENDER_EXACT, "shop@example.com")
+        ])
+
+        # Act
+        order = [entry['type'] for entry in rule.evaluation_order()]
+
+        # Assert
+        assert order == ['sender_exact', 'subject_regex']
+
+    def test_content_conditions_always_last(self):
+        """Content conditions run after every header condition"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "invoice"),
+            RuleCondition(ConditionType.SUBJECT_REGEX, "bill")
+        ], logic="OR")
+
+        # Act
+        order = [entry['type'] for entry in rule.evaluation_order()]
+
+        # Assert
+        assert order == ['subject_regex', 'content_contains']
+
+    def test_retune_uses_selectivity(self):
+        """AND rules move the condition that is most often false to the front"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SUBJECT_CONTAINS, "hello"),
+            RuleCondition(ConditionType.SENDER_CONTAINS, "rare-sender")
+        ])
+        emails = [{'from': 'someone@example.com', 'subject': 'hello there'}] * 50
+
+        # Act
+        for email in emails:
+            rule.matches(email)
+        rule.compiled.retune()
+        order = rule.evaluation_order()
+
+        # Assert
+        assert order[0]['value'] == 'rare-sender'
+        assert order[0]['selectivity'] < 0.1
+
+    def test_compiled_matches_reference_semantics(self):
+        """Compiled evaluation agrees with RuleCondition.matches"""
+        # Arrange
+        conditions = [
+            RuleCondition(ConditionType.SENDER_CONTAINS, "Example"),
+            RuleCondition(ConditionType.SENDER_DOMAIN, "EXAMPLE.com"),
+            RuleCondition(ConditionType.SENDER_EXACT, "A@example.com", case_sensitive=True),
+            RuleCondition(ConditionType.SUBJECT_CONTAINS, "sale"),
+            RuleCondition(ConditionType.SUBJECT_EXACT, "Big Sale"),
+            RuleCondition(ConditionType.SUBJECT_REGEX, "^big"),
+            RuleCondition(ConditionType.SUBJECT_REGEX, "(unclosed"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "Unsubscribe", case_sensitive=True),
+        ]
+        emails = [
+            {'from': 'A@example.com', 'subject': 'Big Sale', 'content': 'click Unsubscribe'},
+            {'from': 'Shop <b@Example.com>', 'subject': 'big sale today', 'content': 'unsubscribe'},
+            {'from': 'nobody', 'subject': '', 'content': ''},
+        ]
+
+        # Act & Assert
+        for condition in conditions:
+            compiled = r.compile_condition(condition)
+            for email in emails:
+                assert compiled.evaluate(email) == condition.matches(email)
+
+    def test_identical_conditions_share_statistics(self):
+        """Identical conditions in different rules share one compiled instance"""
+        # Arrange
+        condition_a = RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")
+        condition_b = RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")
+
+        # Act & Assert
+        assert r.compile_condition(condition_a) is r.compile_condition(condition_b)
+
+    def test_private_plans_stay_out_of_shared_cache(self):
+        """Draft plans get private conditions and unused shared conditions are released"""
+        # Arrange
+        import gc
+        draft = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "draft-only-value")])
+        live = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "live-only-value")])
+        key = (ConditionType.SUBJECT_CONTAINS, "live-only-value", False)
+
+        # Act
+        draft.matches({'from': 'a@example.com', 'subject': 'draft-only-value'})
+        live.compile(shared=True)
+        cached_while_live = key in r._compiled_conditions
+        live = None
+        gc.collect()
+
+        # Assert
+        assert (ConditionType.SUBJECT_CONTAINS, "draft-only-value", False) not in r._compiled_conditions
+        assert cached_while_live
+        assert key not in r._compiled_conditions
+
+
+class TestRuleInstrumentation:
+    """Test per-rule metrics recorded during processing"""
+
+    @patch('functions.fetch_class')
+    def test_process_emails_records_metrics(self, mock_fetch_class):
+        """Evaluations, matches and action outcomes are recorded per rule"""
+        # Arrange
+        from metrics import get_rule_metrics
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        rule.id = "instrumented-rule"
+        mock_fetch_class.return_value = [
+            Mail("1", "Hi", "a@example.com", "", date(2024, 1, 1)),
+            Mail("2", "Hi", "b@other.com", "", date(2024, 1, 1)),
+        ]
+        mailbox = Mock()
+        mailbox.flag.side_effect = Exception("IMAP error")
+        account = Mock()
+        account.email = "metrics@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        rule.process_emails(account)
+
+        # Assert
+        stats = get_rule_metrics().get_rule_stats("instrumented-rule")
+        assert stats['evaluations'] == 2
+        assert stats['matches'] == 1
+        assert stats['action_failures'] == 1
+        assert 'sender_domain' in get_rule_metrics().get_condition_stats()
+
+    def test_unsupported_action_not_counted_as_executed(self):
+        """An action type with no implementation reports failure"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        action = RuleAction(ActionType.CREATE_LIST, "new-list")
+
+        # Act
+        result = rule._execute_action(action, Mail("1", "Hi", "a@example.com", "", date(2024, 1, 1)),
+                                      Mock(), Mock())
+
+        # Assert
+        assert result is False
+
+    @patch('functions.is_gmail_account', return_value=False)
+    @patch('functions.fetch_class')
+    def test_forward_runs_before_move(self, mock_fetch_class, mock_is_gmail):
+        """A forward declared after a move still sees the message in its folder"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")], actions=[
+            RuleAction(ActionType.MOVE_TO_FOLDER, "INBOX.Archive"),
+            RuleAction(ActionType.FORWARD, "boss@example.com")
+        ])
+        mock_fetch_class.return_value = [Mail("1", "Hi", "a@example.com", "", date(2024, 1, 1))]
+        calls = []
+        mailbox = Mock()
+        mailbox.move.side_effect = lambda uids, folder: calls.append('move')
+        account = Mock()
+        account.email = "order@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        with patch('services.smtp_sender.forward_messages',
+                   side_effect=lambda *args: calls.append('forward') or 1):
+            rule.process_emails(account)
+
+        # Assert
+        assert calls == ['forward', 'move']
+
+    def test_forward_nothing_queued_is_failure(self):
+        """A forward that queues no message reports failure"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        action = RuleAction(ActionType.FORWARD, "boss@example.com")
+
+        # Act
+        with patch('services.smtp_sender.forward_messages', return_value=0):
+            result = rule._execute_action(action, Mail("1", "Hi", "a@example.com", "", date(2024, 1, 1)),
+                                          Mock(), Mock())
+
+        # Assert
+        assert result is False
+
+
+class TestBacktest:
+    """Test offline backtesting against cached headers"""
+
+    def make_headers(self):
+        """Small header corpus"""
+        return [
+            {'uid': '1', 'from': 'news@shop.com', 'subject': 'Big sale'},
+            {'uid': '2', 'from': 'boss@work.com', 'subject': 'Meeting'},
+            {'uid': '3', 'from': 'deals@shop.com', 'subject': 'Weekly deals'},
+            {'uid': '4', 'from': 'friend@mail.com', 'subject': 'sale on my bike'},
+        ]
+
+    def test_current_rules_counts_and_samples(self):
+        """Each active rule reports its match count and sample messages"""
+        # Arrange
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com")])
+
+        # Act
+        report = r.backtest_rules([rule], self.make_headers(), sample_size=1)
+
+        # Assert
+        assert report['messages'] == 4
+        assert report['rules']['rule-1']['matches'] == 2
+        assert [s['uid'] for s in report['rules']['rule-1']['samples']] == ['1']
+        assert report['diff'] is None
+
+    def test_draft_diff_against_replaced_rule(self):
+        """A draft with an existing rule's ID is diffed against that rule"""
+        # Arrange
+        current = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com")])
+        draft = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "sale")])
+
+        # Act
+        report = r.backtest_rules([current], self.make_headers(), draft=draft)
+
+        # Assert
+        diff = report['diff']
+        assert diff['replaces'] == 'rule-1'
+        assert diff['added'] == 1
+        assert diff['removed'] == 1
+        assert diff['unchanged'] == 1
+        assert diff['added_samples'][0]['uid'] == '4'
+        assert diff['removed_samples'][0]['uid'] == '3'
+        assert 'rule-1' not in report['rules']
+
+    def test_new_draft_reports_overlaps(self):
+        """A new draft reports which current rules already match its messages"""
+        # Arrange
+        current = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com")])
+        draft = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "sale")])
+        draft.id = "draft"
+
+        # Act
+        report = r.backtest_rules([current], self.make_headers(), draft=draft)
+
+        # Assert
+        assert report['diff']['replaces'] is None
+        assert report['diff']['added'] == 2
+        assert report['diff']['overlapping_rules'] == {'rule-1': 1}
+
+    def test_backtest_leaves_live_statistics_untouched(self):
+        """Backtests record neither condition selectivity nor rule metrics"""
+        # Arrange
+        from metrics import get_rule_metrics
+        get_rule_metrics().reset()
+        rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "backtest-only.com")])
+        condition = rule.compiled.header_conditions[0]
+
+        # Act
+        report = r.backtest_rules([rule], self.make_headers() * 50)
+
+        # Assert
+        assert report['messages'] == 200
+        assert condition.evaluations == 0
+        assert rule.compiled.evaluations == 0
+        assert get_rule_metrics().get_condition_stats() == {}
+        assert get_rule_metrics().get_rule_stats() == {}
+
+    def test_content_conditions_are_undecided(self):
+        """Messages that need a body are counted separately, not matched"""
+        # Arrange
+        rule = make_rule([
+            RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "unsubscribe")
+        ])
+
+        # Act
+        report = r.backtest_rules([rule], self.make_headers())
+
+        # Assert
+        assert report['rules']['rule-1']['matches'] == 0
+        assert report['rules']['rule-1']['needs_content'] == 2
+
+    def test_fifty_thousand_headers_under_a_second(self):
+        """A draft and the current rules run over 50k headers in under a second"""
+        # Arrange
+        headers = [
+            {'uid': str(i), 'from': f'user{i % 997}@domain{i % 41}.com', 'subject': f'Order #{i} shipped'}
+            for i in range(50000)
+        ]
+        current = make_rule([
+            RuleCondition(ConditionType.SENDER_DOMAIN, "domain3.com"),
+            RuleCondition(ConditionType.SUBJECT_REGEX, r"order\s+#\d+")
+        ])
+        draft = make_rule([RuleCondition(ConditionType.SENDER_CONTAINS, "user7")])
+
+        # Act
+        report = r.backtest_rules([current], headers, draft=draft)
+
+        # Assert
+        assert report['messages'] == 50000
+        assert report['elapsed_ms'] < 1000
+
+
+class TestRuleSetCache:
+    """Test the versioned per-account rule set cache"""
+
+    def make_engine(self, tmp_path):
+        """Rules file with one global and one account-specific rule"""
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        global_rule = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        global_rule.id = "global"
+        account_rule = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "invoice")])
+        account_rule.id = "account"
+        account_rule.account_email = "a@example.com"
+        account_rule.priority = 50
+        engine.add_rule(global_rule)
+        engine.add_rule(account_rule)
+        return engine
+
+    def test_account_email_is_loaded(self, tmp_path):
+        """account_email survives a save and reload"""
+        # Arrange
+        self.make_engine(tmp_path)
+
+        # Act
+        reloaded = r.RulesEngine(tmp_path / "rules.json")
+
+        # Assert
+        assert reloaded.get_rule("account").account_email == "a@example.com"
+
+    def test_snapshot_filters_by_account(self, tmp_path):
+        """Snapshots include global rules and the account's own rules, by priority"""
+        # Arrange
+        self.make_engine(tmp_path)
+        cache = r.RuleSetCache(tmp_path / "rules.json")
+
+        # Act
+        own = cache.get("a@example.com")
+        other = cache.get("b@example.com")
+
+        # Assert
+        assert [rule.id for rule in own] == ["account", "global"]
+        assert [rule.id for rule in other] == ["global"]
+        assert isinstance(own.rules, tuple)
+
+    def test_snapshot_reused_until_file_changes(self, tmp_path):
+        """The rules file is not re-parsed while it is unchanged"""
+        # Arrange
+        self.make_engine(tmp_path)
+        cache = r.RuleSetCache(tmp_path / "rules.json")
+        first = cache.get("a@example.com")
+
+        # Act
+        with patch.object(r, 'RulesEngine') as mock_engine:
+            second = cache.get("a@example.com")
+
+        # Assert
+        assert second is first
+        mock_engine.assert_not_called()
+
+    def test_save_rules_bumps_version(self, tmp_path):
+        """Saving rules invalidates the shared cache and bumps the version"""
+        # Arrange
+        engine = self.make_engine(tmp_path)
+        first = r.get_active_rule_set("a@example.com", tmp_path / "rules.json")
+
+        # Act
+        engine.delete_rule("account")
+        second = r.get_active_rule_set("a@example.com", tmp_path / "rules.json")
+
+        # Assert
+        assert second.version > first.version
+        assert [rule.id for rule in second] == ["global"]
+
+    def test_missing_file_is_empty(self, tmp_path):
+        """A missing rules file yields an empty snapshot"""
+        # Arrange
+        cache = r.RuleSetCache(tmp_path / "missing.json")
+
+        # Act & Assert
+        assert len(cache.get("a@example.com")) == 0
+
+    def test_evaluation_orders_come_from_live_plans(self, tmp_path):
+        """Orders are read from the plans processing uses, for every account"""
+        # Arrange
+        self.make_engine(tmp_path)
+        cache = r.RuleSetCache(tmp_path / "rules.json")
+        live = {rule.id: rule for rule in cache.get("a@example.com")}
+
+        # Act
+        orders = cache.get_evaluation_orders()
+
+        # Assert
+        assert set(orders) == {"global", "account"}
+        assert orders["account"] == live["account"].evaluation_order()
+        assert live["global"].compiled.header_conditions[0] is r.compile_condition(
+            RuleCondition(ConditionType.SENDER_DOMAIN, "example.com"))
+
+
+class TestStopProcessing:
+    """Test stop_processing, first-match mode and single-pass processing"""
+
+    def rules(self, stop=False):
+        """A read rule followed by a move rule and a second read rule"""
+        first = make_rule([RuleCondition(ConditionType.SENDER_DOMAIN, "example.com")])
+        first.id = "first"
+        first.stop_processing = stop
+        move = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "hello")],
+                         actions=[RuleAction(type=ActionType.MOVE_TO_FOLDER, target="Archive")])
+        move.id = "move"
+        last = make_rule([RuleCondition(ConditionType.SUBJECT_CONTAINS, "hello")])
+        last.id = "last"
+        return [first, move, last]
+
+    def test_stop_processing_persists(self, tmp_path):
+        """stop_processing survives a save and reload"""
+        # Arrange
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        engine.add_rule(self.rules(stop=True)[0])
+
+        # Act
+        reloaded = r.RulesEngine(tmp_path / "rules.json")
+
+        # Assert
+        assert reloaded.get_rule("first").stop_processing is True
+
+    def test_process_email_stops_after_terminal_rule(self, tmp_path):
+        """process_email stops at a stop_processing rule, a move, or the first match"""
+        # Arrange
+        engine = r.RulesEngine(tmp_path / "rules.json")
+        for priority, rule in enumerate(self.rules(), start=1):
+            rule.priority = priority
+            engine.rules.append(rule)
+        email = {'from': 'a@example.com', 'subject': 'hello'}
+
+        # Act
+        all_actions = engine.process_email(email, first_match=False)
+        first_only = engine.process_email(email, first_match=True)
+        engine.rules[0].stop_processing = True
+        stopped = engine.process_email(email, first_match=False)
+
+        # Assert
+        assert [a.type for a in all_actions] == [ActionType.MARK_READ, ActionType.MOVE_TO_FOLDER]
+        assert [a.type for a in first_only] == [ActionType.MARK_READ]
+        assert [a.type for a in stopped] == [ActionType.MARK_READ]
+
+    @patch('functions.fetch_class')
+    def test_process_rules_single_pass_skips_moved(self, mock_fetch_class):
+        """One login and fetch serve all rules; moved emails skip later rules"""
+        # Arrange
+        mock_fetch_class.return_value = [
+            Mail("1", "hello", "a@other.com", "", date(2024, 1, 1)),
+            Mail("2", "bye", "b@other.com", "", date(2024, 1, 1)),
+        ]
+        mailbox = Mock()
+        account = Mock()
+        account.email = "single-pass@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        counts = r.process_rules(account, self.rules(), first_match=False)
+
+        # Assert
+        assert counts == {"first": 0, "move": 1, "last": 0}
+        account.login.assert_called_once()
+        mock_fetch_class.assert_called_once()
+        mailbox.move.assert_called_once_with(["1"], "Archive")
+        mailbox.flag.assert_not_called()
+
+    @patch('functions.fetch_class')
+    def test_process_rules_stop_processing(self, mock_fetch_class):
+        """A stop_processing rule keeps later rules from acting on its matches"""
+        # Arrange
+        mock_fetch_class.return_value = [Mail("1", "hello", "a@example.com", "", date(2024, 1, 1))]
+        mailbox = Mock()
+        account = Mock()
+        account.email = "stop@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        counts = r.process_rules(account, self.rules(stop=True), first_match=False)
+
+        # Assert
+        assert counts == {"first": 1, "move": 0, "last": 0}
+        mailbox.move.assert_not_called()
+
+    @patch('functions.fetch_class')
+    def test_process_rules_first_match(self, mock_fetch_class):
+        """In first-match mode each email is handled by one rule at most"""
+        # Arrange
+        mock_fetch_class.return_value = [
+            Mail("1", "hello", "a@example.com", "", date(2024, 1, 1)),
+            Mail("2", "hello", "b@other.com", "", date(2024, 1, 1)),
+        ]
+        mailbox = Mock()
+        account = Mock()
+        account.email = "first-match@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        counts = r.process_rules(account, self.rules(), first_match=True)
+
+        # Assert
+        assert counts == {"first": 1, "move": 1, "last": 0}
+        mailbox.flag.assert_called_once_with(["1"], ['\\Seen'], True)
+        mailbox.move.assert_called_once_with(["2"], "Archive")
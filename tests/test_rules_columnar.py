@@ -0,0 +1,209 @@
+"""
+Unit Tests for Columnar Rule Evaluation
+
+Property tests checking that batch evaluation gives exactly the same
+results as evaluating rules message by message.
+"""
+
+import pytest
+import random
+from unittest.mock import Mock, patch
+from datetime import date
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import rules as r
+from rules import RuleCondition, RuleAction, EmailRule, ConditionType, ActionType
+from rules_columnar import HeaderBatch, ColumnarEvaluator, evaluate_rules
+from functions import Mail
+
+
+SENDERS = [
+    'alice@example.com', 'Bob <BOB@Example.com>', 'carol@shop.example.com',
+    'news@shop.com', 'Deals <deals@shop.com>', 'no-at-sign', '', 'ALICE@EXAMPLE.COM',
+    'eve@evil.org>', 'Frank <frank@work.net>'
+]
+SUBJECTS = [
+    'Big Sale', 'big sale today', 'Order #123 shipped', 'order  #9', 'Meeting notes',
+    '', 'Invoice attached', 'INVOICE overdue', 'Re: lunch', 'sale'
+]
+CONTENTS = ['', 'Click Unsubscribe', 'unsubscribe here', 'your invoice', 'hello']
+VALUES = {
+    ConditionType.SENDER_CONTAINS: ['example', 'SHOP', 'bob', 'zzz'],
+    ConditionType.SENDER_DOMAIN: ['example.com', 'SHOP.COM', 'work.net', 'evil.org'],
+    ConditionType.SENDER_EXACT: ['alice@example.com', 'news@shop.com', 'no-at-sign'],
+    ConditionType.SUBJECT_CONTAINS: ['sale', 'INVOICE', 'notes'],
+    ConditionType.SUBJECT_EXACT: ['Big Sale', 'sale', ''],
+    ConditionType.SUBJECT_REGEX: [r'^big', r'order\s+#\d+', r'(unclosed', r'INVOICE$'],
+    ConditionType.CONTENT_CONTAINS: ['unsubscribe', 'Unsubscribe', 'invoice'],
+    ConditionType.SENDER_IN_LIST: ['white', 'vendor'],
+}
+LISTS = {
+    'white': {'alice@example.com', 'bob@example.com'},
+    'vendor': {'deals@shop.com'},
+}
+
+BACKENDS = [False]
+try:
+    import numpy  # noqa: F401
+    BACKENDS.append(True)
+except ImportError:
+    pass
+
+
+def random_emails(rng, count):
+    """Random emails drawn from small pools so values repeat"""
+    return [{
+        'from': rng.choice(SENDERS),
+        'subject': rng.choice(SUBJECTS),
+        'content': rng.choice(CONTENTS)
+    } for _ in range(count)]
+
+
+def random_rule(rng, rule_id):
+    """Random rule with 0-4 random conditions"""
+    conditions = []
+    for _ in range(rng.randint(0, 4)):
+        condition_type = rng.choice(list(VALUES))
+        conditions.append(RuleCondition(
+            type=condition_type,
+            value=rng.choice(VALUES[condition_type]),
+            case_sensitive=rng.random() < 0.3
+        ))
+    return EmailRule(
+        id=rule_id,
+        name=rule_id,
+        description='',
+        conditions=conditions,
+        actions=[RuleAction(type=ActionType.MARK_READ, target='')],
+        condition_logic=rng.choice(['AND', 'OR', 'and']),
+        active=rng.random() < 0.9
+    )
+
+
+@pytest.fixture(autouse=True)
+def fake_lists():
+    """Serve sender lists from memory"""
+    with patch.object(r, '_load_list_entries', side_effect=lambda name: LISTS[name]):
+        yield
+
+
+class TestColumnarParity:
+    """Columnar results must equal per-message results"""
+
+    @pytest.mark.parametrize('use_numpy', BACKENDS)
+    @pytest.mark.parametrize('seed', range(20))
+    def test_matches_equal_per_message(self, seed, use_numpy):
+        """Full rule evaluation agrees with EmailRule.matches"""
+        # Arrange
+        rng = random.Random(seed)
+        emails = random_emails(rng, 200)
+        rules = [random_rule(rng, f'rule-{i}') for i in range(10)]
+        evaluator = ColumnarEvaluator(HeaderBatch(emails), use_numpy=use_numpy)
+
+        # Act & Assert
+        for rule in rules:
+            assert evaluator.matches(rule) == [rule.matches(email) for email in emails]
+
+    @pytest.mark.parametrize('use_numpy', BACKENDS)
+    @pytest.mark.parametrize('seed', range(20))
+    def test_header_phase_equals_per_message(self, seed, use_numpy):
+        """Header-only evaluation agrees with EmailRule.match_headers"""
+        # Arrange
+        rng = random.Random(1000 + seed)
+        emails = random_emails(rng, 200)
+        rules = [random_rule(rng, f'rule-{i}') for i in range(10)]
+        evaluator = ColumnarEvaluator(HeaderBatch(emails), use_numpy=use_numpy)
+
+        # Act & Assert
+        for rule in rules:
+            outcomes = [rule.match_headers(email) for email in emails]
+            matched, undecided = evaluator.match_headers(rule)
+            assert matched == [i for i, outcome in enumerate(outcomes) if outcome is True]
+            assert undecided == [i for i, outcome in enumerate(outcomes) if outcome is None]
+
+
+class TestColumnarEvaluator:
+    """Test batch construction and helpers"""
+
+    def test_factorized_columns(self):
+        """Repeated values share one code"""
+        # Arrange
+        batch = HeaderBatch([{'from': 'a'}, {'from': 'b'}, {'from': 'a'}])
+
+        # Act
+        uniques, codes = batch.factorized('from')
+
+        # Assert
+        assert uniques == ['a', 'b']
+        assert codes == [0, 1, 0]
+
+    def test_dates_as_epoch(self):
+        """Dates become epoch seconds and missing dates 0"""
+        # Arrange
+        batch = HeaderBatch([{'date': date(2024, 1, 1)}, {}])
+
+        # Act
+        epochs = batch.dates
+
+        # Assert
+        assert epochs[0] > 0
+        assert epochs[1] == 0.0
+
+    def test_evaluate_rules_indexes(self):
+        """evaluate_rules returns matching positions per rule"""
+        # Arrange
+        rule = EmailRule(
+            id='shop', name='Shop', description='',
+            conditions=[RuleCondition(ConditionType.SENDER_DOMAIN, 'shop.com')],
+            actions=[]
+        )
+        emails = [{'from': 'a@shop.com'}, {'from': 'b@other.com'}, {'from': 'c@shop.com'}]
+
+        # Act
+        result = evaluate_rules([rule], emails, use_numpy=False)
+
+        # Assert
+        assert result == {'shop': [0, 2]}
+
+    def test_empty_batch(self):
+        """Empty batches produce empty results"""
+        # Arrange
+        rule = EmailRule(
+            id='any', name='Any', description='',
+            conditions=[RuleCondition(ConditionType.SUBJECT_CONTAINS, 'x')],
+            actions=[]
+        )
+
+        # Act & Assert
+        assert evaluate_rules([rule], [], use_numpy=False) == {'any': []}
+
+    @patch('functions.fetch_class')
+    def test_process_emails_uses_columnar_for_large_batches(self, mock_fetch_class):
+        """process_emails matches the same messages through the columnar path"""
+        # Arrange
+        rule = EmailRule(
+            id='columnar-rule', name='Columnar', description='',
+            conditions=[RuleCondition(ConditionType.SENDER_DOMAIN, 'shop.com')],
+            actions=[RuleAction(type=ActionType.MARK_READ, target='')]
+        )
+        mock_fetch_class.return_value = [
+            Mail(str(i), 'Hi', 'a@shop.com' if i % 2 else 'b@other.com', '', date(2024, 1, 1))
+            for i in range(10)
+        ]
+        mailbox = Mock()
+        account = Mock()
+        account.email = 'columnar@example.com'
+        account.login.return_value = mailbox
+
+        # Act
+        with patch.object(r, '_get_rules_setting', side_effect=lambda key, default: 5 if key == 'columnar_min_batch' else default), \
+                patch('rules_columnar.ColumnarEvaluator', wraps=ColumnarEvaluator) as spy:
+            processed = rule.process_emails(account)
+
+        # Assert
+        assert processed == 5
+        spy.assert_called_once()
+        assert mailbox.flag.call_count == 5
@@ -0,0 +1,181 @@
+"""
+Unit Tests for Parallel Rule Evaluation
+
+Tests for process-pool backfill evaluation and bulk action execution.
+"""
+
+import pickle
+import pytest
+from unittest.mock import Mock, patch, call
+from datetime import date
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import rules_parallel as rp
+from rules import RuleCondition, RuleAction, EmailRule, ConditionType, ActionType
+from functions import Mail
+
+
+def make_rule(rule_id, conditions, actions, logic="AND"):
+    """Build a rule with the given conditions and actions"""
+    return EmailRule(
+        id=rule_id,
+        name=rule_id,
+        description="",
+        conditions=conditions,
+        actions=actions,
+        condition_logic=logic
+    )
+
+
+def make_mail(count):
+    """Mail objects from a few senders"""
+    senders = ['a@shop.com', 'b@work.com', 'Deals <deals@shop.com>', 'c@news.org']
+    subjects = ['Big sale', 'Meeting', 'Invoice 12', 'Weekly news']
+    return [
+        Mail(str(i), subjects[i % 4], senders[(i // 3) % 4], "", date(2024, 1, 1))
+        for i in range(count)
+    ]
+
+
+class TestParallelEvaluation:
+    """Test sharded evaluation in the process pool"""
+
+    def test_rules_pickle_without_compiled_plan(self):
+        """Rules sent to workers do not carry the compiled plan"""
+        # Arrange
+        rule = make_rule("shop", [RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com")], [])
+        rule.compiled
+
+        # Act
+        clone = pickle.loads(pickle.dumps(rule))
+
+        # Assert
+        assert '_compiled' not in clone.__dict__
+        assert clone.matches({'from': 'x@shop.com', 'subject': ''})
+
+    def test_split_shards_cover_corpus(self):
+        """Shards are contiguous and cover every item once"""
+        # Act
+        shards = rp._split(list(range(10)), 4)
+
+        # Assert
+        assert [len(shard) for shard in shards] == [3, 3, 2, 2]
+        assert sum(shards, []) == list(range(10))
+
+    def test_process_pool_matches_in_process(self):
+        """Results from worker processes equal in-process evaluation"""
+        # Arrange
+        rule_list = [
+            make_rule("shop", [RuleCondition(ConditionType.SENDER_DOMAIN, "shop.com")], []),
+            make_rule("sale", [
+                RuleCondition(ConditionType.SUBJECT_CONTAINS, "sale"),
+                RuleCondition(ConditionType.CONTENT_CONTAINS, "unsubscribe")
+            ], [], logic="OR"),
+        ]
+        mail_list = make_mail(200)
+
+        # Act
+        local = rp.evaluate_parallel(rule_list, mail_list, workers=1)
+        pooled = rp.evaluate_parallel(rule_list, mail_list, workers=2, min_batch=0)
+
+        # Assert
+        assert pooled == local
+        assert len(local['shop'][0]) > 0
+        assert len(local['sale'][1]) > 0
+
+
+class TestBulkActions:
+    """Test grouped action execution"""
+
+    def test_actions_grouped_and_moved_once(self):
+        """One command per action group, flags before moves, one move per message"""
+        # Arrange
+        read_rule = make_rule("read", [], [RuleAction(ActionType.MARK_READ, "")])
+        move_a = make_rule("move-a", [], [RuleAction(ActionType.MOVE_TO_FOLDER, "A")])
+        move_b = make_rule("move-b", [], [RuleAction(ActionType.MOVE_TO_FOLDER, "B")])
+        planned = rp.plan_actions([read_rule, move_a, move_b], {
+            "move-a": ["1", "2"],
+            "read": ["1", "3"],
+            "move-b": ["2", "3"],
+        })
+        mailbox = Mock()
+        account = Mock()
+        account.email = "user@example.com"
+
+        # Act
+        summary = rp.execute_bulk_actions(mailbox, account, planned, {})
+
+        # Assert
+        assert mailbox.method_calls == [
+            call.flag(["1", "3"], ['\\Seen'], True),
+            call.move(["1", "2"], "A"),
+            call.move(["3"], "B"),
+        ]
+        assert summary['imap_commands'] == 3
+        assert summary['actions_executed'] == 5
+
+    @patch('functions.new_entries')
+    def test_add_to_list_deduplicates_senders(self, mock_new_entries):
+        """Senders are added to a list once per bulk action"""
+        # Arrange
+        rule = make_rule("list", [], [RuleAction(ActionType.ADD_TO_LIST, "vendor")])
+        mail_by_uid = {str(m.uid): m for m in make_mail(3)}
+        planned = rp.plan_actions([rule], {"list": ["0", "1", "2"]})
+        account = Mock()
+        account.email = "user@example.com"
+
+        # Act
+        rp.execute_bulk_actions(Mock(), account, planned, mail_by_uid)
+
+        # Assert
+        mock_new_entries.assert_called_once_with("vendor", ["a@shop.com"])
+
+    def test_failed_command_counts_failures(self):
+        """A failed bulk command records a failure for each affected action"""
+        # Arrange
+        rule = make_rule("read", [], [RuleAction(ActionType.MARK_READ, "")])
+        planned = rp.plan_actions([rule], {"read": ["1", "2"]})
+        mailbox = Mock()
+        mailbox.flag.side_effect = Exception("IMAP error")
+        account = Mock()
+        account.email = "user@example.com"
+
+        # Act
+        summary = rp.execute_bulk_actions(mailbox, account, planned, {})
+
+        # Assert
+        assert summary['action_failures'] == 2
+        assert summary['actions_executed'] == 0
+
+
+class TestBackfill:
+    """Test the full backfill pipeline against a mocked mailbox"""
+
+    @patch('functions.fetch_text_parts')
+    @patch('functions.fetch_class')
+    def test_backfill_fetches_content_once_and_moves_in_bulk(self, mock_fetch_class, mock_fetch_text_parts):
+        """Header matches and content matches are moved with one command"""
+        # Arrange
+        rule = make_rule("invoices", [
+            RuleCondition(ConditionType.SUBJECT_CONTAINS, "invoice"),
+            RuleCondition(ConditionType.CONTENT_CONTAINS, "amount due")
+        ], [RuleAction(ActionType.MOVE_TO_FOLDER, "Invoices")], logic="OR")
+        mock_fetch_class.return_value = make_mail(8)
+        mock_fetch_text_parts.return_value = {"0": "Amount due: 10", "1": "hello"}
+        mailbox = Mock()
+        account = Mock()
+        account.email = "backfill@example.com"
+        account.login.return_value = mailbox
+
+        # Act
+        summary = rp.backfill(account, [rule], workers=1)
+
+        # Assert
+        assert summary['messages'] == 8
+        assert summary['bodies_fetched'] == 6
+        mock_fetch_text_parts.assert_called_once()
+        mailbox.move.assert_called_once_with(["0", "2", "6"], "Invoices")
+        mailbox.logout.assert_called_once()
@@ -0,0 +1,245 @@
+"""
+Unit Tests for the Adaptive Scheduling Policy
+
+Tests for arrival-rate driven inbox intervals, training folder backoff and
+staggered job starts.
+"""
+
+import time
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.scheduling_policy import AdaptiveIntervalPolicy, StartLimiter, phase_offset, first_run_time
+from services.worker_pool import WorkerPool, PRIORITY_INTERACTIVE
+from services.email_processor import EmailProcessor, ProcessingMode
+from config import AccountConfig
+
+
+@pytest.fixture
+def policy():
+    """Policy with explicit bounds"""
+    policy = AdaptiveIntervalPolicy(inbox_interval=5, folder_interval=4)
+    policy.inbox_min, policy.inbox_max, policy.folder_max = 1, 30, 60
+    policy.target, policy.alpha, policy.empty_before_backoff = 20, 0.5, 3
+    return policy
+
+
+class TestInboxInterval:
+    """Test intervals driven by the arrival rate"""
+
+    def test_first_cycle_keeps_configured_interval(self, policy):
+        """Without a previous UID no rate is known"""
+        # Act & Assert
+        assert policy.observe_inbox('inbox', 100, now=0) == 5
+
+    def test_busy_account_polls_faster(self, policy):
+        """40 new messages per minute gives a half-minute target, clamped to the minimum"""
+        # Arrange
+        policy.observe_inbox('inbox', 100, now=0)
+
+        # Act
+        interval = policy.observe_inbox('inbox', 300, now=300)
+
+        # Assert
+        assert interval == 1
+
+    def test_rate_sets_interval_within_bounds(self, policy):
+        """2 messages per minute gives a 10 minute interval"""
+        # Arrange
+        policy.observe_inbox('inbox', 100, now=0)
+
+        # Act
+        interval = policy.observe_inbox('inbox', 110, now=300)
+
+        # Assert
+        assert interval == pytest.approx(10)
+
+    def test_idle_account_decays_to_maximum(self, policy):
+        """An account with no new mail drifts to the longest interval"""
+        # Arrange
+        policy.observe_inbox('inbox', 100, now=0)
+        policy.observe_inbox('inbox', 110, now=300)
+
+        # Act
+        intervals = [policy.observe_inbox('inbox', 110, now=300 + 600 * i) for i in range(1, 6)]
+
+        # Assert
+        assert intervals == sorted(intervals)
+        assert intervals[-1] == 30
+
+    def test_empty_inbox_decays_rate(self, policy):
+        """Cycles over an empty inbox count as no arrivals"""
+        # Arrange
+        policy.observe_inbox('inbox', 100, now=0)
+        policy.observe_inbox('inbox', 110, now=300)
+
+        # Act
+        intervals = [policy.observe_inbox('inbox', None, now=300 + 600 * i) for i in range(1, 6)]
+        rate = policy.get_status()['inbox']['arrival_rate_per_minute']
+        policy.observe_inbox('inbox', 120, now=3600)
+
+        # Assert
+        assert intervals == sorted(intervals) and intervals[-1] > intervals[0]
+        assert rate < 2
+        # Ten messages over the 55 minutes since UID 110 was seen
+        assert policy.get_status()['inbox']['arrival_rate_per_minute'] > rate
+
+    def test_uidvalidity_reset_counts_no_arrivals(self, policy):
+        """A lower UID after a mailbox reset is not a negative rate"""
+        # Arrange
+        policy.observe_inbox('inbox', 500, now=0)
+
+        # Act
+        interval = policy.observe_inbox('inbox', 3, now=60)
+
+        # Assert
+        assert interval == 30
+        assert policy.get_status()['inbox']['arrival_rate_per_minute'] == 0
+
+
+class TestFolderBackoff:
+    """Test exponential backoff for empty training folders"""
+
+    def test_empty_folder_backs_off_and_resets(self, policy):
+        """Intervals double after N empty cycles and reset when mail appears"""
+        # Act
+        intervals = [policy.observe_folder('folder_white', 0) for _ in range(7)]
+        reset = policy.observe_folder('folder_white', 2)
+
+        # Assert
+        assert intervals == [4, 4, 8, 16, 32, 60, 60]
+        assert reset == 4
+
+
+class TestStaggeredStart:
+    """Test phase offsets, jitter and the start limiter"""
+
+    def test_phase_offset_deterministic_and_spread(self):
+        """Each account keeps its offset and accounts cover the interval"""
+        # Act
+        offsets = [phase_offset(f"user{i}@example.com", 'inbox_maintenance', 300) for i in range(200)]
+
+        # Assert
+        assert offsets[0] == phase_offset("user0@example.com", 'inbox_maintenance', 300)
+        assert all(0 <= offset < 300 for offset in offsets)
+        assert min(offsets) < 30 and max(offsets) > 270
+        assert phase_offset("user0@example.com", 'folder_white', 300) != offsets[0]
+
+    def test_first_run_time_within_interval_plus_jitter(self):
+        """First run is the phase offset plus at most the jitter"""
+        # Arrange
+        now = datetime(2024, 1, 1, 12, 0)
+        offset = phase_offset("me@example.com", 'inbox_maintenance', 300)
+
+        # Act
+        runs = [first_run_time("me@example.com", 'inbox_maintenance', 5, jitter_seconds=10, now=now)
+                for _ in range(20)]
+
+        # Assert
+        for run in runs:
+            assert timedelta(seconds=offset) <= run - now <= timedelta(seconds=offset + 10)
+
+    def test_limiter_spaces_starts_after_burst(self):
+        """Starts beyond the burst wait for the configured rate"""
+        # Arrange
+        limiter = StartLimiter(rate=20, burst=2)
+
+        # Act
+        started = time.monotonic()
+        waits = [limiter.acquire() for _ in range(4)]
+        elapsed = time.monotonic() - started
+
+        # Assert
+        assert waits[:2] == [0.0, 0.0]
+        assert waits[2] > 0 and waits[3] > 0
+        assert elapsed >= 0.09
+
+    def test_pool_waits_on_limiter(self):
+        """Every pool task acquires a start before running"""
+        # Arrange
+        limiter = Mock()
+        limiter.try_acquire.return_value = 0.0
+        pool = WorkerPool(max_workers=2, start_limiter=limiter)
+
+        # Act
+        futures = [pool.submit(f"user{i}", lambda: None) for i in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert limiter.try_acquire.call_count == 3
+
+    def test_limiter_wait_leaves_lane_open(self):
+        """A background task waiting for a start is still queued, so interactive work runs first"""
+        # Arrange
+        limiter = StartLimiter(rate=4, burst=1)
+        pool = WorkerPool(max_workers=1, start_limiter=limiter)
+        order = []
+
+        # Act
+        first = pool.submit("user", lambda: order.append("background-1"))
+        first.result(timeout=5)
+        second = pool.submit("user", lambda: order.append("background-2"))
+        time.sleep(0.05)
+        urgent = pool.submit("user", lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+        urgent.result(timeout=5)
+        second.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert order == ["background-1", "interactive", "background-2"]
+        assert pool.lane_status("user")['max_wait_seconds'] >= 0.15
+        assert limiter.waited > 0
+
+
+class TestProcessorIntervals:
+    """Test that the processor reschedules its jobs"""
+
+    @patch('services.email_processor.pf.process_folder')
+    def test_training_folder_job_rescheduled(self, mock_process_folder):
+        """An empty folder's job gets the backed-off interval"""
+        # Arrange
+        with patch('services.email_processor.get_config'):
+            processor = EmailProcessor(AccountConfig(name="a", server="imap.example.com",
+                                                     email="adaptive@example.com", password="x"))
+        processor.scheduler = Mock()
+        processor.interval_policy.empty_before_backoff = 1
+        mock_process_folder.return_value = {"Messages Processed": 0}
+
+        # Act
+        processor._process_training_folder('white', 'INBOX._whitelist', 'INBOX')
+
+        # Assert
+        job_id, = processor.scheduler.reschedule_job.call_args[0]
+        trigger = processor.scheduler.reschedule_job.call_args[1]['trigger']
+        assert job_id == 'folder_white_adaptive@example.com'
+        assert trigger.interval.total_seconds() == 8 * 60
+        assert processor.interval_policy.get_status()["folder_white"]["interval_minutes"] == 8
+
+    def test_maintenance_jobs_staggered(self):
+        """Jobs no longer all start immediately"""
+        # Arrange
+        with patch('services.email_processor.get_config'):
+            processor = EmailProcessor(AccountConfig(name="a", server="imap.example.com",
+                                                     email="stagger@example.com", password="x"))
+        processor.scheduler = Mock()
+        processor.job_jitter = 0
+        processor.mode = ProcessingMode.MAINTENANCE
+
+        # Act
+        before = datetime.now()
+        processor._setup_jobs()
+
+        # Assert
+        calls = processor.scheduler.add_job.call_args_list
+        assert len(calls) == 4
+        for call in calls:
+            interval = call.kwargs['trigger'].interval.total_seconds()
+            assert before <= call.kwargs['next_run_time'] <= datetime.now() + timedelta(seconds=interval)
+        assert len({call.kwargs['next_run_time'] for call in calls}) == 4
@@ -229,6 +229,37 @@ class TestEmailProcessor:
         assert 'stats' in status
         assert 'scheduler_running' in status
     
+    def test_get_status_is_lock_free_snapshot(self, email_processor):
+        """Status reads return the published snapshot while the processor lock is held"""
+        # Arrange
+        email_processor._lock.acquire()
+        email_processor.state = ServiceState.RUNNING_STARTUP
+        
+        # Act
+        try:
+            status = email_processor.get_status()
+            stats = email_processor.get_stats_snapshot()
+        finally:
+            email_processor._lock.release()
+        email_processor._publish_status()
+        
+        # Assert
+        assert status['state'] == ServiceState.STOPPED.value
+        assert stats['state'] == ServiceState.STOPPED.value
+        assert email_processor.get_status()['state'] == ServiceState.RUNNING_STARTUP.value
+    
+    def test_snapshot_published_after_mode_switch(self, email_processor):
+        """Switching mode publishes a new snapshot"""
+        # Arrange
+        email_processor.state = ServiceState.RUNNING_STARTUP
+        
+        # Act
+        result = email_processor.switch_mode(ProcessingMode.MAINTENANCE)
+        
+        # Assert
+        assert result
+        assert email_processor.get_status()['mode'] == ProcessingMode.MAINTENANCE.value
+    
     def test_test_connection_success(self, email_processor):
         """Test successful connection test"""
         # Arrange
@@ -430,6 +461,35 @@ class TestTaskManager:
         assert result
         mock_switch_mode.assert_called_once_with(ProcessingMode.MAINTENANCE)
     
+    @patch('services.email_processor.EmailProcessor.switch_mode', return_value=True)
+    @patch('services.email_processor.EmailProcessor.stop', return_value=True)
+    @patch('services.email_processor.EmailProcessor.start', return_value=True)
+    def test_running_accounts_restored_by_next_leader(self, mock_start, mock_stop, mock_switch_mode,
+                                                      mock_account_config, tmp_path):
+        """Accounts running when a leader shuts down are started again in their modes"""
+        # Arrange
+        other_config = AccountConfig(name="other", server="test.example.com",
+                                     email="other@example.com", password="test_password")
+        leader = TaskManager(max_workers=1, state_file=tmp_path / "running_accounts.json")
+        for config in (mock_account_config, other_config):
+            leader.add_account(config)
+            leader.start_account(config.email, ProcessingMode.STARTUP)
+        leader.switch_mode(mock_account_config.email, ProcessingMode.MAINTENANCE)
+        leader.stop_account(other_config.email)
+        leader.shutdown()
+        mock_start.reset_mock()
+        
+        # Act
+        successor = TaskManager(max_workers=1, state_file=tmp_path / "running_accounts.json")
+        for config in (mock_account_config, other_config):
+            successor.add_account(config)
+        restored = successor.restore_running_accounts()
+        successor.shutdown()
+        
+        # Assert
+        assert restored == {mock_account_config.email: True}
+        mock_start.assert_called_once_with(ProcessingMode.MAINTENANCE)
+    
     @patch('services.email_processor.EmailProcessor.get_status')
     def test_get_account_status(self, mock_get_status, task_manager, mock_account_config):
         """Test getting account status"""
@@ -467,6 +527,21 @@ class TestTaskManager:
         assert 'total_accounts' in result['task_manager']
         assert 'startup_time' in result['task_manager']
     
+    def test_get_all_status_does_not_check_transitions(self, task_manager, mock_account_config):
+        """Status reads neither take the task manager lock nor switch modes"""
+        # Arrange
+        task_manager.add_account(mock_account_config)
+        task_manager._check_auto_transitions = Mock()
+        
+        # Act
+        with task_manager._lock:
+            result = task_manager.get_all_status()
+        
+        # Assert
+        assert mock_account_config.email in result['accounts']
+        task_manager._check_auto_transitions.assert_not_called()
+        assert task_manager.scheduler.scheduler.get_job('task_manager:auto_transitions') is not None
+    
     def test_get_aggregate_stats(self, task_manager, mock_account_config):
         """Test getting aggregate statistics"""
         # Arrange
@@ -0,0 +1,294 @@
+"""
+Unit Tests for Account Sharding
+
+Tests for the consistent hash ring, account leases, shard workers splitting
+and rebalancing accounts, and the web app's control plane.
+"""
+
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.sharding import HashRing, ShardStore, ShardWorker, ShardedTaskManager
+
+ACCOUNTS = [f"user{i}@example.com" for i in range(20)]
+
+
+class FakeTaskManager:
+    """Task manager whose processors only track state and mode"""
+
+    def __init__(self, accounts):
+        self.processors = {email: {'state': 'stopped', 'mode': 'startup'} for email in accounts}
+        self.restarts = []
+        self.busy = set()  # Accounts whose lane does not drain
+
+    def refresh_accounts_from_config(self):
+        pass
+
+    def get_account_status(self, email):
+        return {'account_email': email, **self.processors[email]} if email in self.processors else None
+
+    def start_account(self, email, mode):
+        self.processors[email] = {'state': f"running_{mode.value}", 'mode': mode.value}
+        return True
+
+    def stop_account(self, email):
+        self.processors[email]['state'] = 'stopped'
+        return True
+
+    def restart_account(self, email):
+        self.restarts.append(email)
+        return True
+
+    def drain_account(self, email, timeout=None):
+        return email not in self.busy
+
+    def get_rule_stats(self):
+        return {'rules': {}, 'condition_types': {}}
+
+    def get_evaluation_orders(self):
+        return {}
+
+    def switch_mode(self, email, mode):
+        return self.start_account(email, mode)
+
+    def running(self):
+        return {email for email, processor in self.processors.items() if processor['state'].startswith('running')}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ShardStore(tmp_path / "shards.db")
+
+
+class TestHashRing:
+    """Test account assignment"""
+
+    def test_spreads_accounts_and_moves_few_on_join(self):
+        """Every worker gets a share; a new worker only takes accounts, never shuffles others"""
+        # Arrange
+        before = HashRing(["w1", "w2"])
+        after = HashRing(["w1", "w2", "w3"])
+        emails = [f"user{i}@example.com" for i in range(300)]
+
+        # Act
+        moved = [email for email in emails if before.owner(email) != after.owner(email)]
+
+        # Assert
+        assert {before.owner(email) for email in emails} == {"w1", "w2"}
+        assert all(after.owner(email) == "w3" for email in moved)
+        assert 50 < len(moved) < 150
+
+    def test_empty_ring(self):
+        """No workers means no owner"""
+        assert HashRing([]).owner("me@example.com") is None
+
+
+class TestShardStore:
+    """Test leases and worker liveness"""
+
+    def test_lease_is_exclusive_until_expiry(self, store):
+        """Only the holder renews; another worker gets it once it expires"""
+        # Act & Assert
+        assert store.acquire_lease("me@example.com", "w1", ttl=30, now=100)
+        assert not store.acquire_lease("me@example.com", "w2", ttl=30, now=110)
+        assert store.acquire_lease("me@example.com", "w1", ttl=30, now=120)
+        assert store.acquire_lease("me@example.com", "w2", ttl=30, now=151)
+        assert store.lease_owners(now=151) == {"me@example.com": "w2"}
+
+    def test_stale_workers_not_live(self, store):
+        """Workers that stop heartbeating drop out"""
+        # Arrange
+        store.heartbeat("w1", now=100)
+        store.heartbeat("w2", now=125)
+
+        # Act
+        live = [worker['worker_id'] for worker in store.live_workers(ttl=30, now=140)]
+
+        # Assert
+        assert live == ["w2"]
+
+
+class TestShardWorker:
+    """Test workers splitting and rebalancing accounts"""
+
+    def test_workers_split_and_rebalance(self, store):
+        """Each account runs in exactly one worker, and a leaving worker's accounts move"""
+        # Arrange
+        for email in ACCOUNTS:
+            store.set_desired(email, 'running', 'startup')
+        managers = {worker_id: FakeTaskManager(ACCOUNTS) for worker_id in ("w1", "w2")}
+        workers = {worker_id: ShardWorker(worker_id, store, manager) for worker_id, manager in managers.items()}
+
+        # Act
+        for worker in workers.values():
+            worker.store.heartbeat(worker.worker_id)
+        for worker in workers.values():
+            worker.run_once()
+        split = {worker_id: manager.running() for worker_id, manager in managers.items()}
+        for email in list(workers["w2"].owned):
+            workers["w2"]._hand_off(email)
+        store.remove_worker("w2")
+        workers["w1"].run_once()
+
+        # Assert
+        assert split["w1"] and split["w2"]
+        assert not split["w1"] & split["w2"]
+        assert split["w1"] | split["w2"] == set(ACCOUNTS)
+        assert managers["w1"].running() == set(ACCOUNTS)
+        assert not managers["w2"].running()
+        assert set(store.lease_owners().values()) == {"w1"}
+
+    def test_applies_desired_state_and_publishes_status(self, store):
+        """Control-plane requests reach the owning worker, which reports back"""
+        # Arrange
+        manager = FakeTaskManager(["me@example.com"])
+        worker = ShardWorker("w1", store, manager)
+        store.set_desired("me@example.com", 'running', 'maintenance')
+
+        # Act
+        worker.run_once()
+        running_status = store.get_statuses()["me@example.com"]
+        store.set_desired("me@example.com", 'stopped')
+        worker.run_once()
+
+        # Assert
+        assert running_status['state'] == 'running_maintenance' and running_status['worker_id'] == "w1"
+        assert store.get_statuses()["me@example.com"]['state'] == 'stopped'
+
+    def test_local_mode_change_kept(self, store):
+        """An auto-transition in the worker is not undone, and is recorded for the next owner"""
+        # Arrange
+        manager = FakeTaskManager(["me@example.com"])
+        worker = ShardWorker("w1", store, manager)
+        store.set_desired("me@example.com", 'running', 'startup')
+        worker.run_once()
+
+        # Act
+        manager.processors["me@example.com"] = {'state': 'running_maintenance', 'mode': 'maintenance'}
+        worker.run_once()
+        worker.run_once()
+
+        # Assert
+        assert manager.processors["me@example.com"]['mode'] == 'maintenance'
+        assert store.get_desired("me@example.com")[:2] == ('running', 'maintenance')
+
+
+    def test_restart_request_restarts_once(self, store):
+        """A restart from the control plane restarts the running account and becomes running again"""
+        # Arrange
+        manager = FakeTaskManager(["me@example.com"])
+        worker = ShardWorker("w1", store, manager)
+        store.set_desired("me@example.com", 'running', 'maintenance')
+        worker.run_once()
+
+        # Act
+        ShardedTaskManager(store).restart_account("me@example.com")
+        worker.run_once()
+        worker.run_once()
+
+        # Assert
+        assert manager.restarts == ["me@example.com"]
+        assert store.get_desired("me@example.com")[:2] == ('running', 'maintenance')
+
+    def test_lease_kept_until_lane_drains(self, store):
+        """A handed-off account keeps its lease while a task is still running"""
+        # Arrange
+        manager = FakeTaskManager(["me@example.com"])
+        worker = ShardWorker("w1", store, manager)
+        store.set_desired("me@example.com", 'running', 'startup')
+        worker.run_once()
+        manager.busy.add("me@example.com")
+
+        # Act
+        worker._hand_off("me@example.com", timeout=0)
+        kept = store.lease_owners()
+        manager.busy.clear()
+        worker._hand_off("me@example.com", timeout=0)
+
+        # Assert
+        assert kept == {"me@example.com": "w1"}
+        assert store.lease_owners() == {}
+        assert "me@example.com" not in worker.owned
+
+
+class TestShardedTaskManager:
+    """Test the web app's control plane"""
+
+    @pytest.fixture
+    def control(self, store):
+        accounts = [type("Account", (), {'email': email})() for email in ("a@example.com", "b@example.com")]
+        with patch('config.get_config') as mock_config:
+            mock_config.return_value.accounts = accounts
+            yield ShardedTaskManager(store)
+
+    def test_control_calls_write_desired_state(self, control, store):
+        """Start and stop are requests for the workers"""
+        # Arrange
+        from services.email_processor import ProcessingMode
+
+        # Act
+        control.start_account("a@example.com", ProcessingMode.MAINTENANCE)
+        control.stop_account("b@example.com")
+
+        # Assert
+        assert store.get_desired("a@example.com")[:2] == ('running', 'maintenance')
+        assert store.get_desired("b@example.com")[0] == 'stopped'
+
+    def test_status_read_from_store(self, control, store):
+        """Published statuses are served, unreported accounts show as stopped"""
+        # Arrange
+        store.publish_status("a@example.com", "w1", {'account_email': "a@example.com", 'state': 'running_startup',
+                                                     'mode': 'startup', 'stats': {'emails_processed': 7}})
+
+        # Act
+        status = control.get_all_status()
+        stats = control.get_aggregate_stats()
+
+        # Assert
+        assert status['accounts']["a@example.com"]['worker_id'] == "w1"
+        assert status['accounts']["b@example.com"]['state'] == 'stopped'
+        assert stats['running_accounts'] == 1 and stats['total_emails_processed'] == 7
+
+    def test_rule_stats_merged_across_workers(self, control, store):
+        """Counters are summed over live workers; the busiest worker's condition order wins"""
+        # Arrange
+        def published(evaluations, order, disabled_reason=None):
+            return {
+                'rules': {'r1': {'name': 'Rule', 'evaluations': evaluations, 'matches': 1, 'match_rate': 0.0,
+                                 'actions_executed': 1, 'action_failures': 0, 'eval_time_ms': 2.0,
+                                 'avg_eval_us': 0.0, 'last_match': None, 'disabled_reason': disabled_reason,
+                                 'disabled_at': None}},
+                'condition_types': {'sender_domain': {'count': evaluations, 'p50': float(evaluations)}},
+                'evaluation_orders': {'r1': order}
+            }
+        for worker_id in ("w1", "w2", "gone"):
+            store.heartbeat(worker_id, now=0 if worker_id == "gone" else None)
+        store.publish_rule_stats("w1", published(10, ["subject"]))
+        store.publish_rule_stats("w2", published(30, ["sender"], "too slow"))
+        store.publish_rule_stats("gone", published(1000, ["stale"]))
+
+        # Act
+        stats = control.get_rule_stats()
+        orders = control.get_evaluation_orders()
+
+        # Assert
+        rule = stats['rules']['r1']
+        assert (rule['evaluations'], rule['matches'], rule['eval_time_ms']) == (40, 2, 4.0)
+        assert rule['match_rate'] == 0.05 and rule['avg_eval_us'] == 100.0
+        assert rule['disabled_reason'] == "too slow"
+        assert stats['condition_types']['sender_domain']['count'] == 30
+        assert orders == {'r1': ["sender"]}
+
+    def test_processor_operations_not_available(self, control):
+        """Operations needing the live processor explain where the account runs"""
+        # Arrange
+        processor = control._get_processor("a@example.com")
+
+        # Act & Assert
+        assert control._get_processor("missing@example.com") is None
+        with pytest.raises(RuntimeError, match="shard worker"):
+            processor.run_manual_batch()
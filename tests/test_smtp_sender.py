@@ -0,0 +1,175 @@
+"""
+Unit Tests for the SMTP Delivery Queue
+
+Tests for pooled connections, batching, retry with backoff and queued
+FORWARD rule actions.
+"""
+
+import smtplib
+import pytest
+from unittest.mock import Mock, patch
+from email.mime.text import MIMEText
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.smtp_sender import SmtpSender, forward_messages, smtp_endpoint
+from rules import RuleAction, EmailRule, ActionType
+from functions import Mail
+
+
+def make_sender(**kwargs):
+    """Sender whose batches are driven by the test instead of a thread"""
+    return SmtpSender("me@example.com", "secret", "smtp.example.com", **kwargs)
+
+
+class TestSmtpSender:
+    """Test queued delivery over a pooled connection"""
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    def test_batch_shares_one_connection(self, mock_smtp):
+        """Consecutive messages are sent over one login"""
+        # Arrange
+        sender = make_sender(batch_size=10)
+        for i in range(3):
+            sender.enqueue("to@example.com", MIMEText(f"message {i}"))
+
+        # Act
+        delivered = sender.process_batch()
+        sender.enqueue("to@example.com", MIMEText("later"))
+        delivered += sender.process_batch()
+
+        # Assert
+        assert delivered == 4
+        mock_smtp.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once_with("me@example.com", "secret")
+        assert mock_smtp.return_value.sendmail.call_count == 4
+        assert sender.stats['batches'] == 2
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    def test_disconnect_retries_with_new_connection(self, mock_smtp):
+        """A dropped connection is reopened and the unsent messages retried"""
+        # Arrange
+        connection = mock_smtp.return_value
+        connection.sendmail.side_effect = [None, smtplib.SMTPServerDisconnected("gone"), None, None]
+        sender = make_sender(retry_base=0)
+        for i in range(3):
+            sender.enqueue("to@example.com", MIMEText(f"message {i}"))
+
+        # Act
+        first = sender.process_batch()
+        second = sender.process_batch()
+
+        # Assert
+        assert (first, second) == (1, 2)
+        assert mock_smtp.call_count == 2
+        assert sender.stats['retried'] == 2
+        assert sender.pending == 0
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    def test_backoff_and_give_up(self, mock_smtp):
+        """Retries wait for their backoff and stop after max_attempts"""
+        # Arrange
+        mock_smtp.return_value.sendmail.side_effect = smtplib.SMTPServerDisconnected("gone")
+        sender = make_sender(retry_base=60, max_attempts=2)
+        sender.enqueue("to@example.com", MIMEText("message"))
+
+        # Act
+        sender.process_batch()
+        not_due = sender.process_batch()
+        sender._retries = [(0, *entry[1:]) for entry in sender._retries]
+        sender.process_batch()
+
+        # Assert
+        assert not_due == 0
+        assert sender.stats['retried'] == 1
+        assert sender.stats['failed'] == 1
+        assert sender.pending == 0
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    def test_rejected_recipient_not_retried(self, mock_smtp):
+        """Permanent rejections are dropped without a retry"""
+        # Arrange
+        mock_smtp.return_value.sendmail.side_effect = smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"no")})
+        sender = make_sender()
+        sender.enqueue("to@example.com", MIMEText("message"))
+
+        # Act
+        sender.process_batch()
+
+        # Assert
+        assert sender.stats['failed'] == 1
+        assert sender.stats['retried'] == 0
+
+    @patch('services.smtp_sender.smtplib.SMTP_SSL')
+    def test_stop_drains_queue_and_reports_delivery(self, mock_smtp):
+        """Queued messages are sent on stop and only accepted ones are reported"""
+        # Arrange
+        mock_smtp.return_value.sendmail.side_effect = [None, smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"no")})]
+        sender = make_sender()
+        delivered = []
+        sender.enqueue("to@example.com", MIMEText("one"), key="one", on_delivered=lambda: delivered.append("one"))
+        sender.enqueue("to@example.com", MIMEText("two"), key="two", on_delivered=lambda: delivered.append("two"))
+
+        # Act
+        pending_before = sender.is_pending("one")
+        sender.stop(timeout=1)
+
+        # Assert
+        assert pending_before
+        assert delivered == ["one"]
+        assert not sender.is_pending("one") and not sender.is_pending("two")
+        assert sender.pending == 0
+
+    def test_smtp_endpoint_derived_from_imap_server(self):
+        """Without environment settings the host comes from the IMAP server"""
+        # Arrange
+        account = Mock()
+        account.server = "imap.example.com"
+
+        # Act
+        with patch.dict(os.environ, {"smtp_server": "", "smtp_port": ""}):
+            endpoint = smtp_endpoint(account)
+
+        # Assert
+        assert endpoint == ("smtp.example.com", 465)
+
+
+class TestForwardAction:
+    """Test that FORWARD rule actions queue instead of sending"""
+
+    @patch('services.smtp_sender.get_account_sender')
+    def test_forward_action_enqueues(self, mock_get_sender):
+        """The rule action fetches the message and hands it to the queue"""
+        # Arrange
+        rule = EmailRule(id="fwd", name="Forward", description="", conditions=[],
+                         actions=[RuleAction(ActionType.FORWARD, "boss@example.com")])
+        message = Mock(from_="a@example.com", to=("me@example.com",), subject="Report", html="<p>hi</p>")
+        mailbox = Mock()
+        mailbox.fetch.return_value = [message]
+        account = Mock()
+        account.email = "me@example.com"
+
+        # Act
+        succeeded = rule._execute_action(rule.actions[0], Mail("7", "Report", "a@example.com", "", None),
+                                         mailbox, account)
+
+        # Assert
+        assert succeeded is True
+        sender = mock_get_sender.return_value
+        sender.enqueue.assert_called_once()
+        to_addr, queued = sender.enqueue.call_args[0][:2]
+        assert to_addr == "boss@example.com"
+        assert queued["To"] == "boss@example.com"
+        assert queued["From"] == "me@example.com"
+
+    @patch('services.smtp_sender.get_account_sender')
+    def test_forward_messages_skips_empty(self, mock_get_sender):
+        """No fetch or sender is needed when there is nothing to forward"""
+        # Act
+        queued = forward_messages(Mock(), Mock(), [], "boss@example.com")
+
+        # Assert
+        assert queued == 0
+        mock_get_sender.assert_not_called()
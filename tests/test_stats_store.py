@@ -0,0 +1,109 @@
+"""
+Unit Tests for the Processing Statistics Store
+
+Tests for the memory-mapped per-account time series: minute, hour and day
+roll-ups, ring slots reused after a full lap, and persistence across reopen.
+"""
+
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.stats_store import StatsStore, StatsSeries, FILE_SIZE, MAGIC, RESOLUTIONS
+
+
+# Local noon, so a few hours either side stay on the same local day
+NOON = time.mktime((2026, 3, 10, 12, 0, 0, 0, 0, -1))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StatsStore(tmp_path / "stats")
+    yield store
+    store.close()
+
+
+class TestStatsStore:
+    """Test recording and querying counts"""
+
+    def test_today_and_last_days(self, store):
+        """Counts roll up into the day and sum across accounts"""
+        # Arrange
+        store.record("a@example.com", {'processed': 3, 'junk': 1}, now=NOON)
+        store.record("a@example.com", {'processed': 2}, now=NOON + 3600)
+        store.record("b@example.com", {'junk': 4, 'unknown': 9}, now=NOON)
+        store.record("a@example.com", {'processed': 10}, now=NOON - 2 * 86400)
+
+        # Act
+        today = store.today(now=NOON + 7200)
+        week = store.last_days(7, now=NOON + 7200)
+        single = store.today("b@example.com", now=NOON)
+
+        # Assert
+        assert today['processed'] == 5
+        assert today['junk'] == 5
+        assert week['processed'] == 15
+        assert single == {'processed': 0, 'inbox': 0, 'junk': 4, 'approved_ads': 0, 'pending': 0, 'rules': 0}
+        assert store.today("missing@example.com", now=NOON)['processed'] == 0
+
+    def test_trend_by_hour(self, store):
+        """Trend returns one bucket per hour, oldest first"""
+        # Arrange
+        store.record("a@example.com", {'pending': 1}, now=NOON - 3600)
+        store.record("a@example.com", {'pending': 2}, now=NOON)
+
+        # Act
+        trend = store.trend('hour', 3, "a@example.com", now=NOON)
+
+        # Assert
+        assert [point['pending'] for point in trend] == [0, 1, 2]
+        assert trend[-1]['time'].endswith('12:00:00')
+
+    def test_stale_slot_reads_as_zero(self, store):
+        """A slot from an earlier lap of the ring is ignored and then reset"""
+        # Arrange
+        lap = RESOLUTIONS['minute'][0] * RESOLUTIONS['minute'][1]
+        store.record("a@example.com", {'inbox': 5}, now=NOON)
+
+        # Act
+        stale = store.totals('minute', 1, now=NOON + lap)
+        store.record("a@example.com", {'inbox': 1}, now=NOON + lap)
+        fresh = store.totals('minute', 1, now=NOON + lap)
+
+        # Assert
+        assert stale['inbox'] == 0
+        assert fresh['inbox'] == 1
+
+    def test_persists_across_reopen(self, tmp_path):
+        """Counts survive closing and reopening the store"""
+        # Arrange
+        first = StatsStore(tmp_path)
+        first.record("a@example.com", {'approved_ads': 7}, now=NOON)
+        first.close()
+
+        # Act
+        second = StatsStore(tmp_path)
+        today = second.today(now=NOON)
+        second.close()
+
+        # Assert
+        assert today['approved_ads'] == 7
+
+    def test_invalid_file_recreated(self, tmp_path):
+        """A file with another layout is replaced by an empty series"""
+        # Arrange
+        path = tmp_path / "a@example.com.ts"
+        path.write_bytes(b"garbage")
+
+        # Act
+        series = StatsSeries(path)
+        counts = series.read('day', 0)
+        series.close()
+
+        # Assert
+        assert path.stat().st_size == FILE_SIZE
+        assert path.read_bytes()[:len(MAGIC)] == MAGIC
+        assert sum(counts.values()) == 0
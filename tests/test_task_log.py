@@ -0,0 +1,130 @@
+"""
+Unit Tests for the Task History Log
+
+Tests for the in-memory tail, cursor pagination and filters, on-disk
+segments with offset indexes, retention and recovery after a crash.
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.task_log import TaskLog
+
+
+def _entry(number, account="a@example.com", task_type="service_started"):
+    return {'timestamp': f"2026-01-01T00:00:{number:02d}", 'type': task_type,
+            'details': {'account': account, 'number': number}}
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = TaskLog(tmp_path, tail_size=5, segment_entries=4, max_segments=10)
+    yield log
+    log.close()
+
+
+class TestTaskLog:
+    """Test appending, querying and persistence"""
+
+    def test_memory_only_tail_is_bounded(self):
+        """Without a directory only the newest entries are kept"""
+        # Arrange
+        log = TaskLog(tail_size=3)
+
+        # Act
+        for number in range(5):
+            log.append(_entry(number))
+
+        # Assert
+        assert len(log) == 3
+        assert [entry['seq'] for entry in log.query(10)] == [3, 4, 5]
+
+    def test_pagination_reaches_past_the_tail(self, log):
+        """Pages walk back from the cursor into the segments on disk"""
+        # Arrange
+        for number in range(12):
+            log.append(_entry(number))
+
+        # Act
+        first = log.query(5)
+        second = log.query(5, before=first[0]['seq'])
+        third = log.query(5, before=second[0]['seq'])
+
+        # Assert
+        assert [entry['seq'] for entry in first] == [8, 9, 10, 11, 12]
+        assert [entry['seq'] for entry in second] == [3, 4, 5, 6, 7]
+        assert [entry['seq'] for entry in third] == [1, 2]
+
+    def test_filters(self, log):
+        """Entries can be filtered by account and type"""
+        # Arrange
+        for number in range(10):
+            log.append(_entry(number, account="a@example.com" if number % 2 else "b@example.com",
+                              task_type="mode_switched" if number == 2 else "service_started"))
+
+        # Act
+        by_account = log.query(10, account_email="b@example.com")
+        by_type = log.query(10, task_type="mode_switched")
+
+        # Assert
+        assert [entry['details']['number'] for entry in by_account] == [0, 2, 4, 6, 8]
+        assert [entry['details']['number'] for entry in by_type] == [2]
+
+    def test_history_survives_restart(self, tmp_path):
+        """A reopened log continues the sequence and reloads its tail"""
+        # Arrange
+        first = TaskLog(tmp_path, tail_size=5, segment_entries=4)
+        for number in range(6):
+            first.append(_entry(number))
+        first.close()
+
+        # Act
+        second = TaskLog(tmp_path, tail_size=5, segment_entries=4)
+        added = second.append(_entry(6))
+        entries = second.query(10)
+        second.close()
+
+        # Assert
+        assert added['seq'] == 7
+        assert [entry['seq'] for entry in entries] == list(range(1, 8))
+        assert [entry['seq'] for entry in second.tail] == [3, 4, 5, 6, 7]
+
+    def test_old_segments_deleted(self, tmp_path):
+        """Only max_segments segment files are kept"""
+        # Arrange
+        log = TaskLog(tmp_path, tail_size=2, segment_entries=4, max_segments=2)
+
+        # Act
+        for number in range(10):
+            log.append(_entry(number))
+        entries = log.query(20)
+        log.close()
+
+        # Assert
+        assert len(list(tmp_path.glob('*.log'))) == 2
+        assert [entry['seq'] for entry in entries] == [5, 6, 7, 8, 9, 10]
+
+    def test_torn_write_repaired(self, tmp_path):
+        """A partly written last entry is dropped and the index rebuilt"""
+        # Arrange
+        log = TaskLog(tmp_path, tail_size=5)
+        for number in range(3):
+            log.append(_entry(number))
+        log.close()
+        segment = next(tmp_path.glob('*.log'))
+        with open(segment, 'ab') as f:
+            f.write(b'{"seq": 4, "typ')
+        next(tmp_path.glob('*.idx')).write_bytes(b'')
+
+        # Act
+        reopened = TaskLog(tmp_path, tail_size=5)
+        added = reopened.append(_entry(3))
+        entries = reopened.query(10)
+        reopened.close()
+
+        # Assert
+        assert added['seq'] == 4
+        assert [entry['details']['number'] for entry in entries] == [0, 1, 2, 3]
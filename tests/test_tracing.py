@@ -0,0 +1,137 @@
+"""
+Unit Tests for Cycle Tracing
+
+Tests for nested spans, attributes, the per-account ring buffer and the
+cycle IDs stamped onto structured log records.
+"""
+
+import json
+import logging
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tracing
+from tracing import cycle, span, add_span, traced, set_attributes, TraceBuffer, TraceContextFilter
+from logging_config import StructuredFormatter
+
+
+@pytest.fixture(autouse=True)
+def buffer(monkeypatch):
+    buffer = TraceBuffer(max_cycles=3)
+    monkeypatch.setattr(tracing, '_trace_buffer', buffer)
+    return buffer
+
+
+class TestSpans:
+    """Test cycles and nested spans"""
+
+    def test_nested_spans_recorded(self, buffer):
+        """Spans nest under their parent with attributes and relative times"""
+        # Arrange
+        @traced()
+        def purge(folder):
+            set_attributes(folder=folder, uids=4)
+
+        # Act
+        with cycle("me@example.com", "inbox_job"):
+            with span('fetch', folder="INBOX") as fetch:
+                fetch.set(uids=10)
+                purge("INBOX.Junk")
+            add_span('move', start=0.0, end=0.0, uids=6)
+
+        # Assert
+        trace = buffer.recent("me@example.com")[0]
+        spans = {entry['name']: entry for entry in trace['spans']}
+        assert trace['name'] == "inbox_job" and trace['status'] == 'ok'
+        assert spans['fetch']['parent_id'] == spans['inbox_job']['span_id']
+        assert spans['purge']['parent_id'] == spans['fetch']['span_id']
+        assert spans['fetch']['attributes'] == {'folder': "INBOX", 'uids': 10}
+        assert spans['purge']['attributes'] == {'folder': "INBOX.Junk", 'uids': 4}
+        assert spans['fetch']['start_ms'] >= 0
+        assert spans['fetch']['duration_ms'] >= spans['purge']['duration_ms']
+
+    def test_errors_marked(self, buffer):
+        """A failing cycle keeps the error on the span and the cycle"""
+        # Act
+        with pytest.raises(ValueError):
+            with cycle("me@example.com", "inbox_job"):
+                with span('login'):
+                    raise ValueError("auth failed")
+
+        # Assert
+        trace = buffer.recent("me@example.com")[0]
+        assert trace['status'] == 'error'
+        assert trace['spans'][1]['error'] == "auth failed"
+
+    def test_no_cycle_is_noop(self, buffer):
+        """Spans outside a cycle record nothing"""
+        # Act
+        with span('fetch') as fetch:
+            fetch.set(uids=3)
+        set_attributes(uids=1)
+
+        # Assert
+        assert buffer.recent("me@example.com") == []
+
+    def test_inner_cycle_becomes_span(self, buffer):
+        """A cycle started inside another is traced as a span of the outer one"""
+        # Act
+        with cycle("me@example.com", "manual_batch"):
+            with cycle("me@example.com", "process_inbox"):
+                pass
+
+        # Assert
+        traces = buffer.recent("me@example.com")
+        assert len(traces) == 1
+        assert [entry['name'] for entry in traces[0]['spans']] == ["manual_batch", "process_inbox"]
+
+
+class TestTraceBuffer:
+    """Test the per-account ring buffer"""
+
+    def test_keeps_last_cycles_per_account(self, buffer):
+        """Only the newest cycles are kept, newest first, per account"""
+        # Act
+        for index in range(5):
+            with cycle("me@example.com", f"job{index}"):
+                pass
+        with cycle("other@example.com", "job"):
+            pass
+
+        # Assert
+        assert [trace['name'] for trace in buffer.recent("me@example.com")] == ["job4", "job3", "job2"]
+        assert [trace['name'] for trace in buffer.recent("me@example.com", limit=1)] == ["job4"]
+        assert len(buffer.recent("other@example.com")) == 1
+
+
+class TestTraceLogging:
+    """Test correlation through structured logs"""
+
+    def test_log_records_carry_cycle_and_span(self):
+        """Records logged inside a cycle include its IDs in JSON output"""
+        # Arrange
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        handler.addFilter(TraceContextFilter())
+        test_logger = logging.getLogger('test_tracing')
+        test_logger.addHandler(handler)
+        test_logger.setLevel(logging.INFO)
+
+        # Act
+        try:
+            with cycle("me@example.com", "inbox_job") as current:
+                with span('move') as move:
+                    test_logger.info("moving")
+            test_logger.info("outside")
+        finally:
+            test_logger.removeHandler(handler)
+
+        # Assert
+        entry = json.loads(StructuredFormatter(use_json=True).format(records[0]))
+        assert entry['cycle_id'] == current.cycle_id
+        assert entry['span_id'] == move.span_id
+        assert not hasattr(records[1], 'cycle_id')
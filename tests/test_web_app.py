@@ -113,6 +113,23 @@ class TestWebApp:
                 response = client.get('/nonexistent-page')
                 assert response.status_code == 404
                 assert b'404 Not Found' in response.data
+    
+    def test_metrics_endpoint(self):
+        """Test that /metrics needs a session or the scrape token"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = create_app(config_dir=temp_dir, testing=True)
+            
+            with app.test_client() as client, \
+                    patch.dict(os.environ, {'MAIL_RULEZ_METRICS_TOKEN': 'scrape-secret'}), \
+                    patch('web.routes.monitoring.get_task_manager') as mock_get_task_manager:
+                mock_get_task_manager.return_value.get_metrics_text.return_value = "mail_rulez_up 1\n"
+                
+                assert client.get('/metrics').status_code == 401
+                assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+                response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+                assert response.status_code == 200
+                assert response.content_type.startswith('text/plain; version=0.0.4')
+                assert response.data == b"mail_rulez_up 1\n"
 
 
 class TestWebAppIntegration:
@@ -0,0 +1,237 @@
+"""
+Unit Tests for the Processing Scheduler and Worker Pool
+
+Tests for serialized per-account lanes, job coalescing and the shared
+scheduler used by all email processors.
+"""
+
+import threading
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from apscheduler.triggers.interval import IntervalTrigger
+from services.worker_pool import WorkerPool, ProcessingScheduler, PRIORITY_INTERACTIVE
+from services.email_processor import EmailProcessor
+from config import AccountConfig
+
+
+class TestWorkerPool:
+    """Test the bounded worker pool"""
+
+    @pytest.fixture
+    def pool(self):
+        pool = WorkerPool(max_workers=1)
+        yield pool
+        pool.shutdown(wait=True, cancel_pending=True)
+
+    def test_accounts_served_round_robin(self, pool):
+        """A busy account does not delay other accounts' tasks"""
+        # Arrange
+        gate = threading.Event()
+        order = []
+        pool.submit("busy", gate.wait)
+        for i in range(3):
+            pool.submit("busy", order.append, f"busy-{i}")
+        last = pool.submit("quiet", order.append, "quiet-0")
+
+        # Act
+        gate.set()
+        last.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert order[0] == "quiet-0"
+        assert sorted(order) == ["busy-0", "busy-1", "busy-2", "quiet-0"]
+
+    def test_pending_key_skips_duplicate(self, pool):
+        """A job that is still queued or running is not queued again"""
+        # Arrange
+        gate = threading.Event()
+        first = pool.submit("account", gate.wait, key="inbox")
+
+        # Act
+        duplicate = pool.submit("account", gate.wait, key="inbox")
+        gate.set()
+        first.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert duplicate is None
+        assert pool.stats['skipped'] == 1
+        assert pool.get_status()['queued'] == 0
+
+    def test_account_lane_serialized(self):
+        """An account's tasks never overlap, even with idle workers"""
+        # Arrange
+        pool = WorkerPool(max_workers=3)
+        lock = threading.Lock()
+        running, overlaps = [0], []
+
+        def job():
+            with lock:
+                running[0] += 1
+                overlaps.append(running[0])
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+
+        # Act
+        futures = [pool.submit("account", job) for _ in range(4)]
+        for future in futures:
+            future.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert max(overlaps) == 1
+
+    def test_lane_reports_depth_and_wait(self, pool):
+        """Lane stats show queued tasks and time spent waiting"""
+        # Arrange
+        gate, started = threading.Event(), threading.Event()
+        pool.submit("account", lambda: (started.set(), gate.wait()))
+        last = pool.submit("account", lambda: None)
+        started.wait(timeout=5)
+
+        # Act
+        queued = pool.lane_status("account")
+        threading.Event().wait(0.05)
+        gate.set()
+        last.result(timeout=5)
+        pool.shutdown(wait=True)
+        lane = pool.get_status()['lanes']['account']
+
+        # Assert
+        assert queued['queued'] == 1 and queued['running']
+        assert lane['runs'] == 2
+        assert lane['max_wait_seconds'] >= 0.05
+
+    def test_interactive_task_jumps_account_queue(self, pool):
+        """An interactive request runs before the account's queued background cycles"""
+        # Arrange
+        gate, started = threading.Event(), threading.Event()
+        order = []
+        pool.submit("account", lambda: (started.set(), gate.wait()))
+        started.wait(timeout=5)
+        for i in range(2):
+            pool.submit("account", order.append, f"background-{i}")
+        pool.submit("other", order.append, "other-background")
+
+        # Act
+        last = pool.submit("account", order.append, "interactive", priority=PRIORITY_INTERACTIVE)
+        gate.set()
+        last.result(timeout=5)
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert order.index("interactive") < order.index("background-0")
+        assert pool.get_status()['interactive']['runs'] == 1
+        assert pool.get_status()['lanes']['account']['runs'] == 3
+
+    def test_reserved_worker_serves_interactive_under_load(self):
+        """Busy background workers do not delay another account's interactive request"""
+        # Arrange
+        pool = WorkerPool(max_workers=1, reserved_workers=1)
+        gate = threading.Event()
+        pool.submit("busy", gate.wait)
+        pool.submit("busy-2", gate.wait)
+
+        # Act
+        result = pool.submit("dashboard", lambda: "done", priority=PRIORITY_INTERACTIVE).result(timeout=5)
+        gate.set()
+        pool.shutdown(wait=True)
+
+        # Assert
+        assert result == "done"
+        assert pool.get_status()['interactive']['max_wait_seconds'] < 1
+
+    def test_failed_task_reports_exception(self, pool):
+        """Task exceptions are delivered through the future"""
+        # Act
+        future = pool.submit("account", lambda: 1 / 0)
+
+        # Assert
+        with pytest.raises(ZeroDivisionError):
+            future.result(timeout=5)
+
+
+class TestProcessingScheduler:
+    """Test the scheduler shared by all accounts"""
+
+    @pytest.fixture
+    def scheduler(self):
+        scheduler = ProcessingScheduler(max_workers=2)
+        yield scheduler
+        scheduler.shutdown(wait=True)
+
+    def test_thread_count_constant_across_accounts(self, scheduler):
+        """Adding accounts does not add scheduler or worker threads"""
+        # Arrange
+        before = threading.active_count()
+        with patch('services.email_processor.get_config'):
+            processors = [
+                EmailProcessor(AccountConfig(name=f"a{i}", server="imap.example.com",
+                                             email=f"user{i}@example.com", password="x"), scheduler=scheduler)
+                for i in range(20)
+            ]
+
+        # Act
+        ran = threading.Event()
+        for processor in processors:
+            processor.scheduler.start()
+            processor.scheduler.add_job(ran.set, trigger=IntervalTrigger(minutes=5),
+                                        id=f"job_{processor.account_config.email}", next_run_time=datetime.now())
+        ran.wait(timeout=5)
+
+        # Assert
+        assert ran.is_set()
+        assert threading.active_count() - before <= 1 + 1 + 2  # scheduler, its executor, workers
+        assert len(processors[0].scheduler.get_jobs()) == 1
+        assert len(scheduler.scheduler.get_jobs()) == 20
+
+    def test_account_shutdown_removes_only_its_jobs(self, scheduler):
+        """Stopping one account leaves other accounts scheduled"""
+        # Arrange
+        first = scheduler.for_account("first@example.com")
+        second = scheduler.for_account("second@example.com")
+        for view in (first, second):
+            view.start()
+            view.add_job(lambda: None, trigger=IntervalTrigger(minutes=5), id=f"inbox_{view.account_email}")
+
+        # Act
+        first.shutdown(wait=True)
+
+        # Assert
+        assert not first.running
+        assert first.get_jobs() == []
+        assert [job.id for job in second.get_jobs()] == ["inbox_second@example.com"]
+        assert scheduler.scheduler.running
+
+    def test_account_shutdown_drains_its_lane(self, scheduler):
+        """Shutdown cancels queued tasks and waits for the running one"""
+        # Arrange
+        view = scheduler.for_account("drain@example.com")
+        view.start()
+        started = threading.Event()
+        finished = []
+
+        def slow():
+            started.set()
+            threading.Event().wait(0.2)
+            finished.append('slow')
+
+        running = view.submit(slow)
+        queued = view.submit(lambda: finished.append('queued'))
+        started.wait(timeout=5)
+
+        # Act
+        view.shutdown(wait=True)
+
+        # Assert
+        assert finished == ['slow']
+        assert running.done() and queued.cancelled()
+        assert view.get_lane_status()['queued'] == 0 and not view.get_lane_status()['running']
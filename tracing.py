@@ -0,0 +1,298 @@
+"""
+Cycle Tracing for Mail-Rulez
+
+Lightweight spans for following one processing cycle through the pipeline.
+Each cycle gets an ID, and spans nest under it with perf_counter start/end
+times and attributes (UID counts, bytes, folder). While a cycle is active,
+every log record carries its cycle and span IDs (see TraceContextFilter).
+Finished spans are logged at debug level and the finished cycle, with all
+its spans, at info level. The last cycles of each account are kept in a
+ring buffer for the dashboard's waterfall view.
+
+Outside a cycle, span() and traced functions cost one context variable lookup.
+"""
+
+import functools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+
+DEFAULT_TRACE_HISTORY = 20  # cycles kept per account
+MAX_SPANS_PER_CYCLE = 500  # later spans are counted but not kept
+
+_current_cycle: ContextVar[Optional['Cycle']] = ContextVar('trace_cycle', default=None)
+_current_span: ContextVar[Optional['Span']] = ContextVar('trace_span', default=None)
+
+logger = logging.getLogger('tracing')
+
+
+class Span:
+    """One timed step of a cycle"""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None,
+                 start: Optional[float] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Add or replace attributes"""
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        """Span with times in milliseconds relative to origin"""
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((end - self.start) * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NullSpan:
+    """Span stand-in used outside a cycle"""
+
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Cycle:
+    """One processing cycle: a root span plus the spans opened beneath it"""
+
+    def __init__(self, account_email: str, name: str):
+        self.cycle_id = uuid.uuid4().hex[:16]
+        self.account_email = account_email
+        self.started_at = datetime.now()
+        self.root = Span(name)
+        self.spans: List[Span] = [self.root]
+        self.dropped_spans = 0
+
+    def add(self, span: Span):
+        if len(self.spans) < MAX_SPANS_PER_CYCLE:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        origin = self.root.start
+        root = self.root.to_dict(origin)
+        return {
+            'cycle_id': self.cycle_id,
+            'account_email': self.account_email,
+            'name': self.root.name,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': root['duration_ms'],
+            'status': 'error' if self.root.error else 'ok',
+            'error': self.root.error,
+            'dropped_spans': self.dropped_spans,
+            'spans': [span.to_dict(origin) for span in self.spans]
+        }
+
+
+@contextmanager
+def cycle(account_email: str, name: str):
+    """
+    Trace the enclosed block as one processing cycle
+
+    A cycle started inside another cycle becomes a span of the outer one.
+
+    Args:
+        account_email: Account the cycle belongs to
+        name: Cycle name, usually the job name
+    """
+    if _current_cycle.get() is not None:
+        with span(name):
+            yield _current_cycle.get()
+        return
+
+    current = Cycle(account_email, name)
+    cycle_token = _current_cycle.set(current)
+    span_token = _current_span.set(current.root)
+    try:
+        yield current
+    except BaseException as e:
+        current.root.error = str(e)
+        raise
+    finally:
+        current.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_cycle.reset(cycle_token)
+        get_trace_buffer().add(current)
+        trace = current.to_dict()
+        logger.info(f"Cycle {name} for {account_email} took {trace['duration_ms']:.1f} ms "
+                    f"({len(current.spans)} spans)",
+                    extra={'account_email': account_email, 'cycle_id': current.cycle_id, 'trace': trace})
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Trace the enclosed block as a span of the current cycle
+
+    Yields:
+        Span: The span, for adding attributes (a no-op stand-in outside a cycle)
+    """
+    current = _current_cycle.get()
+    if current is None:
+        yield NULL_SPAN
+        return
+
+    parent = _current_span.get()
+    new_span = Span(name, parent.span_id if parent else None, attributes)
+    current.add(new_span)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = str(e)
+        raise
+    finally:
+        new_span.end = time.perf_counter()
+        _current_span.reset(token)
+        _log_span(current, new_span)
+
+
+def add_span(name: str, start: float, end: Optional[float] = None, **attributes):
+    """
+    Record already-timed work as a span of the current cycle
+
+    Args:
+        name: Span name
+        start: time.perf_counter() when the work started
+        end: time.perf_counter() when it ended (defaults to now)
+    """
+    current = _current_cycle.get()
+    if current is None:
+        return
+    parent = _current_span.get()
+    new_span = Span(name, parent.span_id if parent else None, attributes, start=start)
+    new_span.end = time.perf_counter() if end is None else end
+    current.add(new_span)
+    _log_span(current, new_span)
+
+
+def _log_span(current: Cycle, finished: Span):
+    if logger.isEnabledFor(logging.DEBUG):
+        data = finished.to_dict(current.root.start)
+        logger.debug(f"Span {finished.name} took {data['duration_ms']:.1f} ms",
+                     extra={'account_email': current.account_email, 'span': data})
+
+
+def traced(name: Optional[str] = None):
+    """Decorator tracing every call of a function as a span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_cycle.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attributes(**attributes):
+    """Add attributes to the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamps the active cycle and span IDs onto log records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_cycle.get()
+        if current is not None:
+            if not hasattr(record, 'cycle_id'):
+                record.cycle_id = current.cycle_id
+            current_span = _current_span.get()
+            if current_span is not None and not hasattr(record, 'span_id'):
+                record.span_id = current_span.span_id
+        return True
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent cycles per account"""
+
+    def __init__(self, max_cycles: int = DEFAULT_TRACE_HISTORY):
+        self.max_cycles = max(1, int(max_cycles))
+        self._cycles: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, finished: Cycle):
+        with self._lock:
+            self._cycles.setdefault(finished.account_email, deque(maxlen=self.max_cycles)).append(finished)
+
+    def recent(self, account_email: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Recent cycles of an account, newest first
+
+        Args:
+            account_email: Account to report
+            limit: Maximum number of cycles (defaults to all kept)
+        """
+        with self._lock:
+            cycles = list(self._cycles.get(account_email, ()))
+        cycles.reverse()
+        return [finished.to_dict() for finished in cycles[:limit]]
+
+    def clear(self, account_email: Optional[str] = None):
+        """Forget the cycles of one account, or of all accounts"""
+        with self._lock:
+            if account_email is None:
+                self._cycles = {}
+            else:
+                self._cycles.pop(account_email, None)
+
+
+# Global trace buffer instance
+_trace_buffer: Optional[TraceBuffer] = None
+_trace_buffer_lock = threading.Lock()
+
+
+def get_trace_buffer() -> TraceBuffer:
+    """
+    Get global trace buffer instance (singleton)
+
+    Returns:
+        TraceBuffer: Recent cycles per account, sized by the trace_history_size setting
+    """
+    global _trace_buffer
+
+    if _trace_buffer is None:
+        with _trace_buffer_lock:
+            if _trace_buffer is None:
+                try:
+                    from config import get_config
+                    size = get_config().get_scheduler_setting('trace_history_size', DEFAULT_TRACE_HISTORY)
+                except Exception:
+                    size = DEFAULT_TRACE_HISTORY
+                _trace_buffer = TraceBuffer(size)
+
+    return _trace_buffer
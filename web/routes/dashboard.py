@@ -168,16 +168,22 @@ def get_processing_stats():
         else:
             last_run_display = 'Never'
         
-        # Convert to dashboard format with safe defaults
-        total_processed = aggregate_stats.get('total_emails_processed', 0)
+        # Daily breakdown comes from the on-disk time series shared by all processes
+        try:
+            from services.stats_store import get_stats_store
+            today = get_stats_store().today()
+        except Exception as e:
+            current_app.logger.warning(f"Error reading daily stats: {e}")
+            today = {}
+        total_processed = sum(today.values())
         
         # Debug logging for zero value troubleshooting
         current_app.logger.debug(f"Processing stats - total_processed: {total_processed}, aggregate_stats keys: {list(aggregate_stats.keys())}")
         
         stats = {
             'total_processed_today': total_processed,
-            'whitelisted_today': 0,  # TODO: Implement daily breakdown
-            'blacklisted_today': 0,  # TODO: Implement daily breakdown
+            'whitelisted_today': today.get('processed', 0) + today.get('inbox', 0),
+            'blacklisted_today': today.get('junk', 0),
             'pending_count': aggregate_stats.get('total_emails_pending', 0),
             'last_run': last_run_display,
             'processing_errors': aggregate_stats.get('total_errors', 0),
@@ -0,0 +1,47 @@
+"""
+Monitoring Routes for Mail-Rulez
+
+Prometheus scrape endpoint. Metrics come from pre-aggregated counters, so a
+scrape never contacts mail servers or blocks processing.
+"""
+
+import hmac
+import logging
+import os
+from flask import Blueprint, Response, current_app, request
+
+from services.task_manager import get_task_manager
+
+monitoring_bp = Blueprint('monitoring', __name__)
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _authorized() -> bool:
+    """Logged-in users, or scrapers presenting MAIL_RULEZ_METRICS_TOKEN as a bearer token"""
+    if current_app.get_current_user():
+        return True
+    token = os.getenv('MAIL_RULEZ_METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
+
+@monitoring_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics
+    
+    Returns:
+        text: Metrics in text exposition format
+    """
+    if not _authorized():
+        return Response("Authentication required\n", status=401, content_type='text/plain')
+    
+    try:
+        # Followers forward to the processing leader, whose counters cover all accounts
+        return Response(get_task_manager().get_metrics_text(), content_type=CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"Failed to render metrics: {e}")
+        return Response(f"# metrics unavailable: {e}\n", status=503, content_type='text/plain')
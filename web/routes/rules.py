@@ -4,6 +4,7 @@ Rules management routes for Mail-Rulez web interface
 Handles custom email processing rules configuration.
 """
 
+import re
 import sys
 import uuid
 from pathlib import Path
@@ -16,7 +17,9 @@ from datetime import datetime
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from rules import RulesEngine, EmailRule, RuleCondition, RuleAction, ConditionType, ActionType, RULE_TEMPLATES, create_rule_from_template
+from rules import RulesEngine, EmailRule, RuleCondition, RuleAction, ConditionType, ActionType, RULE_TEMPLATES, create_rule_from_template, backtest_rules
+from header_cache import get_header_cache
+from regex_guard import analyze_regex
 
 
 rules_bp = Blueprint('rules', __name__)
@@ -62,6 +65,45 @@ def ensure_list_files_exist(rule):
                     current_app.logger.error(f"Failed to create list file {list_path}: {e}")
 
 
+def rule_from_json(rule_data, rule_id='test', name='Test Rule'):
+    """
+    Build a temporary rule from API JSON data
+    
+    Args:
+        rule_data: Dict with conditions, actions and condition_logic
+        rule_id: ID used when rule_data does not provide one
+        name: Name used when rule_data does not provide one
+        
+    Returns:
+        EmailRule: Rule that is not saved to the rules file
+    """
+    conditions = []
+    for cond_data in rule_data.get('conditions', []):
+        conditions.append(RuleCondition(
+            type=ConditionType(cond_data['type']),
+            value=cond_data['value'],
+            case_sensitive=cond_data.get('case_sensitive', False)
+        ))
+    
+    actions = []
+    for action_data in rule_data.get('actions', []):
+        actions.append(RuleAction(
+            type=ActionType(action_data['type']),
+            target=action_data['target']
+        ))
+    
+    return EmailRule(
+        id=rule_data.get('id') or rule_id,
+        name=rule_data.get('name') or name,
+        description='',
+        conditions=conditions,
+        actions=actions,
+        account_email=rule_data.get('account_email', ''),
+        condition_logic=rule_data.get('condition_logic', 'AND'),
+        stop_processing=rule_data.get('stop_processing', False)
+    )
+
+
 def validate_rule(rule, exclude_rule_id=None):
     """
     Validate rule for common issues
@@ -75,6 +117,11 @@ def validate_rule(rule, exclude_rule_id=None):
     """
     errors = []
     
+    # Reject subject regexes that are invalid or prone to catastrophic backtracking
+    for condition in rule.conditions:
+        if condition.type == ConditionType.SUBJECT_REGEX:
+            errors.extend(analyze_regex(condition.value, condition.case_sensitive))
+    
     # Check for duplicate rule names
     rules_engine = get_rules_engine()
     existing_rules = rules_engine.get_all_rules()
@@ -88,6 +135,11 @@ def validate_rule(rule, exclude_rule_id=None):
     accounts = config.accounts
     
     for action in rule.actions:
+        if action.type == ActionType.FORWARD:
+            if not re.fullmatch(r"[^@\s<>]+@[^@\s<>]+\.[^@\s<>]+", action.target or ""):
+                errors.append(f"Forward address '{action.target}' is not a valid email address")
+            continue
+        
         if action.type == ActionType.MOVE_TO_FOLDER:
             folder_name = action.target
             
@@ -153,7 +205,8 @@ class ActionForm(FlaskForm):
     type = SelectField('Action Type', choices=[
         (ActionType.MOVE_TO_FOLDER.value, 'Move to Folder'),
         (ActionType.ADD_TO_LIST.value, 'Add to List'),
-        (ActionType.CREATE_LIST.value, 'Create List')
+        (ActionType.CREATE_LIST.value, 'Create List'),
+        (ActionType.FORWARD.value, 'Forward Email')
     ])
     target = StringField('Target', validators=[DataRequired()])
 
@@ -176,6 +229,7 @@ class RuleForm(FlaskForm):
         NumberRange(min=1, max=1000, message='Priority must be between 1 and 1000')
     ], default=100)
     active = BooleanField('Active', default=True)
+    stop_processing = BooleanField('Stop processing further rules', default=False)
     
     conditions = FieldList(FormField(ConditionForm), min_entries=1)
     actions = FieldList(FormField(ActionForm), min_entries=1)
@@ -189,7 +243,15 @@ def list_rules():
     """List all configured rules"""
     rules_engine = get_rules_engine()
     rules = rules_engine.get_all_rules()
-    return render_template('rules/list.html', rules=rules, templates=RULE_TEMPLATES)
+    try:
+        # Import here to avoid circular imports
+        from services.task_manager import get_task_manager
+        # Counters live in the processing process (the leader or the shard workers)
+        rule_stats = get_task_manager().get_rule_stats()['rules']
+    except Exception as e:
+        current_app.logger.warning(f"Rule stats not available: {e}")
+        rule_stats = {}
+    return render_template('rules/list.html', rules=rules, templates=RULE_TEMPLATES, rule_stats=rule_stats)
 
 
 @rules_bp.route('/add')
@@ -223,6 +285,7 @@ def create_rule():
         condition_logic = request.form.get('condition_logic', 'AND')
         priority = int(request.form.get('priority', 100))
         active = 'active' in request.form
+        stop_processing = 'stop_processing' in request.form
         
         # Extract conditions
         conditions = []
@@ -270,6 +333,7 @@ def create_rule():
             condition_logic=condition_logic,
             priority=priority,
             active=active,
+            stop_processing=stop_processing,
             created_at=datetime.now().isoformat(),
             updated_at=datetime.now().isoformat()
         )
@@ -341,6 +405,7 @@ def update_rule(rule_id):
         condition_logic = request.form.get('condition_logic', 'AND')
         priority = int(request.form.get('priority', 100))
         active = 'active' in request.form
+        stop_processing = 'stop_processing' in request.form
         
         # Extract conditions
         conditions = []
@@ -388,6 +453,7 @@ def update_rule(rule_id):
             condition_logic=condition_logic,
             priority=priority,
             active=active,
+            stop_processing=stop_processing,
             created_at=existing_rule.created_at,
             updated_at=datetime.now().isoformat()
         )
@@ -468,33 +534,11 @@ def test_rule():
     """Test a rule against sample email data"""
     try:
         data = request.get_json()
-        rule_data = data.get('rule')
         email_data = data.get('email')
         
         # Create temporary rule for testing
-        conditions = []
-        for cond_data in rule_data.get('conditions', []):
-            conditions.append(RuleCondition(
-                type=ConditionType(cond_data['type']),
-                value=cond_data['value'],
-                case_sensitive=cond_data.get('case_sensitive', False)
-            ))
-        
-        actions = []
-        for action_data in rule_data.get('actions', []):
-            actions.append(RuleAction(
-                type=ActionType(action_data['type']),
-                target=action_data['target']
-            ))
-        
-        rule = EmailRule(
-            id='test',
-            name='Test Rule',
-            description='',
-            conditions=conditions,
-            actions=actions,
-            condition_logic=rule_data.get('condition_logic', 'AND')
-        )
+        rule = rule_from_json(data.get('rule'))
+        actions = rule.actions
         
         # Test rule
         matches = rule.matches(email_data)
@@ -509,6 +553,39 @@ def test_rule():
         return jsonify({'success': False, 'error': str(e)})
 
 
+@rules_bp.route('/api/backtest', methods=['POST'])
+@login_required
+def backtest_rule():
+    """Backtest a draft rule or the current rule set against cached headers"""
+    try:
+        data = request.get_json() or {}
+        account_email = data.get('account_email')
+        if not account_email:
+            return jsonify({'success': False, 'error': 'account_email is required'})
+        
+        limit = int(data.get('limit', 50000))
+        sample_size = int(data.get('sample_size', 10))
+        
+        draft = None
+        if data.get('rule'):
+            draft = rule_from_json(data['rule'], rule_id='draft', name='Draft Rule')
+        
+        rules_engine = get_rules_engine()
+        account_rules = [
+            rule for rule in rules_engine.get_all_rules()
+            if rule.account_email in (account_email, "")
+        ]
+        headers = get_header_cache().get_headers(account_email, limit=limit)
+        
+        report = backtest_rules(account_rules, headers, draft=draft, sample_size=sample_size)
+        report['success'] = True
+        report['account_email'] = account_email
+        return jsonify(report)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
 @rules_bp.route('/api/templates')
 @login_required
 def get_templates():
@@ -516,4 +593,57 @@ def get_templates():
     return jsonify({
         'success': True,
         'templates': RULE_TEMPLATES
-    })
\ No newline at end of file
+    })
+
+@rules_bp.route('/api/evaluation-order')
+@login_required
+def get_evaluation_order():
+    """Get the current condition evaluation order of every rule, for debugging"""
+    try:
+        from services.task_manager import get_task_manager
+        rules_engine = get_rules_engine()
+        # Inactive rules keep their configured order; active ones report the order processing tuned
+        evaluation_order = rules_engine.get_evaluation_orders()
+        evaluation_order.update(get_task_manager().get_evaluation_orders())
+        return jsonify({
+            'success': True,
+            'evaluation_order': evaluation_order
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@rules_bp.route('/api/stats')
+@login_required
+def get_rule_stats():
+    """Get per-rule hit counts and evaluation timing"""
+    try:
+        from services.task_manager import get_task_manager
+        rules_engine = get_rules_engine()
+        metrics = get_task_manager().get_rule_stats()
+        collected = metrics['rules']
+        
+        # Include configured rules that have not been evaluated yet
+        rules_stats = {}
+        for rule in rules_engine.get_all_rules():
+            stats = collected.pop(rule.id, None) or {
+                'evaluations': 0, 'matches': 0, 'match_rate': 0.0,
+                'actions_executed': 0, 'action_failures': 0,
+                'eval_time_ms': 0.0, 'avg_eval_us': 0.0, 'last_match': None,
+                'disabled_reason': None, 'disabled_at': None
+            }
+            stats['name'] = rule.name
+            stats['active'] = rule.active
+            stats['disabled_reason'] = stats['disabled_reason'] or rule.disabled_reason or None
+            rules_stats[rule.id] = stats
+        
+        return jsonify({
+            'success': True,
+            'rules': rules_stats,
+            'deleted_rules': collected,
+            'condition_types': metrics['condition_types']
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
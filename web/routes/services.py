@@ -7,12 +7,14 @@ email processing services across multiple accounts.
 """
 
 import logging
+import os
 from flask import Blueprint, request, jsonify, current_app, redirect, url_for
 from werkzeug.exceptions import BadRequest, NotFound
 from functools import wraps
 
 from services.task_manager import get_task_manager
-from services.email_processor import ProcessingMode, ServiceState
+from services.email_processor import ProcessingMode, ServiceState, DEFAULT_MANUAL_BATCH_TIMEOUT
+from services.worker_pool import _get_scheduler_setting
 
 # Create blueprint
 services_bp = Blueprint('services', __name__, url_prefix='/api/services')
@@ -87,6 +89,49 @@ def get_aggregate_stats():
         }), 500
 
 
+@services_bp.route('/stats/history', methods=['GET'])
+def get_stats_history():
+    """
+    Get classified message counts over time, by disposition
+    
+    Query Parameters:
+        account: Single account (default: all accounts)
+        resolution: minute, hour or day (default: hour)
+        points: Number of buckets to return (default: 24)
+        
+    Returns:
+        JSON: Totals for today and the last 7 days, and per-bucket counts oldest first
+    """
+    try:
+        from services.stats_store import get_stats_store, RESOLUTIONS
+        
+        account_email = request.args.get('account') or None
+        resolution = request.args.get('resolution', 'hour')
+        points = request.args.get('points', 24, type=int)
+        if resolution not in RESOLUTIONS:
+            raise BadRequest(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+        
+        store = get_stats_store()
+        return jsonify({
+            'success': True,
+            'data': {
+                'today': store.today(account_email),
+                'last_7_days': store.last_days(7, account_email),
+                'resolution': resolution,
+                'trend': store.trend(resolution, max(1, points), account_email)
+            }
+        })
+        
+    except BadRequest:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get stats history: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @services_bp.route('/accounts/<account_email>/status', methods=['GET'])
 def get_account_status(account_email: str):
     """
@@ -521,25 +566,32 @@ def stop_all_accounts():
 @services_bp.route('/task-history', methods=['GET'])
 def get_task_history():
     """
-    Get recent task history
+    Get recent task history, one page at a time
     
     Query Parameters:
-        limit: Maximum number of entries (default 50)
+        limit: Maximum number of entries (default 50, at most 500)
+        before: Cursor from the previous page's next_cursor
+        account: Only entries about this account
+        type: Only entries of this task type
         
     Returns:
-        JSON: Recent task history
+        JSON: Task history page in chronological order and the cursor for older entries
     """
     try:
-        limit = request.args.get('limit', 50, type=int)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        before = request.args.get('before', type=int)
         
         task_manager = get_task_manager()
-        history = task_manager.get_task_history(limit)
+        history = task_manager.get_task_history(limit, before=before,
+                                                account_email=request.args.get('account') or None,
+                                                task_type=request.args.get('type') or None)
         
         return jsonify({
             'success': True,
             'data': {
                 'history': history,
-                'count': len(history)
+                'count': len(history),
+                'next_cursor': history[0].get('seq') if len(history) == limit else None
             }
         })
         
@@ -646,8 +698,17 @@ def process_batch(account_email: str):
                 'error': f'Batch processing only available in startup mode. Account is in {current_mode} mode.'
             }), 400
         
-        # Use the new manual processing method that includes all rule types
-        batch_result = processor.process_manual_batch()
+        # Runs on the account's lane ahead of queued background jobs; a batch
+        # that outlasts the timeout keeps running and is reported as accepted
+        timeout = _get_scheduler_setting('manual_batch_timeout', DEFAULT_MANUAL_BATCH_TIMEOUT)
+        try:
+            batch_result = processor.run_manual_batch(timeout=timeout)
+        except TimeoutError:
+            return jsonify({
+                'success': True,
+                'message': f'Batch for {account_email} is still running; results will appear in the account stats',
+                'data': {'pending': True}
+            }), 202
         
         return jsonify({
             'success': True,
@@ -663,6 +724,270 @@ def process_batch(account_email: str):
         }), 500
 
 
+@services_bp.route('/accounts/<account_email>/backfill-rules', methods=['POST'])
+def backfill_rules(account_email: str):
+    """
+    Start running all active rules over the whole inbox of an account
+
+    The backfill runs in the background on the account's lane; poll
+    GET /accounts/<account_email>/backfill-rules for its progress.
+
+    Args:
+        account_email: Email address of the account
+
+    JSON Body:
+        limit: Maximum number of emails to process (default: all)
+        workers: Number of worker processes (default and maximum: number of CPUs)
+
+    Returns:
+        JSON: Rule backfill progress (202 Accepted)
+    """
+    try:
+        data = request.get_json() or {}
+        limit = data.get('limit')
+        workers = data.get('workers')
+
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            return jsonify({
+                'success': False,
+                'error': 'Limit must be a positive integer'
+            }), 400
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'error': 'Workers must be a positive integer'
+            }), 400
+        if workers is not None:
+            workers = min(workers, os.cpu_count() or 1)
+
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        try:
+            progress = processor.start_rule_backfill(limit=limit, workers=workers)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'message': f'Rule backfill running for {account_email}',
+            'data': progress
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Failed to backfill rules for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@services_bp.route('/accounts/<account_email>/backfill-rules', methods=['GET'])
+def get_rule_backfill_progress(account_email: str):
+    """
+    Get rule backfill progress for an account
+
+    Args:
+        account_email: Email address of the account
+
+    Returns:
+        JSON: Status, stage, messages fetched and the summary once completed
+    """
+    try:
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': processor.get_rule_backfill_progress()
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to get rule backfill progress for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@services_bp.route('/accounts/<account_email>/backfill', methods=['GET'])
+def get_backfill_progress(account_email: str):
+    """
+    Get inbox backfill progress for an account
+
+    Args:
+        account_email: Email address of the account
+
+    Returns:
+        JSON: Position, counts, messages/second and ETA
+    """
+    try:
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': processor.get_backfill_progress()
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to get backfill progress for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@services_bp.route('/accounts/<account_email>/backfill', methods=['POST'])
+def start_backfill(account_email: str):
+    """
+    Start or resume the inbox backfill for an account in startup mode
+
+    Args:
+        account_email: Email address of the account
+
+    JSON Body:
+        reset: Start over from the oldest message (default false)
+
+    Returns:
+        JSON: Backfill progress
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        reset = data.get('reset', False)
+
+        if not isinstance(reset, bool):
+            return jsonify({
+                'success': False,
+                'error': 'Reset must be a boolean'
+            }), 400
+
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        try:
+            progress = processor.start_backfill(reset=reset)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'message': f'Inbox backfill running for {account_email}',
+            'data': progress
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to start backfill for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@services_bp.route('/accounts/<account_email>/backfill/stop', methods=['POST'])
+def stop_backfill(account_email: str):
+    """
+    Pause the inbox backfill for an account; it resumes from the same position
+
+    Args:
+        account_email: Email address of the account
+
+    Returns:
+        JSON: Success status
+    """
+    try:
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        processor.stop_backfill()
+
+        return jsonify({
+            'success': True,
+            'message': f'Inbox backfill pausing for {account_email}'
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to stop backfill for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@services_bp.route('/accounts/<account_email>/traces', methods=['GET'])
+def get_account_traces(account_email: str):
+    """
+    Get recent traced processing cycles for an account, for a waterfall view
+
+    Args:
+        account_email: Email address of the account
+
+    Query Parameters:
+        limit: Maximum number of cycles to return (default: 10)
+
+    Returns:
+        JSON: Cycles, newest first, each with spans timed in ms from the cycle start
+    """
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        task_manager = get_task_manager()
+        processor = task_manager._get_processor(account_email)
+
+        if not processor:
+            return jsonify({
+                'success': False,
+                'error': f'Account {account_email} not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': processor.get_traces(limit)
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to get traces for account {account_email}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @services_bp.route('/accounts/<account_email>/inbox-count', methods=['GET'])
 def get_inbox_count(account_email: str):
     """
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Mail-Rulez processing worker
+
+Runs the processing engine for a shard of accounts when sharded_processing
+is enabled. Start one or more workers next to the web app; accounts are
+spread over the live workers by consistent hashing and move automatically
+when a worker joins or leaves.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import get_config
+from logging_config import setup_for_environment, get_logger
+from services.task_manager import TaskManager
+from services.worker_pool import _get_scheduler_setting
+from services.sharding import ShardWorker, get_shard_store
+
+
+def main():
+    """Run a shard worker until SIGTERM or SIGINT"""
+    parser = argparse.ArgumentParser(description="Mail-Rulez processing worker")
+    parser.add_argument('--worker-id', default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Unique worker name (defaults to host-pid)")
+    args = parser.parse_args()
+
+    setup_for_environment()
+    logger = get_logger('shard_worker')
+    get_config()
+
+    task_manager = TaskManager()
+    task_manager.load_accounts_from_config()
+
+    worker = ShardWorker(args.worker_id, get_shard_store(), task_manager,
+                         lease_ttl=_get_scheduler_setting('shard_lease_ttl', 30.0),
+                         heartbeat_interval=_get_scheduler_setting('shard_heartbeat_interval', 10.0))
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    logger.info(f"Worker {args.worker_id} managing up to {len(task_manager.processors)} accounts")
+    try:
+        worker.run(stop_event)
+    finally:
+        task_manager.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())